@@ -4,179 +4,708 @@ from __future__ import absolute_import
 # * lazy loading
 # * locking
 
-from .GangaRepository import GangaRepository, RepositoryError
-import os
-import os.path
+# GangaRepositorySQLite keeps all objects of a registry in a single SQLite database.
+# Objects are stored as XML (the same format as GangaRepositoryLocal) in the objects table,
+# subjobs in a separate subjobs table and the index caches as pickles next to them.
+# The fields which are used to select objects (status, name, application, backend and the
+# backend id) are stored in indexed columns so that selections can be done in SQL.
+# Sessions and the locks they hold are kept in the database as well, a session is considered
+# dead once its heartbeat is older than the DiskIOTimeout.
+# The database is used in WAL mode, so it should not be placed on a network file system.
+
+from Ganga.Core.GangaRepository import GangaRepository, RepositoryError, InaccessibleObjectError
+from Ganga.Core.GangaRepository.GangaRepositorySegment import SubJobSegmentList
+from Ganga.Core.GangaRepository.VStreamer import to_file as xml_to_file
+from Ganga.Core.GangaRepository.VStreamer import from_file as xml_from_file
+from Ganga.Core.GangaRepository.VStreamer import XMLFileError, EmptyGangaObject
+from Ganga.Core.GangaRepository.GangaRepositoryXML import check_app_hash, rmrf
+from Ganga.Core.GangaThread import GangaThread
+from Ganga.Utility.Plugin import PluginManagerError
+from Ganga.Utility.Config import getConfig
+from Ganga.GPIDev.Base.Objects import Node, GangaObject
+from Ganga.GPIDev.Schema.Schema import Schema, Version
+from Ganga.GPIDev.Base.Proxy import isType, stripProxy, getName
 
+import Ganga.Utility.logging
+
+import os
+import time
+import errno
 import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+from StringIO import StringIO
 
 try:
     import cPickle as pickle
-except:
+except ImportError:
     import pickle
 
-import Ganga.Utility.logging
 logger = Ganga.Utility.logging.getLogger()
 
+# SQLite refuses statements with more than 999 parameters
+_max_variables = 900
+
+_schema_statements = [
+    "CREATE TABLE IF NOT EXISTS objects (id INTEGER PRIMARY KEY, classname TEXT, category TEXT, version INTEGER, "
+    "status TEXT, name TEXT, application TEXT, backend TEXT, backend_id TEXT, idx BLOB, data TEXT)",
+    "CREATE INDEX IF NOT EXISTS objects_status ON objects (status)",
+    "CREATE INDEX IF NOT EXISTS objects_name ON objects (name)",
+    "CREATE INDEX IF NOT EXISTS objects_application ON objects (application)",
+    "CREATE INDEX IF NOT EXISTS objects_backend ON objects (backend)",
+    "CREATE INDEX IF NOT EXISTS objects_backend_id ON objects (backend_id)",
+    "CREATE TABLE IF NOT EXISTS subjobs (master_id INTEGER, sub_id INTEGER, status TEXT, backend_id TEXT, idx BLOB, data TEXT, "
+    "PRIMARY KEY (master_id, sub_id))",
+    "CREATE INDEX IF NOT EXISTS subjobs_status ON subjobs (master_id, status)",
+    "CREATE INDEX IF NOT EXISTS subjobs_backend_id ON subjobs (backend_id)",
+    "CREATE TABLE IF NOT EXISTS sessions (session TEXT PRIMARY KEY, info TEXT, heartbeat REAL)",
+    "CREATE TABLE IF NOT EXISTS locks (id INTEGER PRIMARY KEY, session TEXT)",
+    "CREATE TABLE IF NOT EXISTS counter (name TEXT PRIMARY KEY, value INTEGER)",
+]
+
+# select attributes which are stored in a column of the objects table
+_string_columns = ['status', 'name']
+_class_columns = ['application', 'backend']
+
+
+def _chunks(seq, size=_max_variables):
+    """Split a sequence into lists which fit into a single SQL statement"""
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _placeholders(seq):
+    return ",".join("?" * len(seq))
+
+
+def _column_values(obj):
+    """
+    Return the values of the indexed columns (status, name, application, backend, backend_id) of an object
+    Args:
+        obj (GangaObject): The object which is about to be stored
+    """
+    values = []
+    for attr in _string_columns:
+        value = getattr(obj, attr) if obj._schema.hasAttribute(attr) else None
+        values.append(str(value) if value is not None else None)
+    for attr in _class_columns:
+        value = getattr(obj, attr) if obj._schema.hasAttribute(attr) else None
+        values.append(getName(value) if value is not None else None)
+    backend_id = None
+    if obj._schema.hasAttribute('backend'):
+        backend = stripProxy(getattr(obj, 'backend'))
+        if backend is not None and backend._schema.hasAttribute('id'):
+            backend_id = getattr(backend, 'id')
+    values.append(str(backend_id) if backend_id not in [None, '', -1] else None)
+    return values
+
+
+class SubJobSQLiteList(SubJobSegmentList):
+    """
+        Lazy loading list of subjobs which are stored as rows of the subjobs table of a GangaRepositorySQLite
+    """
+
+    _category = 'internal'
+    _exportmethods = ['__getitem__', '__len__', '__iter__', 'getAllCachedData', 'values']
+    _hidden = True
+    _name = 'SubJobSQLiteList'
+
+    _schema = Schema(Version(1, 0), {})
+
+    def __len__(self):
+        """ Number of subjobs, all of them have an entry in the index loaded on construction """
+        return len(self._subjobIndexData)
+
+
+class SQLiteSessionRefresher(GangaThread):
+    """
+    Thread keeping the heartbeat of the session of a GangaRepositorySQLite up to date
+    """
+
+    def __init__(self, repo):
+        super(SQLiteSessionRefresher, self).__init__(name='SQLiteSessionRefresher_%s' % repo.registry.name, critical=False)
+        self.repo = repo
+
+    def run(self):
+        try:
+            while not self.should_stop():
+                try:
+                    self.repo._heartbeat()
+                except Exception as err:
+                    logger.debug("Failed to update the session heartbeat of '%s': %s" % (self.repo.registry.name, err))
+                interval = max(1., getConfig('Configuration')['DiskIOTimeout'] / 4.)
+                end_time = time.time() + interval
+                while time.time() < end_time and not self.should_stop():
+                    time.sleep(0.1)
+        finally:
+            self.unregister()
+
 
 class GangaRepositorySQLite(GangaRepository):
 
-    """GangaRepository SQLite"""
+    """GangaRepository storing objects, subjobs and locks in a single SQLite database"""
 
-    def startup(self):
-        """ Starts an repository and reads in a directory structure."""
-        self._load_timestamp = {}
-        self._cache_load_timestamp = {}
+    def __init__(self, registry):
+        """
+        Initialize a Repository from within a Registry and keep a reference to the Registry which 'owns' it
+        Args:
+            Registry (Registry): This is the registry which manages this Repo
+        """
+        super(GangaRepositorySQLite, self).__init__(registry)
+        self.sub_split = "subjobs"
+        self.root = os.path.join(self.registry.location, "0.2", self.registry.name)
+        self.con = None
+        self.locked = set()
+        self.session_name = None
+        self.printed_explanation = False
         self._fully_loaded = {}
+        self._versions = {}
+        self._data_version = None
+        self._db_lock = threading.RLock()
+        self._refresher = None
+
+    def startup(self):
+        """ Connects to the database, creating it if needed, and reads the index of all objects.
+        Raise RepositoryError"""
         self.known_bad_ids = []
-        self.root = os.path.join(
-            self.registry.location, "0.1", self.registry.name)
+        self._fully_loaded = {}
+        self._versions = {}
+        self._data_version = None
+        self.locked = set()
         try:
             os.makedirs(self.root)
-        except OSError as x:
-            pass
-        self.con = sqlite3.connect(os.path.join(self.root, "database.db"))
-        logger.debug("Connected to ", os.path.join(self.root, "database.db"))
-        self.cur = self.con.cursor()
-        tables = self.cur.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' and name LIKE 'objects'")
-        if len(self.cur.fetchall()) == 0:
-            self.cur.execute(
-                "CREATE TABLE objects (id INTEGER PRIMARY KEY, classname VARCHAR(30), category VARCHAR(20), idx VARCHAR(100), data VARCHAR(1000))")
-        self.con.commit()
-        self.update_index(verbose=True)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise RepositoryError(self, "OSError on directory create: %s" % err)
+        db_file = os.path.join(self.root, "database.db")
+        try:
+            self.con = sqlite3.connect(db_file, timeout=getConfig('Configuration')['DiskIOTimeout'],
+                                       isolation_level=None, check_same_thread=False)
+            self.con.text_factory = str
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute("PRAGMA synchronous=NORMAL")
+            with self._transaction() as con:
+                for statement in _schema_statements:
+                    con.execute(statement)
+        except sqlite3.Error as err:
+            raise RepositoryError(self, "Error opening SQLite database '%s': %s" % (db_file, err))
+        logger.debug("Connected to %s" % db_file)
+
+        this_date = datetime.datetime.now().strftime("%H.%M_%A_%d_%B_%Y")
+        self.session_name = ".".join([os.uname()[1], this_date, "PID", str(os.getpid()), self.registry.name])
+        with self._transaction() as con:
+            con.execute("INSERT OR REPLACE INTO sessions (session, info, heartbeat) VALUES (?, ?, ?)",
+                        (self.session_name, "%s (pid %s) since %s" % (os.uname()[1], os.getpid(), this_date), time.time()))
+        self._refresher = SQLiteSessionRefresher(self)
+        self._refresher.start()
+
+        self.update_index(verbose=True, firstRun=True)
+        logger.debug("GangaRepositorySQLite Finished Startup")
 
     def shutdown(self):
         """Shutdown the repository. Flushing is done by the Registry
+        Remove the session and its locks from the database
         Raise RepositoryError"""
-        self.cur.close()
-        self.con.close()
+        logger.debug("Shutting Down GangaRepositorySQLite: %s" % self.registry.name)
+        if self._refresher is not None:
+            self._refresher.stop()
+            self._refresher = None
+        if self.con is None:
+            return
+        try:
+            with self._transaction() as con:
+                con.execute("DELETE FROM locks WHERE session=?", (self.session_name,))
+                con.execute("DELETE FROM sessions WHERE session=?", (self.session_name,))
+        except sqlite3.Error as err:
+            logger.warning("Failed to remove session '%s' from the database: %s" % (self.session_name, err))
+        with self._db_lock:
+            self.con.close()
+            self.con = None
+        self.locked = set()
 
-    def update_index(self, id=None, verbose=False):
-        """ Update the list of available objects
-        Raise RepositoryError"""
-        # First locate and load the index files
-        logger.debug("updating index...")
-        self.cur.execute("SELECT id,classname,category,idx FROM objects")
-        for e in self.cur:
-            id = int(e[0])
-            if e[1] is None:  # deleted object
-                continue
-            # Locked IDs can be ignored
-            # if id in self.sessionlock.locked:
-            #    continue
-            # Now we treat unlocked IDs
-            if id in self.objects:
-                obj = self.objects[id]
-            else:
-                obj = self._make_empty_object_(id, e[2], e[1])
-            obj._index_cache = pickle.loads(e[3])
-        logger.debug("updated index done")
+    def updateLocksNow(self):
+        """
+        Trigger the session heartbeat to be updated now
+        """
+        self._heartbeat()
 
-    def constructDataDict(self, obj):
-        data_dict = {}
-        for attr_name, attr in obj._schema.allItems():
-            if not attr['getter']:
-                data_dict[attr_name] = getattr(obj, attr_name)
-        return data_dict
+    @contextmanager
+    def _transaction(self):
+        """
+        Run the enclosed statements in a single write transaction on the connection of this repository
+        """
+        with self._db_lock:
+            if self.con is None:
+                raise RepositoryError(self, "The SQLite database of '%s' is not open" % self.registry.name)
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.con
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+            self.con.execute("COMMIT")
 
-    def add(self, objs, force_ids=None):
-        """ Add the given objects to the repository, forcing the IDs if told to.
-        Raise RepositoryError"""
-        ids = []
-        # assume the ids are already locked by Registry
-        if not force_ids is None:
-            if not len(objs) == len(force_ids):
-                raise RepositoryError(
-                    self, "Internal Error: add with different number of objects and force_ids!")
-            ids = force_ids
-        for i in range(0, len(objs)):
-            cls = objs[i]._name
-            cat = objs[i]._category
-            objs[i]._index_cache = self.registry.getIndexCache(objs[i])
-            data = pickle.dumps(self.constructDataDict(obj)).replace("'", "''")
-            idx = pickle.dumps(objs[i]._index_cache).replace("'", "''")
-            if force_ids is None:
-                self.cur.execute("INSERT INTO objects (id,classname,category,idx,data) VALUES (NULL,'%s','%s','%s','%s')" % (
-                    cls, cat, idx, data))
-            else:
-                self.cur.execute("INSERT INTO objects (id,classname,category,idx,data) VALUES (%i,'%s','%s','%s','%s')" % (
-                    force_ids[i], cls, cat, idx, data))
-            ids.append(self.cur.lastrowid)
-            self._internal_setitem__(ids[i], objs[i])
-        self.con.commit()
-        return ids
+    def _query(self, statement, params=()):
+        """ Run a read only query and return all resulting rows """
+        with self._db_lock:
+            if self.con is None:
+                raise RepositoryError(self, "The SQLite database of '%s' is not open" % self.registry.name)
+            return self.con.execute(statement, params).fetchall()
 
-    def flush(self, ids):
-        for id in ids:
-            obj = self.objects[id]
-            if obj._name != "EmptyGangaObject":
-                obj._index_cache = self.registry.getIndexCache(obj)
-                data = pickle.dumps(self.constructDataDict(obj)).replace("'", "''")
-                idx = pickle.dumps(obj._index_cache).replace("'", "''")
-                self.cur.execute(
-                    "UPDATE objects SET idx='%s',data='%s' WHERE id=%s" % (idx, data, id))
-                # print "flushing id ", id, " backend ", obj.backend._name
-        self.con.commit()
-
-    def load(self, ids):
-        self.cur.execute("SELECT id,classname,category,data FROM objects WHERE id IN (%s)" % (
-            ",".join(map(str, ids))))
-        for e in self.cur:
-            # print "load: ",e
-            _id = int(e[0])
-            if e[1] is None:  # deleted object
-                continue
-            if not _id in self.objects:
-                obj = self._make_empty_object_(_id, e[2], e[1])
-            else:
-                obj = self.objects[_id]
-            if _id not in self._fully_loaded:
-                new_data = pickle.loads(e[3])
-                for k, v in new_data:
-                    setattr(obj, k, v)
-            self._fully_loaded[_id] = obj
-            ids.remove(_id)
-        if len(ids) > 0:
-            raise KeyError(ids[0])
+    # Sessions and locks
 
-    def delete(self, ids):
-        for id in ids:
-            self.cur.execute(
-                "UPDATE objects SET classname=NULL,category=NULL,idx=NULL,data=NULL WHERE id=%s" % (id))
-            self._internal_del__(id)
-        self.con.commit()
+    def _heartbeat(self):
+        """ Mark this session as alive """
+        with self._transaction() as con:
+            con.execute("UPDATE sessions SET heartbeat=? WHERE session=?", (time.time(), self.session_name))
+
+    def _dead_before(self):
+        """ Sessions which have not updated their heartbeat after this time are considered dead """
+        return time.time() - getConfig('Configuration')['DiskIOTimeout']
+
+    def _foreign_locks(self, con):
+        """ Return a dict of id -> session for all ids locked by other live sessions """
+        rows = con.execute("SELECT locks.id, locks.session FROM locks JOIN sessions ON locks.session = sessions.session "
+                           "WHERE locks.session != ? AND sessions.heartbeat > ?", (self.session_name, self._dead_before()))
+        return dict(rows.fetchall())
+
+    def make_new_ids(self, n):
+        """
+        Lock the next n available ids and return them as a list
+        Args:
+            n (int): number of ids to reserve
+        """
+        with self._transaction() as con:
+            count = con.execute("SELECT MAX(value) FROM (SELECT value FROM counter WHERE name='ids' "
+                                "UNION ALL SELECT MAX(id) + 1 FROM objects UNION ALL SELECT MAX(id) + 1 FROM locks)").fetchone()[0] or 0
+            if self.locked and max(self.locked) >= count:
+                count = max(self.locked) + 1
+            ids = range(count, count + n)
+            con.executemany("INSERT OR REPLACE INTO locks (id, session) VALUES (?, ?)", [(i, self.session_name) for i in ids])
+            con.execute("INSERT OR REPLACE INTO counter (name, value) VALUES ('ids', ?)", (count + n,))
+        self.locked.update(ids)
+        return list(ids)
 
     def lock(self, ids):
-        return ids
+        """
+        Request a session lock for the following ids
+        Returns the ids which could be locked, ids locked by other live sessions are left out
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+        """
+        with self._transaction() as con:
+            foreign = self._foreign_locks(con)
+            free_ids = [this_id for this_id in ids if this_id not in foreign]
+            con.executemany("INSERT OR REPLACE INTO locks (id, session) VALUES (?, ?)", [(i, self.session_name) for i in free_ids])
+        self.locked.update(free_ids)
+        return free_ids
 
     def unlock(self, ids):
-        return ids
+        """
+        Release the session locks of the following ids
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+        """
+        with self._transaction() as con:
+            con.executemany("DELETE FROM locks WHERE id=? AND session=?", [(i, self.session_name) for i in ids])
+        self.locked.difference_update(ids)
 
-    def get_lock_session(self, id):
+    def get_lock_session(self, this_id):
         """get_lock_session(id)
         Tries to determine the session that holds the lock on id for information purposes, and return an informative string.
         Returns None on failure
+        Args:
+            this_id (int): Get the id of the session which has a lock on the object with this id
         """
-        return ""
+        rows = self._query("SELECT sessions.info FROM locks JOIN sessions ON locks.session = sessions.session WHERE locks.id=?", (this_id,))
+        if rows:
+            return rows[0][0]
+        return None
 
     def get_other_sessions(self):
         """get_session_list()
         Tries to determine the other sessions that are active and returns an informative string for each of them.
         """
-        return []
+        rows = self._query("SELECT info FROM sessions WHERE session != ? AND heartbeat > ?", (self.session_name, self._dead_before()))
+        return [row[0] for row in rows]
 
     def reap_locks(self):
         """reap_locks() --> True/False
         Remotely clear all foreign locks from the session.
-        WARNING: This is not nice.
+        Only sessions which have stopped updating their heartbeat are removed.
         Returns True on success, False on error."""
-        return False
+        try:
+            with self._transaction() as con:
+                dead = [row[0] for row in con.execute("SELECT session FROM sessions WHERE session != ? AND heartbeat <= ?",
+                                                      (self.session_name, self._dead_before()))]
+                for session in dead:
+                    logger.debug("Reaping session: %s" % session)
+                con.executemany("DELETE FROM locks WHERE session=?", [(session,) for session in dead])
+                con.executemany("DELETE FROM sessions WHERE session=?", [(session,) for session in dead])
+                con.execute("DELETE FROM locks WHERE session NOT IN (SELECT session FROM sessions)")
+        except sqlite3.Error as err:
+            logger.debug("Failed to reap locks: %s" % err)
+            return False
+        return True
+
+    # Serialisation helpers
+
+    def _serialise(self, obj, ignore_subs=''):
+        """
+        Return the XML and the index cache of an object
+        Args:
+            obj (GangaObject): the object to serialise
+            ignore_subs (str): attribute which is not written with the object
+        """
+        check_app_hash(obj)
+        data = StringIO()
+        xml_to_file(obj, data, ignore_subs)
+        return data.getvalue(), self.registry.getIndexCache(stripProxy(obj))
+
+    def _parse(self, this_id, data):
+        """
+        Parse the XML of an object
+        Raise InaccessibleObjectError if it can't be parsed
+        """
+        try:
+            obj, errs = xml_from_file(StringIO(data))
+        except XMLFileError as err:
+            raise InaccessibleObjectError(self, this_id, err)
+        if len(errs) > 0:
+            for err in errs:
+                logger.error("err: %s" % err)
+            raise InaccessibleObjectError(self, this_id, errs[0])
+        return obj
+
+    def _count_subjobs(self, this_id):
+        """ Return the number of subjobs stored for an object """
+        return self._query("SELECT COUNT(*) FROM subjobs WHERE master_id=?", (this_id,))[0][0]
+
+    def _read_object(self, this_id, sub_id=-1):
+        """
+        Read and parse an object or one of its subjobs
+        Raise KeyError if it is not stored, InaccessibleObjectError if it can't be parsed
+        """
+        if sub_id < 0:
+            rows = self._query("SELECT data FROM objects WHERE id=?", (this_id,))
+        else:
+            rows = self._query("SELECT data FROM subjobs WHERE master_id=? AND sub_id=?", (this_id, sub_id))
+        if not rows:
+            raise KeyError(this_id)
+        return self._parse(this_id, rows[0][0])
+
+    def _read_subjob_indexes(self, this_id):
+        """ Return a dict of subjob number -> index cache for all subjobs of an object """
+        result = {}
+        for sub_id, idx in self._query("SELECT sub_id, idx FROM subjobs WHERE master_id=?", (this_id,)):
+            try:
+                result[sub_id] = pickle.loads(str(idx))
+            except Exception as err:
+                logger.debug("Corrupt index of subjob %s.%s: %s" % (this_id, sub_id, err))
+                result[sub_id] = {}
+        return result
+
+    def _subjob_rows(self, this_id, subjobs):
+        """
+        Return the rows of the subjobs table and the index caches of the given subjobs
+        Args:
+            this_id (int): registry id of the master object
+            subjobs (dict): subjob number -> subjob object
+        """
+        rows = []
+        indexes = {}
+        for index, subjob_obj in subjobs.iteritems():
+            data, cache = self._serialise(subjob_obj)
+            columns = _column_values(subjob_obj)
+            status, backend_id = columns[0], columns[-1]
+            rows.append((this_id, index, status, backend_id, sqlite3.Binary(pickle.dumps(cache, pickle.HIGHEST_PROTOCOL)), data))
+            indexes[index] = cache
+        return rows, indexes
+
+    def _write_subjobs(self, this_id, subjobs):
+        """
+        Write the given subjobs of an object in one transaction and return their index caches
+        Args:
+            this_id (int): registry id of the master object
+            subjobs (dict): subjob number -> subjob object
+        """
+        rows, indexes = self._subjob_rows(this_id, subjobs)
+        with self._transaction() as con:
+            con.executemany("INSERT OR REPLACE INTO subjobs (master_id, sub_id, status, backend_id, idx, data) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return indexes
+
+    # GangaRepository interface
+
+    def update_index(self, this_id=None, verbose=False, firstRun=False):
+        """ Update the list of available objects from the database
+        Only the index caches of objects which were changed by other sessions are read
+        Raise RepositoryError
+        Args:
+            this_id (int): Unused, the whole table is always checked
+            verbose (bool): Should we be verbose
+            firstRun (bool): If this is the call from the Repo startup
+        """
+        logger.debug("updating index...")
+        # data_version only changes when another connection has committed to the database
+        data_version = self._query("PRAGMA data_version")[0][0]
+        if not firstRun and data_version == self._data_version:
+            return []
+        self._data_version = data_version
+
+        on_disk = dict(self._query("SELECT id, version FROM objects"))
+        changed = [i for i, version in on_disk.iteritems() if firstRun or self._versions.get(i) != version]
+
+        changed_ids = []
+        summary = []
+        rows = []
+        for chunk in _chunks(sorted(changed)):
+            rows.extend(self._query("SELECT id, classname, category, version, idx FROM objects WHERE id IN (%s)" % _placeholders(chunk), chunk))
+
+        for this_id, cls, cat, version, idx in rows:
+            if this_id in self.locked or this_id in self.incomplete_objects:
+                continue
+            try:
+                cache = pickle.loads(str(idx))
+            except Exception as err:
+                summary.append((this_id, err))
+                continue
+            if this_id in self.objects:
+                obj = self.objects[this_id]
+                setattr(obj, '_registry_refresh', True)
+            else:
+                try:
+                    obj = self._make_empty_object_(this_id, cat, cls)
+                except PluginManagerError as err:
+                    summary.append((this_id, err))
+                    continue
+            obj._index_cache = cache
+            self._versions[this_id] = version
+            changed_ids.append(this_id)
+
+        deleted_ids = set(self.objects.keys()) - set(on_disk.keys())
+        for this_id in deleted_ids:
+            if this_id in self.locked:
+                # Added by us but not flushed yet
+                continue
+            self._internal_del__(this_id)
+            self._fully_loaded.pop(this_id, None)
+            self._versions.pop(this_id, None)
+            changed_ids.append(this_id)
+
+        for this_id, err in summary:
+            if this_id in self.known_bad_ids:
+                continue
+            self.known_bad_ids.append(this_id)
+            if this_id not in self.incomplete_objects:
+                self.incomplete_objects.append(this_id)
+            logger.error("Registry '%s': Failed to load object #%s due to '%s'" % (self.registry.name, this_id, err))
+        if summary and self.printed_explanation is False:
+            logger.error("If you want to delete the incomplete objects, you can type:\n")
+            logger.error("'for i in %s.incomplete_ids(): %s(i).remove()'\n (then press 'Enter' twice)" % (self.registry.name, self.registry.name))
+            self.printed_explanation = True
+
+        logger.debug("updated index done")
+        return changed_ids
+
+    def add(self, objs, force_ids=None):
+        """ Add the given objects to the repository, forcing the IDs if told to.
+        Raise RepositoryError
+        Args:
+            objs (list): GangaObject-s which we want to add to the Repo
+            force_ids (list, None): IDs to assign to object, None for auto-assign
+        """
+        if force_ids not in [None, []]:  # assume the ids are already locked by Registry
+            if not len(objs) == len(force_ids):
+                raise RepositoryError(self, "Internal Error: add with different number of objects and force_ids!")
+            ids = force_ids
+        else:
+            ids = self.make_new_ids(len(objs))
+
+        for i in range(0, len(objs)):
+            self._internal_setitem__(ids[i], objs[i])
+            # Set subjobs dirty - they will not be flushed if they are not.
+            for sj in getattr(objs[i], self.sub_split, None) or []:
+                sj._dirty = True
+
+        return ids
+
+    def flush(self, ids):
+        """
+        Write the objects for the given ids (and their dirty subjobs) to the database in one transaction
+        Args:
+            ids (list): List of integers, used as keys to objects in the self.objects dict
+        """
+        logger.debug("Flushing: %s" % ids)
+        object_rows = []
+        subjob_rows = []
+        subjob_counts = []
+        flushed = []
+        for this_id in ids:
+            if this_id in self.incomplete_objects:
+                logger.debug("Should NEVER re-flush an incomplete object, it's now 'bad' respect this!")
+                continue
+            obj = self.objects[this_id]
+            if isType(obj, EmptyGangaObject):
+                raise RepositoryError(self, "Cannot flush an Empty object for ID: %s" % this_id)
+            try:
+                subjobs = getattr(obj, self.sub_split, None) if obj._schema.hasAttribute(self.sub_split) else None
+                if isinstance(subjobs, SubJobSegmentList):
+                    subjobs.flush()
+                elif subjobs:
+                    # Constructed in this session, write any dirty subjob
+                    dirty_subjobs = dict((index, stripProxy(sj)) for index, sj in enumerate(subjobs) if getattr(sj, '_dirty', True))
+                    rows, _ = self._subjob_rows(this_id, dirty_subjobs)
+                    subjob_rows.extend(rows)
+                    for sj in dirty_subjobs.values():
+                        sj._setFlushed()
+                subjob_counts.append((this_id, len(subjobs) if subjobs else 0))
+                data, cache = self._serialise(obj, self.sub_split)
+            except XMLFileError as err:
+                raise RepositoryError(self, "Error of type: %s on flushing id '%s': %s" % (type(err), this_id, err))
+            version = self._versions.get(this_id, 0) + 1
+            object_rows.append(tuple([this_id, getName(obj), obj._category, version] + _column_values(obj) +
+                                     [sqlite3.Binary(pickle.dumps(cache, pickle.HIGHEST_PROTOCOL)), data]))
+            flushed.append((this_id, obj, version))
+
+        with self._transaction() as con:
+            con.executemany("INSERT OR REPLACE INTO subjobs (master_id, sub_id, status, backend_id, idx, data) VALUES (?, ?, ?, ?, ?, ?)", subjob_rows)
+            # Remove subjobs which are no longer part of an object
+            con.executemany("DELETE FROM subjobs WHERE master_id=? AND sub_id>=?", subjob_counts)
+            con.executemany("INSERT OR REPLACE INTO objects (id, classname, category, version, status, name, application, backend, backend_id, idx, data) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", object_rows)
+
+        for this_id, obj, version in flushed:
+            self._versions[this_id] = version
+            if this_id not in self._fully_loaded:
+                self._fully_loaded[this_id] = obj
+            obj._setFlushed()
+
+    def load(self, ids, load_backup=False):
+        """
+        Load the following "ids" from the database
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+            load_backup (bool): There are no backups in the database, this is ignored
+        """
+        logger.debug("Loading Repo object(s): %s" % ids)
+        for this_id in ids:
+            if this_id in self.incomplete_objects:
+                raise RepositoryError(self, "Trying to re-load a corrupt repository id: %s" % this_id)
+
+        rows = {}
+        subjob_counts = {}
+        for chunk in _chunks(ids):
+            for this_id, version, data in self._query("SELECT id, version, data FROM objects WHERE id IN (%s)" % _placeholders(chunk), chunk):
+                rows[this_id] = (version, data)
+            subjob_counts.update(self._query("SELECT master_id, COUNT(*) FROM subjobs WHERE master_id IN (%s) GROUP BY master_id" % _placeholders(chunk), chunk))
+
+        for this_id in ids:
+            if this_id not in rows:
+                if this_id in self.objects:
+                    self._internal_del__(this_id)
+                raise KeyError(this_id)
+            version, data = rows[this_id]
+            try:
+                tmpobj = self._parse(this_id, data)
+            except InaccessibleObjectError:
+                logger.error("Adding id: %s to Corrupt IDs will not attempt to re-load this session" % this_id)
+                self.incomplete_objects.append(this_id)
+                raise
+
+            if this_id not in self.objects:
+                self._internal_setitem__(this_id, tmpobj)
+                obj = tmpobj
+            else:
+                obj = self.objects[this_id]
+                for key, val in tmpobj._data.items():
+                    obj.setSchemaAttribute(key, val)
+                for attr_name, attr_val in obj._schema.allItems():
+                    if attr_name not in tmpobj._data:
+                        obj.setSchemaAttribute(attr_name, obj._schema.getDefaultValue(attr_name))
+
+            if obj._schema.hasAttribute(self.sub_split):
+                if subjob_counts.get(this_id, 0) > 0:
+                    obj.setSchemaAttribute(self.sub_split, SubJobSQLiteList(self, this_id, parent=obj))
+                else:
+                    from Ganga.GPIDev.Lib.GangaList.GangaList import GangaList
+                    obj.setSchemaAttribute(self.sub_split, GangaList())
+
+            from Ganga.GPIDev.Base.Objects import do_not_copy
+            for node_key, node_val in obj._data.items():
+                if isType(node_val, Node) and node_key not in do_not_copy:
+                    node_val._setParent(obj)
+
+            obj._index_cache = {}
+            self._versions[this_id] = version
+            self._fully_loaded[this_id] = obj
+            obj._setFlushed()
+
+        logger.debug("Finished 'load'-ing of: %s" % ids)
+
+    def delete(self, ids):
+        """
+        Remove the objects and their subjobs from the database
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+        """
+        with self._transaction() as con:
+            con.executemany("DELETE FROM subjobs WHERE master_id=?", [(this_id,) for this_id in ids])
+            con.executemany("DELETE FROM objects WHERE id=?", [(this_id,) for this_id in ids])
+        for this_id in ids:
+            self._internal_del__(this_id)
+            self._versions.pop(this_id, None)
+            if this_id in self._fully_loaded:
+                del self._fully_loaded[this_id]
+            if this_id in self.objects:
+                del self.objects[this_id]
+
+    def select_ids(self, attrs):
+        """
+        Return the set of stored ids matching all of the given select attributes, using the indexed columns.
+        Returns None if one of the attributes can't be evaluated in SQL
+        Args:
+            attrs (dict): attribute name -> value as passed to RegistrySlice.do_select
+        """
+        clauses = []
+        params = []
+        for attr, value in attrs.iteritems():
+            if attr == 'ids':
+                value = list(value)
+                if len(value) > _max_variables:
+                    return None
+                clauses.append("id IN (%s)" % _placeholders(value))
+                params.extend(value)
+            elif attr in _string_columns and isinstance(value, str):
+                # fnmatch and GLOB only differ for character classes
+                if '[' in value:
+                    return None
+                clauses.append("%s GLOB ?" % attr)
+                params.append(value)
+            elif attr in _class_columns and isinstance(stripProxy(value), GangaObject):
+                clauses.append("%s = ?" % attr)
+                params.append(getName(value))
+            else:
+                return None
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return set(row[0] for row in self._query("SELECT id FROM objects" + where, params))
 
     def clean(self):
         """clean() --> True/False
         Clear EVERYTHING in this repository, counter, all jobs, etc.
         WARNING: This is not nice."""
         self.shutdown()
-        os.unlink(os.path.join(self.root, "database.db"))
+        try:
+            rmrf(self.root)
+        except Exception as err:
+            logger.error("Failed to correctly clean repository due to: %s" % err)
         self.startup()
+
+    def isObjectLoaded(self, obj):
+        """
+        This will return a true false if an object has been fully loaded into memory
+        Args:
+            obj (GangaObject): The object we want to know if it was loaded into memory
+        """
+        return any(o is obj for o in self._fully_loaded.values())
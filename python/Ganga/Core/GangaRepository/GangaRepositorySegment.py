@@ -0,0 +1,549 @@
+# Note: Following stuff must be considered in a GangaRepository:
+#
+# * lazy loading
+# * locking
+
+# GangaRepositorySegment keeps all objects of a registry, their subjobs and
+# their index caches in a single append-only segment file (see SegmentStore)
+# instead of one directory, data file and index file per (sub)object.
+
+from Ganga.Core.GangaRepository import GangaRepository, RepositoryError, InaccessibleObjectError
+from Ganga.Core.GangaRepository.SessionLock import SessionLockManager
+from Ganga.Core.GangaRepository.SegmentStore import SegmentStore, DATA, INDEX, PUT, DELETE
+from Ganga.Core.GangaRepository.SubJobXMLList import SubJobXMLList
+from Ganga.Core.GangaRepository.VStreamer import to_file as xml_to_file
+from Ganga.Core.GangaRepository.VStreamer import from_file as xml_from_file
+from Ganga.Core.GangaRepository.VStreamer import XMLFileError, EmptyGangaObject
+from Ganga.Core.GangaRepository.GangaRepositoryXML import check_app_hash, rmrf
+from Ganga.Core.exceptions import GangaException
+from Ganga.Utility.Plugin import PluginManagerError
+from Ganga.Utility.Config import getConfig
+from Ganga.GPIDev.Base.Objects import Node
+from Ganga.GPIDev.Schema.Schema import Schema, Version
+from Ganga.GPIDev.Base.Proxy import isType, stripProxy, getName
+from Ganga.Utility.external.OrderedDict import OrderedDict as oDict
+
+import Ganga.Utility.logging
+
+import os
+from StringIO import StringIO
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+logger = Ganga.Utility.logging.getLogger()
+
+
+class SubJobSegmentList(SubJobXMLList):
+    """
+        Lazy loading list of subjobs which are stored as records in the segment file of a GangaRepositorySegment
+        All storage access goes through the _count_subjobs, _read_subjob_indexes, _read_object and _write_subjobs
+        methods of the owning repository
+    """
+
+    _category = 'internal'
+    _exportmethods = ['__getitem__', '__len__', '__iter__', 'getAllCachedData', 'values']
+    _hidden = True
+    _name = 'SubJobSegmentList'
+
+    _schema = Schema(Version(1, 0), {})
+
+    def __init__(self, repo=None, master_id=None, parent=None):
+        """ Constructor for SubJobSegmentList
+        Args:
+            repo (GangaRepository): The repository owning the subjob records
+            master_id (int): The registry id of the master job
+            parent (Job): parent of self after constuction
+        """
+        # Deliberately skip the SubJobXMLList constructor which reads from a job directory
+        super(SubJobXMLList, self).__init__()
+
+        self._repo = repo
+        self._master_id = master_id
+        self._registry = repo.registry if repo is not None else None
+        self._jobDirectory = ''
+        self._dataFileName = 'data'
+        self._load_backup = False
+        self._subjob_master_index_name = None
+        self._journal_length = 0
+        self._index_generation = 0
+        self._unindexed = set()
+        self._known_len = 0
+        self._cachedJobs = oDict()
+        self._definedParent = None
+        self._cached_filenames = {}
+        self._stored_len = []
+        self._storedKeys = {}
+        self._subjobIndexData = {}
+        self._reset_loading_state()
+
+        if repo is None:
+            return
+
+        if parent:
+            self._setParent(parent)
+        self.load_subJobIndex()
+
+    def __deepcopy__(self, memo=None):
+        obj = super(SubJobSegmentList, self).__deepcopy__(memo)
+        obj._repo = self._repo
+        obj._master_id = self._master_id
+        return obj
+
+    def __len__(self):
+        """ Number of subjobs stored in the repository """
+        if self._repo is None:
+            return 0
+        return self._repo._count_subjobs(self._master_id)
+
+    def load_subJobIndex(self):
+        """Load the index of all subjobs from the index records of the repository"""
+        self._subjobIndexData = self._repo._read_subjob_indexes(self._master_id)
+
+    def write_subJobIndex(self, ignore_disk=False, updated=None):
+        """The subjob index records are written together with the subjob data by flush"""
+        pass
+
+    def prefetch(self, indices):
+        """The records are read from the repository when they are parsed, there are no files to read ahead"""
+        pass
+
+    def _getItem(self, index):
+        """Load the subjob from the repository if it is not in memory
+        Args:
+            index (int): The index corresponding to the subjob object we want
+        """
+        subjob_obj = self._fromCache(index)
+        if subjob_obj is None:
+            with self._get_subjob_lock(index):
+                subjob_obj = self._fromCache(index)
+                if subjob_obj is not None:
+                    return subjob_obj
+
+                if index < 0 or index >= len(self):
+                    raise GangaException("Subjob: %s does NOT exist" % index)
+
+                logger.debug("Loading subjob #%s for job #%s from repository" % (index, self.getMasterID()))
+                subjob_obj = self._repo._read_object(self._master_id, index)
+                subjob_obj._setParent(self._definedParent)
+                subjob_obj._setFlushed()
+                self._addToCache(index, subjob_obj)
+
+        return subjob_obj
+
+    def _flushSubJobs(self, subjobs):
+        """Write the given subjobs and their index records in one batch
+        Args:
+            subjobs (dict): subjob index -> subjob object
+        """
+        self._subjobIndexData.update(self._repo._write_subjobs(self._master_id, subjobs))
+        for subjob_obj in subjobs.values():
+            subjob_obj._setFlushed()
+
+    def flush(self, ignore_disk=False):
+        """Write the dirty subjobs held in memory and their index records in one batch
+        Args:
+            ignore_disk (bool): Unused, kept for compatibility with SubJobXMLList
+        """
+        self._reviveDirtyEvicted()
+        dirty_subjobs = {}
+        for index in sorted(self._cachedJobs.keys()):
+            subjob_obj = self._cachedJobs[index]
+            if not subjob_obj._dirty:
+                continue
+            if subjob_obj is subjob_obj._getRoot():
+                raise GangaException(self, "Subjob parent not set correctly in flush.")
+            dirty_subjobs[index] = subjob_obj
+        self._subjobIndexData.update(self._repo._write_subjobs(self._master_id, dirty_subjobs))
+
+
+class GangaRepositorySegment(GangaRepository):
+
+    """GangaRepository storing objects in a single append-only segment file"""
+
+    def __init__(self, registry):
+        """
+        Initialize a Repository from within a Registry and keep a reference to the Registry which 'owns' it
+        Args:
+            Registry (Registry): This is the registry which manages this Repo
+        """
+        super(GangaRepositorySegment, self).__init__(registry)
+        self.sub_split = "subjobs"
+        self.root = os.path.join(self.registry.location, "6.0", self.registry.name)
+        self.lockroot = os.path.join(self.registry.location, "6.0")
+        self.store = None
+        self.sessionlock = None
+        self.printed_explanation = False
+        self._fully_loaded = {}
+
+    def startup(self):
+        """ Starts a repository and reads in the segment file.
+        Raise RepositoryError"""
+        self.known_bad_ids = []
+        self._fully_loaded = {}
+        self.sessionlock = SessionLockManager(self, self.lockroot, self.registry.name)
+        self.sessionlock.startup()
+        self.store = SegmentStore(os.path.join(self.root, "segment.dat"), self)
+        self.store.open()
+        self.update_index(verbose=True, firstRun=True)
+        logger.debug("GangaRepositorySegment Finished Startup")
+
+    def shutdown(self):
+        """Shutdown the repository. Flushing is done by the Registry
+        Raise RepositoryError
+        Compact the segment if nobody else is using it and write the offset index snapshot"""
+        logger.debug("Shutting Down GangaRepositorySegment: %s" % self.registry.name)
+        try:
+            if self.store.dead_fraction() > getConfig('Registry')['SegmentCompactionThreshold']:
+                self.compact()
+        except Exception as err:
+            logger.warning("Warning: Failed to compact segment file due to: %s" % err)
+        self.store.close()
+        self.sessionlock.shutdown()
+
+    def compact(self):
+        """
+        Rewrite the segment file without the overwritten and deleted records.
+        This is only done if no other Ganga session is using the repository.
+        Returns the number of bytes reclaimed
+        """
+        if self.sessionlock.get_other_sessions():
+            logger.debug("Not compacting segment file of '%s', other sessions are active" % self.registry.name)
+            return 0
+        return self.store.compact()
+
+    def updateLocksNow(self):
+        """
+        Trigger the session locks to all be updated now
+        """
+        self.sessionlock.updateNow()
+
+    # Serialisation helpers
+
+    def _make_records(self, this_id, sub_id, obj, ignore_subs=''):
+        """
+        Return the DATA and INDEX records (in that order) for an object
+        Args:
+            this_id (int): registry id of the (master) object
+            sub_id (int): subjob number or -1 for the master object
+            obj (GangaObject): the object to serialise
+            ignore_subs (str): attribute which is not written with the object
+        """
+        check_app_hash(obj)
+        data = StringIO()
+        xml_to_file(obj, data, ignore_subs)
+        index = pickle.dumps((obj._category, getName(obj), self.registry.getIndexCache(stripProxy(obj))), pickle.HIGHEST_PROTOCOL)
+        return [(PUT, DATA, this_id, sub_id, data.getvalue()), (PUT, INDEX, this_id, sub_id, index)]
+
+    def _count_subjobs(self, this_id):
+        """ Return the number of subjobs stored for an object """
+        return self.store.count_children(this_id)
+
+    def _write_subjobs(self, this_id, subjobs):
+        """
+        Write the given subjobs of an object in one batch and return their index caches
+        Args:
+            this_id (int): registry id of the master object
+            subjobs (dict): subjob number -> subjob object
+        """
+        records = []
+        indexes = {}
+        for index, subjob_obj in subjobs.iteritems():
+            records.extend(self._make_records(this_id, index, subjob_obj))
+            indexes[index] = pickle.loads(records[-1][4])[2]
+        self.store.write_many(records)
+        return indexes
+
+    def _read_object(self, this_id, sub_id=-1):
+        """
+        Parse the data record of an object from the segment
+        Raise KeyError if the record is not present, InaccessibleObjectError if it can't be parsed
+        """
+        data = self.store.read(DATA, this_id, sub_id)
+        try:
+            obj, errs = xml_from_file(StringIO(data))
+        except XMLFileError as err:
+            raise InaccessibleObjectError(self, this_id, err)
+        if len(errs) > 0:
+            for err in errs:
+                logger.error("err: %s" % err)
+            raise InaccessibleObjectError(self, this_id, errs[0])
+        return obj
+
+    def _read_index(self, this_id, sub_id=-1):
+        """ Return the (category, classname, index_cache) tuple of an object """
+        return pickle.loads(self.store.read(INDEX, this_id, sub_id))
+
+    def _read_subjob_indexes(self, this_id):
+        """ Return a dict of subjob number -> index cache for all subjobs of an object """
+        keys = [(INDEX, this_id, sub_id) for sub_id in self.store.children(this_id)]
+        result = {}
+        for key, payload in self.store.read_many(keys).iteritems():
+            try:
+                result[key[2]] = pickle.loads(payload)[2]
+            except Exception as err:
+                logger.debug("Corrupt subjob index record %s: %s" % (key, err))
+        return result
+
+    # GangaRepository interface
+
+    def update_index(self, this_id=None, verbose=False, firstRun=False):
+        """ Update the list of available objects from the segment file
+        Raise RepositoryError
+        Args:
+            this_id (int): Unused, the whole segment is always checked
+            verbose (bool): Should we be verbose
+            firstRun (bool): If this is the call from the Repo startup
+        """
+        logger.debug("updating index...")
+        changed = self.store.refresh()
+        on_disk = set(self.store.ids())
+        if changed is None or firstRun:
+            changed = on_disk
+
+        changed_ids = []
+        summary = []
+        locked_ids = self.sessionlock.locked
+
+        for this_id in sorted(changed):
+            if this_id not in on_disk:
+                continue
+            if this_id >= self.sessionlock.count:
+                self.sessionlock.count = this_id + 1
+            if this_id in locked_ids or this_id in self.incomplete_objects:
+                continue
+            try:
+                cat, cls, cache = self._read_index(this_id)
+            except KeyError:
+                # No index record, load the object to find out what it is
+                try:
+                    self.load([this_id])
+                    changed_ids.append(this_id)
+                except (KeyError, InaccessibleObjectError) as err:
+                    summary.append((this_id, err))
+                continue
+            except Exception as err:
+                summary.append((this_id, err))
+                continue
+            if this_id in self.objects:
+                obj = self.objects[this_id]
+                setattr(obj, '_registry_refresh', True)
+            else:
+                try:
+                    obj = self._make_empty_object_(this_id, cat, cls)
+                except PluginManagerError as err:
+                    summary.append((this_id, err))
+                    continue
+            obj._index_cache = cache
+            changed_ids.append(this_id)
+
+        deleted_ids = set(self.objects.keys()) - on_disk
+        for this_id in deleted_ids:
+            if this_id in locked_ids:
+                # Added by us but not flushed yet
+                continue
+            self._internal_del__(this_id)
+            self._fully_loaded.pop(this_id, None)
+            changed_ids.append(this_id)
+
+        for this_id, err in summary:
+            if this_id in self.known_bad_ids:
+                continue
+            self.known_bad_ids.append(this_id)
+            if this_id not in self.incomplete_objects:
+                self.incomplete_objects.append(this_id)
+            logger.error("Registry '%s': Failed to load object #%s due to '%s'" % (self.registry.name, this_id, err))
+        if summary and self.printed_explanation is False:
+            logger.error("If you want to delete the incomplete objects, you can type:\n")
+            logger.error("'for i in %s.incomplete_ids(): %s(i).remove()'\n (then press 'Enter' twice)" % (self.registry.name, self.registry.name))
+            self.printed_explanation = True
+
+        logger.debug("updated index done")
+        return changed_ids
+
+    def add(self, objs, force_ids=None):
+        """ Add the given objects to the repository, forcing the IDs if told to.
+        Raise RepositoryError
+        Args:
+            objs (list): GangaObject-s which we want to add to the Repo
+            force_ids (list, None): IDs to assign to object, None for auto-assign
+        """
+        if force_ids not in [None, []]:  # assume the ids are already locked by Registry
+            if not len(objs) == len(force_ids):
+                raise RepositoryError(self, "Internal Error: add with different number of objects and force_ids!")
+            ids = force_ids
+        else:
+            ids = self.sessionlock.make_new_ids(len(objs))
+
+        for i in range(0, len(objs)):
+            self._internal_setitem__(ids[i], objs[i])
+            # Set subjobs dirty - they will not be flushed if they are not.
+            for sj in getattr(objs[i], self.sub_split, None) or []:
+                sj._dirty = True
+
+        return ids
+
+    def flush(self, ids):
+        """
+        Append the objects for the given ids (and their dirty subjobs) to the segment
+        Args:
+            ids (list): List of integers, used as keys to objects in the self.objects dict
+        """
+        logger.debug("Flushing: %s" % ids)
+        for this_id in ids:
+            if this_id in self.incomplete_objects:
+                logger.debug("Should NEVER re-flush an incomplete object, it's now 'bad' respect this!")
+                continue
+            obj = self.objects[this_id]
+            if isType(obj, EmptyGangaObject):
+                raise RepositoryError(self, "Cannot flush an Empty object for ID: %s" % this_id)
+            try:
+                records = []
+                subjobs = getattr(obj, self.sub_split, None) if obj._schema.hasAttribute(self.sub_split) else None
+                if isinstance(subjobs, SubJobSegmentList):
+                    subjobs.flush()
+                elif subjobs:
+                    # Constructed in this session, write any dirty subjob
+                    for index, sj in enumerate(subjobs):
+                        if getattr(sj, '_dirty', True):
+                            records.extend(self._make_records(this_id, index, stripProxy(sj)))
+                            sj._setFlushed()
+                n_subjobs = len(subjobs) if subjobs else 0
+                # Remove subjobs which are no longer part of this object
+                for sub_id in self.store.children(this_id):
+                    if sub_id >= n_subjobs:
+                        records.append((DELETE, DATA, this_id, sub_id, ''))
+                records.extend(self._make_records(this_id, -1, obj, self.sub_split))
+                self.store.write_many(records)
+            except XMLFileError as err:
+                raise RepositoryError(self, "Error of type: %s on flushing id '%s': %s" % (type(err), this_id, err))
+
+            if this_id not in self._fully_loaded:
+                self._fully_loaded[this_id] = obj
+            obj._setFlushed()
+
+    def load(self, ids, load_backup=False):
+        """
+        Load the following "ids" from the segment
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+            load_backup (bool): There are no backups in a segment, this is ignored
+        """
+        logger.debug("Loading Repo object(s): %s" % ids)
+        for this_id in ids:
+            if this_id in self.incomplete_objects:
+                raise RepositoryError(self, "Trying to re-load a corrupt repository id: %s" % this_id)
+            try:
+                tmpobj = self._read_object(this_id)
+            except KeyError:
+                if this_id in self.objects:
+                    self._internal_del__(this_id)
+                raise KeyError(this_id)
+            except InaccessibleObjectError:
+                logger.error("Adding id: %s to Corrupt IDs will not attempt to re-load this session" % this_id)
+                self.incomplete_objects.append(this_id)
+                raise
+
+            if this_id not in self.objects:
+                self._internal_setitem__(this_id, tmpobj)
+                obj = tmpobj
+            else:
+                obj = self.objects[this_id]
+                for key, val in tmpobj._data.items():
+                    obj.setSchemaAttribute(key, val)
+                for attr_name, attr_val in obj._schema.allItems():
+                    if attr_name not in tmpobj._data:
+                        obj.setSchemaAttribute(attr_name, obj._schema.getDefaultValue(attr_name))
+
+            if obj._schema.hasAttribute(self.sub_split):
+                if self.store.count_children(this_id) > 0:
+                    obj.setSchemaAttribute(self.sub_split, SubJobSegmentList(self, this_id, parent=obj))
+                else:
+                    from Ganga.GPIDev.Lib.GangaList.GangaList import GangaList
+                    obj.setSchemaAttribute(self.sub_split, GangaList())
+
+            from Ganga.GPIDev.Base.Objects import do_not_copy
+            for node_key, node_val in obj._data.items():
+                if isType(node_val, Node) and node_key not in do_not_copy:
+                    node_val._setParent(obj)
+
+            obj._index_cache = {}
+            self._fully_loaded[this_id] = obj
+            obj._setFlushed()
+
+        logger.debug("Finished 'load'-ing of: %s" % ids)
+
+    def delete(self, ids):
+        """
+        Append tombstones for the objects (and their subjobs) to the segment
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+        """
+        self.store.write_many([(DELETE, DATA, this_id, -1, '') for this_id in ids])
+        for this_id in ids:
+            self._internal_del__(this_id)
+            if this_id in self._fully_loaded:
+                del self._fully_loaded[this_id]
+            if this_id in self.objects:
+                del self.objects[this_id]
+
+    def lock(self, ids):
+        """
+        Request a session lock for the following ids
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+        """
+        return self.sessionlock.lock_ids(ids)
+
+    def unlock(self, ids):
+        """
+        Unlock (release file locks of) the following ids
+        Args:
+            ids (list): The object keys which we want to iterate over from the objects dict
+        """
+        released_ids = self.sessionlock.release_ids(ids)
+        if len(released_ids) < len(ids):
+            logger.error("The write locks of some objects could not be released!")
+
+    def get_lock_session(self, this_id):
+        """get_lock_session(id)
+        Tries to determine the session that holds the lock on id for information purposes, and return an informative string.
+        Returns None on failure
+        Args:
+            this_id (int): Get the id of the session which has a lock on the object with this id
+        """
+        return self.sessionlock.get_lock_session(this_id)
+
+    def get_other_sessions(self):
+        """get_session_list()
+        Tries to determine the other sessions that are active and returns an informative string for each of them.
+        """
+        return self.sessionlock.get_other_sessions()
+
+    def reap_locks(self):
+        """reap_locks() --> True/False
+        Remotely clear all foreign locks from the session.
+        WARNING: This is not nice.
+        Returns True on success, False on error."""
+        return self.sessionlock.reap_locks()
+
+    def clean(self):
+        """clean() --> True/False
+        Clear EVERYTHING in this repository, counter, all jobs, etc.
+        WARNING: This is not nice."""
+        self.shutdown()
+        try:
+            rmrf(self.root)
+        except Exception as err:
+            logger.error("Failed to correctly clean repository due to: %s" % err)
+        self.startup()
+
+    def isObjectLoaded(self, obj):
+        """
+        This will return a true false if an object has been fully loaded into memory
+        Args:
+            obj (GangaObject): The object we want to know if it was loaded into memory
+        """
+        return any(o is obj for o in self._fully_loaded.values())
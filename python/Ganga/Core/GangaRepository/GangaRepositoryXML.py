@@ -13,6 +13,7 @@ import copy
 import threading
 
 from Ganga.Core.GangaRepository.SessionLock import SessionLockManager
+from Ganga.Core.GangaRepository.MasterIndex import MasterIndex
 
 import Ganga.Utility.logging
 
@@ -32,6 +33,21 @@ logger = Ganga.Utility.logging.getLogger()
 
 save_all_history = False
 
+# A chunk directory modified less than this many seconds before it was listed may be modified again without its mtime
+# changing (coarse filesystem timestamps), so its listing is not trusted on the next update
+_mtime_margin = 2.
+
+
+def _trusted_mtime(mtime):
+    """Return the mtime of a chunk directory if a later change to it is certain to change the mtime, None otherwise
+    Args:
+        mtime (float): The mtime of the directory
+    """
+    # Timestamps with a fraction of a second come from a filesystem with fine grained timestamps
+    if mtime == int(mtime) and time.time() - mtime < _mtime_margin:
+        return None
+    return mtime
+
 def check_app_hash(obj):
     """Writes a file safely, raises IOError on error
     Args:
@@ -216,6 +232,11 @@ class GangaRepositoryLocal(GangaRepository):
         self._cached_obj = {}
         self._master_index_timestamp = 0
 
+        # Persistent index of all index files and the state of the chunk directories they live in
+        self._master_index = MasterIndex(os.path.join(self.root, 'master.index'))
+        self._chunk_state = {}
+        self._unchanged_ids = set()
+
         self.known_bad_ids = []
         if "XML" in self.registry.type:
             self.to_file = xml_to_file
@@ -268,7 +289,7 @@ class GangaRepositoryLocal(GangaRepository):
             self.saved_idxpaths[this_id] = os.path.join(self.root, "%ixxx" % int(this_id * 0.001), "%i.index" % this_id)
         return self.saved_idxpaths[this_id]
 
-    def index_load(self, this_id):
+    def index_load(self, this_id, unchanged=False):
         """ load the index file for this object if necessary
             Loads if never loaded or timestamp changed. Creates object if necessary
             Returns True if this object has been changed, False if not
@@ -277,11 +298,15 @@ class GangaRepositoryLocal(GangaRepository):
             Raise PluginManagerError if the class name is not found
         Args:
             this_id (int): This is the id for which we want to load the index file from disk
+            unchanged (bool): The chunk directory of this object hasn't changed since its index was cached, skip the stat
         """
         #logger.debug("Loading index %s" % this_id)
         fn = self.get_idxfn(this_id)
         # index timestamp changed
-        fn_ctime = os.stat(fn).st_ctime
+        if unchanged and this_id in self._cache_load_timestamp:
+            fn_ctime = self._cache_load_timestamp[this_id]
+        else:
+            fn_ctime = os.stat(fn).st_ctime
         cache_time = self._cache_load_timestamp.get(this_id, 0)
         if cache_time != fn_ctime:
             logger.debug("%s != %s" % (cache_time, fn_ctime))
@@ -335,19 +360,82 @@ class GangaRepositoryLocal(GangaRepository):
             new_idx_cache = self.registry.getIndexCache(stripProxy(obj))
             if not os.path.exists(ifn) or shutdown:
                 new_cache = new_idx_cache
-                with open(ifn, "w") as this_file:
+                chunk = os.path.basename(os.path.dirname(ifn))
+                chunk_mtime = os.stat(os.path.dirname(ifn)).st_mtime
+                # Replace the file rather than rewriting it so the mtime of the chunk directory changes
+                with open(ifn + ".new", "w") as this_file:
                     new_index = (obj._category, getName(obj), new_cache)
                     logger.debug("Writing: %s" % str(new_index))
                     pickle_to_file(new_index, this_file)
+                os.rename(ifn + ".new", ifn)
+                self._own_chunk_write(chunk, chunk_mtime, this_id)
+                self._cache_load_timestamp[this_id] = os.stat(ifn).st_ctime
+                self._cached_cat[this_id] = obj._category
+                self._cached_cls[this_id] = getName(obj)
                 self._cached_obj[this_id] = new_cache
                 obj._index_cache = {}
+                # On shutdown the whole master index is rewritten afterwards
+                if not shutdown:
+                    try:
+                        self._master_index.append({this_id: (self._cache_load_timestamp[this_id],) + new_index})
+                    except (IOError, OSError) as err:
+                        logger.debug("Failed to add index %s to the master index: %s" % (this_id, err))
             self._cached_obj[this_id] = new_idx_cache
-        except IOError as err:
+        except (IOError, OSError) as err:
             logger.error("Index saving to '%s' failed: %s %s" % (ifn, getName(err), err))
 
+    def _own_chunk_write(self, chunk, mtime_before, this_id):
+        """ Keep the listing of a chunk directory trusted after this session wrote the index file of an object in it, by
+            recording its new mtime, as long as nothing else had changed the directory since it was listed
+        Args:
+            chunk (str): Name of the chunk directory, e.g. '1xxx'
+            mtime_before (float): The mtime of the chunk directory before the index file was written
+            this_id (int): The id of the object whose index file was written
+        """
+        state = self._chunk_state.get(chunk)
+        if state is None or state[0] is None or state[0] != mtime_before:
+            return
+        try:
+            mtime = os.stat(os.path.join(self.root, chunk)).st_mtime
+        except OSError as err:
+            logger.debug("_own_chunk_write: %s" % err)
+            return
+        listing = dict(state[1])
+        listing[this_id] = True
+        self._chunk_state[chunk] = (_trusted_mtime(mtime), listing)
+
+    def _list_chunk(self, chunk, known=None):
+        """ List the objects in a chunk directory, reusing the known listing if the directory is unchanged.
+            Returns ((mtime, {id: index present}), unchanged). The mtime is None if it can't be trusted next time
+            Raise OSError
+        Args:
+            chunk (str): Name of the chunk directory, e.g. '1xxx'
+            known (tuple, None): State (mtime, listing) of the chunk directory when it was last listed
+        """
+        chunk_dir = os.path.join(self.root, chunk)
+        mtime = os.stat(chunk_dir).st_mtime
+        if known is not None and known[0] is not None and known[0] == mtime:
+            return known, True
+        listing = os.listdir(chunk_dir)
+        objs = dict([(int(l), False) for l in listing if l.isdigit()])
+        for l in listing:
+            if l.endswith(".index") and l[:-6].isdigit():
+                this_id = int(l[:-6])
+                if this_id in objs:
+                    objs[this_id] = True
+                else:
+                    try:
+                        rmrf(self.get_idxfn(this_id))
+                        logger.warning("Deleted index file without data file: %s" % self.get_idxfn(this_id))
+                    except OSError as err:
+                        logger.debug("get_index_listing delete Exception: %s" % err)
+        return (_trusted_mtime(mtime), objs), False
+
     def get_index_listing(self):
         """Get dictionary of possible objects in the Repository: True means index is present,
             False if not present
+            Only chunk directories whose mtime changed since they were last listed are listed again, the ids in the others
+            are stored in self._unchanged_ids
         Raise RepositoryError"""
         try:
             obj_chunks = [d for d in os.listdir(self.root) if d.endswith("xxx") and d[:-3].isdigit()]
@@ -355,35 +443,50 @@ class GangaRepositoryLocal(GangaRepository):
             logger.debug("get_index_listing Exception: %s" % err)
             raise RepositoryError(self, "Could not list repository '%s'!" % (self.root))
         objs = {}  # True means index is present, False means index not present
+        unchanged_ids = set()
         for c in obj_chunks:
             try:
-                listing = os.listdir(os.path.join(self.root, c))
+                state, unchanged = self._list_chunk(c, self._chunk_state.get(c))
             except OSError as err:
-                logger.debug("get_index_listing Exception: %s")
+                logger.debug("get_index_listing Exception: %s" % err)
                 raise RepositoryError(self, "Could not list repository '%s'!" % (os.path.join(self.root, c)))
-            objs.update(dict([(int(l), False) for l in listing if l.isdigit()]))
-            for l in listing:
-                if l.endswith(".index") and l[:-6].isdigit():
-                    this_id = int(l[:-6])
-                    if this_id in objs:
-                        objs[this_id] = True
-                    else:
-                        try:
-                            rmrf(self.get_idxfn(this_id))
-                            logger.warning("Deleted index file without data file: %s" % self.get_idxfn(this_id))
-                        except OSError as err:
-                            logger.debug("get_index_listing delete Exception: %s" % err)
+            self._chunk_state[c] = state
+            objs.update(state[1])
+            if unchanged:
+                unchanged_ids.update(state[1])
+        for c in set(self._chunk_state) - set(obj_chunks):
+            del self._chunk_state[c]
+        self._unchanged_ids = unchanged_ids
         return objs
 
     def _read_master_cache(self):
         """
-        read in the master cache to reduce significant I/O over many indexes separately on startup
+        read in the master index to reduce significant I/O over many indexes separately on startup
+        The chunk directories unchanged since the index was written don't need to be listed again
+        """
+        master = self._master_index.read()
+        if master is None:
+            logger.debug("No usable master index, reading the index files")
+            self._read_legacy_master_cache()
+            return
+        logger.debug("Reading Master index")
+        entries, chunks = master
+        for this_id, (ctime, cat, cls, cache) in entries.iteritems():
+            self._cache_load_timestamp[this_id] = ctime
+            self._cached_cat[this_id] = cat
+            self._cached_cls[this_id] = cls
+            self._cached_obj[this_id] = cache
+        self._chunk_state = chunks
+        self._master_index_timestamp = time.time()
+
+    def _read_legacy_master_cache(self):
+        """
+        read in the master cache written by older versions and remove it, it's replaced by the master index on shutdown
         """
         try:
             _master_idx = os.path.join(self.root, 'master.idx')
             if os.path.isfile(_master_idx):
                 logger.debug("Reading Master index")
-                self._master_index_timestamp = os.stat(_master_idx).st_ctime
                 with open(_master_idx, 'r') as input_f:
                     this_master_cache = pickle_from_file(input_f)[0]
                 for this_cache in this_master_cache:
@@ -407,27 +510,22 @@ class GangaRepositoryLocal(GangaRepository):
         """
         clear the master cache(s) which have been stored in memory
         """
-        for k, v in self._cache_load_timestamp.iteritems():
-            self._cache_load_timestamp.pop(k)
-        for k, v in self._cached_cat.iteritems():
-            self._cached_cat.pop(k)
-        for k, v in self._cached_cls.iteritems():
-            self._cached_cls.pop(k)
-        for k, v in self._cached_obj.iteritems():
-            self._cached_obj.pop(k)
+        self._cache_load_timestamp.clear()
+        self._cached_cat.clear()
+        self._cached_cls.clear()
+        self._cached_obj.clear()
+        self._chunk_state = {}
 
     def _write_master_cache(self, shutdown=False):
         """
-        write a master index cache once per 300sec
+        write the master index once per 300sec
+        Only chunk directories which are unchanged since this session listed them are stored as trusted
         Args:
             shutdown (boool): True causes this to be written now
         """
         try:
-            _master_idx = os.path.join(self.root, 'master.idx')
-            this_master_cache = []
-            if os.path.isfile(_master_idx) and not shutdown:
-                if abs(self._master_index_timestamp - os.stat(_master_idx).st_ctime) < 300:
-                    return
+            if not shutdown and abs(time.time() - self._master_index_timestamp) < 300:
+                return
 
             items_to_save = self.objects.iteritems()
             for k, v in items_to_save:
@@ -453,46 +551,43 @@ class GangaRepositoryLocal(GangaRepository):
                     logger.debug("Failed to update index: %s on startup/shutdown" % k)
                     logger.debug("Reason: %s" % err)
 
-            iterables = self._cache_load_timestamp.iteritems()
-            for k, v in iterables:
-                if k in self.incomplete_objects:
+            entries = {}
+            for k, ctime in self._cache_load_timestamp.iteritems():
+                if k in self.incomplete_objects or k not in self.objects:
+                    continue
+                # The timestamp of flushed objects is the time of the flush rather than that of their index file
+                if k in self._fully_loaded:
+                    try:
+                        ctime = os.stat(self.get_idxfn(k)).st_ctime
+                    except OSError as err:
+                        logger.debug("_write_master_cache: %s" % err)
+                        if err.errno == errno.ENOENT:  # If file is not found
+                            continue
+                        raise
+                entries[k] = (ctime, self._cached_cat[k], self._cached_cls[k], self._cached_obj[k])
+
+            chunks = {}
+            for c, state in self._chunk_state.iteritems():
+                if state[0] is None:
                     continue
-                cached_list = []
-                cached_list.append(k)
                 try:
-                    fn = self.get_idxfn(k)
-                    if os.path.isfile(fn):
-                        time = os.stat(fn).st_ctime
-                    else:
-                        time = -1
+                    mtime = os.stat(os.path.join(self.root, c)).st_mtime
                 except OSError as err:
                     logger.debug("_write_master_cache: %s" % err)
-                    logger.debug("_cache_load_timestamp: %s" % self._cache_load_timestamp)
-                    import errno
-                    if err.errno == errno.ENOENT:  # If file is not found
-                        time = -1
-                    else:
-                        raise
-
-                if time > 0:
-                    cached_list.append(time)
-                    cached_list.append(self._cached_cat[k])
-                    cached_list.append(self._cached_cls[k])
-                    cached_list.append(self._cached_obj[k])
-                    this_master_cache.append(cached_list)
+                    continue
+                # Otherwise changed since the objects in it were last loaded
+                if mtime == state[0]:
+                    chunks[c] = state
 
-            try:
-                with open(_master_idx, 'w') as of:
-                    pickle_to_file(this_master_cache, of)
-            except IOError as err:
-                logger.debug("write_master: %s" % err)
-                try:
-                    os.remove(os.path.join(self.root, 'master.idx'))
-                except OSError as x:
-                    Ganga.Utility.logging.log_user_exception(debug=True)
+            self._master_index.write(entries, chunks)
+            self._master_index_timestamp = time.time()
         except Exception as err:
             logger.debug("write_error2: %s" % err)
             Ganga.Utility.logging.log_unknown_exception()
+            try:
+                self._master_index.remove()
+            except Exception as x:
+                Ganga.Utility.logging.log_user_exception(debug=True)
 
         return
 
@@ -514,12 +609,12 @@ class GangaRepositoryLocal(GangaRepository):
         """
         # First locate and load the index files
         logger.debug("updating index...")
+        if firstRun:
+            self._read_master_cache()
         objs = self.get_index_listing()
         changed_ids = []
         deleted_ids = set(self.objects.keys())
         summary = []
-        if firstRun:
-            self._read_master_cache()
         logger.debug("Iterating over Items")
 
         locked_ids = self.sessionlock.locked
@@ -539,7 +634,7 @@ class GangaRepositoryLocal(GangaRepository):
             # Now we treat unlocked IDs
             try:
                 # if this succeeds, all is well and we are done
-                if self.index_load(this_id):
+                if self.index_load(this_id, this_id in self._unchanged_ids):
                     changed_ids.append(this_id)
                 continue
             except IOError as err:
@@ -0,0 +1,189 @@
+##########################################################################
+# Ganga Project. http://cern.ch/ganga
+#
+# Persistent master index of the per-object index files of GangaRepositoryLocal
+##########################################################################
+
+# The master index file is a header followed by a sequence of records. The
+# first record written by a compaction is a SNAPSHOT holding the cached index
+# (ctime, category, class, index cache) of every object together with the
+# state (mtime and listing) of every NNNxxx chunk directory when it was taken.
+# Sessions which write an index file afterwards append an UPDATE record with
+# the new entries so that the snapshot doesn't have to be rewritten, the
+# newest entry for an id wins.
+#
+# A reader trusts the listing of a chunk directory, and the entries of the
+# objects inside it, only as long as the mtime of the directory is unchanged.
+# Index files are written with a rename so every change to a chunk is seen.
+#
+# The file is never modified in place: records are only appended under an
+# fcntl lock on <master>.lock and a compaction renames a new file over it.
+
+import os
+import fcntl
+import mmap
+import struct
+import zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from Ganga.Utility.logging import getLogger
+
+logger = getLogger()
+
+# Record kinds
+SNAPSHOT = 'S'
+UPDATE = 'U'
+
+_file_magic = 'GANGAMIX'
+_file_version = 1
+# magic, version
+_file_header = struct.Struct('>8sB')
+# kind, payload length, crc32 of payload
+_record_header = struct.Struct('>cIi')
+
+
+class MasterIndex(object):
+    """
+    Reader and writer of the master index file of a GangaRepositoryLocal.
+    Entries are dicts of id -> (ctime, category, class name, index cache) and chunk states are dicts of
+    chunk directory name -> (mtime, {id: index file present}).
+    """
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str): Full path of the master index, it and its '.lock' companion are created when first written
+        """
+        self.filename = filename
+        self.lock_filename = filename + '.lock'
+
+    class _FileLock(object):
+        """Context manager for the exclusive inter-session lock on the master index"""
+        def __init__(self, index):
+            self.index = index
+            self.fd = None
+
+        def __enter__(self):
+            self.fd = os.open(self.index.lock_filename, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+
+        def __exit__(self, *args):
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+            finally:
+                os.close(self.fd)
+
+    def _file_lock(self):
+        return MasterIndex._FileLock(self)
+
+    def _read(self):
+        """
+        Map the file and decode every record in it.
+        Returns (entries, chunks) or None if there is no usable index. A version mismatch or a damaged record makes the
+        whole file unusable as a missing update would leave stale entries behind
+        """
+        try:
+            fobj = open(self.filename, 'rb')
+        except IOError:
+            return None
+        with fobj:
+            size = os.fstat(fobj.fileno()).st_size
+            if size < _file_header.size:
+                return None
+            data = mmap.mmap(fobj.fileno(), size, access=mmap.ACCESS_READ)
+        try:
+            magic, version = _file_header.unpack_from(data, 0)
+            if magic != _file_magic or version != _file_version:
+                logger.debug("Master index '%s' has version %s, expected %s" % (self.filename, version, _file_version))
+                return None
+            entries = None
+            chunks = {}
+            offset = _file_header.size
+            while offset < size:
+                if offset + _record_header.size > size:
+                    logger.debug("Master index '%s' ends with a partial record" % self.filename)
+                    return None
+                kind, length, crc = _record_header.unpack_from(data, offset)
+                offset += _record_header.size
+                payload = data[offset:offset + length]
+                offset += length
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.debug("Master index '%s' has a damaged record" % self.filename)
+                    return None
+                if kind == SNAPSHOT:
+                    entries, chunks = pickle.loads(payload)
+                elif kind == UPDATE and entries is not None:
+                    entries.update(pickle.loads(payload))
+                else:
+                    return None
+        finally:
+            data.close()
+        if entries is None:
+            return None
+        return entries, chunks
+
+    def read(self):
+        """
+        Read the index.
+        Returns (entries, chunks) or None if the file is missing, of another version or damaged
+        """
+        try:
+            return self._read()
+        except Exception as err:
+            logger.debug("Ignoring unreadable master index '%s': %s" % (self.filename, err))
+            return None
+
+    @staticmethod
+    def _record(kind, obj):
+        payload = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        return _record_header.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+    def append(self, entries):
+        """
+        Append the entries of some newly written index files to the index. Nothing is written if there is no snapshot
+        to append to, the next compaction will pick them up from the in-memory cache
+        Args:
+            entries (dict): id -> (ctime, category, class name, index cache)
+        """
+        if not entries:
+            return
+        with self._file_lock():
+            if not os.path.isfile(self.filename):
+                return
+            with open(self.filename, 'ab') as fobj:
+                fobj.write(self._record(UPDATE, entries))
+
+    def write(self, entries, chunks, merge=True):
+        """
+        Replace the index by a single snapshot.
+        Args:
+            entries (dict): id -> (ctime, category, class name, index cache)
+            chunks (dict): chunk name -> (mtime, {id: index present}), chunks with an mtime of None are left out
+            merge (bool): Keep the entries appended by other sessions which are newer than the ones given
+        """
+        chunks = dict((c, state) for c, state in chunks.iteritems() if state[0] is not None)
+        with self._file_lock():
+            if merge:
+                on_disk = self.read()
+                if on_disk is not None:
+                    entries = dict(entries)
+                    for this_id, entry in on_disk[0].iteritems():
+                        if this_id not in entries or entries[this_id][0] < entry[0]:
+                            entries[this_id] = entry
+            new_name = self.filename + '.new'
+            with open(new_name, 'wb') as fobj:
+                fobj.write(_file_header.pack(_file_magic, _file_version))
+                fobj.write(self._record(SNAPSHOT, (entries, chunks)))
+            os.rename(new_name, self.filename)
+
+    def remove(self):
+        """Remove the index so that the next startup rescans the repository"""
+        with self._file_lock():
+            try:
+                os.unlink(self.filename)
+            except OSError:
+                pass
@@ -8,12 +8,14 @@ from Ganga.Core.GangaRepository import InaccessibleObjectError, RepositoryError
 
 import time
 import threading
+from itertools import islice
 
 from Ganga.GPIDev.Lib.GangaList.GangaList import GangaList
 from Ganga.GPIDev.Base.Objects import GangaObject
 from Ganga.GPIDev.Schema import Schema, Version
 from Ganga.GPIDev.Base.Proxy import isType, getName
 from Ganga.Utility.Config import getConfig
+from Ganga.Utility.external.OrderedDict import OrderedDict as oDict
 
 logger = getLogger()
 
@@ -93,6 +95,9 @@ def makeRepository(registry):
     if registry.type in ["LocalXML", "LocalPickle"]:
         from Ganga.Core.GangaRepository.GangaRepositoryXML import GangaRepositoryLocal
         return GangaRepositoryLocal(registry)
+    elif registry.type in ["LocalSegment"]:
+        from Ganga.Core.GangaRepository.GangaRepositorySegment import GangaRepositorySegment
+        return GangaRepositorySegment(registry)
     elif registry.type in ["SQLite"]:
         from Ganga.Core.GangaRepository.GangaRepositorySQLite import GangaRepositorySQLite
         return GangaRepositorySQLite(registry)
@@ -204,8 +209,10 @@ def synchronised_complete_lock(f):
 class RegistryFlusher(threading.Thread):
     """
     This class is intended to be used by the registry to perfom
-    automatic flushes on a fixed schedule so that information is not
-    lost if Ganga is shut down abruptly.
+    automatic flushes so that information is not lost if Ganga is shut down abruptly.
+    It sleeps until objects are marked dirty in the registry and then flushes them once the
+    oldest has been dirty for AutoFlusherWaitTime seconds, so that repeated changes are written once,
+    or straight away once AutoFlushMaxBatch objects are waiting.
     """
     def __init__(self, registry, *args, **kwargs):
         """
@@ -226,6 +233,7 @@ class RegistryFlusher(threading.Thread):
         TODO, does this need to be exposed as a method if only used internally?
         """
         self._stop.set()
+        self.registry._dirty_event.set()
 
     @property
     def stopped(self):
@@ -246,23 +254,24 @@ class RegistryFlusher(threading.Thread):
 
     def run(self):
         """
-        This will run an indefinite loop which periodically checks
-        whether it should stop. In between calls to ``flush_all`` it
-        will wait for a fixed period of time.
+        This will run an indefinite loop waiting for objects to be marked dirty in the registry.
+        When a flush is due ``flush_dirty`` writes out the dirty objects in batches.
         """
-        sleeps_per_second = 10  # This changes the granularity of the sleep.
         regConf = getConfig('Registry')
         while not self.stopped:
-            sleep_period = regConf['AutoFlusherWaitTime']
-            for i in range(sleep_period*sleeps_per_second):
-                time.sleep(1/sleeps_per_second)
-                if self.stopped:
-                    return
-            # This will trigger a flush on all dirty objects in the repo,
-            # It will lock all objects dirty as a result of the nature of the flush command
+            wait_time = regConf['AutoFlusherWaitTime']
+            if not self.registry._flushDue(wait_time):
+                oldest = self.registry._oldestDirtyTime()
+                # Sleep until something is marked dirty, the batch fills up or the oldest change is due
+                timeout = None if oldest is None else max(oldest + wait_time - time.time(), 0.1)
+                self.registry._dirty_event.wait(timeout)
+                self.registry._dirty_event.clear()
+                continue
             logger.debug('Auto-flushing: %s', self.registry.name)
             if regConf['EnableAutoFlush']:
-                self.registry.flush_all()
+                self.registry.flush_dirty()
+            else:
+                self.registry._clearDirty()
         logger.debug("Auto-Flusher shutting down for Registry: %s" % self.registry.name)
 
 
@@ -286,6 +295,16 @@ class Registry(object):
         self._read_lock = threading.RLock()
         self._flush_lock = threading.RLock()
 
+        # Root objects marked dirty since they were last flushed, id(obj) -> (obj, time first marked), oldest first
+        self._dirty_objects = oDict()
+        self._dirty_lock = threading.Lock()
+        # Wakes the RegistryFlusher when the first object is marked dirty or the backlog fills a batch
+        self._dirty_event = threading.Event()
+        # Number of objects taken off _dirty_objects which are being flushed
+        self._dirty_in_flight = 0
+        self._flush_stats = {}
+        self._resetFlushStats()
+
         self._parent = None
 
         self.repository = None
@@ -476,6 +495,8 @@ class Registry(object):
 
             logger.debug('deleting the object %d from the registry %s', this_id, self.name)
             self.repository.delete([this_id])
+            with self._dirty_lock:
+                self._dirty_objects.pop(id(obj), None)
 
     @synchronised_flush_lock
     def _flush(self, objs):
@@ -521,6 +542,113 @@ class Registry(object):
         if self.metadata and self.metadata.hasStarted():
             self.metadata.flush_all()
 
+    def _markDirty(self, obj):
+        """
+        Record that a root object of this registry has been modified so the RegistryFlusher writes it out.
+        Called by Node._setDirty, marking the same object again before it's flushed costs nothing
+        Args:
+            obj (GangaObject): The root object which is now dirty
+        """
+        with self._dirty_lock:
+            if id(obj) in self._dirty_objects:
+                return
+            self._dirty_objects[id(obj)] = (obj, time.time())
+            backlog = len(self._dirty_objects)
+        if backlog == 1 or backlog >= getConfig('Registry')['AutoFlushMaxBatch']:
+            self._dirty_event.set()
+
+    def _oldestDirtyTime(self):
+        """Return when the longest waiting dirty object here or in the metadata registry was marked dirty, None if there are none"""
+        times = []
+        for registry in (self, self.metadata):
+            if registry is None:
+                continue
+            with registry._dirty_lock:
+                for obj, marked in registry._dirty_objects.itervalues():
+                    times.append(marked)
+                    break
+        return min(times) if times else None
+
+    def _flushDue(self, wait_time):
+        """
+        Should the dirty objects be flushed now, because a full batch is waiting or the oldest has waited long enough
+        Args:
+            wait_time (float): How long in seconds a dirty object may wait to be flushed
+        """
+        oldest = self._oldestDirtyTime()
+        if oldest is None:
+            return False
+        return len(self._dirty_objects) >= getConfig('Registry')['AutoFlushMaxBatch'] or time.time() >= oldest + wait_time
+
+    def _clearDirty(self):
+        """Forget the objects marked dirty, they are only written by an explicit flush"""
+        for registry in (self, self.metadata):
+            if registry is not None:
+                with registry._dirty_lock:
+                    registry._dirty_objects.clear()
+
+    def flush_dirty(self):
+        """
+        Flush the objects which have been marked dirty since they were last flushed, oldest first,
+        in batches of at most [Registry]AutoFlushMaxBatch objects. Unlike ``flush_all`` this never
+        looks at the objects which haven't been modified.
+        """
+        if self.hasStarted():
+            max_batch = getConfig('Registry')['AutoFlushMaxBatch']
+            while True:
+                with self._dirty_lock:
+                    batch = [self._dirty_objects.pop(key) for key in list(islice(self._dirty_objects, max_batch))]
+                    self._dirty_in_flight = len(batch)
+                if not batch:
+                    break
+                objs = [obj for obj, marked in batch]
+                try:
+                    self._flush(objs)
+                except Exception:
+                    # Put back what is still dirty so that it gets retried
+                    with self._dirty_lock:
+                        for obj, marked in batch:
+                            if obj._dirty and id(obj) not in self._dirty_objects:
+                                self._dirty_objects[id(obj)] = (obj, marked)
+                        self._dirty_in_flight = 0
+                    raise
+                with self._dirty_lock:
+                    self._recordFlush(batch)
+                    self._dirty_in_flight = 0
+
+        if self.metadata and self.metadata.hasStarted():
+            self.metadata.flush_dirty()
+
+    def _recordFlush(self, batch):
+        """
+        Update the flush statistics after a batch has been written
+        Args:
+            batch (list): (object, time it was first marked dirty) for each object in the batch
+        """
+        now = time.time()
+        latencies = [now - marked for obj, marked in batch]
+        stats = self._flush_stats
+        stats['batches'] += 1
+        stats['objects'] += len(batch)
+        stats['last_batch'] = len(batch)
+        stats['max_batch'] = max(stats['max_batch'], len(batch))
+        stats['total_latency'] += sum(latencies)
+        stats['last_latency'] = max(latencies)
+        stats['max_latency'] = max(stats['max_latency'], stats['last_latency'])
+
+    def getFlushStats(self):
+        """
+        Return a dict of statistics about the automatic flushing of this registry: the number of batches and objects flushed,
+        the last and largest batch size, the last, mean and max latency in seconds between an object being marked dirty
+        and written, and the number of objects currently waiting or being flushed
+        """
+        with self._dirty_lock:
+            stats = dict(self._flush_stats)
+            stats['backlog'] = len(self._dirty_objects) + self._dirty_in_flight
+        total_latency = stats.pop('total_latency')
+        stats['mean_latency'] = total_latency / stats['objects'] if stats['objects'] else 0.
+        return stats
+
     def _load(self, obj):
         """
         Use this function to load an object from disk as it will check if the object is already loaded *outside*
@@ -594,11 +722,17 @@ class Registry(object):
         This can and should be overwritten by derived Registries to provide more index values."""
         return {}
 
+    def _resetFlushStats(self):
+        """Start the flush statistics of a new session"""
+        self._flush_stats = {'batches': 0, 'objects': 0, 'last_batch': 0, 'max_batch': 0,
+                             'total_latency': 0., 'last_latency': 0., 'max_latency': 0.}
+
     @synchronised_complete_lock
     def startup(self):
         """Connect the repository to the registry. Called from Repository_runtime.py"""
         try:
             self._hasStarted = True
+            self._resetFlushStats()
             t0 = time.time()
             self.repository = makeRepository(self)
             self._objects = self.repository.objects
@@ -611,6 +745,8 @@ class Registry(object):
                     self.metadata.type = self.type
                     self.metadata.location = self.location
                     setattr(self.metadata, '_parent', self) ## rcurrie Registry has NO '_parent' Object so don't understand this is this used for JobTree?
+                    # Wake our flusher for changes to the metadata too
+                    self.metadata._dirty_event = self._dirty_event
                 logger.debug("metadata startup")
                 self.metadata.startup()
                 t3 = time.time()
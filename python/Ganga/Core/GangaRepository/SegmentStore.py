@@ -0,0 +1,417 @@
+##########################################################################
+# Ganga Project. http://cern.ch/ganga
+#
+# Append-only, single file record store used by GangaRepositorySegment
+##########################################################################
+
+# A segment file is a header followed by a sequence of records. Every record
+# is keyed by (kind, id, sub_id) where sub_id is -1 for a root object and the
+# subjob number otherwise. The newest record for a key wins, a DELETE record
+# removes the key (or every key of a root object if sub_id is -1).
+#
+# The location of the live record for every key is kept in memory (the offset
+# index) and a snapshot of it is written to <segment>.idx so that startup only
+# has to replay the records appended since the snapshot was taken.
+#
+# Several Ganga sessions may append to the same segment file. All writers take
+# an fcntl lock on <segment>.lock (which is never replaced) and re-read any
+# records appended by other sessions before they write their own.
+# Compaction writes the live records to a new file and renames it over the old
+# one, readers notice this by the change in inode/generation and rescan.
+
+import os
+import errno
+import fcntl
+import struct
+import zlib
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from Ganga.Utility.logging import getLogger
+from Ganga.Core.exceptions import RepositoryError
+
+logger = getLogger()
+
+# Record kinds
+DATA = 'd'
+INDEX = 'i'
+
+# Record operations
+PUT = 'P'
+DELETE = 'D'
+
+_file_magic = 'GANGASEG'
+_file_version = 1
+# magic, version, generation
+_file_header = struct.Struct('>8sBq')
+# magic, operation, kind, id, sub_id, payload length, crc32 of payload
+_record_header = struct.Struct('>2sccqqIi')
+_record_magic = 'GR'
+
+
+class SegmentStore(object):
+    """
+    Append-only store of keyed binary records in a single file with an in-memory offset index.
+    This class knows nothing of Ganga objects, the payloads are opaque strings.
+    """
+
+    def __init__(self, filename, repo=None):
+        """
+        Args:
+            filename (str): Full path of the segment file, it and its '.idx'/'.lock' companions are created if missing
+            repo (GangaRepository): Repository used when raising RepositoryError
+        """
+        self.filename = filename
+        self.idx_filename = filename + '.idx'
+        self.lock_filename = filename + '.lock'
+        self.repo = repo
+
+        self._lock = threading.RLock()
+        self._fobj = None
+        self._lockfd = None
+        self._inode = None
+        self.generation = 0
+
+        # (kind, id, sub_id) -> (payload offset, payload length)
+        self._offsets = {}
+        # id -> set of sub_ids which have a DATA record
+        self._children = {}
+        # Offset at which the next record should be read/written
+        self._end = 0
+        self.live_bytes = 0
+        self.dead_bytes = 0
+
+    # File handling
+
+    def open(self):
+        """
+        Open (creating if needed) the segment file and build the offset index,
+        from the snapshot if it is valid and from the file otherwise.
+        """
+        with self._lock:
+            dirname = os.path.dirname(self.filename)
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError as err:
+                    if err.errno != errno.EEXIST:
+                        raise RepositoryError(self.repo, "OSError on mkdir: %s" % err)
+            self._lockfd = os.open(self.lock_filename, os.O_RDWR | os.O_CREAT, 0644)
+            with self._file_lock():
+                if not os.path.isfile(self.filename):
+                    with open(self.filename, 'wb') as new_file:
+                        new_file.write(_file_header.pack(_file_magic, _file_version, 0))
+                        new_file.flush()
+                        os.fsync(new_file.fileno())
+                self._reopen()
+
+    def close(self):
+        """
+        Write the offset index snapshot and release all file handles
+        """
+        with self._lock:
+            if self._fobj is None:
+                return
+            try:
+                self.write_snapshot()
+            except (IOError, OSError) as err:
+                logger.debug("Failed to write segment snapshot: %s" % err)
+            self._fobj.close()
+            self._fobj = None
+            os.close(self._lockfd)
+            self._lockfd = None
+
+    def _reopen(self):
+        """
+        (Re)open the segment file and rebuild the offset index. The file lock must be held.
+        """
+        if self._fobj is not None:
+            self._fobj.close()
+        self._fobj = open(self.filename, 'r+b')
+        self._inode = os.fstat(self._fobj.fileno()).st_ino
+        header = self._fobj.read(_file_header.size)
+        try:
+            magic, version, generation = _file_header.unpack(header)
+        except struct.error:
+            raise RepositoryError(self.repo, "Segment file '%s' has a corrupt header" % self.filename)
+        if magic != _file_magic or version != _file_version:
+            raise RepositoryError(self.repo, "Segment file '%s' is not a version %s segment file" % (self.filename, _file_version))
+        self.generation = generation
+
+        self._offsets = {}
+        self._children = {}
+        self._end = _file_header.size
+        self.live_bytes = 0
+        self.dead_bytes = 0
+        if not self.read_snapshot():
+            logger.debug("Rebuilding segment index of '%s' from file" % self.filename)
+        self._replay()
+
+    class _FileLock(object):
+        """Context manager for the exclusive inter-session lock on the segment"""
+        def __init__(self, store):
+            self.store = store
+
+        def __enter__(self):
+            try:
+                fcntl.lockf(self.store._lockfd, fcntl.LOCK_EX)
+            except IOError as err:
+                raise RepositoryError(self.store.repo, "IOError on lock ('%s'): %s" % (self.store.lock_filename, err))
+
+        def __exit__(self, *args):
+            fcntl.lockf(self.store._lockfd, fcntl.LOCK_UN)
+
+    def _file_lock(self):
+        return SegmentStore._FileLock(self)
+
+    # Offset index handling
+
+    def read_snapshot(self):
+        """
+        Load the offset index snapshot if it belongs to the current generation of the file.
+        Returns True if the snapshot was used
+        """
+        if not os.path.isfile(self.idx_filename):
+            return False
+        try:
+            with open(self.idx_filename, 'rb') as idx_file:
+                generation, end, offsets, dead_bytes = pickle.load(idx_file)
+        except Exception as err:
+            logger.debug("Ignoring corrupt segment snapshot '%s': %s" % (self.idx_filename, err))
+            return False
+        if generation != self.generation or end > os.fstat(self._fobj.fileno()).st_size:
+            return False
+        self._offsets = offsets
+        self._children = {}
+        self.live_bytes = 0
+        for (kind, this_id, sub_id), (offset, length) in offsets.iteritems():
+            self.live_bytes += length + _record_header.size
+            if kind == DATA and sub_id >= 0:
+                self._children.setdefault(this_id, set()).add(sub_id)
+        self.dead_bytes = dead_bytes
+        self._end = end
+        return True
+
+    def write_snapshot(self):
+        """
+        Write the offset index to disk so the next open doesn't need to replay the whole file
+        """
+        with self._lock:
+            new_name = self.idx_filename + '.new'
+            with open(new_name, 'wb') as idx_file:
+                pickle.dump((self.generation, self._end, self._offsets, self.dead_bytes), idx_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(new_name, self.idx_filename)
+
+    def _apply(self, op, kind, this_id, sub_id, offset, length):
+        """
+        Update the offset index with a single record, returns the root id affected
+        """
+        if op == PUT:
+            key = (kind, this_id, sub_id)
+            if key in self._offsets:
+                self.dead_bytes += self._offsets[key][1] + _record_header.size
+                self.live_bytes -= self._offsets[key][1] + _record_header.size
+            self._offsets[key] = (offset, length)
+            self.live_bytes += length + _record_header.size
+            if kind == DATA and sub_id >= 0:
+                self._children.setdefault(this_id, set()).add(sub_id)
+        elif op == DELETE:
+            if sub_id < 0:
+                keys = [k for k in self._offsets if k[1] == this_id]
+                self._children.pop(this_id, None)
+            else:
+                keys = [k for k in ((DATA, this_id, sub_id), (INDEX, this_id, sub_id)) if k in self._offsets]
+                if this_id in self._children:
+                    self._children[this_id].discard(sub_id)
+            for key in keys:
+                old_length = self._offsets.pop(key)[1]
+                self.dead_bytes += old_length + _record_header.size
+                self.live_bytes -= old_length + _record_header.size
+            self.dead_bytes += _record_header.size
+        return this_id
+
+    def _replay(self):
+        """
+        Read every record after the last known end of the file and apply it to the offset index.
+        A torn record at the end of the file (crashed writer) is ignored and will be overwritten by the next append.
+        Returns the set of root ids which changed
+        """
+        changed = set()
+        fobj = self._fobj
+        fobj.seek(self._end)
+        while True:
+            header = fobj.read(_record_header.size)
+            if len(header) < _record_header.size:
+                break
+            magic, op, kind, this_id, sub_id, length, crc = _record_header.unpack(header)
+            if magic != _record_magic or op not in (PUT, DELETE):
+                logger.warning("Corrupt record found in '%s' at offset %s, ignoring the rest of the file" % (self.filename, self._end))
+                break
+            payload_offset = self._end + _record_header.size
+            if op == PUT:
+                payload = fobj.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.warning("Incomplete record found in '%s' at offset %s, ignoring the rest of the file" % (self.filename, self._end))
+                    break
+            changed.add(self._apply(op, kind, this_id, sub_id, payload_offset, length))
+            self._end = payload_offset + (length if op == PUT else 0)
+        return changed
+
+    def refresh(self):
+        """
+        Pick up changes made to the file by other sessions.
+        Returns the set of root ids which changed, or None if the whole index was rebuilt
+        """
+        with self._lock:
+            try:
+                current_inode = os.stat(self.filename).st_ino
+            except OSError as err:
+                raise RepositoryError(self.repo, "Segment file '%s' has disappeared: %s" % (self.filename, err))
+            if current_inode != self._inode:
+                with self._file_lock():
+                    self._reopen()
+                return None
+            if os.fstat(self._fobj.fileno()).st_size == self._end:
+                return set()
+            with self._file_lock():
+                return self._replay()
+
+    # Read access
+
+    def read(self, kind, this_id, sub_id=-1):
+        """
+        Return the payload of the live record for the key
+        Raise KeyError if there is none
+        """
+        with self._lock:
+            offset, length = self._offsets[(kind, this_id, sub_id)]
+            self._fobj.seek(offset)
+            return self._fobj.read(length)
+
+    def read_many(self, keys):
+        """
+        Return a dict of key -> payload for the given keys, reading in file order.
+        Keys which are not present are skipped
+        """
+        with self._lock:
+            present = sorted((self._offsets[key], key) for key in keys if key in self._offsets)
+            result = {}
+            for (offset, length), key in present:
+                self._fobj.seek(offset)
+                result[key] = self._fobj.read(length)
+            return result
+
+    def has_key(self, kind, this_id, sub_id=-1):
+        return (kind, this_id, sub_id) in self._offsets
+
+    def ids(self):
+        """ Return the list of root ids which have a DATA record """
+        with self._lock:
+            return [k[1] for k in self._offsets if k[0] == DATA and k[2] < 0]
+
+    def children(self, this_id):
+        """ Return the sorted list of sub_ids of this root id which have a DATA record """
+        with self._lock:
+            return sorted(self._children.get(this_id, ()))
+
+    def count_children(self, this_id):
+        return len(self._children.get(this_id, ()))
+
+    # Write access
+
+    def write_many(self, records):
+        """
+        Append a batch of records with one lock acquisition, one write and one fsync.
+        Args:
+            records (list): list of (op, kind, id, sub_id, payload) tuples. payload is ignored for DELETE
+        """
+        if not records:
+            return
+        with self._lock:
+            with self._file_lock():
+                # Another session may have compacted or appended to the file since we last looked
+                if os.stat(self.filename).st_ino != self._inode:
+                    self._reopen()
+                else:
+                    self._replay()
+                chunks = []
+                offset = self._end
+                applied = []
+                for op, kind, this_id, sub_id, payload in records:
+                    if op == DELETE:
+                        payload = ''
+                    chunks.append(_record_header.pack(_record_magic, op, kind, this_id, sub_id, len(payload), zlib.crc32(payload)))
+                    chunks.append(payload)
+                    applied.append((op, kind, this_id, sub_id, offset + _record_header.size, len(payload)))
+                    offset += _record_header.size + len(payload)
+                try:
+                    self._fobj.seek(self._end)
+                    self._fobj.write(''.join(chunks))
+                    # Drop anything left over from a torn write by a crashed session
+                    self._fobj.truncate()
+                    self._fobj.flush()
+                    os.fsync(self._fobj.fileno())
+                except (IOError, OSError) as err:
+                    raise RepositoryError(self.repo, "Error appending to segment file '%s': %s" % (self.filename, err))
+                for record in applied:
+                    self._apply(*record)
+                self._end = offset
+
+    def put(self, kind, this_id, sub_id, payload):
+        self.write_many([(PUT, kind, this_id, sub_id, payload)])
+
+    def delete(self, this_id, sub_id=-1):
+        self.write_many([(DELETE, DATA, this_id, sub_id, '')])
+
+    # Compaction
+
+    def dead_fraction(self):
+        """ Fraction of the file which is taken up by overwritten or deleted records """
+        total = self.live_bytes + self.dead_bytes
+        if total == 0:
+            return 0.
+        return float(self.dead_bytes) / total
+
+    def compact(self):
+        """
+        Rewrite the file keeping only the live records. The caller must make sure no other
+        session is holding objects which it may flush without taking the file lock (i.e. none).
+        """
+        with self._lock:
+            with self._file_lock():
+                if os.stat(self.filename).st_ino != self._inode:
+                    self._reopen()
+                else:
+                    self._replay()
+                new_name = self.filename + '.compact'
+                new_offsets = {}
+                new_generation = self.generation + 1
+                with open(new_name, 'wb') as new_file:
+                    new_file.write(_file_header.pack(_file_magic, _file_version, new_generation))
+                    offset = _file_header.size
+                    for key, (old_offset, length) in sorted(self._offsets.items(), key=lambda item: item[1][0]):
+                        self._fobj.seek(old_offset)
+                        payload = self._fobj.read(length)
+                        kind, this_id, sub_id = key
+                        new_file.write(_record_header.pack(_record_magic, PUT, kind, this_id, sub_id, length, zlib.crc32(payload)))
+                        new_file.write(payload)
+                        new_offsets[key] = (offset + _record_header.size, length)
+                        offset += _record_header.size + length
+                    new_file.flush()
+                    os.fsync(new_file.fileno())
+                os.rename(new_name, self.filename)
+                saved_bytes = self.dead_bytes
+                self._fobj.close()
+                self._fobj = open(self.filename, 'r+b')
+                self._inode = os.fstat(self._fobj.fileno()).st_ino
+                self.generation = new_generation
+                self._offsets = new_offsets
+                self._end = offset
+                self.dead_bytes = 0
+                self.write_snapshot()
+                logger.debug("Compacted segment file '%s', removed %s bytes" % (self.filename, saved_bytes))
+                return saved_bytes
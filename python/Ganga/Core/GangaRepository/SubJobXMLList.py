@@ -5,14 +5,109 @@ from Ganga.Core.GangaRepository.GangaRepository import RepositoryError
 from Ganga.Core.exceptions import GangaException
 from Ganga.GPIDev.Base.Proxy import stripProxy
 from Ganga.Core.GangaRepository.VStreamer import XMLFileError
+from Ganga.Core.GangaThread import GangaThread
+from Ganga.Utility.Config import getConfig
+from Ganga.Utility.external.OrderedDict import OrderedDict as oDict
 import errno
 import copy
+import os
 import threading
 import shutil
+import Queue
+import weakref
 from os import listdir, path, stat
+from StringIO import StringIO
 
 logger = getLogger()
 
+
+class PendingRead(object):
+    """The contents of a subjob data file which is being read by the SubJobReaderPool"""
+    __slots__ = ('filename', 'data', 'error', '_done')
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.data = None
+        self.error = None
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            with open(self.filename, 'r') as sj_file:
+                self.data = sj_file.read()
+        except Exception as err:
+            self.error = err
+        finally:
+            self._done.set()
+
+    def wait(self):
+        """Block until the file has been read and return its contents, None if it couldn't be read"""
+        self._done.wait()
+        return self.data
+
+
+class SubJobReaderThread(GangaThread):
+    """A thread reading the subjob data files queued on a SubJobReaderPool until it is stopped"""
+
+    def __init__(self, name, queue):
+        GangaThread.__init__(self, name=name, critical=False)
+        self._queue = queue
+
+    def run(self):
+        while not self.should_stop():
+            pending = self._queue.get()
+            # None is queued by stop() to wake the thread up
+            if pending is None:
+                break
+            pending.run()
+        self.unregister()
+
+    def stop(self):
+        """Ask the thread to stop, waking it up if it is waiting for a file to read"""
+        super(SubJobReaderThread, self).stop()
+        self._queue.put(None)
+
+
+class SubJobReaderPool(object):
+    """
+    Threads reading subjob data files ahead of the subjobs being parsed.
+    Parsing stays in the thread requesting the subjob, so that reading the next files overlaps with parsing the current one.
+    """
+
+    def __init__(self, num_threads):
+        self._queue = Queue.Queue()
+        self._threads = []
+        for i in range(num_threads):
+            t = SubJobReaderThread('SubJobReader_%s' % i, self._queue)
+            t.start()
+            self._threads.append(t)
+
+    def alive(self):
+        return any(t.isAlive() and not t.should_stop() for t in self._threads)
+
+    def read(self, filename):
+        """Queue the reading of a file and return the PendingRead for it"""
+        pending = PendingRead(filename)
+        self._queue.put(pending)
+        return pending
+
+
+_reader_pool = None
+_reader_pool_lock = threading.Lock()
+
+
+def getSubJobReaderPool():
+    """Return the SubJobReaderPool shared by all SubJobXMLLists, None if prefetching is disabled"""
+    global _reader_pool
+    num_threads = getConfig('Registry')['SubJobLoaderThreads']
+    if num_threads < 1:
+        return None
+    with _reader_pool_lock:
+        if _reader_pool is None or not _reader_pool.alive():
+            _reader_pool = SubJobReaderPool(num_threads)
+        return _reader_pool
+
+
 ##FIXME There has to be a better way of doing this?
 class SJXLIterator(object):
     """Class for iterating over SJXMLList, potentially very unstable, dangerous and only supports looping forwards ever"""
@@ -23,10 +118,20 @@ class SJXLIterator(object):
         """
         self._mySubJobs = theseSubJobs
         self._myCount = 0
+        # Position at which the next window of subjobs is prefetched
+        self._nextPrefetch = 0
+        self._window = getConfig('Registry')['SubJobPrefetchWindow']
+
+    def __iter__(self):
+        return self
 
     ## NB becomes __next__ in Python 3.x don't know if Python 2.7 has a wrapper here
     def next(self):
         if self._myCount < len(self._mySubJobs):
+            if self._window > 0 and self._myCount >= self._nextPrefetch:
+                self._mySubJobs.prefetch(range(self._myCount, self._myCount + self._window))
+                # Top up the window when half of it has been used
+                self._nextPrefetch = self._myCount + max(1, self._window // 2)
             returnable = self._mySubJobs[self._myCount]
             self._myCount += 1
             return returnable
@@ -59,7 +164,8 @@ class SubJobXMLList(GangaObject):
 
         self._jobDirectory = jobDirectory
         self._registry = registry
-        self._cachedJobs = {}
+        # Loaded subjobs, least recently used first
+        self._cachedJobs = oDict()
 
         self._dataFileName = dataFileName
         self._load_backup = load_backup
@@ -67,23 +173,40 @@ class SubJobXMLList(GangaObject):
         self._definedParent = None
 
         self._subjob_master_index_name = "subjobs.idx"
+        # Number of subjob index updates appended to the journal since the snapshot was written
+        self._journal_length = 0
+        # Generation of the index snapshot, journal records written for an older snapshot are not replayed
+        self._index_generation = 0
+        # Subjobs with no index data and the number of subjobs they were worked out for
+        self._unindexed = set()
+        self._known_len = 0
+
+        self._reset_loading_state()
 
         if jobDirectory == '' and registry is None:
             return
 
-        self._subjobIndexData = {}
-        if parent:
-            self._setParent(parent)
-        self.load_subJobIndex()
-
         self._cached_filenames = {}
         self._stored_len = []
         # For caching a large list of integers, the key is the length of the list
         self._storedKeys = {}
 
-        # Lock to ensure only one load at a time
-        self._load_lock = threading.Lock()
+        self._subjobIndexData = {}
+        if parent:
+            self._setParent(parent)
+        self.load_subJobIndex()
 
+    def _reset_loading_state(self):
+        """Create the locks, the prefetch buffer and the eviction bookkeeping used when loading subjobs"""
+        # Lock protecting the per-subjob locks, the prefetched files and the order of the loaded subjobs
+        self._load_lock = threading.RLock()
+        # Lock per subjob to ensure only one load of the same subjob at a time
+        self._subjob_locks = {}
+        # subjob index -> PendingRead of its data file, in the order they were queued
+        self._prefetched = oDict()
+        # Subjobs evicted from _cachedJobs which are still referenced from elsewhere
+        self._evictedJobs = weakref.WeakValueDictionary()
+        self._cacheStats = {'hits': 0, 'loads': 0, 'revived': 0, 'evicted': 0, 'flushed': 0}
 
     ## THIS CLASS MAKES USE OF THE INTERNAL CLASS DICTIONARY ONLY!!!
     ## THIS CLASS DOES NOT MAKE USE OF THE SCHEMA TO STORE INFORMATION AS TRANSIENT OR UNCOPYABLE
@@ -98,10 +221,15 @@ class SubJobXMLList(GangaObject):
         obj._load_backup = copy.deepcopy(self._load_backup, memo)
         obj._cached_filenames = copy.deepcopy(self._cached_filenames, memo)
         obj._stored_len = copy.deepcopy(self._stored_len, memo)
+        obj._journal_length = self._journal_length
+        obj._index_generation = self._index_generation
+        obj._unindexed = set(self._unindexed)
+        obj._known_len = self._known_len
 
         ## Manually define unsafe/uncopyable objects
         obj._definedParent = None
-        obj._cachedJobs = {}
+        obj._cachedJobs = oDict()
+        obj._reset_loading_state()
         return obj
 
     def _reset_cachedJobs(self, obj):
@@ -109,7 +237,7 @@ class SubJobXMLList(GangaObject):
         Args:
             obj (dict): This is the new dictonary of subjob Job objects with sequential integer keys
         """
-        self._cachedJobs = obj
+        self._cachedJobs = oDict(sorted(obj.items()))
 
     def isLoaded(self, subjob_id):
         """Has the subjob been loaded? True/False
@@ -129,6 +257,7 @@ class SubJobXMLList(GangaObject):
                 try:
                     index_file_obj = open(index_file, "r" )
                     self._subjobIndexData = from_file( index_file_obj )[0]
+                    self._index_generation = self._readIndexGeneration(index_file_obj)
                 except IOError as err:
                     self._subjobIndexData = None
                     self._setDirty()
@@ -170,56 +299,164 @@ class SubJobXMLList(GangaObject):
                     self._subjobIndexData = {}
         else:
             self._setDirty()
+        self._replayIndexJournal()
+        self._known_len = len(self)
+        self._unindexed = set(xrange(self._known_len)) - set(self._subjobIndexData)
         return
 
-    def write_subJobIndex(self, ignore_disk=False):
+    @staticmethod
+    def _readIndexGeneration(index_file_obj):
+        """Return the generation stored after the index data in a snapshot, 0 for snapshots written without one
+        Args:
+            index_file_obj (file): The snapshot file, positioned after the index data
+        """
+        from Ganga.Core.GangaRepository.PickleStreamer import from_file
+        try:
+            return from_file(index_file_obj)[0]
+        except EOFError:
+            return 0
+
+    def _getIndexJournal(self):
+        """Return the name of the file holding the subjob index updates made since the index snapshot was written"""
+        return path.join(self._jobDirectory, self._subjob_master_index_name + '.journal')
+
+    def _replayIndexJournal(self):
+        """Apply the updates in the index journal on top of the index snapshot in _subjobIndexData. Records written
+        for an older snapshot, left behind when a crash came between writing a snapshot and dropping the journal, are
+        skipped as the snapshot already holds newer data
+        """
+        self._journal_length = 0
+        journal_file = self._getIndexJournal()
+        if not path.isfile(journal_file):
+            return
+        from Ganga.Core.GangaRepository.PickleStreamer import from_file
+        stale = False
+        with open(journal_file, 'rb') as journal_obj:
+            journal_size = os.fstat(journal_obj.fileno()).st_size
+            while journal_obj.tell() < journal_size:
+                try:
+                    generation, updates = from_file(journal_obj)[0]
+                except Exception as err:
+                    # A record cut short by a crash, the next index write compacts the journal away
+                    logger.debug("Ignoring incomplete subjob index journal record in %s: %s" % (journal_file, err))
+                    self._journal_length = -1
+                    break
+                if generation < self._index_generation:
+                    logger.debug("Ignoring subjob index journal record of an older snapshot in %s" % journal_file)
+                    stale = True
+                    continue
+                self._subjobIndexData.update(updates)
+                self._journal_length += len(updates)
+        if stale and self._journal_length >= 0:
+            # Have the next index write compact the stale records away
+            self._journal_length = -1
+
+    def write_subJobIndex(self, ignore_disk=False, updated=None):
         """interface for writing the index which captures errors and alerts the user vs throwing uncaught exception
         Args:
             ignore_disk (bool): Optional flag to force the class to ignore all on-disk data when flushing
+            updated (list): indices of the subjobs written since the index was last written, None for all loaded subjobs
         """
         try:
-            self.__really_writeIndex(ignore_disk)
+            self.__really_writeIndex(ignore_disk, updated)
         ## Once It's known what te likely exceptions here are they'll be added
-        except (IOError,) as err:
+        except (IOError, OSError) as err:
             logger.debug("Can't write Index. Moving on as this is not essential to functioning it's a performance bug")
             logger.debug("Error: %s" % err)
 
-    def __really_writeIndex(self, ignore_disk=False):
-        """Do the actual work of writing the index for all subjobs
+    def __makeIndexCache(self, sj_id):
+        """Return the index data of a subjob, loading it if needed, stamped with the modification time of its file
         Args:
-            ignore_disk (bool): Optional flag to force the class to ignore all on-disk data when flushing
+            sj_id (int): index of the subjob
         """
+        this_cache = self._registry.getIndexCache(self.__getitem__(sj_id))
+        disk_location = self.__get_dataFile(sj_id)
+        this_cache['modified'] = stat(disk_location).st_ctime
+        return this_cache
 
-        all_caches = {}
+    def __really_writeIndex(self, ignore_disk=False, updated=None):
+        """
+        Do the actual work of writing the index for all subjobs.
+        The index data of the updated subjobs is appended to the journal. The whole index is only rewritten
+        as a snapshot when there is none yet or once the journal holds more updates than there are subjobs
+        (or [Registry]SubJobIndexJournalLimit if larger), so a flush touching k subjobs costs O(k). The subjobs
+        without index data are kept in _unindexed rather than being looked for among all of them.
+        Args:
+            ignore_disk (bool): Optional flag to force the class to ignore all on-disk data when flushing
+            updated (list): indices of the subjobs written since the index was last written, None for all loaded subjobs
+        """
         if ignore_disk:
-            range_limit = self._cachedJobs.keys()
-        else:
-            range_limit = range(len(self))
-
-        for sj_id in range_limit:
-            if sj_id in self._cachedJobs:
-                this_cache = self._registry.getIndexCache(self.__getitem__(sj_id))
-                all_caches[sj_id] = this_cache
-                disk_location = self.__get_dataFile(sj_id)
-                all_caches[sj_id]['modified'] = stat(disk_location).st_ctime
-            else:
-                if sj_id in self._subjobIndexData:
-                    all_caches[sj_id] = self._subjobIndexData[sj_id]
-                else:
-                    this_cache = self._registry.getIndexCache(self.__getitem__(sj_id))
-                    all_caches[sj_id] = this_cache
-                    disk_location = self.__get_dataFile(sj_id)
-                    all_caches[sj_id]['modified'] = stat(disk_location).st_ctime
+            all_caches = {}
+            for sj_id in self._cachedJobs.keys():
+                all_caches[sj_id] = self.__makeIndexCache(sj_id)
+            with self._load_lock:
+                self._subjobIndexData = all_caches
+                self._known_len = len(self)
+                self._unindexed = set(xrange(self._known_len)) - set(all_caches)
+                self.__writeIndexSnapshot()
+            return
 
-        try:
-            from Ganga.Core.GangaRepository.PickleStreamer import to_file
+        if updated is None:
+            updated = self._cachedJobs.keys()
+        updates = {}
+        for sj_id in updated:
+            updates[sj_id] = self.__makeIndexCache(sj_id)
+        # Subjobs which have never been indexed need to be loaded once
+        self.__updateUnindexed()
+        for sj_id in self._unindexed.difference(updates):
+            updates[sj_id] = self.__makeIndexCache(sj_id)
+
+        with self._load_lock:
+            self._subjobIndexData.update(updates)
+            self._unindexed.clear()
             index_file = path.join(self._jobDirectory, self._subjob_master_index_name)
-            index_file_obj = open(index_file, "w")
-            to_file(all_caches, index_file_obj)
-            index_file_obj.close()
+            limit = max(getConfig('Registry')['SubJobIndexJournalLimit'], len(self))
+            if self._journal_length < 0 or not path.isfile(index_file) or self._journal_length + len(updates) > limit:
+                self.__writeIndexSnapshot()
+            elif updates:
+                self.__appendIndexJournal(updates)
+
+    def __updateUnindexed(self):
+        """Bring _unindexed up to date with the subjobs added or removed since it was last worked out"""
+        subjob_count = len(self)
+        if subjob_count > self._known_len:
+            self._unindexed.update(sj_id for sj_id in xrange(self._known_len, subjob_count) if sj_id not in self._subjobIndexData)
+        elif subjob_count < self._known_len:
+            self._unindexed = set(sj_id for sj_id in self._unindexed if sj_id < subjob_count)
+        self._known_len = subjob_count
+
+    def __appendIndexJournal(self, updates):
+        """Append the index data of some subjobs to the journal
+        Args:
+            updates (dict): subjob index -> index data
+        """
+        from Ganga.Core.GangaRepository.PickleStreamer import to_file
+        with open(self._getIndexJournal(), 'ab') as journal_obj:
+            to_file((self._index_generation, updates), journal_obj)
+        self._journal_length += len(updates)
+
+    def __writeIndexSnapshot(self):
+        """Write the whole of _subjobIndexData as the index snapshot and drop the journal it replaces. The snapshot is
+        stamped with a new generation, followed by the journal records, so that a crash before the journal is dropped
+        doesn't have its records replayed over the newer snapshot
+        """
+        from Ganga.Core.GangaRepository.PickleStreamer import to_file
+        index_file = path.join(self._jobDirectory, self._subjob_master_index_name)
+        self._index_generation += 1
+        try:
+            with open(index_file + '.new', 'wb') as index_file_obj:
+                to_file(self._subjobIndexData, index_file_obj)
+                # Written after the index data so that older versions of Ganga can still read the snapshot
+                to_file(self._index_generation, index_file_obj)
+            os.rename(index_file + '.new', index_file)
         ## Once I work out what the other exceptions here are I'll add them
-        except (IOError,) as err:
+        except (IOError, OSError) as err:
             logger.debug("cache write error: %s" % err)
+            return
+        journal_file = self._getIndexJournal()
+        if path.isfile(journal_file):
+            os.unlink(journal_file)
+        self._journal_length = 0
 
     def __iter__(self):
         """Return iterator for this class"""
@@ -350,6 +587,162 @@ class SubJobXMLList(GangaObject):
             logger.error("CANNOT LOAD SUBJOB INDEX: %s. Reason: %s" % (index, err))
             raise
 
+    def prefetch(self, indices):
+        """Start reading the data files of the given subjobs in the background, this doesn't wait for them
+        Args:
+            indices (list): The indices of the subjobs which are about to be accessed
+        """
+        pool = getSubJobReaderPool()
+        if pool is None:
+            return
+        n_subjobs = len(self)
+        # Files read for an iteration which was abandoned are never parsed, so only keep the most recent ones
+        limit = max(2 * getConfig('Registry')['SubJobPrefetchWindow'], len(indices))
+        with self._load_lock:
+            for index in indices:
+                if 0 <= index < n_subjobs and index not in self._cachedJobs and index not in self._prefetched:
+                    self._prefetched[index] = pool.read(self.__get_dataFile(str(index)))
+            while len(self._prefetched) > limit:
+                self._prefetched.popitem(last=False)
+
+    def load_range(self, start, stop):
+        """Load the subjobs start <= index < stop, reading their files in the background while they are parsed
+        Returns the list of subjobs
+        Args:
+            start (int): The index of the first subjob to load
+            stop (int): The index after the last subjob to load
+        """
+        indices = range(max(start, 0), min(stop, len(self)))
+        self.prefetch(indices)
+        return [self[index] for index in indices]
+
+    def _get_subjob_lock(self, index):
+        """Return the lock guarding the load of one subjob"""
+        with self._load_lock:
+            if index not in self._subjob_locks:
+                self._subjob_locks[index] = threading.Lock()
+            return self._subjob_locks[index]
+
+    def _parsePrefetched(self, index):
+        """Parse the prefetched data file of a subjob, None if it wasn't prefetched or can't be parsed from it
+        Args:
+            index (int): The index corresponding to the subjob object we want
+        """
+        pending = self._prefetched.pop(index, None)
+        if pending is None:
+            return None
+        data = pending.wait()
+        if data is None:
+            logger.debug("Prefetching subjob #%s failed: %s" % (index, pending.error))
+            return None
+        from Ganga.Core.GangaRepository.VStreamer import from_file
+        try:
+            return from_file(StringIO(data))[0]
+        except (IOError, XMLFileError) as err:
+            logger.debug("Failed to parse prefetched subjob #%s: %s" % (index, err))
+            return None
+
+    def _fromCache(self, index):
+        """Return the subjob if it is in memory (marking it as recently used) or None
+        Args:
+            index (int): The index corresponding to the subjob object we want
+        """
+        with self._load_lock:
+            subjob_obj = self._cachedJobs.pop(index, None)
+            if subjob_obj is not None:
+                self._cachedJobs[index] = subjob_obj
+                self._cacheStats['hits'] += 1
+                return subjob_obj
+            # An evicted subjob which is still in use elsewhere must not be loaded a second time
+            subjob_obj = self._evictedJobs.pop(index, None)
+            if subjob_obj is not None:
+                self._cachedJobs[index] = subjob_obj
+                # Its file may have been read ahead after it was evicted, it won't be parsed now
+                self._prefetched.pop(index, None)
+                self._cacheStats['revived'] += 1
+            return subjob_obj
+
+    def _addToCache(self, index, subjob_obj):
+        """Store a freshly loaded subjob and evict the least recently used ones if over budget
+        Args:
+            index (int): The index of the subjob
+            subjob_obj (Job): The loaded subjob
+        """
+        with self._load_lock:
+            self._cachedJobs[index] = subjob_obj
+            self._cacheStats['loads'] += 1
+            self._subjob_locks.pop(index, None)
+        self._enforceCacheBudget()
+
+    def _enforceCacheBudget(self):
+        """
+        Drop the least recently used subjobs once more than [Registry]MaxLoadedSubJobs are loaded.
+        Dirty subjobs are flushed first and the index of every dropped subjob is refreshed so that
+        the status and display data keep being served from _subjobIndexData.
+        """
+        budget = getConfig('Registry')['MaxLoadedSubJobs']
+        if budget <= 0 or len(self._cachedJobs) <= budget:
+            return
+        # Evict down to 90% of the budget so this isn't triggered by every load
+        target = max(1, budget - budget // 10)
+        with self._load_lock:
+            victims = oDict()
+            for index, subjob_obj in self._cachedJobs.iteritems():
+                if len(self._cachedJobs) - len(victims) <= target:
+                    break
+                victims[index] = subjob_obj
+
+        dirty = dict((index, sj) for index, sj in victims.iteritems() if sj._dirty)
+        if dirty:
+            self._flushSubJobs(dirty)
+        for index, subjob_obj in victims.iteritems():
+            if index not in dirty:
+                self._subjobIndexData[index] = self._registry.getIndexCache(subjob_obj)
+                self._unindexed.discard(index)
+
+        evicted = 0
+        with self._load_lock:
+            for index, subjob_obj in victims.iteritems():
+                # Leave anything which was used or modified in the meantime
+                if self._cachedJobs.get(index) is subjob_obj and not subjob_obj._dirty:
+                    del self._cachedJobs[index]
+                    self._evictedJobs[index] = subjob_obj
+                    evicted += 1
+            self._cacheStats['evicted'] += evicted
+            self._cacheStats['flushed'] += len(dirty)
+
+        if getConfig('Registry')['LogSubJobCacheStats']:
+            logger.info("Evicted %s subjobs (%s flushed) of job %s: %s" % (evicted, len(dirty), self.getMasterID(), self.getCacheStats()))
+
+    def getCacheStats(self):
+        """Return a dict of the number of subjobs loaded, cache hits, loads, revivals, evictions and flushes on eviction"""
+        stats = dict(self._cacheStats)
+        stats['loaded'] = len(self._cachedJobs)
+        return stats
+
+    def _reviveDirtyEvicted(self):
+        """Put evicted subjobs which were modified through an outside reference back in memory so that they get flushed"""
+        with self._load_lock:
+            for index, subjob_obj in self._evictedJobs.items():
+                if subjob_obj._dirty and index not in self._cachedJobs:
+                    del self._evictedJobs[index]
+                    self._cachedJobs[index] = subjob_obj
+                    self._cacheStats['revived'] += 1
+
+    def _flushSubJobs(self, subjobs):
+        """Write the given subjobs to disk and update their index data
+        Args:
+            subjobs (dict): subjob index -> subjob object
+        """
+        from Ganga.Core.GangaRepository.GangaRepositoryXML import safe_save
+        from Ganga.Core.GangaRepository.VStreamer import to_file
+        for index, subjob_obj in subjobs.iteritems():
+            if subjob_obj is subjob_obj._getRoot():
+                raise GangaException(self, "Subjob parent not set correctly in flush.")
+            safe_save(self.__get_dataFile(str(index)), subjob_obj, to_file)
+            subjob_obj._setFlushed()
+        self.write_subJobIndex(updated=subjobs.keys())
+
     def _getItem(self, index):
         """Actual meat of loading the subjob from disk is required, parsing and storing a copy in memory
         (_cached_subjobs) for future use
@@ -358,22 +751,32 @@ class SubJobXMLList(GangaObject):
         """
         logger.debug("Requesting subjob: #%s" % index)
 
-        if index not in self._cachedJobs:
+        subjob_obj = self._fromCache(index)
+        if subjob_obj is None:
 
             logger.debug("Attempting to load subjob: #%s from disk" % index)
 
             # obtain a lock to make sure multiple loads of the same object don't happen
-            with self._load_lock:
+            with self._get_subjob_lock(index):
 
                 # just make sure we haven't loaded this object already while waiting on the lock
-                if index in self._cachedJobs:
-                    return self._cachedJobs[index]
-
-                has_loaded_backup = False
+                subjob_obj = self._fromCache(index)
+                if subjob_obj is not None:
+                    return subjob_obj
 
                 # Now try to load the subjob
                 if len(self) < index:
                     raise GangaException("Subjob: %s does NOT exist" % index)
+
+                loaded_sj = self._parsePrefetched(index)
+                if loaded_sj is not None:
+                    loaded_sj._setParent(self._definedParent)
+                    loaded_sj._setFlushed()
+                    self._addToCache(index, loaded_sj)
+                    return loaded_sj
+
+                has_loaded_backup = False
+
                 subjob_data = self.__get_dataFile(str(index))
                 try:
                     sj_file = self._loadSubJobFromDisk(subjob_data)
@@ -415,9 +818,10 @@ class SubJobXMLList(GangaObject):
                     loaded_sj._setDirty()
                 else:
                     loaded_sj._setFlushed()
-                self._cachedJobs[index] = loaded_sj
+                self._addToCache(index, loaded_sj)
+                subjob_obj = loaded_sj
 
-        return self._cachedJobs[index]
+        return subjob_obj
 
     def _setParent(self, parentObj):
         """Set the parent of self and any objects in memory we control
@@ -440,9 +844,9 @@ class SubJobXMLList(GangaObject):
 
         if not hasattr(self, '_cachedJobs'):
             return
-        for k in self._cachedJobs:
-            if self._cachedJobs[k]._getParent() is not self._definedParent:
-                self._cachedJobs[k]._setParent( parentObj )
+        for subjob_obj in self._cachedJobs.values():
+            if subjob_obj._getParent() is not self._definedParent:
+                subjob_obj._setParent( parentObj )
 
     def getCachedData(self, index):
         """Get the cached data from the index for one of the subjobs
@@ -466,15 +870,14 @@ class SubJobXMLList(GangaObject):
         """Get the cached data from the index for all subjobs"""
         cached_data = []
         #logger.debug("Cache: %s" % self._subjobIndexData)
-        if len(self._subjobIndexData) == len(self):
-            for i in range(len(self)):
-                if self.isLoaded(i):
-                    cached_data.append( self._registry.getIndexCache( self.__getitem__(i) ) )
-                else:
-                    cached_data.append( self._subjobIndexData[i] )
-        else:
-            for i in range(len(self)):
-                cached_data.append(self._registry.getIndexCache( self.__getitem__(i) ) )
+        for i in range(len(self)):
+            subjob_obj = self._cachedJobs.get(i)
+            if subjob_obj is not None:
+                cached_data.append( self._registry.getIndexCache( subjob_obj ) )
+            elif i in self._subjobIndexData:
+                cached_data.append( self._subjobIndexData[i] )
+            else:
+                cached_data.append( self._registry.getIndexCache( self.__getitem__(i) ) )
 
         return cached_data
 
@@ -483,14 +886,13 @@ class SubJobXMLList(GangaObject):
         Returns the cached statuses of the subjobs whilst respecting the Lazy loading
         """
         sj_statuses = []
-        if len(self._subjobIndexData) == len(self):
-            for i in range(len(self)):
-                if self.isLoaded(i):
-                    sj_statuses.append(self.__getitem__(i).status)
-                else:
-                    sj_statuses.append(self._subjobIndexData[i]['status'])
-        else:
-            for i in range(len(self)):
+        for i in range(len(self)):
+            subjob_obj = self._cachedJobs.get(i)
+            if subjob_obj is not None:
+                sj_statuses.append(subjob_obj.status)
+            elif i in self._subjobIndexData:
+                sj_statuses.append(self._subjobIndexData[i]['status'])
+            else:
                 sj_statuses.append(self.__getitem__(i).status)
         return sj_statuses
 
@@ -503,31 +905,29 @@ class SubJobXMLList(GangaObject):
 
         from Ganga.Core.GangaRepository.VStreamer import to_file
 
-        if ignore_disk:
-            range_limit = self._cachedJobs.keys()
-        else:
-            range_limit = range(len(self))
+        self._reviveDirtyEvicted()
 
-        for index in range_limit:
-            if index in self._cachedJobs:
-                ## If it ain't dirty skip it
-                if not self._cachedJobs[index]._dirty:
-                    continue
+        updated = []
+        for index, subjob_obj in self._cachedJobs.items():
+            ## If it ain't dirty skip it
+            if not subjob_obj._dirty:
+                continue
 
-                subjob_data = self.__get_dataFile(str(index))
-                subjob_obj = self._cachedJobs[index]
+            subjob_data = self.__get_dataFile(str(index))
 
-                if subjob_obj is subjob_obj._getRoot():
-                    raise GangaException(self, "Subjob parent not set correctly in flush.")
+            if subjob_obj is subjob_obj._getRoot():
+                raise GangaException(self, "Subjob parent not set correctly in flush.")
 
-                safe_save( subjob_data, subjob_obj, to_file )
+            safe_save( subjob_data, subjob_obj, to_file )
+            subjob_obj._setFlushed()
+            updated.append(index)
 
-        self.write_subJobIndex(ignore_disk)
+        self.write_subJobIndex(ignore_disk, updated)
 
     def _setFlushed(self):
         """ Like Node only descend into objects which aren't in the Schema"""
-        for index in self._cachedJobs:
-            self._cachedJobs[index]._setFlushed()
+        for subjob_obj in self._cachedJobs.values():
+            subjob_obj._setFlushed()
         super(SubJobXMLList, self)._setFlushed()
 
     def _private_display(self, reg_slice, this_format, default_width, markup):
@@ -18,11 +18,18 @@ from .GangaRepository import SchemaVersionError
 
 import xml.sax.saxutils
 import copy
+import re
 
 logger = getLogger()
 
 _cached_eval_strings = {}
 
+# Values of these types are never modified in place so the result of eval can be shared without a deepcopy
+_immutable_types = (str, unicode, int, long, float, bool, type(None))
+
+# Strings made of these characters are unchanged by an XML round trip and can be written as <str>
+_plain_str = re.compile(r'^[\x20-\x7e\t\n]*$')
+
 ##########################################################################
 # Ganga Project. http://cern.ch/ganga
 #
@@ -47,8 +54,8 @@ class XMLFileError(GangaException):
             err = ''
         return "XMLFileError: %s %s" % (self.message, err)
 
-def _raw_to_file(j, fobj=None, ignore_subs=[]):
-    vstreamer = VStreamer(out=fobj, selection=ignore_subs)
+def _raw_to_file(j, fobj=None, ignore_subs=[], typed_values=None):
+    vstreamer = VStreamer(out=fobj, selection=ignore_subs, typed_values=typed_values)
     vstreamer.begin_root()
     stripProxy(j).accept(vstreamer)
     vstreamer.end_root()
@@ -107,6 +114,35 @@ def escape(s):
 def unescape(s):
     return xml.sax.saxutils.unescape(s)
 
+
+def encode_value(x, typed_values=True):
+    """
+    Return the XML representation of a simple value.
+    str/int/float/bool/None values and lists and dicts of them are written with explicit type tags
+    (<str>, <int>, <float>, <bool>, <none/>, <list>, <dict>) which the Loader decodes without eval.
+    Anything else is written as a python expression inside <value> which is eval-ed on loading.
+    Args:
+        x (object): The value to be written
+        typed_values (bool): Use the type tags where possible, otherwise always use <value>
+    """
+    if typed_values:
+        t = type(x)
+        if x is None:
+            return '<none/>'
+        if t is bool:
+            return '<bool>%s</bool>' % x
+        if t is int or t is long:
+            return '<int>%d</int>' % x
+        if t is float:
+            return '<float>%r</float>' % x
+        if t is str and _plain_str.match(x):
+            return '<str>%s</str>' % escape(x)
+        if t is list:
+            return '<list>%s</list>' % ''.join([encode_value(v) for v in x])
+        if t is dict:
+            return '<dict>%s</dict>' % ''.join([encode_value(k) + encode_value(v) for k, v in x.iteritems()])
+    return '<value>%s</value>' % escape(repr(x))
+
 # An experimental, fast way to print a tree of Ganga Objects to file
 # Unused at the moment
 
@@ -153,9 +189,15 @@ class VStreamer(object):
     # selection: string specifying the name of properties which should not be printed
     # e.g. 'subjobs' - will not print subjobs
 
-    def __init__(self, out=None, selection=[]):
+    # typed_values: write simple values with type tags, None takes the value from the [Registry] config
+
+    def __init__(self, out=None, selection=[], typed_values=None):
         self.level = 0
         self.selection = selection
+        if typed_values is None:
+            from Ganga.Utility.Config import getConfig
+            typed_values = getConfig('Registry')['TypedXMLValues']
+        self.typed_values = typed_values
         if out is not None:
             self.out = out
         else:
@@ -182,7 +224,7 @@ class VStreamer(object):
         return
 
     def print_value(self, x):
-        print('\n', self.indent(), '<value>%s</value>' % escape(repr(stripProxy(x))), file=self.out)
+        print('\n', self.indent(), encode_value(stripProxy(x), self.typed_values), file=self.out)
 
     def showAttribute(self, node, name):
         return not node._schema.getItem(name)['transient'] and (self.level > 1 or name not in self.selection)
@@ -215,10 +257,10 @@ class VStreamer(object):
     def acceptOptional(self, s):
         self.level += 1
         if s is None:
-            print(self.indent(), '<value>None</value>', file=self.out)
+            print(self.indent(), encode_value(None, self.typed_values), file=self.out)
         else:
             if isType(s, str):
-                print(self.indent(), '<value>%s</value>' % escape(repr(s)), file=self.out)
+                print(self.indent(), encode_value(s, self.typed_values), file=self.out)
             elif hasattr(stripProxy(s), 'accept'):
                 stripProxy(s).accept(self)
             elif isType(s, (list, tuple, GangaList)):
@@ -265,6 +307,19 @@ class EmptyGangaObject(GangaObject):
         super(EmptyGangaObject, self).__init__()
 
 
+def _decode_str(s):
+    # expat hands out unicode, <str> is only written for plain ascii
+    return str(s)
+
+
+def _decode_bool(s):
+    return s == 'True'
+
+
+# Decoders for the CDATA of the typed scalar elements written by encode_value
+_scalar_decoders = {'str': _decode_str, 'int': int, 'float': float, 'bool': _decode_bool}
+
+
 class Loader(object):
 
     """ Job object tree loader.
@@ -275,136 +330,164 @@ class Loader(object):
         # ignore nested XML elements in case of data errors at a higher level
         self.ignore_count = 0
         self.errors = []  # list of exception objects in case of data errors
-        # buffer for <value> elements (evaled as python expressions)
+        # buffer for the CDATA of <value> (evaled as python expressions) and typed scalar elements
         self.value_construct = None
         # buffer for building sequences (FIXME: what about nested sequences?)
         self.sequence_start = []
-
-    def parse(self, s):
-        """ Parse and load object from string s using internal XML parser (expat).
-        """
-        import xml.parsers.expat
-
-        # 3 handler functions
-        def start_element(name, attrs):
-            #logger.debug('Start element: name=%s attrs=%s', name, attrs) #FIXME: for 2.4 use CurrentColumnNumber and CurrentLineNumber
-            # if higher level element had error, ignore the corresponding part
-            # of the XML tree as we go down
-            if self.ignore_count:
-                self.ignore_count += 1
-                return
-
-            # initialize object stack
-            if name == 'root':
-                assert self.stack is None, "duplicated <root> element"
-                self.stack = []
-                return
-
-            assert not self.stack is None, "missing <root> element"
-
-            # load a class, make empty object and push it as the current object
-            # on the stack
-            if name == 'class':
-                try:
-                    cls = allPlugins.find(attrs['category'], attrs['name'])
-                except PluginManagerError as e:
-                    self.errors.append(e)
-                    #self.errors.append('Unknown class: %(name)s'%attrs)
+        # positions on the stack where the items of <list> and <dict> elements begin
+        self.container_start = []
+
+    def start_element(self, name, attrs):
+        #logger.debug('Start element: name=%s attrs=%s', name, attrs) #FIXME: for 2.4 use CurrentColumnNumber and CurrentLineNumber
+        # if higher level element had error, ignore the corresponding part
+        # of the XML tree as we go down
+        if self.ignore_count:
+            self.ignore_count += 1
+            return
+
+        # start value_contruct mode and initialize the value buffer
+        if name in _scalar_decoders or name == 'value':
+            self.value_construct = []
+            return
+
+        # save a marker where the items of a typed container begin on the stack
+        if name == 'list' or name == 'dict':
+            self.container_start.append(len(self.stack))
+            return
+
+        # initialize object stack
+        if name == 'root':
+            assert self.stack is None, "duplicated <root> element"
+            self.stack = []
+            return
+
+        assert not self.stack is None, "missing <root> element"
+
+        # load a class, make empty object and push it as the current object
+        # on the stack
+        if name == 'class':
+            try:
+                cls = allPlugins.find(attrs['category'], attrs['name'])
+            except PluginManagerError as e:
+                self.errors.append(e)
+                #self.errors.append('Unknown class: %(name)s'%attrs)
+                obj = EmptyGangaObject()
+                # ignore all elemenents until the corresponding ending
+                # element (</class>) is reached
+                self.ignore_count = 1
+            else:
+                version = Version(*[int(v) for v in attrs['version'].split('.')])
+                if not cls._schema.version.isCompatible(version):
+                    attrs['currversion'] = '%s.%s' % (cls._schema.version.major, cls._schema.version.minor)
+                    self.errors.append(SchemaVersionError('Incompatible schema of %(name)s, repository is %(version)s currently in use is %(currversion)s' % attrs))
                     obj = EmptyGangaObject()
                     # ignore all elemenents until the corresponding ending
                     # element (</class>) is reached
                     self.ignore_count = 1
                 else:
-                    version = Version(*[int(v) for v in attrs['version'].split('.')])
-                    if not cls._schema.version.isCompatible(version):
-                        attrs['currversion'] = '%s.%s' % (cls._schema.version.major, cls._schema.version.minor)
-                        self.errors.append(SchemaVersionError('Incompatible schema of %(name)s, repository is %(version)s currently in use is %(currversion)s' % attrs))
-                        obj = EmptyGangaObject()
-                        # ignore all elemenents until the corresponding ending
-                        # element (</class>) is reached
-                        self.ignore_count = 1
-                    else:
-                        # make a new ganga object
-                        obj = cls()
-                self.stack.append(obj)
-
-            # push the attribute name on the stack
-            if name == 'attribute':
-                self.stack.append(attrs['name'])
-
-            # start value_contruct mode and initialize the value buffer
-            if name == 'value':
-                self.value_construct = ''
-
-            # save a marker where the sequence begins on the stack
-            if name == 'sequence':
-                self.sequence_start.append(len(self.stack))
-
-        def end_element(name):
-            #logger.debug('End element: name=%s', name)
-
-            # if higher level element had error, ignore the corresponding part
-            # of the XML tree as we go up
-            if self.ignore_count:
-                self.ignore_count -= 1
-                return
-
-            # when </attribute> is seen the current object, attribute name and
-            # value should be on top of the stack
-            if name == 'attribute':
-                value = self.stack.pop()
-                aname = self.stack.pop()
-                obj = self.stack[-1]
-                # update the object's attribute
-                obj.setSchemaAttribute(aname, value)
-                #logger.info("Setting: %s = %s" % (aname, value))
-
-            # when </value> is seen the value_construct buffer (CDATA) should
-            # be a python expression (e.g. quoted string)
-            if name == 'value':
-                # unescape the special characters
-                s = unescape(self.value_construct)
-                #logger.debug('string value: %s',s)
-                if s not in _cached_eval_strings:
-                    # This is ugly and classes which use this are bad, but this needs to be fixed in another PR
-                    # TODO Make the scope of objects a lot better than whatever is in the config
-                    # This is a dictionary constructed from eval-ing things in the Config. Why does should it do this?
-                    # Anyway, lets save the result for speed
-                    _cached_eval_strings[s] = eval(s, config_scope)
-                val = copy.deepcopy(_cached_eval_strings[s])
-                #logger.debug('evaled value: %s type=%s',repr(val),type(val))
-                self.stack.append(val)
-                self.value_construct = None
-
-            # when </sequence> is seen we remove last items from stack (as indicated by sequence_start)
-            # we make a GangaList from these items and put it on stack
-            if name == 'sequence':
-                pos = self.sequence_start.pop()
-                alist = makeGangaList(self.stack[pos:])
-                del self.stack[pos:]
-                self.stack.append(alist)
-
-            # when </class> is seen we finish initializing the new object
-            # by setting remaining attributes to their default values
-            # the object stays on the stack (will be removed by </attribute> or
-            # is a root object)
-            if name == 'class':
-                pass
-
-        def char_data(data):
-            # char_data may be called many times in one CDATA section so we need to build up
-            # the full buffer for <value>CDATA</value> section incrementally
-            if self.value_construct is not None:
-                ###logger.debug('char_data: append=%s',data)
-                # FIXME: decode data
-                self.value_construct += data
+                    # make a new ganga object
+                    obj = cls()
+            self.stack.append(obj)
+
+        # push the attribute name on the stack
+        elif name == 'attribute':
+            self.stack.append(attrs['name'])
+
+        # save a marker where the sequence begins on the stack
+        elif name == 'sequence':
+            self.sequence_start.append(len(self.stack))
+
+    def end_element(self, name):
+        #logger.debug('End element: name=%s', name)
+
+        # if higher level element had error, ignore the corresponding part
+        # of the XML tree as we go up
+        if self.ignore_count:
+            self.ignore_count -= 1
+            return
+
+        # typed scalars are converted directly from their CDATA
+        decoder = _scalar_decoders.get(name)
+        if decoder is not None:
+            self.stack.append(decoder(''.join(self.value_construct)))
+            self.value_construct = None
+
+        # when </attribute> is seen the current object, attribute name and
+        # value should be on top of the stack
+        elif name == 'attribute':
+            value = self.stack.pop()
+            aname = self.stack.pop()
+            obj = self.stack[-1]
+            # update the object's attribute
+            obj.setSchemaAttribute(aname, value)
+            #logger.info("Setting: %s = %s" % (aname, value))
+
+        # when </value> is seen the value_construct buffer (CDATA) should
+        # be a python expression (e.g. quoted string)
+        elif name == 'value':
+            # unescape the special characters
+            s = unescape(''.join(self.value_construct))
+            #logger.debug('string value: %s',s)
+            if s not in _cached_eval_strings:
+                # This is ugly and classes which use this are bad, but this needs to be fixed in another PR
+                # TODO Make the scope of objects a lot better than whatever is in the config
+                # This is a dictionary constructed from eval-ing things in the Config. Why does should it do this?
+                # Anyway, lets save the result for speed
+                _cached_eval_strings[s] = eval(s, config_scope)
+            val = _cached_eval_strings[s]
+            if not isinstance(val, _immutable_types):
+                val = copy.deepcopy(val)
+            #logger.debug('evaled value: %s type=%s',repr(val),type(val))
+            self.stack.append(val)
+            self.value_construct = None
+
+        elif name == 'none':
+            self.stack.append(None)
+
+        # typed containers are built from the items pushed since their start
+        elif name == 'list':
+            pos = self.container_start.pop()
+            alist = self.stack[pos:]
+            del self.stack[pos:]
+            self.stack.append(alist)
+
+        elif name == 'dict':
+            pos = self.container_start.pop()
+            items = self.stack[pos:]
+            del self.stack[pos:]
+            self.stack.append(dict(zip(items[::2], items[1::2])))
+
+        # when </sequence> is seen we remove last items from stack (as indicated by sequence_start)
+        # we make a GangaList from these items and put it on stack
+        elif name == 'sequence':
+            pos = self.sequence_start.pop()
+            alist = makeGangaList(self.stack[pos:])
+            del self.stack[pos:]
+            self.stack.append(alist)
+
+        # when </class> is seen we finish initializing the new object
+        # by setting remaining attributes to their default values
+        # the object stays on the stack (will be removed by </attribute> or
+        # is a root object)
+
+    def char_data(self, data):
+        # char_data may be called many times in one CDATA section so we need to build up
+        # the full buffer for <value>CDATA</value> section incrementally
+        if self.value_construct is not None:
+            ###logger.debug('char_data: append=%s',data)
+            self.value_construct.append(data)
+
+    def parse(self, s):
+        """ Parse and load object from string s using internal XML parser (expat).
+        """
+        import xml.parsers.expat
 
         # start parsing using callbacks
         p = xml.parsers.expat.ParserCreate()
 
-        p.StartElementHandler = start_element
-        p.EndElementHandler = end_element
-        p.CharacterDataHandler = char_data
+        p.StartElementHandler = self.start_element
+        p.EndElementHandler = self.end_element
+        p.CharacterDataHandler = self.char_data
 
         p.Parse(s)
 
@@ -420,4 +503,3 @@ class Loader(object):
             if not hasattr(obj, attr):
                 raise AssertionError("incomplete XML file")
         return obj, self.errors
-
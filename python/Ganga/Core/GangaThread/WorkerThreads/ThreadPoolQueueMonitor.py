@@ -10,6 +10,7 @@ logger = getLogger()
 
 _user_threadpool = None
 _monitoring_threadpool = None
+_submission_threadpool = None
 
 
 class ThreadPoolQueueMonitor(object):
@@ -19,19 +20,28 @@ class ThreadPoolQueueMonitor(object):
 
     The number of worker threads in the pool is initialized by
     the getConfig('Queues')['NumWorkerThreads'] config option.
+
+    The subjobs submitted in parallel are run by a third pool of
+    getConfig('Queues')['NumSubmissionThreads'] threads so that a
+    large submission doesn't hold up the monitoring.
     '''
 
-    def __init__(self, user_threadpool=None, monitoring_threadpool=None):
+    def __init__(self, user_threadpool=None, monitoring_threadpool=None, submission_threadpool=None):
 
         if user_threadpool is None:
             user_threadpool = WorkerThreadPool(worker_thread_prefix="User_Worker_")
         if monitoring_threadpool is None:
             monitoring_threadpool = WorkerThreadPool(worker_thread_prefix="Ganga_Worker_")
+        if submission_threadpool is None:
+            submission_threadpool = WorkerThreadPool(num_worker_threads=getConfig('Queues')['NumSubmissionThreads'],
+                                                     worker_thread_prefix="Submission_Worker_")
 
         global _user_threadpool
         global _monitoring_threadpool
+        global _submission_threadpool
         self._user_threadpool = _user_threadpool
         self._monitoring_threadpool = _monitoring_threadpool
+        self._submission_threadpool = _submission_threadpool
 
         if user_threadpool != None:
             if self._user_threadpool is not None:
@@ -47,9 +57,14 @@ class ThreadPoolQueueMonitor(object):
                 del self._monitoring_threadpool
                 del _monitoring_threadpool
             self._monitoring_threadpool = monitoring_threadpool
+        if self._submission_threadpool is not None:
+            self._submission_threadpool.clear_queue()
+            self._submission_threadpool._stop_worker_threads()
+        self._submission_threadpool = submission_threadpool
 
         _user_threadpool = self._user_threadpool
         _monitoring_threadpool = self._monitoring_threadpool
+        _submission_threadpool = self._submission_threadpool
 
         self._frozen = False
         self._shutdown = False
@@ -95,6 +110,10 @@ class ThreadPoolQueueMonitor(object):
         output += "Ganga monitoring queue:\n"
         output += "----------------------\n"
         output += str([self._display_element(elem) for elem in self._monitoring_threadpool.get_queue()])
+        output += '\n'
+        output += "Ganga submission queue:\n"
+        output += "----------------------\n"
+        output += str([self._display_element(elem) for elem in self._submission_threadpool.get_queue()])
         return output
 
     def _repr_pretty_(self, p, cycle):
@@ -169,6 +188,7 @@ class ThreadPoolQueueMonitor(object):
                     keyin = None
         if _actually_purge:
             self._monitoring_threadpool.clear_queue()
+            self._submission_threadpool.clear_queue()
 
     def add(self, worker_code, args=(), kwargs={}, priority=5):
         """
@@ -202,6 +222,11 @@ class ThreadPoolQueueMonitor(object):
                    priority    = The thread queuing system is a priority
                                  queue with lower number = higher priority.
                                  This then should be an int normally 0-9
+
+        returns:
+        -------
+                   A Future whose result() waits for the code to run and
+                   returns its return value
         """
         if not isinstance(worker_code, collections.Callable):
             logger.error('Only python callable objects can be added to the queue using queues.add()')
@@ -209,7 +234,7 @@ class ThreadPoolQueueMonitor(object):
             logger.error('e.g. Incorrect:     queues.add(myfunc()) *NOTE the brackets*')
             logger.error('e.g. Correct  :     queues.add(myfunc)')
             return
-        self._user_threadpool.add_function(worker_code,
+        return self._user_threadpool.add_function(worker_code,
                                            args=args,
                                            kwargs=kwargs,
                                            priority=priority)
@@ -225,7 +250,7 @@ class ThreadPoolQueueMonitor(object):
                 logger.warning("Queue System is frozen not adding any more System processes!")
             return
 
-        self._monitoring_threadpool.add_function(worker_code,
+        return self._monitoring_threadpool.add_function(worker_code,
                                                  args=args,
                                                  kwargs=kwargs,
                                                  priority=priority)
@@ -332,6 +357,9 @@ class ThreadPoolQueueMonitor(object):
         for t in self._monitoring_threadpool.worker_status():
             if t[1] != "idle":
                 statuses.append(t[0])
+        for t in self._submission_threadpool.worker_status():
+            if t[1] != "idle":
+                statuses.append(t[0])
         return statuses
 
     def totalNumUserThreads(self):
@@ -345,7 +373,7 @@ class ThreadPoolQueueMonitor(object):
 
     def totalNumIntThreads(self):
         num = 0
-        for t in self._monitoring_threadpool.worker_status():
+        for t in self._monitoring_threadpool.worker_status() + self._submission_threadpool.worker_status():
             if t[1] != "idle":
                 num += 1
 
@@ -362,20 +390,24 @@ class ThreadPoolQueueMonitor(object):
         self._frozen = True
         self._user_threadpool._frozen = True
         self._monitoring_threadpool._frozen = True
+        self._submission_threadpool._frozen = True
 
     def unfreeze(self):
         self._frozen = False
         self._user_threadpool._frozen = False
         self._monitoring_threadpool._frozen = False
+        self._submission_threadpool._frozen = False
 
     def _stop_all_threads(self, shutdown=False):
         self._shutdown = shutdown
         self._user_threadpool._stop_worker_threads(shutdown)
         self._monitoring_threadpool._stop_worker_threads(shutdown)
+        self._submission_threadpool._stop_worker_threads(shutdown)
         return
 
     def _start_all_threads(self):
         self._user_threadpool._start_worker_threads()
         self._monitoring_threadpool._start_worker_threads()
+        self._submission_threadpool._start_worker_threads()
         return
 
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import Queue
+import threading
 import traceback
 import collections
 from Ganga.Core.GangaThread import GangaThread
@@ -11,11 +12,74 @@ from Ganga.GPIDev.Base.Proxy import getName
 from collections import namedtuple
 
 logger = getLogger()
-QueueElement = namedtuple('QueueElement',  ['priority', 'command_input', 'callback_func', 'fallback_func', 'name'])
+QueueElement = namedtuple('QueueElement',  ['priority', 'command_input', 'callback_func', 'fallback_func', 'name', 'future'])
 CommandInput = namedtuple('CommandInput',  ['command', 'timeout', 'env', 'cwd', 'shell', 'python_setup', 'eval_includes', 'update_env'])
 FunctionInput = namedtuple('FunctionInput', ['function', 'args', 'kwargs'])
 
 
+class Future(object):
+
+    """
+    The outcome of a function or process added to a WorkerThreadPool, available once a worker thread has run it.
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        """Return True once the function has returned or raised"""
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the function to return or raise, return True if it has
+        Args:
+            timeout (float): Seconds to wait for, no limit if None
+        """
+        self._done.wait(timeout)
+        return self._done.isSet()
+
+    def result(self, timeout=None):
+        """
+        Return the value returned by the function, or raise the exception it raised
+        Args:
+            timeout (float): Seconds to wait for, no limit if None. Queue.Empty is raised if it is reached
+        """
+        if not self.wait(timeout):
+            raise Queue.Empty("Function has not been run within %s seconds" % timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Return the exception raised by the function, None if it returned
+        Args:
+            timeout (float): Seconds to wait for, no limit if None. Queue.Empty is raised if it is reached
+        """
+        if not self.wait(timeout):
+            raise Queue.Empty("Function has not been run within %s seconds" % timeout)
+        return self._exception
+
+    def _set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def _set_exception(self, exception):
+        self._exception = exception
+        self._done.set()
+
+
+def _frozen_future():
+    """Return a Future failed because the queue it was added to is frozen"""
+    from Ganga.Core.exceptions import GangaException
+    future = Future()
+    future._set_exception(GangaException("Queue is frozen"))
+    return future
+
+
 class WorkerThreadPool(object):
 
     """
@@ -115,6 +179,8 @@ class WorkerThreadPool(object):
                 else:
                     result = execute(*item.command_input)
             except Exception as e:
+                if item.future is not None:
+                    item.future._set_exception(e)
                 logger.error("Exception raised executing '%s' in Thread '%s':\n%s" % (thread._command, thread.gangaName, traceback.format_exc()))
                 if item.fallback_func.function is not None:
                     if isinstance(item.fallback_func, FunctionInput):
@@ -128,6 +194,8 @@ class WorkerThreadPool(object):
                         logger.error("Unrecognised fallback_func type: '%s'" % repr(item.fallback_func))
                         logger.error("                       expected: 'FunctionInput'")
             else:
+                if item.future is not None:
+                    item.future._set_result(result)
                 if item.callback_func.function is not None:
                     if isinstance(item.callback_func, FunctionInput):
                         thread._command = getName(item.callback_func.function)
@@ -155,6 +223,10 @@ class WorkerThreadPool(object):
                      callback_func=None, callback_args=(), callback_kwargs={},
                      fallback_func=None, fallback_args=(), fallback_kwargs={},
                      name=None):
+        """
+        Queue a function to be run by a worker thread and return the Future of its result. The Future of a frozen
+        queue fails straight away
+        """
 
         if not isinstance(function, collections.Callable):
             logger.error('Only a python callable object may be added to the queue using the add_function() method')
@@ -162,14 +234,17 @@ class WorkerThreadPool(object):
         if self._frozen is True:
             if not self._shutdown:
                 logger.warning("Cannot Add Process as Queue is frozen!")
-            return
+            return _frozen_future()
+        future = Future()
         self.__queue.put(QueueElement(priority=priority,
                                       command_input=FunctionInput(
                                           function, args, kwargs),
                                       callback_func=FunctionInput(
                                           callback_func, callback_args, callback_kwargs),
-                                      fallback_func=FunctionInput(fallback_func, fallback_args, fallback_kwargs), name=name
+                                      fallback_func=FunctionInput(fallback_func, fallback_args, fallback_kwargs), name=name,
+                                      future=future
                                       ))
+        return future
 
     def add_process(self,
                     command, timeout=None, env=None, cwd=None, shell=False,
@@ -177,6 +252,10 @@ class WorkerThreadPool(object):
                     callback_func=None, callback_args=(), callback_kwargs={},
                     fallback_func=None, fallback_args=(), fallback_kwargs={},
                     name=None):
+        """
+        Queue a command to be run by a worker thread and return the Future of its output. The Future of a frozen
+        queue fails straight away
+        """
 
         if not isinstance(command, str):
             logger.error("Input command must be of type 'string'")
@@ -184,31 +263,39 @@ class WorkerThreadPool(object):
         if self._frozen is True:
             if self._shutdown:
                 logger.warning("Cannot Add Process as Queue is frozen!")
-            return
+            return _frozen_future()
+        future = Future()
         self.__queue.put(QueueElement(priority=priority,
                                       command_input=CommandInput(
                                           command, timeout, env, cwd, shell, python_setup, eval_includes, update_env),
                                       callback_func=FunctionInput(
                                           callback_func, callback_args, callback_kwargs),
-                                      fallback_func=FunctionInput(fallback_func, fallback_args, fallback_kwargs), name=name
+                                      fallback_func=FunctionInput(fallback_func, fallback_args, fallback_kwargs), name=name,
+                                      future=future
                                       ))
+        return future
 
     def map(self, function, *iterables):
+        """
+        Queue the function once for each set of arguments and return the Futures of the results in the same order
+        """
         if not isinstance(function, collections.Callable):
             raise TypeError('must be a function')
         if self._frozen is True:
             logger.error("Cannot map a Function as Queue is frozen!")
-        for args in zip(*iterables):
-            self.__queue.put(QueueElement(priority=5,
-                                          command_input=FunctionInput(
-                                              function, args, {})
-                                          ))
+            return [_frozen_future() for args in zip(*iterables)]
+        return [self.add_function(function, args) for args in zip(*iterables)]
 
     def clear_queue(self):
         """
-        Purges the thread pools queue.
+        Purges the thread pools queue. The Futures of the purged elements fail
         """
+        from Ganga.Core.exceptions import GangaException
+        purged = self.__queue.queue
         self.__queue.queue = []
+        for item in purged:
+            if isinstance(item, QueueElement) and item.future is not None:
+                item.future._set_exception(GangaException("Purged from the queue before being run"))
 
     def get_queue(self):
         """
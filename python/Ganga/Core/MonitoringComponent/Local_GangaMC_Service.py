@@ -8,6 +8,7 @@ from Ganga.Core.GangaThread import GangaThread
 from Ganga.Core.GangaRepository import RegistryKeyError, RegistryLockError
 
 from Ganga.Utility.threads import SynchronisedObject
+from Ganga.Core.MonitoringComponent.PollScheduler import BackendPollSchedule
 
 import Ganga.GPIDev.Credentials as Credentials
 from Ganga.Core.InternalServices import Coordinator
@@ -427,6 +428,34 @@ def resubmit_if_required(jobList_fromset):
     return
 
 
+def _job_poll_key(j):
+    """The key of a job in the poll schedule of its backend"""
+    return stripProxy(j).getFQID('.')
+
+
+def _job_poll_state(j):
+    """
+    What a poll can change about a job: its status, the status of the backend and, for a master job, the number of
+    subjobs in each status
+    """
+    j = stripProxy(j)
+    state = (j.status, getattr(j.backend, 'status', None))
+    if len(j.subjobs) > 0:
+        state += tuple(sorted(j._getSubJobStatusVector().counts().iteritems()))
+    return state
+
+
+def _job_poll_states(jobs):
+    """The poll state of each of the jobs by its key, leaving out the jobs whose state can't be had"""
+    states = {}
+    for j in jobs:
+        try:
+            states[_job_poll_key(j)] = _job_poll_state(j)
+        except Exception as err:
+            log.debug("Poll state of job not known: %s" % err)
+    return states
+
+
 def get_jobs_in_bunches(jobList_fromset, blocks_of_size=5, stripProxies=True):
     """
     Return a list of lists of subjobs where each list contains
@@ -488,6 +517,8 @@ class JobRegistry_Monitor(GangaThread):
         self.activeBackends = {}
         self.updateJobStatus = None
         self.errors = {}
+        # backend name -> BackendPollSchedule
+        self._pollSchedules = {}
 
         self.updateDict_ts = SynchronisedObject(UpdateDict())
 
@@ -1028,6 +1059,22 @@ class JobRegistry_Monitor(GangaThread):
 
                 all_exceptions = []
 
+                # Query the backend for all of its jobs at once, only go through them bunch by bunch to isolate
+                # the jobs causing an error
+                if len(all_job_bunches) > 1:
+                    states_before = _job_poll_states(jobList_fromset)
+                    try:
+                        stripProxy(backendObj).master_updateMonitoringInformation([stripProxy(j) for j in jobList_fromset])
+                        all_job_bunches = []
+                    except Exception as err:
+                        log.debug("Updating all %s jobs together failed, updating them in bunches: %s" % (getName(backendObj), err))
+                        # Only go over the jobs which the failed update didn't move on again. Those it did are left
+                        # until the next cycle, as updating a job which has just finished again could finalise it twice
+                        states_after = _job_poll_states(jobList_fromset)
+                        not_updated = [j for j in jobList_fromset
+                                       if states_after.get(_job_poll_key(j)) == states_before.get(_job_poll_key(j))]
+                        all_job_bunches = get_jobs_in_bunches(not_updated, blocks_of_size = block_size )
+
                 for this_job_list in all_job_bunches:
 
                     if self.enabled is False and self.alive is False:
@@ -1066,6 +1113,8 @@ class JobRegistry_Monitor(GangaThread):
                 log.error("Monitoring Error: %s" % str(err))
                 log.debug("Lets not crash here!")
                 return
+            finally:
+                self._recordPoll(getName(backendObj), jobList_fromset)
 
             # FIXME THIS METHOD DOES NOT EXIST
             #log.debug("[Update Thread %s] Flushing registry %s." % (currentThread, [x.id for x in jobList_fromset]))
@@ -1088,6 +1137,42 @@ class JobRegistry_Monitor(GangaThread):
         log.debug("Finishing _checkBackend")
         return
 
+    def _getPollSchedule(self, backend_name):
+        """
+        Return the poll schedule of a backend, its interval adapts between base_poll_rate and the poll rate of the backend
+        Args:
+            backend_name (str): name of the backend class
+        """
+        if backend_name not in self._pollSchedules:
+            if backend_name in config:
+                pRate = config[backend_name]
+            else:
+                pRate = config['default_backend_poll_rate']
+            if config['adaptive_poll_rate']:
+                schedule = BackendPollSchedule(min(config['base_poll_rate'], pRate), pRate,
+                                               config['stale_job_polls'], config['stale_job_poll_factor'])
+            else:
+                # Poll every job in every monitoring step
+                schedule = BackendPollSchedule(0, 0)
+            self._pollSchedules[backend_name] = schedule
+        return self._pollSchedules[backend_name]
+
+    def _recordPoll(self, backend_name, jobList):
+        """
+        Record the state of the jobs after a poll of their backend to schedule the next one
+        Args:
+            backend_name (str): name of the backend class
+            jobList (list): the jobs which were polled
+        """
+        self._getPollSchedule(backend_name).recordPoll(_job_poll_states(jobList))
+
+    def getPollStats(self):
+        """
+        Return a dict of backend name -> dict of the current poll interval and the number of polls, polls which saw a
+        change, jobs polled and jobs skipped because their status hasn't changed for a while
+        """
+        return dict((name, schedule.getStats()) for name, schedule in self._pollSchedules.items())
+
     def _checkActiveBackends(self, activeBackendsFunc):
 
         log.debug("calling function _checkActiveBackends")
@@ -1102,6 +1187,9 @@ class JobRegistry_Monitor(GangaThread):
         summary += '}'
         log.debug("Active Backends: %s" % summary)
 
+        # Monitoring steps requested with runMonitoring poll every job
+        force = self.steps > 0
+
         for jList in activeBackends.values():
 
             #log.debug("backend: %s" % str(jList))
@@ -1112,6 +1200,11 @@ class JobRegistry_Monitor(GangaThread):
             else:
                 pRate = config['default_backend_poll_rate']
 
+            # Only poll the backend when it's due and leave out the jobs which haven't changed for a while
+            jList = self._getPollSchedule(b_name).selectJobs(jList, _job_poll_key, force)
+            if not jList:
+                continue
+
             # TODO: To include an if statement before adding entry to
             #       updateDict. Entry is added only if credential requirements
             #       of the particular backend is satisfied.
@@ -0,0 +1,153 @@
+import threading
+import time
+
+
+class StaleStateTracker(object):
+    """
+    Counts, for every key polled, the number of consecutive polls in which its state didn't change.
+    Keys whose state hasn't changed for stale_after polls are only due every stale_factor polls so that the
+    monitoring spends its queries on the jobs which are actually moving
+    """
+
+    def __init__(self, stale_after, stale_factor):
+        """
+        Args:
+            stale_after (int): Number of polls without a change after which a key is stale, 0 means never
+            stale_factor (int): A stale key is only due once in this many polls
+        """
+        self.stale_after = stale_after
+        self.stale_factor = max(1, stale_factor)
+        # key -> [last state, number of polls without a change]
+        self._states = {}
+        self.cycle = 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def nextCycle(self):
+        """Start a new poll"""
+        self.cycle += 1
+
+    def isKnown(self, key):
+        return key in self._states
+
+    def isStale(self, key):
+        entry = self._states.get(key)
+        return entry is not None and 0 < self.stale_after <= entry[1]
+
+    def isDue(self, key):
+        """Return True if the key should be polled in this cycle
+        Args:
+            key (hashable): The id of the job or subjob
+        """
+        if not self.isStale(key):
+            return True
+        # Spread the stale keys over the cycles rather than polling all of them together
+        return (self.cycle + hash(key)) % self.stale_factor == 0
+
+    def update(self, key, state):
+        """Record the state of a key after a poll, returns True if it changed or wasn't known before
+        Args:
+            key (hashable): The id of the job or subjob
+            state (object): Anything comparable describing the state, e.g. the status
+        """
+        entry = self._states.get(key)
+        if entry is None:
+            self._states[key] = [state, 0]
+            return True
+        if entry[0] != state:
+            entry[0] = state
+            entry[1] = 0
+            return True
+        entry[1] += 1
+        return False
+
+    def forget(self, keep):
+        """Drop the keys which are no longer monitored
+        Args:
+            keep (iterable): The keys still monitored
+        """
+        keep = set(keep)
+        for key in [k for k in self._states if k not in keep]:
+            del self._states[key]
+
+
+class BackendPollSchedule(object):
+    """
+    Adaptive poll schedule of one backend. The interval between two polls drops to min_interval as soon as a poll sees
+    a job change state and is doubled, up to max_interval, after each poll which sees none.
+    The jobs of the backend are tracked by a StaleStateTracker
+    """
+
+    def __init__(self, min_interval, max_interval, stale_after=0, stale_factor=1):
+        """
+        Args:
+            min_interval (float): Shortest time in seconds between two polls
+            max_interval (float): Longest time in seconds between two polls
+            stale_after (int): See StaleStateTracker
+            stale_factor (int): See StaleStateTracker
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = self.min_interval
+        self.next_poll = 0.
+        self.jobs = StaleStateTracker(stale_after, stale_factor)
+        self._lock = threading.Lock()
+        self.stats = {'polls': 0, 'changed_polls': 0, 'polled': 0, 'skipped': 0}
+
+    def isDue(self, now=None):
+        if now is None:
+            now = time.time()
+        return now >= self.next_poll
+
+    def selectJobs(self, jobs, key, force=False):
+        """
+        Return the jobs to poll now, or an empty list if the backend isn't due. Jobs never polled before make the backend due
+        Args:
+            jobs (list): All of the jobs of this backend which need monitoring
+            key (callable): Returns the key of a job in the tracker
+            force (bool): Poll every job now
+        """
+        with self._lock:
+            keys = [key(j) for j in jobs]
+            self.jobs.forget(keys)
+            now = time.time()
+            if not force and not self.isDue(now) and all(self.jobs.isKnown(k) for k in keys):
+                return []
+            # Don't select the jobs again while this poll is waiting to run
+            self.next_poll = now + self.interval
+            self.jobs.nextCycle()
+            selected = [j for j, k in zip(jobs, keys) if force or self.jobs.isDue(k)]
+            self.stats['skipped'] += len(jobs) - len(selected)
+            return selected
+
+    def recordPoll(self, states, now=None):
+        """
+        Record the state of the jobs after a poll and schedule the next one
+        Args:
+            states (dict): key -> state of every job polled
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            changed = False
+            for k, state in states.iteritems():
+                if self.jobs.update(k, state):
+                    changed = True
+            self.stats['polls'] += 1
+            self.stats['polled'] += len(states)
+            if changed:
+                self.stats['changed_polls'] += 1
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.max_interval, self.interval * 2)
+            self.next_poll = now + self.interval
+            return changed
+
+    def getStats(self):
+        """Return a dict of the current interval and the number of polls, polls which saw a change, jobs polled and skipped"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['interval'] = self.interval
+            stats['jobs'] = len(self.jobs)
+            return stats
@@ -5,7 +5,7 @@ import mimetypes
 import Ganga.Utility.logging
 logger = Ganga.Utility.logging.getLogger(modulename=True)
 
-from .WNSandbox import OUTPUT_TARBALL_NAME, PYTHON_DIR
+from .WNSandbox import OUTPUT_TARBALL_NAME, WN_MODULES_TARBALL_NAME, PYTHON_DIR
 from Ganga.Core import GangaException, GangaIOError
 
 
@@ -28,6 +28,9 @@ def createPackedInputSandbox(sandbox_files, inws, name):
                 'sandbox_files': a list of File or FileBuffer objects.
                 'inws': a InputFileWorkspace object
        Return: a list containing a path to the tarball
+
+       If [Configuration]sandbox_cache is set the tarball is taken from the sandbox cache when
+       a sandbox with the same files has been packed before (see SandboxCache).
        """
 
 #    from Ganga.Core import FileWorkspace
@@ -37,11 +40,31 @@ def createPackedInputSandbox(sandbox_files, inws, name):
 
     tgzfile = inws.getPath(name)
 
+    logger.debug("Creating packed Sandbox with %s many sandbox files." % len(sandbox_files))
+
+    from Ganga.Utility.Config import getConfig
+    if getConfig('Configuration')['sandbox_cache']:
+        from .SandboxCache import getSandboxCache
+        getSandboxCache().place(sandbox_files, tgzfile)
+    else:
+        # the tarball may be a link into the sandbox cache, which mustn't be written through
+        if os.path.lexists(tgzfile):
+            os.remove(tgzfile)
+        writePackedInputSandbox(sandbox_files, tgzfile)
+
+    return [tgzfile]
+
+
+def writePackedInputSandbox(sandbox_files, tgzfile):
+    """Pack all sandbox_files into the tarball tgzfile.
+       Arguments:
+                'sandbox_files': a list of File or FileBuffer objects.
+                'tgzfile': the path of the tarball
+    """
+
     import tarfile
     import stat
 
-    logger.debug("Creating packed Sandbox with %s many sandbox files." % len(sandbox_files))
-
 #
 # Curent release with os module
 #
@@ -112,7 +135,24 @@ def createPackedInputSandbox(sandbox_files, inws, name):
             fileobj.close()
         tf.close()
 
-    return [tgzfile]
+
+def createPackedWNModulesSandbox(inws):
+    """Put the modules used by the job wrapper scripts (WNSandbox and Ganga.Utility.files) into the python directory
+       of a tarball written to the input workspace. It is meant to be part of the master input sandbox so that the
+       modules are shipped once for all of the subjobs rather than inlined into every wrapper script.
+       This function is called by Ganga client at the submission time.
+       Arguments:
+                'inws': a InputFileWorkspace object
+       Return: a list containing a path to the tarball
+    """
+
+    import inspect
+    from Ganga.GPIDev.Lib.File.File import File
+    from . import WNSandbox
+    import Ganga.Utility.files
+
+    modules = [File(inspect.getsourcefile(m), subdir=PYTHON_DIR) for m in (WNSandbox, Ganga.Utility.files)]
+    return createPackedInputSandbox(modules, inws, WN_MODULES_TARBALL_NAME)
 
 
 def createInputSandbox(sandbox_files, inws):
@@ -0,0 +1,247 @@
+##########################################################################
+# Ganga Project. http://cern.ch/ganga
+##########################################################################
+#
+# Content-addressed cache of packed input sandboxes
+#
+# A packed input sandbox is keyed on the names, permissions and contents of the files it holds. The first sandbox
+# with a given key is packed into the cache directory of the workspace, every sandbox with the same key afterwards is
+# hard-linked to it (copied if the filesystem can't link) instead of being packed again. This covers the subjobs of a
+# split job which share their files as well as resubmitted and copied jobs.
+#
+# The link count of a cache entry is its reference count: every job input workspace holding the sandbox is one more
+# link. Removing a job removes its links and prune() then deletes the entries which no job refers to any longer.
+#
+# Usage:
+#
+#     getSandboxCache().place(sandbox_files, '/path/to/_input_sandbox_1.tgz')
+#     getSandboxCache().getStats()
+
+from __future__ import absolute_import
+
+import errno
+import hashlib
+import os
+import stat
+import tempfile
+import threading
+import time
+
+import Ganga.Utility.logging
+
+logger = Ganga.Utility.logging.getLogger()
+
+# Entries are named after the hex digest of their key
+_entry_suffix = '.tgz'
+
+# A file changed less than this many seconds before its digest is worked out may be rewritten again without its size or
+# timestamps changing (coarse filesystem timestamps), so its digest is not kept
+_mtime_margin = 2.
+
+
+def getSandboxCacheDir():
+    """Return the directory of the sandbox cache, within the workspace of the repository"""
+    from Ganga.Core.FileWorkspace import gettop
+    return os.path.join(gettop(), '.sandbox_cache')
+
+
+class SandboxCache(object):
+    """
+    Packs each distinct input sandbox once and shares the tarball between all of the jobs which use it
+    """
+
+    def __init__(self, cachedir=None):
+        """
+        Args:
+            cachedir (str): Where the tarballs are kept, getSandboxCacheDir() if None
+        """
+        self._cachedir = cachedir
+        self._lock = threading.Lock()
+        # path -> ((size, mtime, ctime, inode), digest) so that a file which hasn't changed isn't read again
+        self._digests = {}
+        self.stats = {'hits': 0, 'misses': 0, 'linked': 0, 'copied': 0, 'pruned': 0, 'bytes_saved': 0}
+
+    def getCacheDir(self):
+        """Return the directory of the cache entries"""
+        if self._cachedir is None:
+            return getSandboxCacheDir()
+        return self._cachedir
+
+    def getStats(self):
+        """
+        Return the counts of sandboxes found in the cache (hits) and packed (misses), how many of them were linked or
+        copied into place, the number of entries pruned and the bytes of disk saved by linking to an entry
+        """
+        with self._lock:
+            return dict(self.stats)
+
+    def place(self, sandbox_files, tgzfile):
+        """
+        Put the packed sandbox of the files at tgzfile, packing it only if the cache doesn't hold it yet
+        Args:
+            sandbox_files (list): File or FileBuffer objects
+            tgzfile (str): Where the tarball is needed
+        """
+        from .Sandbox import writePackedInputSandbox
+
+        key = self._key(sandbox_files)
+        if key is None:
+            writePackedInputSandbox(sandbox_files, tgzfile)
+            return
+
+        cachedir = self.getCacheDir()
+        entry = os.path.join(cachedir, key + _entry_suffix)
+
+        # an entry may be pruned by another session between being found and being linked, pack it again then
+        for attempt in range(2):
+            hit = os.path.exists(entry)
+            if not hit:
+                self._pack(sandbox_files, entry)
+            try:
+                linked = self._link(entry, tgzfile)
+            except OSError as err:
+                if err.errno == errno.ENOENT and attempt == 0:
+                    continue
+                raise
+            break
+
+        with self._lock:
+            self.stats['hits' if hit else 'misses'] += 1
+            self.stats['linked' if linked else 'copied'] += 1
+            if hit and linked:
+                self.stats['bytes_saved'] += os.path.getsize(tgzfile)
+
+        logger.debug("Sandbox %s %s cache entry %s", tgzfile, 'reused' if hit else 'packed into', entry)
+
+    def prune(self):
+        """
+        Delete the entries which aren't linked to from any job input workspace any longer, return how many there were
+        """
+        cachedir = self.getCacheDir()
+        if not os.path.isdir(cachedir):
+            return 0
+
+        pruned = 0
+        for name in os.listdir(cachedir):
+            if not name.endswith(_entry_suffix):
+                continue
+            path = os.path.join(cachedir, name)
+            try:
+                if os.stat(path).st_nlink <= 1:
+                    os.remove(path)
+                    pruned += 1
+            except OSError as err:
+                # removed by another session meanwhile
+                logger.debug("Could not prune sandbox cache entry %s: %s", path, err)
+
+        with self._lock:
+            self.stats['pruned'] += pruned
+        if pruned:
+            logger.debug("Pruned %s unused sandboxes from %s", pruned, cachedir)
+        return pruned
+
+    def _key(self, sandbox_files):
+        """
+        Return the digest of the names, permissions and contents of the files as they would be packed, None if the
+        sandbox can't be cached
+        """
+        from Ganga.GPIDev.Lib.File.FileBuffer import FileBuffer
+        from Ganga.GPIDev.Base.Proxy import isType
+        from .Sandbox import SandboxError
+
+        key = hashlib.sha1()
+        for f in sandbox_files:
+            if isType(f, FileBuffer):
+                # the contents of a stream can only be read once, those are packed straight away
+                if not isinstance(f._contents, str):
+                    return None
+                if f.subdir == os.curdir:
+                    name = os.path.basename(f.name)
+                else:
+                    name = os.path.join(f.subdir, os.path.basename(f.name))
+                mode = 0o644
+                digest = hashlib.sha1(f.getContents()).hexdigest()
+            else:
+                name = os.path.join(f.subdir, os.path.basename(f.name))
+                try:
+                    mode = stat.S_IMODE(os.stat(f.name).st_mode)
+                except OSError:
+                    raise SandboxError("File '%s' does not exist." % f.name)
+                digest = self._file_digest(f.name)
+            if f.isExecutable():
+                mode |= stat.S_IXUSR
+            key.update('%s\0%o\0%s\n' % (name, mode, digest))
+        return key.hexdigest()
+
+    def _file_digest(self, path):
+        """Return the digest of the contents of a file, reading it only if it has changed since it was last read"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime, st.st_ctime, st.st_ino)
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), ''):
+                digest.update(block)
+        digest = digest.hexdigest()
+        # Only once the file has settled is any later change certain to show in its timestamps
+        if time.time() - max(st.st_mtime, st.st_ctime) >= _mtime_margin:
+            with self._lock:
+                self._digests[path] = (signature, digest)
+        return digest
+
+    def _pack(self, sandbox_files, entry):
+        """Pack the files into a new cache entry, which appears in one go once it is complete"""
+        from .Sandbox import writePackedInputSandbox
+
+        cachedir = os.path.dirname(entry)
+        if not os.path.isdir(cachedir):
+            try:
+                os.makedirs(cachedir)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        fd, tmpfile = tempfile.mkstemp(suffix='.tmp', dir=cachedir)
+        os.close(fd)
+        try:
+            writePackedInputSandbox(sandbox_files, tmpfile)
+            os.rename(tmpfile, entry)
+        except:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            raise
+
+    @staticmethod
+    def _link(entry, tgzfile):
+        """Hard-link the entry to tgzfile, or copy it if they can't be linked. Return True if linked"""
+        import shutil
+
+        # Never write through an old link into the cache, replace it
+        if os.path.lexists(tgzfile):
+            os.remove(tgzfile)
+        try:
+            os.link(entry, tgzfile)
+            return True
+        except OSError as err:
+            if err.errno == errno.ENOENT:
+                raise
+            logger.debug("Could not link %s to %s, copying it: %s", entry, tgzfile, err)
+        shutil.copyfile(entry, tgzfile)
+        return False
+
+
+_sandbox_cache = None
+_sandbox_cache_lock = threading.Lock()
+
+
+def getSandboxCache():
+    """Return the SandboxCache shared by Ganga"""
+    global _sandbox_cache
+    with _sandbox_cache_lock:
+        if _sandbox_cache is None:
+            _sandbox_cache = SandboxCache()
+    return _sandbox_cache
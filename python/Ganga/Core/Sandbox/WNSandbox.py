@@ -6,6 +6,7 @@ It therefore may use ###TAGS###  which are expanded in the wrapper script.
 
 INPUT_TARBALL_NAME = '_input_sandbox.tgz'
 OUTPUT_TARBALL_NAME = '_output_sandbox.tgz'
+WN_MODULES_TARBALL_NAME = '_wn_modules.tgz'
 PYTHON_DIR = '_python'
 
 import os
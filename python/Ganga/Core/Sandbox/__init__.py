@@ -1,3 +1,4 @@
 from __future__ import absolute_import
-from .Sandbox import SandboxError, createPackedInputSandbox, createInputSandbox, getPackedOutputSandbox
-from .WNSandbox import getPackedInputSandbox, createOutputSandbox, createPackedOutputSandbox, OUTPUT_TARBALL_NAME, PYTHON_DIR
+from .Sandbox import SandboxError, createPackedInputSandbox, createPackedWNModulesSandbox, createInputSandbox, getPackedOutputSandbox
+from .WNSandbox import getPackedInputSandbox, createOutputSandbox, createPackedOutputSandbox, OUTPUT_TARBALL_NAME, WN_MODULES_TARBALL_NAME, PYTHON_DIR
+from .SandboxCache import SandboxCache, getSandboxCache
@@ -6,6 +6,7 @@
 
 from Ganga.Core.exceptions import IncompleteJobSubmissionError
 from Ganga.Core.GangaRepository.SubJobXMLList import SubJobXMLList
+from Ganga.Core.MonitoringComponent.PollScheduler import StaleStateTracker
 from Ganga.GPIDev.Base import GangaObject
 from Ganga.GPIDev.Base.Proxy import stripProxy, isType, getName
 from Ganga.GPIDev.Lib.Dataset import GangaDataset
@@ -59,27 +60,30 @@ class IBackend(GangaObject):
         pass
 
     def _parallel_submit(self, b, sj, sc, master_input_sandbox, fqid, logger):
+        """
+        Submit one subjob from a submission thread, return None if it has been submitted and the reason it couldn't be
+        otherwise
+        Args:
+            b (IBackend): The backend of the subjob
+            sj (Job): The subjob
+            sc (StandardJobConfig): The config of the subjob
+            master_input_sandbox (list): The files shared by all of the subjobs
+            fqid (str): The id of the subjob
+            logger (logger): The logger to report failures to
+        """
 
         try:
             sj.updateStatus('submitting')
             if b.submit(sc, master_input_sandbox):
                 sj.updateStatus('submitted')
                 sj.info.increment()
+                return None
             else:
                 raise IncompleteJobSubmissionError(fqid, 'submission failed')
         except Exception as err:
-            #from Ganga.Utility.logging import log_user_exception
             sj.updateStatus('failed')
-
-            #from Ganga.Core.exceptions import GangaException
-            #if isinstance(err, GangaException):
-            #    logger.error("%s" % err)
-            #    #log_user_exception(logger, debug=True)
-            #else:
-            #    #log_user_exception(logger, debug=False)
             logger.error("Parallel Job Submission Failed: %s" % err)
-        finally:
-            pass
+            return str(err)
 
     def master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going=False, parallel_submit=False):
         """  Submit   the  master  job  and  all   its  subjobs.   The
@@ -144,31 +148,36 @@ class IBackend(GangaObject):
 
             from Ganga.Core.GangaThread.WorkerThreads import getQueues
 
-            threads_before = getQueues().totalNumIntThreads()
+            submission_pool = getQueues()._submission_threadpool
 
+            start = time.time()
+            futures = []
             for sc, sj in zip(subjobconfigs, rjobs):
-
                 fqid = sj.getFQID('.')
-                b = sj.backend
-                # FIXME would be nice to move this to the internal threads not user ones
-                #from Ganga.GPIDev.Base.Proxy import stripProxy
-                getQueues()._monitoring_threadpool.add_function(self._parallel_submit, (b, sj, sc, master_input_sandbox, fqid, logger))
-
-            def subjob_status_check(rjobs):
-                has_submitted = True
-                for sj in rjobs:
-                    if sj.status not in ["submitted","failed","completed","running","completing"]:
-                        has_submitted = False
-                        break
-                return has_submitted
-
-            while not subjob_status_check(rjobs):
-                import time
-                time.sleep(1.)
+                b = stripProxy(sj.backend)
+                futures.append((fqid, submission_pool.add_function(self._parallel_submit, (b, sj, sc, master_input_sandbox, fqid, logger),
+                                                                   name='submit_%s' % fqid)))
 
-            for i in rjobs:
-                if i.status in ["new", "failed"]:
+            failures = []
+            for fqid, future in futures:
+                try:
+                    reason = future.result()
+                except Exception as err:
+                    reason = str(err)
+                if reason is not None:
+                    failures.append((fqid, reason))
+
+            duration = time.time() - start
+            submitted = len(futures) - len(failures)
+            logger.info("Submitted %s of %s subjobs in %.1fs (%.1f jobs/s)", submitted, len(futures), duration,
+                        submitted / max(duration, 1e-3))
+
+            if failures:
+                incomplete_subjobs[:] = [fqid for fqid, reason in failures]
+                if not keep_going and not submitted:
                     return 0
+                raise IncompleteJobSubmissionError(incomplete_subjobs, 'submission failed: %s' %
+                                                   '; '.join('%s: %s' % failure for failure in failures))
             return 1
 
         for sc, sj in zip(subjobconfigs, rjobs):
@@ -407,7 +416,9 @@ class IBackend(GangaObject):
         the subjobs.
 
         The default implementation  iterates  over subjobs and calls
-        updateMonitoringInformation().
+        updateMonitoringInformation(). Subjobs whose status hasn't changed
+        for [PollThread]stale_job_polls calls are only passed on once in
+        [PollThread]stale_job_poll_factor calls.
         """
 
         from Ganga.Core import monitoring_component
@@ -419,11 +430,15 @@ class IBackend(GangaObject):
         #blocks_of_size = 10
         try:
             from Ganga.Utility.Config import getConfig
-            blocks_of_size = getConfig('PollThread')['numParallelJobs']
+            poll_config = getConfig('PollThread')
+            blocks_of_size = poll_config['numParallelJobs']
+            stale_after = poll_config['stale_job_polls'] if poll_config['adaptive_poll_rate'] else 0
+            stale_factor = poll_config['stale_job_poll_factor']
         except Exception as err:
             logger.debug("Problem with PollThread Config, defaulting to block size of 5 in master_updateMon...")
             logger.debug("Error: %s" % err)
             blocks_of_size = 5
+            stale_after, stale_factor = 0, 1
         ## Separate different backends implicitly
         simple_jobs = {}
 
@@ -431,26 +446,30 @@ class IBackend(GangaObject):
         # are not locked by an active session of ganga
 
         for j in jobs:
+            j = stripProxy(j)
             ## All subjobs should have same backend
             if len(j.subjobs) > 0:
                 #logger.info("Looking for sj")
                 monitorable_subjob_ids = []
 
-                if isType(j.subjobs, SubJobXMLList):
-                    cache = j.subjobs.getAllCachedData()
-                    for sj_id in range(0,len(j.subjobs)):
-                        if cache[sj_id]['status'] in ['submitted', 'running']:
-                            if j.subjobs.isLoaded(sj_id):
-                                ## SJ may have changed from cache in memory
-                                this_sj = j.subjobs(sj_id)
-                                if this_sj.status in ['submitted', 'running']:
-                                    monitorable_subjob_ids.append(sj_id)
-                            else:
-                                monitorable_subjob_ids.append(sj_id)
-                else:
-                    for sj in j.subjobs:
-                        if sj.status in ['submitted', 'running']:
-                            monitorable_subjob_ids.append(sj.id)
+                # The status vector is kept up to date by the subjobs so there is no need to look at every index entry
+                statuses = j._getSubJobStatusVector()
+                for sj_id, status in enumerate(statuses):
+                    if status in ['submitted', 'running']:
+                        if not isType(j.subjobs, SubJobXMLList) or j.subjobs.isLoaded(sj_id):
+                            ## SJ may have changed from cache in memory
+                            if j.subjobs[sj_id].status not in ['submitted', 'running']:
+                                continue
+                        monitorable_subjob_ids.append(sj_id)
+
+                # Subjobs which haven't changed for a while are only checked every few calls
+                tracker = j._subjob_poll_tracker
+                if tracker is None or tracker.stale_after != stale_after or tracker.stale_factor != stale_factor:
+                    tracker = StaleStateTracker(stale_after, stale_factor)
+                    j._subjob_poll_tracker = tracker
+                tracker.forget(monitorable_subjob_ids)
+                tracker.nextCycle()
+                monitorable_subjob_ids = [sj_id for sj_id in monitorable_subjob_ids if tracker.isDue(sj_id)]
 
                 #logger.info('Monitoring subjobs: %s', monitorable_subjob_ids)
 
@@ -486,6 +505,9 @@ class IBackend(GangaObject):
                     except Exception as err:
                         logger.error("Monitoring Error: %s" % err)
 
+                    for sj_id in this_block:
+                        tracker.update(sj_id, statuses[sj_id])
+
                 j.updateMasterJobStatus()
 
             else:
@@ -8,7 +8,10 @@ from Ganga.Utility.Config import ConfigError, getConfig
 from Ganga.GPIDev.Adapters.IPostProcessor import PostProcessException, IPostProcessor
 from Ganga.GPIDev.Schema import Schema, Version, SimpleItem
 import Ganga.Utility.logging
+import glob
+import json
 import os
+import threading
 
 from Ganga.GPIDev.Base.Proxy import isType
 from posixpath import curdir, sep, pardir, join, abspath, commonprefix
@@ -42,6 +45,22 @@ def getDefaultMergeDir():
     return os.path.expanduser(outputdir)
 
 
+# The pre-merges of the subjobs of a master job are serialised on the directory holding their partial results
+_premerge_locks = {}
+_premerge_locks_lock = threading.Lock()
+
+
+def _getPremergeLock(partial_dir):
+    with _premerge_locks_lock:
+        return _premerge_locks.setdefault(partial_dir, threading.Lock())
+
+
+def _fileStamp(path):
+    """Return what is recorded of a file merged into a partial result to tell whether it has changed since"""
+    st = os.stat(path)
+    return [path, st.st_mtime, st.st_size]
+
+
 class IMerger(IPostProcessor):
 
     """
@@ -55,6 +74,11 @@ class IMerger(IPostProcessor):
     # auto merge
     set_outputdir_for_automerge = True
 
+    # mergers whose mergefiles() gives the same result when some of the files have been merged together beforehand
+    # (e.g. hadd) merge the outputs of the subjobs as they complete, see premerge(). The merge once the job has
+    # finished then only combines these partial results with the outputs which are left
+    premerge_supported = False
+
     _category = 'postprocessor'
     _exportmethods = ['merge']
     _name = 'IMerger'
@@ -77,8 +101,131 @@ class IMerger(IPostProcessor):
                 logger.error("%s" % e)
                 return self.failure
         else:
+            if newstatus == 'completed' and job.master is not None and self.premerge_supported and config['premerge_size'] > 1:
+                try:
+                    self.premerge(job)
+                except Exception as err:
+                    # the outputs are merged once the job has finished instead
+                    logger.warning("Could not pre-merge the output of job %s: %s", job.getFQID('.'), err)
             return True
 
+    @staticmethod
+    def _partialDir(master):
+        """Return the directory of the partial results of the subjobs of a master job"""
+        return os.path.join(master.outputdir, '.merge_partials')
+
+    @staticmethod
+    def _loadPartials(partial_dir):
+        """
+        Return the record of the outputs waiting to be pre-merged ('pending') and of the partial results ('partials')
+        in partial_dir
+        """
+        manifest = os.path.join(partial_dir, 'manifest.json')
+        if not os.path.exists(manifest):
+            return {'pending': {}, 'partials': {}, 'count': 0}
+        with open(manifest) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _savePartials(partial_dir, state):
+        manifest = os.path.join(partial_dir, 'manifest.json')
+        with open(manifest + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.rename(manifest + '.tmp', manifest)
+
+    def premerge(self, job):
+        """
+        Record the output files of a completed subjob and merge every premerge_size of them which have been recorded
+        into a partial result kept with the master job. A subjob completing again (e.g. once resubmitted) invalidates
+        the partial results its files were part of
+        Args:
+            job (Job): The subjob which has completed
+        """
+        partial_dir = self._partialDir(job.master)
+        with _getPremergeLock(partial_dir):
+            if not os.path.exists(partial_dir):
+                os.makedirs(partial_dir)
+            state = self._loadPartials(partial_dir)
+
+            for f in self.files:
+                for matchedFile in glob.glob(os.path.join(job.outputdir, f)):
+                    rel = os.path.relpath(matchedFile, job.outputdir)
+                    pending = state['pending'].setdefault(rel, [])
+                    partials = state['partials'].setdefault(rel, [])
+                    if matchedFile in pending:
+                        continue
+                    for partial in partials[:]:
+                        inputs = [i[0] for i in partial['inputs']]
+                        if matchedFile in inputs:
+                            if _fileStamp(matchedFile) in partial['inputs']:
+                                break
+                            # the file has changed, merge the others again later
+                            partials.remove(partial)
+                            if os.path.exists(partial['file']):
+                                os.remove(partial['file'])
+                            pending.extend(i for i in inputs if i != matchedFile and os.path.exists(i))
+                    else:
+                        pending.append(matchedFile)
+
+            for rel, pending in state['pending'].items():
+                if len(pending) < config['premerge_size']:
+                    continue
+                state['count'] += 1
+                partial_file = os.path.join(partial_dir, 'partial%d_%s' % (state['count'], os.path.basename(rel)))
+                logger.debug("Pre-merging %s files into %s", len(pending), partial_file)
+                inputs = [_fileStamp(p) for p in pending]
+                self.mergefiles(pending, partial_file)
+                state['partials'][rel].append({'file': partial_file, 'inputs': inputs})
+                state['pending'][rel] = []
+
+            self._savePartials(partial_dir, state)
+
+    def _usePartials(self, jobs, rel, file_list):
+        """
+        Return file_list with the files already merged into a valid partial result replaced by that result, and the
+        partial results used
+        """
+        masters = []
+        for j in jobs:
+            if j.master is not None and all(m is not j.master for m in masters):
+                masters.append(j.master)
+
+        remaining = list(file_list)
+        used = []
+        for master in masters:
+            partial_dir = self._partialDir(master)
+            if not os.path.exists(partial_dir):
+                continue
+            try:
+                with _getPremergeLock(partial_dir):
+                    state = self._loadPartials(partial_dir)
+            except ValueError as err:
+                logger.warning("Ignoring the unreadable partial results in %s: %s", partial_dir, err)
+                continue
+            for partial in state['partials'].get(rel, []):
+                inputs = [i[0] for i in partial['inputs']]
+                if not os.path.exists(partial['file']) or not set(inputs).issubset(remaining):
+                    continue
+                if [_fileStamp(i) for i in inputs] != partial['inputs']:
+                    continue
+                remaining = [f for f in remaining if f not in inputs]
+                used.append((partial_dir, partial))
+
+        return [p['file'] for d, p in used] + remaining, used
+
+    def _releasePartials(self, rel, used):
+        """Delete the partial results which have been merged into the final result"""
+        for partial_dir in set(d for d, p in used):
+            with _getPremergeLock(partial_dir):
+                state = self._loadPartials(partial_dir)
+                files = [p['file'] for d, p in used if d == partial_dir]
+                state['partials'][rel] = [p for p in state['partials'].get(rel, []) if p['file'] not in files]
+                for f in files:
+                    for path in (f, f + '.hadd_output'):
+                        if os.path.exists(path):
+                            os.remove(path)
+                self._savePartials(partial_dir, state)
+
     def merge(self, jobs, outputdir=None, ignorefailed=None, overwrite=None):
 
         if ignorefailed == None:
@@ -131,10 +278,10 @@ class IMerger(IPostProcessor):
                     raise PostProcessException('The merge of Job %s failed and so the merge can not continue. '
                                                'This can be overridden with the ignorefailed flag.' % j.fqid)
 
-            import glob
             for f in self.files:
 
-                for matchedFile in glob.glob(os.path.join(j.outputdir, f)):
+                matchedFiles = glob.glob(os.path.join(j.outputdir, f))
+                for matchedFile in matchedFiles:
                     relMatchedFile = ''
                     try:
                         relMatchedFile = os.path.relpath(
@@ -148,7 +295,7 @@ class IMerger(IPostProcessor):
                     else:
                         files[relMatchedFile] = [matchedFile]
 
-                if not len(glob.glob(os.path.join(j.outputdir, f))):
+                if not matchedFiles:
                     if ignorefailed:
                         logger.warning('The file pattern %s in Job %s was not found. The file will be ignored.', f, j.fqid)
                         continue
@@ -187,7 +334,15 @@ class IMerger(IPostProcessor):
             # merge the lists of files with a merge tool into outputfile
             msg = None
             try:
-                self.mergefiles(files[k], outputfile)
+                if self.premerge_supported:
+                    to_merge, used = self._usePartials(jobs, k, files[k])
+                    if used:
+                        logger.info('Merging %s partial results and %s other files into %s', len(used),
+                                    len(to_merge) - len(used), outputfile)
+                    self.mergefiles(to_merge, outputfile)
+                    self._releasePartials(k, used)
+                else:
+                    self.mergefiles(files[k], outputfile)
 
                 # create a log file of the merge
                 # we only get to here if the merge_tool ran ok
@@ -180,6 +180,11 @@ class Node(object):
         parent = self._getParent()
         if parent is not None:
             parent._setDirty()
+        else:
+            # Let the registry of a root object know it needs flushing
+            mark_dirty = getattr(getattr(self, '_registry', None), '_markDirty', None)
+            if mark_dirty is not None:
+                mark_dirty(self)
 
     def _setFlushed(self):
         """
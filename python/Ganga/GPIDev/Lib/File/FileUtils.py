@@ -5,6 +5,8 @@ from Ganga.GPIDev.Lib.File.LocalFile import LocalFile
 
 import Ganga.Utility.logging
 import fnmatch
+import re
+import threading
 
 import os
 
@@ -32,6 +34,75 @@ def indentScript(script, indenting):
 
     return '\n'.join(output_script)
 
+
+class ScriptTemplate(object):
+    """
+    A script with ###TAG### placeholders, split once into the text between the tags so that filling them in for a job
+    is a single join rather than a str.replace over the whole script per tag
+    """
+
+    _tag_re = re.compile(r'(###[A-Z0-9_]+###)')
+
+    def __init__(self, text):
+        # The text is at the even indices and the tags at the odd ones
+        self._parts = ScriptTemplate._tag_re.split(text)
+
+    def tags(self):
+        """Return the set of tags still to be filled in"""
+        return set(self._parts[1::2])
+
+    def substitute(self, values):
+        """
+        Return a new template with the given tags filled in and the others kept. Tags within the values become tags of
+        the new template, this is meant for the parts of a script which are the same for every job
+        Args:
+            values (dict): The text to put in place of each tag
+        """
+        return ScriptTemplate(self._fill(values))
+
+    def render(self, values):
+        """
+        Return the script with the given tags filled in, the values are inserted as they are and not searched for tags
+        Args:
+            values (dict): The text to put in place of each tag
+        """
+        return self._fill(values)
+
+    def _fill(self, values):
+        parts = list(self._parts)
+        for i in xrange(1, len(parts), 2):
+            if parts[i] in values:
+                parts[i] = str(values[parts[i]])
+        return ''.join(parts)
+
+
+_template_cache = {}
+_template_cache_lock = threading.Lock()
+
+
+def loadScriptTemplate(scriptFilePath, static_values=None):
+    """
+    Return the ScriptTemplate of a script file with the static_values filled in. The template is compiled once for each
+    set of static values and kept until the file is modified
+    Args:
+        scriptFilePath (str): Path of the script
+        static_values (dict): The text to put in place of the tags which are the same for every job
+    """
+    if not os.path.exists(scriptFilePath):
+        raise GangaException("Error Finding script file: %s" % str(scriptFilePath))
+
+    if static_values is None:
+        static_values = {}
+    key = (scriptFilePath, tuple(sorted((k, str(v)) for k, v in static_values.iteritems())))
+    mtime = os.path.getmtime(scriptFilePath)
+
+    with _template_cache_lock:
+        cached = _template_cache.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, ScriptTemplate(loadScript(scriptFilePath, '')).substitute(static_values))
+            _template_cache[key] = cached
+        return cached[1]
+
 def __populate():
     if len(transformDictionary) == 0:
         transformDictionary[File] = LocalFile
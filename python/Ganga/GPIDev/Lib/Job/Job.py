@@ -29,6 +29,7 @@ from Ganga.Utility.Config import ConfigError, getConfig
 from Ganga.Utility.logging import getLogger, log_user_exception
 
 from .JobTime import JobTime
+from .SubJobStatusVector import SubJobStatusVector
 
 logger = getLogger()
 config = Ganga.Utility.Config.getConfig('Configuration')
@@ -288,6 +289,13 @@ class Job(GangaObject):
                 self.unprepare()
 
 
+    # Status of each subjob, see _getSubJobStatusVector
+    _subjob_statuses = None
+    # The subjobs the status vector was built from
+    _subjob_statuses_of = None
+    # Number of monitoring polls each subjob has kept its status for, see IBackend.master_updateMonitoringInformation
+    _subjob_poll_tracker = None
+
     def _getMasterJob(self):
         parent = self._getParent()
         while parent is not None:
@@ -603,10 +611,11 @@ class Job(GangaObject):
 
 	final_status = self.status
 
-        if final_status != initial_status and self.master is None:
+        master = self.master
+        if final_status != initial_status and master is None:
             logger.info('job %s status changed to "%s"', self.getFQID('.'), final_status)
-        if update_master and self.master:
-            self.master.updateMasterJobStatus()
+        if update_master and master is not None:
+            master.updateMasterJobStatus()
 
     def transition_update(self, new_status):
         """Propagate status transitions"""
@@ -719,17 +728,53 @@ class Job(GangaObject):
 
         return postprocessFailure
 
-    def getSubJobStatuses(self):
+    def setSchemaAttribute(self, attrib_name, attrib_value):
         """
-        This returns a set of all of the different subjob statuses whilst respecting lazy loading
+        Set a schema attribute, recording a new status in the status vector of the master job
+        Args:
+            attrib_name (str): the name of the schema attribute
+            attrib_value (unknown): the value to set it to
         """
+        super(Job, self).setSchemaAttribute(attrib_name, attrib_value)
+        # Every write of the status, whether assigned, set by updateStatus or loaded from disk, ends up here
+        if attrib_name == 'status':
+            parent = self._getParent()
+            if isinstance(parent, Job):
+                parent._subJobStatusChanged(self.id, attrib_value)
 
-        if isinstance(self.subjobs, SubJobXMLList):
-            stats = set(self.subjobs.getAllSJStatus())
-        else:
-            stats = set(sj.status for sj in self.subjobs)
+    def _getSubJobStatusVector(self):
+        """
+        Return the SubJobStatusVector holding the status of every subjob.
+        It is built whilst respecting lazy loading the first time it's needed, or when the subjobs have been replaced,
+        and is then kept up to date by setSchemaAttribute whenever the status of a subjob is set
+        """
+        subjobs = self.subjobs
+        vector = self._subjob_statuses
+        if vector is None or self._subjob_statuses_of is not subjobs or len(vector) != len(subjobs):
+            if isinstance(subjobs, SubJobXMLList):
+                vector = SubJobStatusVector(subjobs.getAllSJStatus())
+            else:
+                vector = SubJobStatusVector(sj.status for sj in subjobs)
+            self._subjob_statuses = vector
+            self._subjob_statuses_of = subjobs
+        return vector
 
-	return stats
+    def _subJobStatusChanged(self, index, status):
+        """
+        Record the new status of a subjob in the status vector if it has been built
+        Args:
+            index (int): the id of the subjob
+            status (str): its new status
+        """
+        vector = self._subjob_statuses
+        if vector is not None and 0 <= index < len(vector):
+            vector.set(index, status)
+
+    def getSubJobStatuses(self):
+        """
+        This returns a set of all of the different subjob statuses whilst respecting lazy loading
+        """
+        return self._getSubJobStatusVector().statuses()
 
     def updateMasterJobStatus(self):
         """
@@ -1207,11 +1252,10 @@ class Job(GangaObject):
         return jobmasterconfig
 
     @staticmethod
-    def _prepare_sj( rtHandler, i, app, sub_c, app_master_c, job_master_c, finished):
+    def _prepare_sj(rtHandler, app, sub_c, app_master_c, job_master_c):
         if app.is_prepared in [None, False]:
             app.prepare()
-        finished[i] = rtHandler.prepare(app, sub_c, app_master_c, job_master_c)
-        return
+        return rtHandler.prepare(app, sub_c, app_master_c, job_master_c)
 
     def _getJobSubConfig(self, subjobs):
 
@@ -1233,19 +1277,13 @@ class Job(GangaObject):
                     jobsubconfig = [rtHandler.prepare(sub_job.application, sub_conf, appmasterconfig, jobmasterconfig) for (sub_job, sub_conf) in zip(subjobs, appsubconfig)]
                 else:
 
-                    finished = {}
-
                     from Ganga.Core.GangaThread.WorkerThreads import getQueues
-                    index=0
-                    for sub_j, sub_conf in zip(subjobs, appsubconfig):
-                        getQueues()._monitoring_threadpool.add_function(self._prepare_sj, (rtHandler, index, sub_j.application, sub_conf, appmasterconfig, jobmasterconfig, finished))
-                        index += 1
+                    submission_pool = getQueues()._submission_threadpool
+                    futures = [submission_pool.add_function(self._prepare_sj, (rtHandler, sub_j.application, sub_conf, appmasterconfig, jobmasterconfig))
+                               for sub_j, sub_conf in zip(subjobs, appsubconfig)]
 
-                    while len(finished) != len(subjobs):
-                        time.sleep(0.25)
-
-                    for index in finished.keys():
-                        jobsubconfig.insert(index, finished[index])
+                    # result() raises the exception of a subjob which couldn't be prepared
+                    jobsubconfig = [future.result() for future in futures]
 
         else:
             #   I am a sub-job, lets calculate my config
@@ -1748,6 +1786,9 @@ class Job(GangaObject):
             wsp.jobid = this_job_id
             doit(wsp.remove)
 
+            # drop the cached input sandboxes which were only used by this job
+            doit(Sandbox.getSandboxCache().prune)
+
             try:
 
                 # If the job is associated with a shared directory resource (e.g. has a prepared() application)
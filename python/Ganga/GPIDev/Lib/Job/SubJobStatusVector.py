@@ -0,0 +1,123 @@
+from array import array
+
+# The status of a subjob is stored as its position in this list, unknown status strings are appended when first seen
+status_names = ['new', 'submitting', 'submitted', 'running', 'completing', 'completed', 'failed', 'killed',
+                'removed', 'unknown', 'incomplete', 'template', 'submit_failed']
+status_codes = dict((name, code) for code, name in enumerate(status_names))
+
+
+def status_code(status):
+    """Return the small int code of a status string
+    Args:
+        status (str): name of the status
+    """
+    try:
+        return status_codes[status]
+    except KeyError:
+        if len(status_names) > 255:
+            raise ValueError("Too many different subjob statuses to store '%s'" % status)
+        status_codes[status] = len(status_names)
+        status_names.append(status)
+        return status_codes[status]
+
+
+class SubJobStatusVector(object):
+    """
+    The statuses of the subjobs of a master job stored as one byte per subjob, together with the number of subjobs in each status.
+    Setting the status of a subjob keeps the counts up to date so the number of subjobs in a status, or the set of statuses
+    present, is available without looking at every subjob.
+    """
+
+    __slots__ = ('_codes', '_counts')
+
+    def __init__(self, statuses=()):
+        """
+        Args:
+            statuses (iterable): the status strings of the subjobs in order
+        """
+        self._codes = array('B', [status_code(s) for s in statuses])
+        self._counts = {}
+        for code in self._codes:
+            self._counts[code] = self._counts.get(code, 0) + 1
+
+    @classmethod
+    def fromIndex(cls, statuses):
+        """Return the vector of the list of status strings stored in an index cache
+        Args:
+            statuses (SubJobStatusVector, list): the 'subjobs:status' entry of a job index cache
+        """
+        if isinstance(statuses, cls):
+            return statuses
+        return cls(statuses)
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __getitem__(self, index):
+        return status_names[self._codes[index]]
+
+    def __iter__(self):
+        for code in self._codes:
+            yield status_names[code]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'SubJobStatusVector(%s)' % list(self)
+
+    def __getstate__(self):
+        # Store the names alongside the codes as the codes of unusual statuses depend on the order they were seen
+        return ([status_names[code] for code in sorted(self._counts)], self._codes.tostring())
+
+    def __setstate__(self, state):
+        names, codes = state
+        mapping = [0] * (max(array('B', codes) or [0]) + 1)
+        for old_code, name in zip(sorted(set(array('B', codes))), names):
+            mapping[old_code] = status_code(name)
+        self._codes = array('B', [mapping[code] for code in array('B', codes)])
+        self._counts = {}
+        for code in self._codes:
+            self._counts[code] = self._counts.get(code, 0) + 1
+
+    def copy(self):
+        """Return an independent copy of the vector"""
+        other = SubJobStatusVector()
+        other._codes = array('B', self._codes)
+        other._counts = dict(self._counts)
+        return other
+
+    def set(self, index, status):
+        """Change the status of one subjob and update the counts
+        Args:
+            index (int): index of the subjob
+            status (str): its new status
+        """
+        new_code = status_code(status)
+        old_code = self._codes[index]
+        if old_code == new_code:
+            return
+        self._codes[index] = new_code
+        if self._counts[old_code] == 1:
+            del self._counts[old_code]
+        else:
+            self._counts[old_code] -= 1
+        self._counts[new_code] = self._counts.get(new_code, 0) + 1
+
+    def count(self, *statuses):
+        """Return the number of subjobs in any of the given statuses
+        Args:
+            statuses (str): names of the statuses to count
+        """
+        return sum(self._counts.get(status_codes.get(s), 0) for s in set(statuses))
+
+    def counts(self):
+        """Return a dict of status name -> number of subjobs for the statuses present"""
+        return dict((status_names[code], n) for code, n in self._counts.iteritems())
+
+    def statuses(self):
+        """Return the set of statuses which at least one subjob is in"""
+        return set(status_names[code] for code in self._counts)
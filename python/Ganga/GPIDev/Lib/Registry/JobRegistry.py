@@ -59,15 +59,21 @@ class JobRegistry(Registry):
                 value = None
         del this_slice
 
-        # store subjob status
-        if hasattr(obj, "subjobs"):
-            cache["subjobs:status"] = []
+        # store subjob status as a list of strings, SubJobStatusVector.fromIndex turns it back into a vector, and the
+        # number of subjobs in each status so that they can be counted without going through the list
+        if hasattr(obj, "_getSubJobStatusVector"):
+            vector = obj._getSubJobStatusVector()
+            cache["subjobs:status"] = list(vector)
+            cache["subjobs:status_counts"] = vector.counts()
+        elif hasattr(obj, "subjobs"):
             if hasattr(obj.subjobs, "getAllCachedData"):
-                for sj in obj.subjobs.getAllCachedData():
-                    cache["subjobs:status"].append(sj['status'])
+                cache["subjobs:status"] = [sj['status'] for sj in obj.subjobs.getAllCachedData()]
             else:
-                for sj in obj.subjobs:
-                    cache["subjobs:status"].append(sj.status)
+                cache["subjobs:status"] = [sj.status for sj in obj.subjobs]
+            status_counts = {}
+            for sj_status in cache["subjobs:status"]:
+                status_counts[sj_status] = status_counts.get(sj_status, 0) + 1
+            cache["subjobs:status_counts"] = status_counts
 
         #print("Cache: %s" % str(cache))
         return cache
@@ -198,9 +198,22 @@ class RegistrySlice(object):
                 maxid = sys.maxsize
             select = select_by_range
 
+        ## Repositories which keep the select attributes in a database can evaluate the selection without loading the objects
+        ## None means that the repository can't evaluate all of the attributes and the objects have to be checked one by one
+        repo_selected = None
+        select_ids = getattr(getattr(self.objects, 'repository', None), 'select_ids', None)
+        if attrs and self.name != 'box' and select_ids is not None:
+            repo_selected = select_ids(attrs)
+
         for this_id in self.objects.keys():
             obj = self.objects[this_id]
             logger.debug("id, obj: %s, %s" % (this_id, obj))
+            if repo_selected is not None and select(int(this_id)) and not obj._dirty:
+                ## The stored values are up to date for objects without unflushed changes
+                if this_id in repo_selected:
+                    logger.debug("Selected by repository: %s" % this_id)
+                    callback(this_id, obj)
+                continue
             if select(int(this_id)):
                 logger.debug("Selected: %s" % this_id)
                 selected = True
@@ -6,6 +6,7 @@ from Ganga.Utility.logging import getLogger
 from Ganga.Utility.ColourText import status_colours, overview_colours, ANSIMarkup
 markup = ANSIMarkup()
 from Ganga.GPIDev.Lib.Tasks.common import getJobByID
+from Ganga.GPIDev.Lib.Job.SubJobStatusVector import SubJobStatusVector
 from Ganga.Core.exceptions import ApplicationConfigurationError
 from Ganga.GPIDev.Base.Proxy import stripProxy
 import time
@@ -21,6 +22,22 @@ def formatTraceback():
    "Helper function to printout a traceback as a string"
    return "\n %s\n%s\n%s\n" % (''.join( traceback.format_tb(sys.exc_info()[2])), sys.exc_info()[0], sys.exc_info()[1])
 
+def getSubJobStatusCounts(j):
+    """
+    Return the status of a job and the number of its subjobs in each status. These are read from the index cache of a
+    job which isn't loaded, to preserve lazy loading, and from the subjob status vector of one which is
+    Args:
+        j (Job): the job, not a proxy
+    """
+    if not j._fullyLoadedFromDisk():
+        index_cache = j._index_cache
+        if index_cache and 'subjobs:status_counts' in index_cache:
+            return index_cache['status'], index_cache['subjobs:status_counts']
+        if index_cache and 'subjobs:status' in index_cache:
+            # Indexes written before the counts were stored alongside the statuses
+            return index_cache['status'], SubJobStatusVector.fromIndex(index_cache['subjobs:status']).counts()
+    return j.status, j._getSubJobStatusVector().counts()
+
 class IUnit(GangaObject):
     _schema = Schema(Version(1, 0), {
         'status': SimpleItem(defvalue='new', protected=1, doc='Status - running, pause or completed', typelist=[str]),
@@ -365,26 +382,11 @@ class IUnit(GangaObject):
                                (jid, task.id, trf.getID(), self.getID()))
                 continue
 
-            j = stripProxy(job)
-
-            # try to preserve lazy loading
-            if hasattr(j, '_index_cache') and j._index_cache and 'subjobs:status' in j._index_cache:
-                if len(j._index_cache['subjobs:status']) > 0:
-                    for sj_stat in j._index_cache['subjobs:status']:
-                        if sj_stat in active_states:
-                            tot_active += 1
-                else:
-                    if j._index_cache['status'] in active_states:
-                        tot_active += 1
-            else:
-                #logger.warning("WARNING: (active check) No index cache for job object %d" % jid)
-                if j.status in active_states:
-                    if j.subjobs:
-                        for sj in j.subjobs:
-                            if sj.status in active_states:
-                                tot_active += 1
-                    else:
-                        tot_active += 1
+            job_status, sj_counts = getSubJobStatusCounts(stripProxy(job))
+            if sj_counts:
+                tot_active += sum(sj_counts.get(s, 0) for s in active_states)
+            elif job_status in active_states:
+                tot_active += 1
 
         return tot_active
 
@@ -402,27 +404,11 @@ class IUnit(GangaObject):
                                (jid, task.id, trf.getID(), self.getID()))
                 continue
 
-            j = stripProxy(job)
-
-            # try to preserve lazy loading
-            if hasattr(j, '_index_cache') and j._index_cache and 'subjobs:status' in j._index_cache:
-                if len(j._index_cache['subjobs:status']) > 0:
-                    for sj_stat in j._index_cache['subjobs:status']:
-                        if sj_stat == status:
-                            tot_active += 1
-                else:
-                    if j._index_cache['status'] == status:
-                        tot_active += 1
-
-            else:
-                #logger.warning("WARNING: (status check) No index cache for job object %d" % jid)
-                if j.subjobs:
-                    for sj in j.subjobs:
-                        if sj.status == status:
-                            tot_active += 1
-                else:
-                    if j.status == status:
-                        tot_active += 1
+            job_status, sj_counts = getSubJobStatusCounts(stripProxy(job))
+            if sj_counts:
+                tot_active += sj_counts.get(status, 0)
+            elif job_status == status:
+                tot_active += 1
 
         return tot_active
 
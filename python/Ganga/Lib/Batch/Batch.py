@@ -1,9 +1,14 @@
 import datetime
+import pipes
+import re
+import sys
+import threading
 import time
 from Ganga.GPIDev.Adapters.IBackend import IBackend
 from Ganga.GPIDev.Base.Proxy import isType, getName, stripProxy
 from Ganga.GPIDev.Schema import Schema, Version, SimpleItem
 from Ganga.Core import BackendError
+from Ganga.Utility.CommandEngine import getCommandEngine
 import os.path
 
 import Ganga.Utility.logging
@@ -14,41 +19,59 @@ import os
 
 logger = Ganga.Utility.logging.getLogger()
 
+_script_location = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BatchScriptTemplate.py')
+
+
+def _hostname_source():
+    """Return the source of Ganga.Utility.util.hostname which is inlined into the job wrapper script"""
+    if _hostname_source._cache is None:
+        import inspect
+        import Ganga.Utility.util
+        _hostname_source._cache = inspect.getsource(Ganga.Utility.util.hostname)
+    return _hostname_source._cache
+
+_hostname_source._cache = None
+
+# Run by every element of a job array: the array index selects the subjob whose job script is run, its output is
+# sent to the output workspace of the subjob as if the subjob had been submitted on its own
+_array_wrapper_template = """#!/usr/bin/env python
+import os
+
+elements = ###ELEMENTS###
+
+command, inputdir, outputdir = elements[int(os.environ[###INDEXNAME###])]
+for fd, name in ((1, 'stdout'), (2, 'stderr')):
+    out = os.open(os.path.join(outputdir, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+    os.dup2(out, fd)
+    os.close(out)
+os.chdir(inputdir)
+os.execv(command[0], command)
+"""
+
 # A trival implementation of shell command with stderr/stdout capture
 # This is a self-contained function (with logging).
 #
-# return (exitcode,soutfile,exeflag)
-# soutfile - path where the stdout/stderr is stored
+# return (exitcode,output,exeflag)
+# output - the stdout/stderr of the command
 # exeflag - 0 if the command failed to execute, 1 if it executed
-def shell_cmd(cmd, soutfile=None, allowed_exit=[0]):
-
-    if not soutfile:
-        import tempfile
-        soutfile = tempfile.mktemp()
-
-    # FIXME: garbbing stdout is done by shell magic and probably should be
-    # implemented in python directly
-    cmd = "%s > %s 2>&1" % (cmd, soutfile)
+def shell_cmd(cmd, allowed_exit=[0]):
 
     logger.debug("running shell command: %s", cmd)
-    rc = os.system(cmd)
+    result = getCommandEngine().run(cmd)
+    rc = result.returncode
 
     if not rc in allowed_exit:
         logger.debug('exit status [%d] of command %s', rc, cmd)
-        logger.debug('full output is in file: %s', soutfile)
-        with open(soutfile) as sout_file:
-            logger.debug('<first 255 bytes of output>\n%s', sout_file.read(255))
+        logger.debug('<first 255 bytes of output>\n%s', result.output[:255])
         logger.debug('<end of first 255 bytes of output>')
 
     m = None
 
     if rc != 0:
         logger.debug('non-zero [%d] exit status of command %s ', rc, cmd)
-        import re
-        with open(soutfile) as sout_file:
-            m = re.compile(r"command not found$", re.M).search(sout_file.read())
+        m = re.compile(r"command not found$", re.M).search(result.output)
 
-    return rc, soutfile, m is None
+    return rc, result.output, m is None
 
 
 class Batch(IBackend):
@@ -102,107 +125,240 @@ class Batch(IBackend):
     _name = 'Batch'
     _hidden = 1
 
+    # backend name -> (time, job states) of the last query of the batch system
+    _query_cache = {}
+    _query_lock = threading.Lock()
+    # backends whose last query failed, to warn only once
+    _query_failed = set()
+
     def __init__(self):
         super(Batch, self).__init__()
 
-    def command(klass, cmd, soutfile=None, allowed_exit=None):
+    def command(klass, cmd, allowed_exit=None):
         if allowed_exit is None:
             allowed_exit = [0]
-        rc, soutfile, ef = shell_cmd(cmd, soutfile, allowed_exit)
+        rc, sout, ef = shell_cmd(cmd, allowed_exit)
         if not ef:
             logger.error(
                 'Problem submitting batch job. Maybe your chosen batch system is not available or you have configured it wrongly')
-            with open(soutfile) as sout_file:
-                logger.error(sout_file.read())
-                raiseable = BackendError(klass._name, 'It seems that %s commands are not installed properly:%s' % (klass._name, sout_file.readline()))
-        return rc, soutfile
+            logger.error(sout)
+        return rc, sout
 
     command = classmethod(command)
 
-    def submit(self, jobconfig, master_input_sandbox):
-
-        job = self.getJobObject()
-
-        inw = job.getInputWorkspace()
-        outw = job.getOutputWorkspace()
-
-        #scriptpath = self.preparejob(jobconfig,inw,outw)
-        scriptpath = self.preparejob(jobconfig, master_input_sandbox)
-
-        # FIX from Angelo Carbone
-        # stderr_option = '-e '+str(outw.getPath())+'stderr'
-        # stdout_option = '-o '+str(outw.getPath())+'stdout'
-
-        # FIX from Alex Richards - see Savannah #87477
-        stdout_option = self.config['stdoutConfig'] % str(outw.getPath())
-        stderr_option = self.config['stderrConfig'] % str(outw.getPath())
-
+    def _submit_options(self, job_name):
+        """Return the queue, extra and job name options of the submit command, or None if extraopts is not allowed
+        Args:
+            job_name (str): Name given to the job in the batch system, not set if empty
+        """
         queue_option = ''
         if self.queue:
             queue_option = '-q ' + str(self.queue)
 
         try:
             jobnameopt = "-" + self.config['jobnameopt']
-        except Exception, err:
-            logger.debug("Unknown error: %s" % str(err))
+        except Exception as err:
+            logger.debug("Err: %s" % str(err))
             jobnameopt = False
 
         if self.extraopts:
-            import re
             for opt in re.compile(r'(-\w+)').findall(self.extraopts):
                 if opt in ('-o', '-e', '-oo', '-eo'):
                     logger.warning("option %s is forbidden", opt)
-                    return False
+                    return None
                 if self.queue and opt == '-q':
                     logger.warning("option %s is forbidden if queue is defined ( queue = '%s')", opt, self.queue)
-                    return False
+                    return None
                 if jobnameopt and opt == jobnameopt:
                     jobnameopt = False
 
             queue_option = queue_option + " " + self.extraopts
 
-        if jobnameopt and job.name != '':
+        if jobnameopt and job_name:
             # PBS doesn't like names with spaces
-            tmp_name = job.name
+            tmp_name = job_name
             if isType(self, PBS):
                 tmp_name = tmp_name.replace(" ", "_")
             queue_option = queue_option + " " + \
                 jobnameopt + " " + "'%s'" % (tmp_name)
 
+        return queue_option
+
+    def _script_cmd(self, scriptpath):
+        """Return the command running a job script as a list of arguments"""
         # bugfix #16646
         if self.config['shared_python_executable']:
-            import sys
-            script_cmd = "%s %s" % (sys.executable, scriptpath)
+            return [sys.executable, scriptpath]
+        return [scriptpath]
+
+    def _parse_queue(self, m, sout):
+        """Set the actual queue from the match of the submit command output"""
+        try:
+            queue = m.group('queue')
+            if self.queue != queue:
+                if self.queue:
+                    logger.warning('you requested queue "%s" but the job was submitted to queue "%s"', self.queue, queue)
+                    logger.warning('command output \n %s ', sout)
+                else:
+                    logger.info('using default queue "%s"', queue)
+                self.actualqueue = queue
+        except IndexError:
+            logger.info('could not match the output and extract the Batch queue name')
+
+    def _array_submit_enabled(self):
+        # Backends derived from Batch with their own configuration may not know about job arrays
+        return 'array_submit' in self.config and self.config['array_submit']
+
+    def master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going=False, parallel_submit=False):
+        """Submit the subjobs of a split job as job arrays of the batch system, see the array_submit option of the
+        backend. A single job, or a split job if array_submit is disabled, is submitted by IBackend.master_submit
+        Args:
+            rjobs (list): The subjobs to submit
+            subjobconfigs (list): The configuration of each subjob
+            masterjobconfig (object): The configuration shared by all subjobs
+            keep_going (bool): Submit as many subjobs as possible rather than stopping at the first failure
+            parallel_submit (bool): Only used when the subjobs are submitted one at a time
+        """
+        if len(rjobs) < 2 or not self._array_submit_enabled():
+            return IBackend.master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going, parallel_submit)
+
+        job = self.getJobObject()
+        # The name of the array is part of the array option in LSF
+        array_name = re.sub(r'[^\w.-]', '_', job.name) or 'ganga_%s' % job.getFQID('.')
+        if '-' + self.config['jobnameopt'] in self.config['array_opt'].split():
+            queue_option = self._submit_options('')
         else:
-            script_cmd = scriptpath
+            queue_option = self._submit_options(array_name)
+        if queue_option is None:
+            # Fail in the same way as when submitting the subjobs one at a time
+            return IBackend.master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going, parallel_submit)
+
+        from Ganga.Core import IncompleteJobSubmissionError, GangaException
+        from Ganga.Utility.logging import log_user_exception
+
+        master_input_sandbox = self.master_prepare(masterjobconfig)
+
+        incomplete_subjobs = []
+        elements = []
+        for sc, sj in zip(subjobconfigs, rjobs):
+            fqid = sj.getFQID('.')
+            try:
+                b = stripProxy(sj.backend)
+                sj.updateStatus('submitting')
+                elements.append((sj, b, b.preparejob(sc, master_input_sandbox)))
+            except Exception as x:
+                if isType(x, GangaException):
+                    logger.error("%s" % x)
+                    log_user_exception(logger, debug=True)
+                else:
+                    log_user_exception(logger, debug=False)
+                if not keep_going:
+                    # Nothing has been submitted yet
+                    return 0
+                incomplete_subjobs.append(fqid)
+
+        if not elements:
+            raise IncompleteJobSubmissionError(incomplete_subjobs, 'submission failed')
+
+        wrapper = self._prepare_array_wrapper([(sj, b._script_cmd(scriptpath)) for sj, b, scriptpath in elements])
+
+        inw = job.getInputWorkspace()
+        outw = job.getOutputWorkspace()
+        stdout_option = self.config['stdoutConfig'] % pipes.quote(outw.getPath())
+        stderr_option = self.config['stderrConfig'] % pipes.quote(outw.getPath())
+
+        max_size = max(1, self.config['array_max_size'])
+        submitted = 0
+        for first in range(1, len(elements) + 1, max_size):
+            last = min(first + max_size - 1, len(elements))
+            array_elements = elements[first - 1:last]
+            array_opt = self.config['array_opt'] % {'name': array_name, 'first': first, 'last': last}
+            logger.info("submitting subjobs %s to %s of job %s to %s backend as a job array",
+                        array_elements[0][0].getFQID('.'), array_elements[-1][0].getFQID('.'), job.getFQID('.'), getName(self))
+            script_cmd = ' '.join(pipes.quote(arg) for arg in self._script_cmd(wrapper))
+            command_str = self.config['submit_str'] % (pipes.quote(inw.getPath()), queue_option + ' ' + array_opt,
+                                                       stderr_option, stdout_option, script_cmd)
+            self.command_string = command_str
+            rc, sout = self.command(command_str)
+
+            m = None
+            if rc == 0:
+                m = re.compile(self.config['array_submit_res_pattern'], re.M).search(sout)
+            if m is None:
+                logger.warning('could not submit the job array or extract its Batch job identifier!')
+                logger.warning('command output \n %s ', sout)
+                if not keep_going:
+                    if submitted:
+                        raise IncompleteJobSubmissionError([sj.getFQID('.') for sj, b, s in elements[first - 1:]],
+                                                           'submission failed')
+                    return 0
+                incomplete_subjobs.extend(sj.getFQID('.') for sj, b, s in array_elements)
+                continue
+
+            self._parse_queue(m, sout)
+            for index, (sj, b, scriptpath) in enumerate(array_elements, first):
+                b.id = self.config['array_id_format'] % {'id': m.group('id'), 'index': index}
+                b.actualqueue = self.actualqueue
+                sj.updateStatus('submitted')
+                stripProxy(sj.info).increment()
+            submitted += len(array_elements)
+
+        if incomplete_subjobs:
+            raise IncompleteJobSubmissionError(incomplete_subjobs, 'submission failed')
+
+        return 1
+
+    def _prepare_array_wrapper(self, elements):
+        """Write the script run by every element of the job arrays of the master job, the element given by the array
+        index runs the script of its subjob
+        Args:
+            elements (list): The (subjob, command running the job script of the subjob) of each array index from 1
+        """
+        job = self.getJobObject()
+        commands = {}
+        for index, (sj, script_cmd) in enumerate(elements, 1):
+            commands[index] = (script_cmd, sj.getInputWorkspace().getPath(), sj.getOutputWorkspace().getPath())
+
+        text = _array_wrapper_template.replace('###ELEMENTS###', repr(commands))
+        text = text.replace('###INDEXNAME###', repr(self.config['array_index_name']))
+
+        from Ganga.GPIDev.Lib.File import FileBuffer
+        return job.getInputWorkspace().writefile(FileBuffer('__arrayscript__', text), executable=1)
+
+    def submit(self, jobconfig, master_input_sandbox):
+
+        job = self.getJobObject()
+
+        inw = job.getInputWorkspace()
+        outw = job.getOutputWorkspace()
+
+        #scriptpath = self.preparejob(jobconfig,inw,outw)
+        scriptpath = self.preparejob(jobconfig, master_input_sandbox)
+
+        # FIX from Angelo Carbone
+        # stderr_option = '-e '+str(outw.getPath())+'stderr'
+        # stdout_option = '-o '+str(outw.getPath())+'stdout'
 
-        command_str = self.config['submit_str'] % (inw.getPath(), queue_option, stderr_option, stdout_option, script_cmd)
+        # FIX from Alex Richards - see Savannah #87477
+        stdout_option = self.config['stdoutConfig'] % pipes.quote(outw.getPath())
+        stderr_option = self.config['stderrConfig'] % pipes.quote(outw.getPath())
+
+        queue_option = self._submit_options(job.name)
+        if queue_option is None:
+            return False
+
+        script_cmd = ' '.join(pipes.quote(arg) for arg in self._script_cmd(scriptpath))
+
+        command_str = self.config['submit_str'] % (pipes.quote(inw.getPath()), queue_option, stderr_option, stdout_option, script_cmd)
         self.command_string = command_str
-        rc, soutfile = self.command(command_str)
-        with open(soutfile) as sout_file:
-            sout = sout_file.read()
-        import re
+        rc, sout = self.command(command_str)
         m = re.compile(self.config['submit_res_pattern'], re.M).search(sout)
         if m is None:
             logger.warning('could not match the output and extract the Batch job identifier!')
             logger.warning('command output \n %s ', sout)
         else:
             self.id = m.group('id')
-            try:
-                queue = m.group('queue')
-                if self.queue != queue:
-                    if self.queue:
-                        logger.warning('you requested queue "%s" but the job was submitted to queue "%s"', self.queue, queue)
-                        logger.warning('command output \n %s ', sout)
-                    else:
-                        logger.info('using default queue "%s"', queue)
-                    self.actualqueue = queue
-            except IndexError:
-                logger.info('could not match the output and extract the Batch queue name')
-
-        # clean up the tmp file
-        if os.path.exists(soutfile):
-            os.remove(soutfile)
+            self._parse_queue(m, sout)
 
         return rc == 0
 
@@ -225,57 +381,21 @@ class Batch(IBackend):
         #stdout_option = '-o '+str(outw.getPath())+'stdout'
 
         # FIX from Alex Richards - see Savannah #87477
-        stdout_option = self.config['stdoutConfig'] % str(outw.getPath())
-        stderr_option = self.config['stderrConfig'] % str(outw.getPath())
-
-        queue_option = ''
-        if self.queue:
-            queue_option = '-q ' + str(self.queue)
-
-        try:
-            jobnameopt = "-" + self.config['jobnameopt']
-        except Exception as err:
-            logger.debug("Err: %s" % str(err))
-            jobnameopt = False
-
-        if self.extraopts:
-            import re
-            for opt in re.compile(r'(-\w+)').findall(self.extraopts):
-                if opt in ('-o', '-e', '-oo', '-eo'):
-                    logger.warning("option %s is forbidden", opt)
-                    return False
-                if self.queue and opt == '-q':
-                    logger.warning("option %s is forbidden if queue is defined ( queue = '%s')", opt, self.queue)
-                    return False
-                if jobnameopt and opt == jobnameopt:
-                    jobnameopt = False
-
-            queue_option = queue_option + " " + self.extraopts
+        stdout_option = self.config['stdoutConfig'] % pipes.quote(outw.getPath())
+        stderr_option = self.config['stderrConfig'] % pipes.quote(outw.getPath())
 
-        if jobnameopt and job.name != '':
-            # PBS doesn't like names with spaces
-            tmp_name = job.name
-            if isType(self, PBS):
-                tmp_name = tmp_name.replace(" ", "_")
-            queue_option = queue_option + " " + \
-                jobnameopt + " " + "'%s'" % (tmp_name)
+        queue_option = self._submit_options(job.name)
+        if queue_option is None:
+            return False
 
-        # bugfix #16646
-        if self.config['shared_python_executable']:
-            import sys
-            script_cmd = "%s %s" % (sys.executable, scriptpath)
-        else:
-            script_cmd = scriptpath
+        script_cmd = ' '.join(pipes.quote(arg) for arg in self._script_cmd(scriptpath))
 
         command_str = self.config['submit_str'] % (
-            inw.getPath(), queue_option, stderr_option, stdout_option, script_cmd)
+            pipes.quote(inw.getPath()), queue_option, stderr_option, stdout_option, script_cmd)
         self.command_string = command_str
-        rc, soutfile = self.command(command_str)
+        rc, sout = self.command(command_str)
         logger.debug('from command get rc: "%d"', rc)
         if rc == 0:
-            with open(soutfile) as sout_file:
-                sout = sout_file.read()
-            import re
             m = re.compile(
                 self.config['submit_res_pattern'], re.M).search(sout)
             if m is None:
@@ -283,33 +403,20 @@ class Batch(IBackend):
                 logger.warning('command output \n %s ', sout)
             else:
                 self.id = m.group('id')
-                try:
-                    queue = m.group('queue')
-                    if self.queue != queue:
-                        if self.queue:
-                            logger.warning('you requested queue "%s" but the job was submitted to queue "%s"', self.queue, queue)
-                            logger.warning('command output \n %s ', sout)
-                        else:
-                            logger.info('using default queue "%s"', queue)
-                        self.actualqueue = queue
-                except IndexError:
-                    logger.info('could not match the output and extract the Batch queue name')
+                self._parse_queue(m, sout)
         else:
-            with open(soutfile) as sout_file:
-                logger.warning(sout_file.read())
+            logger.warning(sout)
 
         return rc == 0
 
     def kill(self):
-        rc, soutfile = self.command(self.config['kill_str'] % (self.id))
+        # The ids of array elements contain brackets
+        rc, sout = self.command(self.config['kill_str'] % pipes.quote(str(self.id)))
 
-        with open(soutfile) as sout_file:
-            sout = sout_file.read()
         logger.debug('while killing job %s: rc = %d', self.getJobObject().getFQID('.'), rc)
         if rc == 0:
             return True
         else:
-            import re
             m = re.compile(self.config['kill_res_pattern'], re.M).search(sout)
             logger.warning('while killing job %s: %s', self.getJobObject().getFQID('.'), sout)
 
@@ -380,17 +487,25 @@ class Batch(IBackend):
 
         return d
 
+    def master_prepare(self, masterjobconfig):
+        """Prepare the master input sandbox, adding the modules used by the job wrapper script so that they are shipped
+        once for all of the subjobs
+        """
+        import Ganga.Core.Sandbox as Sandbox
+        master_input_sandbox = super(Batch, self).master_prepare(masterjobconfig)
+        return master_input_sandbox + Sandbox.createPackedWNModulesSandbox(self.getJobObject().getInputWorkspace())
+
     def preparejob(self, jobconfig, master_input_sandbox):
 
         job = self.getJobObject()
         mon = job.getMonitoringService()
         import Ganga.Core.Sandbox as Sandbox
-        from Ganga.GPIDev.Lib.File import File
-        from Ganga.Core.Sandbox.WNSandbox import PYTHON_DIR
-        import inspect
+        from Ganga.Core.Sandbox.WNSandbox import PYTHON_DIR, WN_MODULES_TARBALL_NAME
 
-        fileutils = File( inspect.getsourcefile(Ganga.Utility.files), subdir=PYTHON_DIR )
-        subjob_input_sandbox = job.createPackedInputSandbox(jobconfig.getSandboxFiles() + [ fileutils ] )
+        subjob_input_sandbox = job.createPackedInputSandbox(jobconfig.getSandboxFiles())
+        if not any(os.path.basename(f) == WN_MODULES_TARBALL_NAME for f in master_input_sandbox):
+            # the master input sandbox wasn't made by master_prepare
+            subjob_input_sandbox += Sandbox.createPackedWNModulesSandbox(job.getInputWorkspace())
 
         appscriptpath = [jobconfig.getExeString()] + jobconfig.getArgStrings()
         sharedoutputpath = job.getOutputWorkspace().getPath()
@@ -398,51 +513,34 @@ class Batch(IBackend):
         outputpatterns = jobconfig.outputbox
         environment = jobconfig.env if not jobconfig.env is None else {}
 
-
-        import inspect
-        script_location = os.path.join(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))),
-                                                       'BatchScriptTemplate.py')
-
         from Ganga.GPIDev.Lib.File import FileUtils
-        text = FileUtils.loadScript(script_location, '')
-
-        import Ganga.Core.Sandbox as Sandbox
-        import Ganga.Utility as Utility
         from Ganga.Utility.Config import getConfig
         from Ganga.GPIDev.Lib.File.OutputFileManager import getWNCodeForOutputSandbox, getWNCodeForOutputPostprocessing, getWNCodeForDownloadingInputFiles
-        jobidRepr = repr(self.getJobObject().getFQID('.'))
-
-        replace_dict = {
-
-        '###OUTPUTSANDBOXPOSTPROCESSING###' : getWNCodeForOutputSandbox(job, ['__syslog__'], jobidRepr),
-
-        '###OUTPUTUPLOADSPOSTPROCESSING###' : getWNCodeForOutputPostprocessing(job, ''),
 
-        '###DOWNLOADINPUTFILES###' : getWNCodeForDownloadingInputFiles(job, ''),
+        # the parts of the script which are the same for every job are only filled in when the template is compiled
+        template = FileUtils.loadScriptTemplate(_script_location, {
+            '###PYTHON_DIR###': repr(PYTHON_DIR),
+            '###INLINEHOSTNAMEFUNCTION###': _hostname_source(),
+            '###PREEXECUTE###': self.config['preexecute'],
+            '###POSTEXECUTE###': self.config['postexecute'],
+            '###JOBIDNAME###': self.config['jobid_name'],
+            '###QUEUENAME###': self.config['queue_name'],
+            '###HEARTBEATFREQUENCE###': self.config['heartbeat_frequency'],
+            '###GANGADIR###': repr(getConfig('System')['GANGA_PYTHONPATH'])})
 
-        '###INLINEMODULES###' : inspect.getsource(Sandbox.WNSandbox),
-        '###INLINEHOSTNAMEFUNCTION###' : inspect.getsource(Utility.util.hostname),
-        '###APPSCRIPTPATH###' : repr(appscriptpath),
-        #'###SHAREDINPUTPATH###' : repr(sharedinputpath)),
-
-        '###INPUT_SANDBOX###' : repr(subjob_input_sandbox + master_input_sandbox),
-        '###SHAREDOUTPUTPATH###' : repr(sharedoutputpath),
-
-        '###OUTPUTPATTERNS###' : repr(outputpatterns),
-        '###JOBID###' : jobidRepr,
-        '###ENVIRONMENT###' : repr(environment),
-        '###PREEXECUTE###' : self.config['preexecute'],
-        '###POSTEXECUTE###' : self.config['postexecute'],
-        '###JOBIDNAME###' : self.config['jobid_name'],
-        '###QUEUENAME###' : self.config['queue_name'],
-        '###HEARTBEATFREQUENCE###' : self.config['heartbeat_frequency'],
-        '###INPUT_DIR###' : repr(job.getStringInputDir()),
-
-        '###GANGADIR###' : repr(getConfig('System')['GANGA_PYTHONPATH'])
-        }
+        jobidRepr = repr(self.getJobObject().getFQID('.'))
 
-        for k, v in replace_dict.iteritems():
-            text = text.replace(str(k), str(v))
+        text = template.render({
+            '###OUTPUTSANDBOXPOSTPROCESSING###': getWNCodeForOutputSandbox(job, ['__syslog__'], jobidRepr),
+            '###OUTPUTUPLOADSPOSTPROCESSING###': getWNCodeForOutputPostprocessing(job, ''),
+            '###DOWNLOADINPUTFILES###': getWNCodeForDownloadingInputFiles(job, ''),
+            '###APPSCRIPTPATH###': repr(appscriptpath),
+            '###INPUT_SANDBOX###': repr(subjob_input_sandbox + master_input_sandbox),
+            '###SHAREDOUTPUTPATH###': repr(sharedoutputpath),
+            '###OUTPUTPATTERNS###': repr(outputpatterns),
+            '###JOBID###': jobidRepr,
+            '###ENVIRONMENT###': repr(environment),
+            '###INPUT_DIR###': repr(job.getStringInputDir())})
 
         logger.debug('subjob input sandbox %s ', subjob_input_sandbox)
         logger.debug('master input sandbox %s ', master_input_sandbox)
@@ -451,11 +549,79 @@ class Batch(IBackend):
 
         return job.getInputWorkspace().writefile(FileBuffer('__jobscript__', text), executable=1)
 
+    def _parse_query(self, output):
+        """Return the state of each job id in the output of query_str. Without a parser for the batch system no job
+        has a known state and they are all monitored through their status files
+        """
+        return {}
+
+    def _query_batch_states(self):
+        """Return the state given by the batch system to each job id it knows. The result of query_str is kept for
+        query_max_age seconds so that the blocks of subjobs monitored in one cycle share a single query
+        """
+        name = getName(self)
+        with Batch._query_lock:
+            cached = Batch._query_cache.get(name)
+            if cached is not None and time.time() - cached[0] < self.config['query_max_age']:
+                return cached[1]
+            rc, sout, ef = shell_cmd(self.config['query_str'])
+            if rc != 0:
+                raise BackendError(name, 'query of the job states failed: %s' % sout)
+            states = self._parse_query(sout)
+            Batch._query_cache[name] = (time.time(), states)
+            return states
+
+    def _update_from_query(self, jobs):
+        """Update the status of the jobs which the batch system reports as queued or running, return the jobs which
+        have finished, are no longer known or are in an unknown state and need their status files read
+        Args:
+            jobs (list): The jobs of this backend to monitor
+        """
+        name = getName(self)
+        try:
+            states = self._query_batch_states()
+        except Exception as err:
+            if name not in Batch._query_failed:
+                logger.warning('Could not query the state of the %s jobs, reading their status files instead: %s', name, err)
+                Batch._query_failed.add(name)
+            else:
+                logger.debug('Could not query the state of the %s jobs: %s', name, err)
+            return jobs
+        Batch._query_failed.discard(name)
+
+        categories = self.config['query_states']
+        remaining = []
+        for j in jobs:
+            batch_state = states.get(str(j.backend.id)) if j.backend.id else None
+            if batch_state is None:
+                remaining.append(j)
+                continue
+            j.backend.status = batch_state
+            category = categories.get(batch_state)
+            if category == 'running':
+                if j.status == 'submitted':
+                    stripProxy(j)._getSessionLock()
+                    j.updateStatus('running')
+            elif category != 'queued':
+                remaining.append(j)
+        return remaining
+
     @staticmethod
     def updateMonitoringInformation(jobs):
+        """Update the status of the jobs, see the query_monitoring option of the backend. The status files of the jobs
+        are read when the batch system isn't queried, the query fails or the batch system reports a job as finished
+        """
+        if jobs:
+            backend = stripProxy(jobs[0].backend)
+            if 'query_monitoring' in backend.config and backend.config['query_monitoring']:
+                jobs = backend._update_from_query(jobs)
+        Batch._update_from_status_files(jobs)
+
+    @staticmethod
+    def _update_from_status_files(jobs):
 
-        import re
-        repid = re.compile(r'^PID: (?P<pid>\d+)', re.M)
+        # The element of a job array has an id like 1234[5] in LSF and PBS
+        repid = re.compile(r'^PID: (?P<pid>\d+(\[\d+\])?)', re.M)
         requeue = re.compile(r'^QUEUE: (?P<queue>\S+)', re.M)
         reactualCE = re.compile(r'^ACTUALCE: (?P<actualCE>\S+)', re.M)
         reexit = re.compile(r'^EXITCODE: (?P<exitcode>\d+)', re.M)
@@ -477,7 +643,6 @@ class Batch(IBackend):
 
             pid, queue, actualCE, exitcode = None, None, None, None
 
-            import re
             statusfile = None
             try:
                 statusfile = open(f)
@@ -491,7 +656,7 @@ class Batch(IBackend):
 
             mpid = repid.search(stat)
             if mpid:
-                pid = int(mpid.group('pid'))
+                pid = mpid.group('pid')
 
             mqueue = requeue.search(stat)
             if mqueue:
@@ -520,7 +685,8 @@ class Batch(IBackend):
                 if pid or queue:
                     j.updateStatus('running')
 
-                    if pid:
+                    # SGE only knows the id of the whole array inside an element so keep the id of the element
+                    if pid and not re.match(re.escape(pid) + r'($|[.\[])', str(j.backend.id)):
                         j.backend.id = pid
 
                     if queue and queue != j.backend.actualqueue:
@@ -530,6 +696,8 @@ class Batch(IBackend):
                         j.backend.actualCE = actualCE
 
             if j.status == 'running':
+                if actualCE and not j.backend.actualCE:
+                    j.backend.actualCE = actualCE
                 if exitcode is not None:
                     # Job has finished
                     j.backend.exitcode = exitcode
@@ -560,6 +728,16 @@ class LSF(Batch):
     def __init__(self):
         super(LSF, self).__init__()
 
+    def _parse_query(self, output):
+        """Read the 'jobid jobindex stat' lines of bjobs, the index is 0 unless the job is an array element"""
+        states = {}
+        for m in re.finditer(r'^\s*(?P<id>\d+)\s+(?P<index>\d+)\s+(?P<state>\w+)', output, re.M):
+            job_id = m.group('id')
+            if m.group('index') != '0':
+                job_id = self.config['array_id_format'] % {'id': job_id, 'index': int(m.group('index'))}
+            states[job_id] = m.group('state')
+        return states
+
 
 #_________________________________________________________________________
 
@@ -576,6 +754,18 @@ class PBS(Batch):
     def __init__(self):
         super(PBS, self).__init__()
 
+    def _parse_query(self, output):
+        """Read the XML of qstat -x, the ids of the jobs are reduced to the number and array index"""
+        states = {}
+        if not output.strip():
+            return states
+        from xml.etree import ElementTree
+        for job in ElementTree.fromstring(output).getiterator('Job'):
+            m = re.match(r'\d+(\[\d+\])?', job.findtext('Job_Id', ''))
+            if m:
+                states[m.group()] = job.findtext('job_state')
+        return states
+
 
 #_________________________________________________________________________
 
@@ -592,3 +782,26 @@ class SGE(Batch):
     def __init__(self):
         super(SGE, self).__init__()
 
+    def _parse_query(self, output):
+        """Read the XML of qstat -xml, the tasks of a job array are listed as ranges like 1-10:1"""
+        states = {}
+        if not output.strip():
+            return states
+        from xml.etree import ElementTree
+        for job in ElementTree.fromstring(output).getiterator('job_list'):
+            job_id = job.findtext('JB_job_number')
+            state = job.findtext('state')
+            tasks = job.findtext('tasks')
+            if not tasks:
+                states[job_id] = state
+                continue
+            for task_range in tasks.split(','):
+                m = re.match(r'(\d+)(-(\d+)(:(\d+))?)?$', task_range.strip())
+                if not m:
+                    continue
+                first = int(m.group(1))
+                last = int(m.group(3) or first)
+                for index in range(first, last + 1, int(m.group(5) or 1)):
+                    states[self.config['array_id_format'] % {'id': job_id, 'index': index}] = state
+        return states
+
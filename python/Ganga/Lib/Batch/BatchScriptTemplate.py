@@ -7,9 +7,12 @@ import popen2
 import glob
 import mimetypes
 
+from contextlib import closing
+
+PYTHON_DIR = ###PYTHON_DIR###
+
 ############################################################################################
 
-###INLINEMODULES###
 ###INLINEHOSTNAMEFUNCTION###
 
 ############################################################################################
@@ -59,9 +62,11 @@ import tarfile
 # -- WARNING: get the input files including the python modules BEFORE sys.path.insert()
 # -- SINCE PYTHON 2.6 THERE WAS A SUBTLE CHANGE OF SEMANTICS IN THIS AREA
 
+# the modules shared by the wrapper scripts are unpacked from the master input sandbox here so they are imported below
 for f in input_sandbox:
     if mimetypes.guess_type(f)[1] in ['gzip', 'bzip2']:
-        getPackedInputSandbox(f)
+        with closing(tarfile.open(f, "r:*")) as tf:
+            tf.extractall('.')
     else:
         shutil.copy(f, os.path.join(os.getcwd(), os.path.basename(f)))
 
@@ -74,6 +79,8 @@ import sys
 sys.path.insert(0, ###GANGADIR###)
 sys.path.insert(0,os.path.join(os.getcwd(),PYTHON_DIR))
 
+from WNSandbox import createOutputSandbox
+
 import subprocess
 
 fullenvironment = os.environ.copy()
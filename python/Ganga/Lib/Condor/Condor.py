@@ -60,10 +60,10 @@ __author__ = "K.Harrison <Harrison@hep.phy.cam.ac.uk>"
 __date__ = "09 August 2009"
 __version__ = "2.5"
 
-from Ganga.Core import Sandbox
 from Ganga.GPIDev.Adapters.IBackend import IBackend
 from Ganga.GPIDev.Base.Proxy import stripProxy
 from Ganga.GPIDev.Lib.File.FileBuffer import FileBuffer
+from Ganga.GPIDev.Lib.File.FileUtils import ScriptTemplate
 from Ganga.GPIDev.Schema import ComponentItem, Schema, SimpleItem, Version
 from Ganga.Utility.ColourText import Foreground, Effects
 
@@ -71,13 +71,67 @@ import Ganga.Utility.logging
 from Ganga.Utility.Config import getConfig
 
 import commands
-import inspect
 import os
+import pipes
 import shutil
 import time
 
 logger = Ganga.Utility.logging.getLogger()
 
+# Job wrapper run on the worker node, compiled once and filled in for each job by Condor.preparejob
+_wrapper_template = ScriptTemplate("\n".join([
+    "#!/usr/bin/env python",
+    "from __future__ import print_function",
+    "# Condor job wrapper created by Ganga",
+    "# ###TIME###",
+    "",
+    "import os",
+    "import time",
+    "import mimetypes",
+    "import shutil",
+    "import tarfile",
+    "from contextlib import closing",
+    "",
+    "startTime = time.strftime"
+    + "( '%a %d %b %H:%M:%S %Y', time.gmtime( time.time() ) )",
+    "",
+    "for inFile in ###INPUTFILES###:",
+    "   if mimetypes.guess_type(inFile)[1] in ['gzip', 'bzip2']:",
+    "       with closing(tarfile.open(inFile, 'r:*')) as tf:",
+    "           tf.extractall('.')",
+    "   else:",
+    "       shutil.copy(inFile, os.path.join(os.getcwd(), os.path.basename(inFile)))",
+    "",
+    "exePath = '###EXEPATH###'",
+    "if os.path.isfile( '###EXENAME###' ):",
+    "   os.chmod( '###EXENAME###', 0755 )",
+    "wrapperName = '###WRAPPERNAME###_bash_wrapper.sh'",
+    "wrapperFile = open( wrapperName, 'w' )",
+    "wrapperFile.write( '#!/bin/bash\\n' )",
+    "wrapperFile.write( 'echo \"\"\\n' )",
+    "wrapperFile.write( 'echo \"Hostname: $(hostname -f)\"\\n' )",
+    "wrapperFile.write( 'echo \"\\${BASH_ENV}: ${BASH_ENV}\"\\n' )",
+    "wrapperFile.write( 'if ! [ -z \"${BASH_ENV}\" ]; then\\n' )",
+    "wrapperFile.write( '  if ! [ -f \"${BASH_ENV}\" ]; then\\n' )",
+    "wrapperFile.write( '    echo \"*** Warning: "
+    + "\\${BASH_ENV} file not found ***\"\\n' )",
+    "wrapperFile.write( '  fi\\n' )",
+    "wrapperFile.write( 'fi\\n' )",
+    "wrapperFile.write( 'echo \"\"\\n' )",
+    "wrapperFile.write( '###EXECOMMAND###\\n' )",
+    "wrapperFile.write( 'exit ${?}\\n' )",
+    "wrapperFile.close()",
+    "os.chmod( wrapperName, 0755 )",
+    "result = os.system( './%s' % wrapperName )",
+    "os.remove( wrapperName )",
+    "",
+    "endTime = time.strftime"
+    + "( '%a %d %b %H:%M:%S %Y', time.gmtime( time.time() ) )",
+    "print('\\nJob start: ' + startTime)",
+    "print('Job end: ' + endTime)",
+    "print('Exit code: %s' % str( result ))"
+]))
+
 
 class Condor(IBackend):
 
@@ -136,6 +190,116 @@ class Condor(IBackend):
 
         super(Condor, self).__init__()
 
+    def master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going=False, parallel_submit=False):
+        """Submit the subjobs of a split job as the processes of a single Condor
+           cluster, see the cluster_submit option. A single job, or a split job
+           if cluster_submit is disabled, is submitted by IBackend.master_submit
+
+            Arguments other than self:
+               rjobs - the subjobs to submit
+               subjobconfigs - the configuration of each subjob
+               masterjobconfig - the configuration shared by all subjobs
+               keep_going - prepare as many subjobs as possible rather than
+                            stopping at the first failure
+               parallel_submit - only used when the subjobs are submitted
+                                 one at a time
+
+            Return value: 1 if the subjobs are submitted successfully,
+                          or 0 otherwise"""
+
+        if len(rjobs) < 2 or not getConfig("Condor")["cluster_submit"]:
+            return IBackend.master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going, parallel_submit)
+
+        from Ganga.Core import IncompleteJobSubmissionError, GangaException
+        from Ganga.Utility.logging import log_user_exception
+
+        job = self.getJobObject()
+        master_input_sandbox = self.master_prepare(masterjobconfig)
+
+        incomplete_subjobs = []
+        procs = []
+        for sc, sj in zip(subjobconfigs, rjobs):
+            try:
+                b = stripProxy(sj.backend)
+                sj.updateStatus("submitting")
+                # The description file of the subjob is still written so that it can be resubmitted on its own
+                cdfDict = b._prepare_cdf_dict(sc, master_input_sandbox)
+                b._write_cdf(cdfDict)
+                procs.append((sj, b, cdfDict))
+            except Exception as x:
+                if isinstance(x, GangaException):
+                    logger.error("%s" % x)
+                    log_user_exception(logger, debug=True)
+                else:
+                    log_user_exception(logger, debug=False)
+                if not keep_going:
+                    return 0
+                incomplete_subjobs.append(sj.getFQID("."))
+
+        if not procs:
+            raise IncompleteJobSubmissionError(incomplete_subjobs, "submission failed")
+
+        logger.info("submitting %d subjobs of job %s to Condor backend as one cluster",
+                    len(procs), job.getFQID("."))
+        cdfpath = self._write_cluster_cdf([cdfDict for sj, b, cdfDict in procs])
+        localIds = self._condor_submit(cdfpath)
+        if len(localIds) != len(procs):
+            if localIds:
+                logger.error("Condor queued %d processes for the %d subjobs of job %s" %
+                             (len(localIds), len(procs), job.getFQID(".")))
+            if not keep_going:
+                return 0
+            raise IncompleteJobSubmissionError(incomplete_subjobs + [sj.getFQID(".") for sj, b, cdfDict in procs],
+                                               "submission failed")
+
+        globalIds = Condor._global_ids(localIds)
+        for (sj, b, cdfDict), localId in zip(procs, localIds):
+            b.id = globalIds[localId]
+            sj.updateStatus("submitted")
+            stripProxy(sj.info).increment()
+
+        if incomplete_subjobs:
+            raise IncompleteJobSubmissionError(incomplete_subjobs, "submission failed")
+
+        return 1
+
+    def _write_cluster_cdf(self, cdfDicts):
+        """Write the description file queuing one process per subjob. The
+           settings shared by all of the subjobs are written once, the others
+           are set before each queue statement. A setting missing for a
+           subjob is set empty so that it isn't carried over from the
+           previous process
+
+            Argument other than self:
+               cdfDicts - the description settings of each subjob
+
+            Return value: path to the description file"""
+
+        job = self.getJobObject()
+        keys = set()
+        for cdfDict in cdfDicts:
+            keys.update(cdfDict.keys())
+        sharedKeys = sorted(key for key in keys
+                            if all(key in cdfDict and cdfDict[key] == cdfDicts[0][key] for cdfDict in cdfDicts))
+        procKeys = sorted(keys.difference(sharedKeys))
+
+        cdfList = [
+            "# Condor Description File created by Ganga",
+            "# %s" % (time.strftime("%c")),
+            "# Cluster of the %d subjobs of job %s" % (len(cdfDicts), job.getFQID(".")),
+            ""]
+        for key in sharedKeys:
+            cdfList.append("%s = %s" % (key, cdfDicts[0][key]))
+        for cdfDict in cdfDicts:
+            cdfList.append("")
+            for key in procKeys:
+                cdfList.append("%s = %s" % (key, cdfDict.get(key, "")))
+            cdfList.append("queue")
+        cdfString = "\n".join(cdfList)
+
+        return job.getInputWorkspace().writefile\
+            (FileBuffer("__cdf_cluster__", cdfString))
+
     def submit(self, jobconfig, master_input_sandbox):
         """Submit job to backend.
 
@@ -155,38 +319,68 @@ class Condor(IBackend):
             Return value: True if job is submitted successfully,
                           or False otherwise"""
 
+        localIds = self._condor_submit(cdfpath)
+
+        self.id = ""
+        if localIds:
+            self.id = Condor._global_ids(localIds)[localIds[0]]
+
+        return not self.id is ""
+
+    def _condor_submit(self, cdfpath):
+        """Run condor_submit on a description file and return the local id (cluster.proc) of each process queued,
+        an empty list if the submission failed
+
+            Argument other than self:
+               cdfpath - path to Condor Description File to be submitted"""
+
         commandList = ["condor_submit -v"]
         commandList.extend(self.submit_options)
-        commandList.append(cdfpath)
+        commandList.append(pipes.quote(cdfpath))
         commandString = " ".join(commandList)
 
         status, output = commands.getstatusoutput(commandString)
 
-        self.id = ""
         if 0 != status:
             logger.error\
                 ("Tried submitting job with command: '%s'" % commandString)
             logger.error("Return code: %s" % str(status))
             logger.error("Condor output:")
             logger.error(output)
-        else:
-            tmpList = output.split("\n")
-            for item in tmpList:
-                if 1 + item.find("** Proc"):
-                    localId = item.strip(":").split()[2]
-                    queryCommand = " ".join\
-                        (["condor_q -format \"%s\" GlobalJobId", localId])
-                    qstatus, qoutput = commands.getstatusoutput(queryCommand)
-                    if 0 != status:
-                        logger.warning\
-                            ("Problem determining global id for Condor job '%s'" %
-                             localId)
-                        self.id = localId
-                    else:
-                        self.id = qoutput
-                    break
+            return []
 
-        return not self.id is ""
+        localIds = []
+        for item in output.split("\n"):
+            if 1 + item.find("** Proc"):
+                localIds.append(item.strip(":").split()[2])
+        return localIds
+
+    @staticmethod
+    def _global_ids(localIds):
+        """Return the global id of each local id (cluster.proc) with a single
+           condor_q for all of their clusters, a local id is kept as it is if
+           its global id can't be found
+
+            Argument:
+               localIds - list of local ids"""
+
+        clusters = Condor._clusters(localIds)
+        queryCommand = " ".join\
+            (["condor_q -format \"%s\\n\" GlobalJobId"] + clusters)
+        status, output = commands.getstatusoutput(queryCommand)
+
+        globalIds = dict((localId, localId) for localId in localIds)
+        if 0 != status:
+            logger.warning\
+                ("Problem determining global id for Condor jobs '%s'" %
+                 ", ".join(localIds))
+            return globalIds
+
+        for globalId in output.split("\n"):
+            idElementList = globalId.strip().split("#")
+            if 3 == len(idElementList) and idElementList[1] in globalIds:
+                globalIds[idElementList[1]] = globalId.strip()
+        return globalIds
 
     def resubmit(self):
         """Resubmit job that has already been configured.
@@ -264,6 +458,12 @@ class Condor(IBackend):
     def preparejob(self, jobconfig, master_input_sandbox):
         """Prepare Condor description file"""
 
+        return self._write_cdf(self._prepare_cdf_dict(jobconfig, master_input_sandbox))
+
+    def _prepare_cdf_dict(self, jobconfig, master_input_sandbox):
+        """Write the job wrapper and return the settings of the Condor
+           description file of the job, the requirements included"""
+
         job = self.getJobObject()
         inbox = job.createPackedInputSandbox(jobconfig.getSandboxFiles())
         inpDir = job.getInputWorkspace().getPath()
@@ -296,59 +496,13 @@ class Condor(IBackend):
         name = "_".join(name.split())
         wrapperName = "_".join(["Ganga", str(job.id), name])
 
-        commandList = [
-            "#!/usr/bin/env python",
-            "from __future__ import print_function",
-            "# Condor job wrapper created by Ganga",
-            "# %s" % (time.strftime("%c")),
-            "",
-            inspect.getsource(Sandbox.WNSandbox),
-            "",
-            "import os",
-            "import time",
-            "import mimetypes",
-            "import shutil",
-            "",
-            "startTime = time.strftime"
-            + "( '%a %d %b %H:%M:%S %Y', time.gmtime( time.time() ) )",
-            "",
-            "for inFile in %s:" % str(fileList),
-            "   if mimetypes.guess_type(inFile)[1] in ['gzip', 'bzip2']:",
-            "       getPackedInputSandbox( inFile )",
-            "   else:",
-            "       shutil.copy(inFile, os.path.join(os.getcwd(), os.path.basename(inFile)))",
-            "",
-            "exePath = '%s'" % exeString,
-            "if os.path.isfile( '%s' ):" % os.path.basename(exeString),
-            "   os.chmod( '%s', 0755 )" % os.path.basename(exeString),
-            "wrapperName = '%s_bash_wrapper.sh'" % wrapperName,
-            "wrapperFile = open( wrapperName, 'w' )",
-            "wrapperFile.write( '#!/bin/bash\\n' )",
-            "wrapperFile.write( 'echo \"\"\\n' )",
-            "wrapperFile.write( 'echo \"Hostname: $(hostname -f)\"\\n' )",
-            "wrapperFile.write( 'echo \"\\${BASH_ENV}: ${BASH_ENV}\"\\n' )",
-            "wrapperFile.write( 'if ! [ -z \"${BASH_ENV}\" ]; then\\n' )",
-            "wrapperFile.write( '  if ! [ -f \"${BASH_ENV}\" ]; then\\n' )",
-            "wrapperFile.write( '    echo \"*** Warning: "
-            + "\\${BASH_ENV} file not found ***\"\\n' )",
-            "wrapperFile.write( '  fi\\n' )",
-            "wrapperFile.write( 'fi\\n' )",
-            "wrapperFile.write( 'echo \"\"\\n' )",
-            "wrapperFile.write( '%s\\n' )" % exeCmdString,
-            "wrapperFile.write( 'exit ${?}\\n' )",
-            "wrapperFile.close()",
-            "os.chmod( wrapperName, 0755 )",
-            "result = os.system( './%s' % wrapperName )",
-            "os.remove( wrapperName )",
-            "",
-            "endTime = time.strftime"
-              + "( '%a %d %b %H:%M:%S %Y', time.gmtime( time.time() ) )",
-            "print('\\nJob start: ' + startTime)",
-            "print('Job end: ' + endTime)",
-            "print('Exit code: %s' % str( result ))"
-        ]
-
-        commandString = "\n".join(commandList)
+        commandString = _wrapper_template.render({
+            "###TIME###": time.strftime("%c"),
+            "###INPUTFILES###": str(fileList),
+            "###EXEPATH###": exeString,
+            "###EXENAME###": os.path.basename(exeString),
+            "###WRAPPERNAME###": wrapperName,
+            "###EXECOMMAND###": exeCmdString})
         wrapper = job.getInputWorkspace().writefile\
             (FileBuffer(wrapperName, commandString), executable=1)
 
@@ -415,17 +569,23 @@ class Condor(IBackend):
         if outfileString:
             cdfDict['transfer_output_files'] = outfileString
 
+        cdfDict['requirements'] = self.requirements.convert().split("=", 1)[1].strip()
+
+        return cdfDict
+
+    def _write_cdf(self, cdfDict):
+        """Write the Condor description file of the job and return its path"""
+
         cdfList = [
             "# Condor Description File created by Ganga",
             "# %s" % (time.strftime("%c")),
             ""]
         for key, value in cdfDict.iteritems():
             cdfList.append("%s = %s" % (key, value))
-        cdfList.append(self.requirements.convert())
         cdfList.append("queue")
         cdfString = "\n".join(cdfList)
 
-        return job.getInputWorkspace().writefile\
+        return self.getJobObject().getInputWorkspace().writefile\
             (FileBuffer("__cdf__", cdfString))
 
     def updateMonitoringInformation(jobs):
@@ -440,6 +600,9 @@ class Condor(IBackend):
         if not idList:
             return
 
+        # A single query covers every cluster tracked, the processes are
+        # found by their global id or, for the ids without one, by cluster.proc
+        clusters = Condor._clusters(idList)
         queryCommand = " ".join\
             ([
                 "condor_q -global" if getConfig(
@@ -448,30 +611,36 @@ class Condor(IBackend):
                 "-format \"%s \" RemoteHost",
                 "-format \"%d \" JobStatus",
                 "-format \"%f\\n\" RemoteUserCpu"
-            ])
+            ] + clusters)
         status, output = commands.getstatusoutput(queryCommand)
         if 0 != status:
             logger.error("Problem retrieving status for Condor jobs")
             return
 
-        if ("All queues are empty" == output):
-            infoList = []
-        else:
-            infoList = output.split("\n")
-
-        allDict = {}
-        for infoString in infoList:
-            tmpList = infoString.split()
-            id, host, status, cputime = ("", "", "", "")
-            if 3 == len(tmpList):
-                id, status, cputime = tmpList
-            if 4 == len(tmpList):
-                id, host, status, cputime = tmpList
-            if id:
-                allDict[id] = {}
-                allDict[id]["status"] = Condor.statusDict[status]
-                allDict[id]["cputime"] = cputime
-                allDict[id]["host"] = host
+        allDict = Condor._parse_query_output(output)
+
+        # The jobs which have left the queue are looked up in the history
+        # with one more query for all of their clusters
+        historyDict = {}
+        finishedIdList = [id for id in idList if jobDict[id].status != "killed" and
+                          allDict.get(id) is None]
+        finishedClusters = Condor._clusters(finishedIdList)
+        if finishedClusters and getConfig("Condor")["query_history"]:
+            constraint = " || ".join\
+                (["ClusterId == %s" % cluster for cluster in finishedClusters])
+            historyCommand = " ".join\
+                ([
+                    "condor_history",
+                    "-constraint \"%s\"" % constraint,
+                    "-format \"%s \" GlobalJobId",
+                    "-format \"%d \" JobStatus",
+                    "-format \"%f\\n\" RemoteUserCpu"
+                ])
+            status, output = commands.getstatusoutput(historyCommand)
+            if 0 == status:
+                historyDict = Condor._parse_query_output(output)
+            else:
+                logger.debug("Problem retrieving history of Condor jobs: %s" % output)
 
         fg = Foreground()
         fx = Effects()
@@ -485,25 +654,11 @@ class Condor(IBackend):
             if jobDict[id].status == "killed":
                 continue
 
-            localId = id.split("#")[-1]
-            globalId = id
-
-            if globalId == localId:
-                queryCommand = " ".join\
-                    ([
-                        "condor_q -global" if getConfig(
-                            "Condor")["query_global_queues"] else "condor_q",
-                        "-format \"%s\" GlobalJobId",
-                        id
-                    ])
-                status, output = commands.getstatusoutput(queryCommand)
-                if 0 == status:
-                    globalId = output
-
-            if globalId in allDict.keys():
-                status = allDict[globalId]["status"]
-                host = allDict[globalId]["host"]
-                cputime = allDict[globalId]["cputime"]
+            info = allDict.get(id)
+            if info is not None:
+                status = info["status"]
+                host = info["host"]
+                cputime = info["cputime"]
                 if status != jobDict[id].backend.status:
                     printStatus = True
                     stripProxy(jobDict[id])._getSessionLock()
@@ -517,6 +672,10 @@ class Condor(IBackend):
                 jobDict[id].backend.cputime = cputime
             else:
                 jobDict[id].backend.status = ""
+                info = historyDict.get(id)
+                if info is not None:
+                    jobDict[id].backend.status = info["status"]
+                    jobDict[id].backend.cputime = info["cputime"]
                 outDir = jobDict[id].getOutputWorkspace().getPath()
                 condorLogPath = "".join([outDir, "condorLog"])
                 checkExit = True
@@ -594,6 +753,51 @@ class Condor(IBackend):
     updateMonitoringInformation = \
         staticmethod(updateMonitoringInformation)
 
+    @staticmethod
+    def _local_id(id):
+        """Return the local id (cluster.proc) of a Condor id, which may be a
+           global id schedd#cluster.proc#time"""
+
+        idElementList = id.split("#")
+        if 3 == len(idElementList):
+            return idElementList[1]
+        return id
+
+    @staticmethod
+    def _clusters(idList):
+        """Return the sorted cluster numbers of a list of Condor ids"""
+
+        clusters = set(Condor._local_id(id).split(".")[0] for id in idList)
+        return sorted(cluster for cluster in clusters if cluster.isdigit())
+
+    @staticmethod
+    def _parse_query_output(output):
+        """Return the status, host and cputime of each job listed by condor_q
+           or condor_history, formatted as
+           'GlobalJobId [RemoteHost] JobStatus RemoteUserCpu' lines. The
+           jobs are indexed by global id and by cluster.proc"""
+
+        if ("All queues are empty" == output):
+            infoList = []
+        else:
+            infoList = output.split("\n")
+
+        allDict = {}
+        for infoString in infoList:
+            tmpList = infoString.split()
+            id, host, status, cputime = ("", "", "", "")
+            if 3 == len(tmpList):
+                id, status, cputime = tmpList
+            if 4 == len(tmpList):
+                id, host, status, cputime = tmpList
+            if id:
+                allDict[id] = {}
+                allDict[id]["status"] = Condor.statusDict.get(status, status)
+                allDict[id]["cputime"] = cputime
+                allDict[id]["host"] = host
+                allDict.setdefault(Condor._local_id(id), allDict[id])
+        return allDict
+
 #_________________________________________________________________________
 
 
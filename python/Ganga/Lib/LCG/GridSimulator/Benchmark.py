@@ -0,0 +1,243 @@
+##########################################################################
+# Ganga Project. http://cern.ch/ganga
+##########################################################################
+#
+# Submission and monitoring benchmark of the LCG backend driven by the GridSimulator
+#
+# K master jobs of N subjobs each are submitted with native bulk submission and monitored until they are all final,
+# with the simulator standing in for the middleware. The numbers recorded are:
+#
+#  - submit:     the time of each job.submit() and of each LCG.master_bulk_submit() and the subjobs submitted per second
+#  - monitoring: the time of each LCG.master_bulk_updateMonitoringInformation() and the lag between a subjob
+#                finishing in the simulator and Ganga retrieving its output (or seeing it fail)
+#  - flush:      the time to write each master job with its subjobs to the repository, once submitted and once final
+#  - peak_rss:   the peak resident memory of the session in kB
+#
+# Each series of times is summarised by its count, min, mean, median, 90th/99th percentile and max. The results are
+# returned as a dictionary and written as JSON, so that runs can be compared to catch regressions.
+#
+# Usage, in a Ganga session with the monitoring loop disabled (it would poll the jobs as well):
+#
+#     from Ganga.Lib.LCG.GridSimulator.Benchmark import runBenchmark
+#     runBenchmark(num_jobs=10, num_subjobs=50, outfile='results.json')
+#
+# or with the simulator-benchmark.py driver script.
+
+import json
+import math
+import platform
+import resource
+import shutil
+import tempfile
+import time
+
+from Ganga.Utility.Config import getConfig
+from Ganga.Utility.logging import getLogger
+
+logger = getLogger()
+
+
+def summarise(values):
+    """
+    Return the count, min, mean, median, 90th and 99th percentile and max of a series of numbers
+    Args:
+        values (list): The numbers to summarise
+    """
+    values = sorted(values)
+    summary = {'count': len(values)}
+    if not values:
+        return summary
+
+    def percentile(p):
+        # nearest rank
+        return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+    summary.update({'min': values[0],
+                    'mean': sum(values) / float(len(values)),
+                    'median': percentile(50),
+                    'p90': percentile(90),
+                    'p99': percentile(99),
+                    'max': values[-1]})
+    return summary
+
+
+def peakRSS():
+    """Return the peak resident memory of this process in kB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on Mac OS, kB everywhere else
+    if platform.system() == 'Darwin':
+        rss /= 1024
+    return rss
+
+
+class _Timed(object):
+
+    """
+    Replaces a method of the LCG class by a wrapper recording how long each call takes
+    """
+
+    def __init__(self, name, static=False):
+        """
+        Args:
+            name (str): The method of the LCG class to time
+            static (bool): Whether it's a staticmethod
+        """
+        from Ganga.Lib.LCG import LCG
+        self.name = name
+        self.static = static
+        self.times = []
+        self._original = LCG.__dict__[name]
+
+        func = getattr(LCG, name)
+
+        def timed(*args, **kwds):
+            t0 = time.time()
+            try:
+                return func(*args, **kwds)
+            finally:
+                self.times.append(time.time() - t0)
+
+        setattr(LCG, name, staticmethod(timed) if static else timed)
+
+    def restore(self):
+        from Ganga.Lib.LCG import LCG
+        setattr(LCG, self.name, self._original)
+
+
+def _flushTimes(jobs):
+    """Write each job with its subjobs to the repository and return how long each one took"""
+    from Ganga.Core.GangaRepository import getRegistry
+
+    registry = getRegistry('jobs')
+    times = []
+    for j in jobs:
+        j._setDirty()
+        t0 = time.time()
+        registry._flush([j])
+        times.append(time.time() - t0)
+    return times
+
+
+def runBenchmark(num_jobs=10, num_subjobs=50, outfile=None, poll_interval=1.0, timeout=3600, basedir=None,
+                 remove=True):
+    """
+    Submit num_jobs master jobs of num_subjobs subjobs each to the simulator, monitor them until they are final and
+    return the numbers recorded
+    Args:
+        num_jobs (int): How many master jobs to submit
+        num_subjobs (int): How many subjobs each master job has
+        outfile (str): Where to write the results as JSON, not written if None
+        poll_interval (float): Seconds between two monitoring passes
+        timeout (float): Seconds to wait for the jobs to be final, the jobs left over are counted as unfinished
+        basedir (str): Directory of the simulator data files, a temporary directory removed afterwards if None
+        remove (bool): Whether to remove the jobs from the repository afterwards
+    """
+    from Ganga.GPI import Job, LCG, GenericSplitter
+    from Ganga.GPIDev.Base.Proxy import stripProxy
+    from Ganga.Lib.LCG import LCG as LCGBackend
+    from Ganga.Lib.LCG.GridSimulator import GridSimulator
+
+    from Ganga.Core import monitoring_component
+    if monitoring_component is not None and monitoring_component.isEnabled(False):
+        logger.warning('The monitoring loop is enabled, it will poll the benchmark jobs as well and skew the numbers')
+
+    lcg_config = getConfig('LCG')
+    glite_enable = lcg_config['GLITE_ENABLE']
+
+    tmpdir = None
+    if basedir is None:
+        basedir = tmpdir = tempfile.mkdtemp(prefix='gridsim_')
+
+    simulator = GridSimulator(basedir)
+    simulator.enable()
+    lcg_config.setUserValue('GLITE_ENABLE', True)
+
+    submit_timer = _Timed('master_bulk_submit')
+    monitor_timer = _Timed('master_bulk_updateMonitoringInformation', static=True)
+
+    jobs = []
+    try:
+        submit_times = []
+        t_submit = time.time()
+        for i in range(num_jobs):
+            j = Job()
+            j.backend = LCG()
+            j.splitter = GenericSplitter()
+            j.splitter.attribute = 'application.args'
+            j.splitter.values = [[str(n)] for n in range(num_subjobs)]
+            t0 = time.time()
+            j.submit()
+            submit_times.append(time.time() - t0)
+            jobs.append(stripProxy(j))
+        t_submit = time.time() - t_submit
+
+        flush_submitted = _flushTimes(jobs)
+
+        polls = 0
+        t_monitor = time.time()
+        deadline = t_monitor + timeout
+        while time.time() < deadline:
+            active = [j for j in jobs if j.status not in LCGBackend._final_ganga_states]
+            if not active:
+                break
+            LCGBackend.master_updateMonitoringInformation(active)
+            polls += 1
+            time.sleep(poll_interval)
+        t_monitor = time.time() - t_monitor
+
+        flush_final = _flushTimes(jobs)
+
+        lags = [ganga_time - finish_time for finish_time, ganga_time in simulator.getFinishTimes().values()]
+
+        statuses = {}
+        for j in jobs:
+            for sj in j.subjobs:
+                statuses[sj.status] = statuses.get(sj.status, 0) + 1
+
+        results = {
+            'parameters': {'num_jobs': num_jobs,
+                           'num_subjobs': num_subjobs,
+                           'poll_interval': poll_interval,
+                           'timeout': timeout,
+                           'simulator': dict(getConfig('GridSimulator').getEffectiveOptions()),
+                           'bulk_job_size': lcg_config['GliteBulkJobSize'],
+                           'submission_threads': lcg_config['SubmissionThread']},
+            'submit': {'total_time': t_submit,
+                       'subjobs_per_second': num_jobs * num_subjobs / t_submit if t_submit else 0,
+                       'job_submit': summarise(submit_times),
+                       'master_bulk_submit': summarise(submit_timer.times)},
+            'monitoring': {'total_time': t_monitor,
+                           'polls': polls,
+                           'master_bulk_updateMonitoringInformation': summarise(monitor_timer.times),
+                           'lag': summarise(lags)},
+            'flush': {'submitted': summarise(flush_submitted),
+                      'final': summarise(flush_final)},
+            'peak_rss': peakRSS(),
+            'subjob_status': statuses,
+            'unfinished': len([j for j in jobs if j.status not in LCGBackend._final_ganga_states]),
+            'time': time.time(),
+        }
+    finally:
+        submit_timer.restore()
+        monitor_timer.restore()
+        if remove:
+            for j in jobs:
+                try:
+                    j.remove()
+                except Exception as err:
+                    logger.warning('Could not remove benchmark job %s: %s', j.id, err)
+        lcg_config.setUserValue('GLITE_ENABLE', glite_enable)
+        simulator.close()
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    logger.info('Submitted %d subjobs in %.1fs (%.1f subjobs/s), all final after %d polls, median lag %.1fs',
+                num_jobs * num_subjobs, t_submit, results['submit']['subjobs_per_second'], polls,
+                results['monitoring']['lag'].get('median', 0))
+
+    if outfile is not None:
+        with open(outfile, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        logger.info('Benchmark results written to %s', outfile)
+
+    return results
@@ -1,14 +1,8 @@
 from Ganga.Utility.Config import getConfig
 from Ganga.Utility.logging import getLogger
 
-from Ganga.Utility.GridShell import getShell
-
-from Ganga.GPIDev.Credentials.ICredential import ICredential
-
 logger = getLogger()
 
-logger.critical('LCG Grid Simulator ENABLED')
-
 ##########################################################################
 # GRID SIMULATOR
 ##########################################################################
@@ -41,10 +35,16 @@ def get_number(val):
     return t
 
 import os
+import re
+import threading
 import time
 
 cmd = 'simulation'
 
+# the functions of Ganga.Lib.LCG.Grid which are replaced by the simulator when it is enabled
+_grid_functions = ['check_proxy', 'submit', 'native_master_cancel', 'status', 'get_loginfo', 'get_output', 'cancel',
+                   'cancelMultiple', 'list_match', 'expandjdl', '__get_lfc_host__']
+
 
 class GridSimulator(object):
 
@@ -52,16 +52,17 @@ class GridSimulator(object):
 
     credential = None
 
-    def __init__(self):
+    def __init__(self, basedir='.'):
+        """
+        Args:
+            basedir (str): Directory of the data files recording the simulated jobs
+        """
         self.active = True
-        self.credential = ICredential()  # FIXME: or the real one
-        #import Ganga.Core.FileWorkspace
-        #basedir = Ganga.Core.FileWorkspace.gettop()
-        #basedir = '/tmp'
-        basedir = '.'
+        self._lock = threading.RLock()
+        self._saved_grid = None
         self.gridmap_filename = '%s/lcg_simulator_gridmap' % basedir
         import shelve
-        # map Grid job id into inputdir (where JDL file is)
+        # map Grid job id into the params file of the job (next to its JDL file)
         self.jobid_map = shelve.open(self.gridmap_filename, writeback=False)
         self.jobid_map.setdefault('_job_count', 0)
 
@@ -70,15 +71,46 @@ class GridSimulator(object):
         self.ganga_finish_time = shelve.open(
             self.finished_jobs_filename, writeback=False)
 
-        self.shell = getShell('GLITE')
+        logger.info('Grid Simulator data files: %s %s',
+                    self.gridmap_filename, self.finished_jobs_filename)
+
+    def enable(self):
+        '''Replace the middleware commands of Ganga.Lib.LCG.Grid by the simulator'''
+        from Ganga.Lib.LCG import Grid
+
+        with self._lock:
+            if self._saved_grid is not None:
+                return
+            self._saved_grid = dict((name, getattr(Grid, name)) for name in _grid_functions)
+            for name in _grid_functions:
+                setattr(Grid, name, getattr(self, name))
+
+        logger.critical('LCG Grid Simulator ENABLED')
+
+    def disable(self):
+        '''Give Ganga.Lib.LCG.Grid its middleware commands back'''
+        from Ganga.Lib.LCG import Grid
 
-        logger.critical('Grid Simulator data files: %s %s',
-                        self.gridmap_filename, self.finished_jobs_filename)
+        with self._lock:
+            if self._saved_grid is None:
+                return
+            for name, func in self._saved_grid.items():
+                setattr(Grid, name, func)
+            self._saved_grid = None
+
+        logger.info('LCG Grid Simulator disabled')
+
+    def close(self):
+        '''Disable the simulator and close its data files'''
+        self.disable()
+        with self._lock:
+            self.jobid_map.close()
+            self.ganga_finish_time.close()
 
     def check_proxy(self):
         return True
 
-    def submit(self, jdlpath, ce=None):
+    def submit(self, jdlpath, ce=None, perusable=False):
         '''This method is used for normal and native bulk submission supported by GLITE middleware.'''
 
         logger.debug(
@@ -88,13 +120,13 @@ class GridSimulator(object):
 
         subjob_ids = []
         if jdl['Type'] == 'collection':
-            import re
             # we need to parse the Nodes attribute string here
-            r = re.compile(r'.*NodeName = "(gsj_\d+)"; file="(\S*)"*')
+            r = re.compile(r'.*NodeName = "(gsj_\d+)"; file="([^"]*)"')
             for line in jdl['Nodes'].splitlines()[1:-1]:
                 m = r.match(line)
-                if m:
-                    nodename, sjdl_path = m.groups()
+                if not m:
+                    continue
+                nodename, sjdl_path = m.groups()
                 subjob_ids.append(
                     self._submit(sjdl_path, ce, [], nodename=nodename))
 
@@ -103,8 +135,11 @@ class GridSimulator(object):
         return masterid
 
     def _params_filename(self, jobid):
-        inputdir = os.path.realpath(self.jobid_map[jobid])
-        return os.path.join(inputdir, 'params')
+        with self._lock:
+            return self.jobid_map[jobid]
+
+    def _read_params(self, jobid):
+        return eval(file(self._params_filename(jobid)).read())
 
     def _submit(self, jdlpath, ce, subjob_ids, nodename=None):
         '''Submit a JDL file to LCG'''
@@ -112,10 +147,11 @@ class GridSimulator(object):
         logger.debug(
             'job submit command: _submit(jdlpath=%s,ce=%s,subjob_ids=%s)', jdlpath, ce, subjob_ids)
 
-        inputdir = os.path.dirname(os.path.realpath(jdlpath))
+        # the collections of a bulk job share their input directory, each JDL file gets its own params
+        params_filename = os.path.realpath(jdlpath) + '.params'
 
         def write():
-            file(os.path.join(inputdir, 'params'), 'w').write(
+            file(params_filename, 'w').write(
                 repr(runtime_params))
 
         runtime_params = {}
@@ -130,20 +166,20 @@ class GridSimulator(object):
             logger.warning('Job submission failed.')
             return
 
-        jobid = self._make_new_id()
-
-        self.jobid_map[jobid] = inputdir
-
-        runtime_params['jobid'] = jobid
         runtime_params['status'] = 'submitted'
         runtime_params['should_fail'] = failed(config['job_failure_rate'])
-        runtime_params['expected_job_id_resolve_time'] = get_number(
-            config['job_id_resolved_time'])
+        runtime_params['expected_job_id_resolve_time'] = time.time(
+        ) + get_number(config['job_id_resolved_time'])
         runtime_params['expected_finish_time'] = time.time(
         ) + get_number(config['job_finish_time'])
         runtime_params['subjob_ids'] = subjob_ids
         runtime_params['nodename'] = nodename
-        write()
+
+        with self._lock:
+            jobid = self._make_new_id()
+            runtime_params['jobid'] = jobid
+            write()
+            self.jobid_map[jobid] = params_filename
         return jobid
 
     def _make_new_id(self):
@@ -153,25 +189,23 @@ class GridSimulator(object):
         return jobid
 
     def _cancel(self, jobid):
-        inputdir = self.jobid_map[jobid]
-
         sleep(config['cancel_time'])
         if failed(config['cancel_failure_rate']):
             file(self._params_filename(jobid), 'a').write(
-                '\n failed to cancel: %d' % time.time())
+                '\n# failed to cancel: %d' % time.time())
             return False
         file(self._params_filename(jobid), 'a').write(
-            '\ncancelled: %d' % time.time())
+            '\n# cancelled: %d' % time.time())
         return True
 
-    def native_master_cancel(self, jobid):
+    def native_master_cancel(self, jobids):
         '''Native bulk cancellation supported by GLITE middleware.'''
 
         logger.debug(
-            'job cancel command: native_master_cancel(jobid=%s', jobid)
+            'job cancel command: native_master_cancel(jobids=%s)', jobids)
 
         # FIXME: TODO: emulate bulk!
-        return self._cancel(jobid)
+        return all([self._cancel(jobid) for jobid in jobids])
 
     def _status(self, jobid, has_id):
         logger.debug(
@@ -179,25 +213,22 @@ class GridSimulator(object):
 
         info = {'id': None,
                 'name': None,
-                'status': None,
-                'exit': None,
-                'reason': None,
+                'status': 'Running',
+                'exit': '',
+                'reason': '',
                 'is_node': False,
                 'destination': 'anywhere'}
 
-        params = eval(file(self._params_filename(jobid)).read())
+        params = self._read_params(jobid)
 
         sleep(config['single_status_time'])
 
         assert params['jobid'] == jobid
 
+        info['id'] = params['jobid']
         if has_id:
-            info['id'] = params['jobid']
             info['name'] = params['nodename']
 
-        # if is_collection and time.time() > params['expected_job_id_resolve_time']:
-        #    info['name'] = 'node_%d' % 0 # FIXME: some number (read from jdl?)
-
         logger.debug('current_time-expected_finish_time = %d',
                      time.time() - params['expected_finish_time'])
 
@@ -206,7 +237,9 @@ class GridSimulator(object):
                 info['status'] = 'Aborted'
                 info['reason'] = 'for no reason'
                 info['exit'] = -1
-                self.ganga_finish_time[jobid] = time.time()
+                with self._lock:
+                    if jobid not in self.ganga_finish_time:
+                        self.ganga_finish_time[jobid] = time.time()
             else:
                 info['status'] = 'Done (Success)'
                 info['exit'] = 0
@@ -214,7 +247,7 @@ class GridSimulator(object):
 
         logger.debug('_status (jobid=%s) -> %s', jobid, repr(info))
 
-        # PENDING: handle other statuses: 'Running','Aborted','Cancelled','Done
+        # PENDING: handle other statuses: 'Scheduled','Cancelled','Done
         # (Exit Code !=0)','Cleared'
         return info
 
@@ -222,30 +255,38 @@ class GridSimulator(object):
         '''Query the status of jobs on the grid.
         If is_collection is False then jobids is a list of non-split jobs or emulated bulk subjobs of a single master job.
         If is_collection is True then jobids is a list of master jobs which are natively bulk.
+        Returns the list of the status information and the list of job ids unknown to the middleware, like Grid.status
         '''
 
         logger.debug(
             'job status command: status(jobid=%s,is_collection=%d)', jobids, is_collection)
 
         info = []
+        missing = []
+
+        if not jobids:
+            return info, missing
+
+        sleep(config['status_time'])
 
         for id in jobids:
+            try:
+                self._params_filename(id)
+            except KeyError:
+                missing.append(id)
+                continue
             if is_collection:
-                # print 'master _status'
                 sleep(config['master_status_time'])
                 info.append(self._status(id, True))
-                # print 'master _status done'
-                params = eval(file(self._params_filename(id)).read())
-                # print 'master params',params
+                params = self._read_params(id)
                 has_id = time.time() > params['expected_job_id_resolve_time']
                 for sid in params['subjob_ids']:
                     info.append(self._status(sid, has_id))
                     info[-1]['is_node'] = True
             else:
-                has_id = False
                 info.append(self._status(id, True))
 
-        return info
+        return info, missing
 
     def get_loginfo(self, jobid, directory, verbosity=1):
         '''Fetch the logging info of the given job and save the output in the jobs outputdir'''
@@ -258,7 +299,8 @@ class GridSimulator(object):
         logger.debug(
             'job get output command: get_output(jobid=%s,directory=%s)', jobid, directory)
         sleep(config['get_output_time'])
-        self.ganga_finish_time[jobid] = time.time()
+        with self._lock:
+            self.ganga_finish_time[jobid] = time.time()
         return (True, None)
 
     def cancel(self, jobid):
@@ -267,6 +309,34 @@ class GridSimulator(object):
 
         return self._cancel(jobid)
 
+    def cancelMultiple(self, jobids):
+        '''Cancel multiple jobs in one go'''
+        logger.debug('job cancel command: cancelMultiple(jobids=%s)', jobids)
+
+        return all([self._cancel(jobid) for jobid in jobids])
+
+    def list_match(self, jdlpath, ce=None):
+        '''Every JDL matches the computing element of the simulator'''
+
+        return [ce or 'anywhere']
+
+    def __get_lfc_host__(self):
+        return ''
+
+    def getFinishTimes(self):
+        '''
+        Return a dictionary of the jobs which finished in the simulator and have been seen as finished by Ganga,
+        mapping their ids to the time they finished and the time Ganga saw it
+        '''
+        times = {}
+        with self._lock:
+            for jobid, ganga_time in self.ganga_finish_time.items():
+                try:
+                    times[jobid] = (self._read_params(jobid)['expected_finish_time'], ganga_time)
+                except (KeyError, IOError) as err:
+                    logger.debug('Missing simulator data for %s: %s', jobid, err)
+        return times
+
     @staticmethod
     def expandjdl(items):
         '''Expand jdl items'''
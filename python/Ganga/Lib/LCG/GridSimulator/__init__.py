@@ -1,2 +1,3 @@
 from __future__ import absolute_import
 from .GridSimulator import GridSimulator
+from .Benchmark import runBenchmark
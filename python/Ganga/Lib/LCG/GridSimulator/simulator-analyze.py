@@ -29,7 +29,7 @@ ganga_finished_times = []
 for gid in gridmap:
     if gid[0] == '_':
         continue
-    params = eval(file(os.path.join(gridmap[gid], 'params')).read())
+    params = eval(file(gridmap[gid]).read())
     try:
         job_finished_times.append(params['expected_finish_time'])
         ganga_finished_times.append(finished_jobs[gid])
@@ -88,4 +88,4 @@ f = file('%s/deltas.dat' % basedir, 'w')
 f.write(
     "# time difference (for each individual job) between the job was reported by the grid as finished and completed/failed in ganga\n")
 for d in deltas:
-    f.write(d + '\n')
+    f.write('%f\n' % d)
@@ -0,0 +1,65 @@
+# this is a ganga grid simulator benchmark driver script
+# usage:
+# ganga -o[LCG]GLITE_ENABLE=False -o[PollThread]autostart=False simulator-benchmark.py [options]
+# (GLITE is enabled by the benchmark once the simulator stands in for the middleware)
+
+# K master jobs with N subjobs each are submitted to the simulator and monitored until they are final,
+# the submission, monitoring, repository flush and memory numbers are written as JSON (see Benchmark.py)
+#
+# the simulator parameters are taken from the [GridSimulator] configuration, e.g.
+# -o[GridSimulator]submit_time=0.0 -o[GridSimulator]job_finish_time='random.uniform(5,10)'
+#
+# two results files may be compared with --compare to spot regressions:
+# ganga ... simulator-benchmark.py --compare baseline.json results.json
+
+import json
+import sys
+from optparse import OptionParser
+
+from Ganga.Lib.LCG.GridSimulator.Benchmark import runBenchmark
+from Ganga.Utility.logging import getLogger
+logger = getLogger(modulename=True)
+
+parser = OptionParser(usage='%prog [options]')
+parser.add_option('-k', '--jobs', dest='num_jobs', type='int', default=10, help='number of master jobs')
+parser.add_option('-n', '--subjobs', dest='num_subjobs', type='int', default=50, help='number of subjobs per master job')
+parser.add_option('-r', '--repeat', dest='repeat', type='int', default=1, help='number of benchmark runs')
+parser.add_option('-o', '--output', dest='outfile', default='benchmark.json', help='JSON results file')
+parser.add_option('-p', '--poll-interval', dest='poll_interval', type='float', default=1.0,
+                  help='seconds between monitoring passes')
+parser.add_option('-t', '--timeout', dest='timeout', type='float', default=3600,
+                  help='seconds to wait for the jobs to be final')
+parser.add_option('--compare', dest='compare', nargs=2, metavar='BASELINE RESULTS',
+                  help='compare the medians of two results files instead of running the benchmark')
+
+(opts, args) = parser.parse_args(sys.argv[1:])
+
+
+def medians(results):
+    # the runs of a results file are compared by the median of each summarised series
+    flat = {}
+    for run in results['runs']:
+        for section in ['submit', 'monitoring', 'flush']:
+            for name, value in run[section].items():
+                if isinstance(value, dict) and 'median' in value:
+                    flat.setdefault('%s.%s' % (section, name), []).append(value['median'])
+        flat.setdefault('peak_rss', []).append(run['peak_rss'])
+    return dict((name, sorted(values)[len(values) // 2]) for name, values in flat.items())
+
+if opts.compare:
+    baseline, results = [medians(json.load(open(f))) for f in opts.compare]
+    for name in sorted(set(baseline) & set(results)):
+        change = (results[name] - baseline[name]) / baseline[name] * 100 if baseline[name] else 0
+        logger.info('%-60s %12.4f %12.4f %+8.1f%%', name, baseline[name], results[name], change)
+else:
+    runs = []
+    for i in range(opts.repeat):
+        logger.info('*' * 80)
+        logger.info('benchmark run %d out of %d' % (i + 1, opts.repeat))
+        logger.info('*' * 80)
+        runs.append(runBenchmark(num_jobs=opts.num_jobs, num_subjobs=opts.num_subjobs,
+                                 poll_interval=opts.poll_interval, timeout=opts.timeout))
+
+    with open(opts.outfile, 'w') as f:
+        json.dump({'runs': runs}, f, indent=2, sort_keys=True)
+    logger.info('benchmark results written to %s' % opts.outfile)
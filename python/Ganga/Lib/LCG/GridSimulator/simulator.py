@@ -1,8 +1,9 @@
 
 # this is a ganga grid simulator driver script
 # usage:
-# env GANGA_GRID_SIMULATOR=1 ganga -o[LCG]GLITE_ENABLE=True
-# -oGLITE_SETUP=/dev/null -o[PollThread]autostart=True simulator.py
+# ganga -o[LCG]GLITE_ENABLE=False
+# -o[PollThread]autostart=True simulator.py
+# (GLITE is enabled by the script once the simulator stands in for the middleware)
 
 # when the simulator is enabled it will produce data files in the current working directory
 # these files may be further processed with the simulator-analyze.py
@@ -17,7 +18,9 @@
 
 from Ganga.GPIDev.Lib.Job.Job import Job
 from Ganga.Lib.LCG import LCG
+from Ganga.Lib.LCG.GridSimulator import GridSimulator
 from Ganga.Lib.Splitters import GenericSplitter
+from Ganga.Utility.Config import getConfig
 from Ganga.Utility.logging import getLogger
 logger = getLogger(modulename=True)
 
@@ -33,6 +36,9 @@ config['job_id_resolved_time'] = 'random.uniform(10,50)'  # up to 800s
 config['job_finish_time'] = '10+random.uniform(10,10)'
 config['job_failure_rate'] = 'random.uniform(0,0.05)'
 
+GridSimulator().enable()
+getConfig('LCG').setUserValue('GLITE_ENABLE', True)
+
 # submit K parallel master jobs with N subjobs each
 
 
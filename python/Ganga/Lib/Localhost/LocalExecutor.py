@@ -0,0 +1,174 @@
+import collections
+import multiprocessing
+import subprocess
+import threading
+import time
+
+import Ganga.Utility.Config
+import Ganga.Utility.logging
+from Ganga.Core.GangaThread import GangaThread
+
+logger = Ganga.Utility.logging.getLogger()
+config = Ganga.Utility.Config.getConfig('Local')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+
+
+class LocalExecutor(object):
+    """
+    Runs the wrapper scripts of the Local jobs in the background, at most [Local]max_running of them at once.
+    Scripts submitted while all of the slots are taken wait in a queue. The wrappers are reaped with a non-blocking
+    waitpid on each poll so that the monitoring only needs to look at the output of a job once it has finished
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every job, e.g. when a new session starts. The wrappers still running carry on by themselves"""
+        # (key, scriptpath) of the scripts waiting for a slot
+        self._queue = collections.deque()
+        # key -> Popen of the running wrappers
+        self._running = {}
+        # key -> exit status of the wrapper, None if it couldn't be started
+        self._finished = {}
+        self.stats = {'started': 0, 'finished': 0}
+
+    def slots(self):
+        """Return the number of scripts which may run at once, 0 for no limit"""
+        max_running = config['max_running']
+        if max_running < 0:
+            return 0
+        if max_running == 0:
+            return multiprocessing.cpu_count()
+        return max_running
+
+    def submit(self, key, scriptpath):
+        """
+        Queue a wrapper script and start it straight away if a slot is free, return the pid of the wrapper or None
+        if it is waiting for a slot
+        Args:
+            key (str): Identifies the job, the fqid
+            scriptpath (str): Path of the wrapper script
+        """
+        with self._lock:
+            self._forget(key)
+            self._queue.append((key, scriptpath))
+            self._startQueued()
+            process = self._running.get(key)
+            return process.pid if process is not None else None
+
+    def state(self, key):
+        """Return (QUEUED, None), (RUNNING, wrapper pid), (FINISHED, wrapper exit status) or (None, None) if the key
+        isn't known
+        Args:
+            key (str): Identifies the job, the fqid
+        """
+        with self._lock:
+            if key in self._running:
+                return RUNNING, self._running[key].pid
+            if key in self._finished:
+                return FINISHED, self._finished[key]
+            if any(k == key for k, scriptpath in self._queue):
+                return QUEUED, None
+            return None, None
+
+    def cancel(self, key):
+        """Stop tracking a job, return (state, value) as given by state() before it was forgotten. A queued script will
+        never be started, a running wrapper has to be killed by the caller
+        Args:
+            key (str): Identifies the job, the fqid
+        """
+        with self._lock:
+            if key in self._running:
+                result = RUNNING, self._running[key].pid
+            elif key in self._finished:
+                result = FINISHED, self._finished[key]
+            elif any(k == key for k, scriptpath in self._queue):
+                result = QUEUED, None
+            else:
+                result = None, None
+            self._forget(key)
+            return result
+
+    def poll(self):
+        """Reap the wrappers which have exited and start queued scripts in the slots freed"""
+        with self._lock:
+            for key, process in self._running.items():
+                status = process.poll()
+                if status is not None:
+                    del self._running[key]
+                    self._finished[key] = status
+                    self.stats['finished'] += 1
+            self._startQueued()
+
+    def getStats(self):
+        """Return the number of scripts queued and running, the slots and the number started and finished so far"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['queued'] = len(self._queue)
+            stats['running'] = len(self._running)
+            stats['slots'] = self.slots()
+            return stats
+
+    def _forget(self, key):
+        self._running.pop(key, None)
+        self._finished.pop(key, None)
+        if any(k == key for k, scriptpath in self._queue):
+            self._queue = collections.deque((k, s) for k, s in self._queue if k != key)
+
+    def _startQueued(self):
+        slots = self.slots()
+        while self._queue and (slots == 0 or len(self._running) < slots):
+            key, scriptpath = self._queue.popleft()
+            try:
+                process = subprocess.Popen(["python", scriptpath, 'subprocess'])
+            except OSError as x:
+                logger.error('cannot start a job process: %s', str(x))
+                self._finished[key] = None
+                continue
+            self._running[key] = process
+            self.stats['started'] += 1
+
+
+class LocalExecutorThread(GangaThread):
+    """Polls the LocalExecutor so that queued scripts start as soon as a slot is freed"""
+
+    def __init__(self, executor, interval=0.2):
+        super(LocalExecutorThread, self).__init__(name='LocalExecutor', critical=False)
+        self.executor = executor
+        self.interval = interval
+
+    def run(self):
+        try:
+            while not self.should_stop():
+                try:
+                    self.executor.poll()
+                except Exception as err:
+                    logger.warning("Problem polling the local job processes: %s", err)
+                time.sleep(self.interval)
+        finally:
+            self.unregister()
+
+
+_executor = LocalExecutor()
+_executor_thread = None
+_executor_thread_lock = threading.Lock()
+
+
+def getLocalExecutor():
+    """Return the LocalExecutor, making sure that a thread is polling it"""
+    global _executor_thread
+    with _executor_thread_lock:
+        if _executor_thread is None or not _executor_thread.isAlive() or _executor_thread.should_stop():
+            if _executor_thread is not None:
+                # The thread is stopped when a session ends, the jobs it left queued are queued again by the monitoring
+                # of the next session
+                with _executor._lock:
+                    _executor.reset()
+            _executor_thread = LocalExecutorThread(_executor)
+            _executor_thread.start()
+    return _executor
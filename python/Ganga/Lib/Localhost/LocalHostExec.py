@@ -25,11 +25,9 @@ import time
 if len(sys.argv)>1 and sys.argv[1] == 'subprocess':
     os.setsid()
 
-###########################################################################################
+from contextlib import closing
 
-###INLINEMODULES###
-
-############################################################################################
+PYTHON_DIR = ###PYTHON_DIR###
 
 input_sandbox = ###INPUT_SANDBOX###
 sharedoutputpath= ###SHAREDOUTPUTPATH###
@@ -58,9 +56,11 @@ os.chdir(workdir)
 ##-- WARNING: get the input files including the python modules BEFORE sys.path.insert()
 # -- SINCE PYTHON 2.6 THERE WAS A SUBTLE CHANGE OF SEMANTICS IN THIS AREA
 
+# the modules shared by the wrapper scripts are unpacked from the master input sandbox here so they are imported below
 for f in input_sandbox:
     if mimetypes.guess_type(f)[1] in ['gzip', 'bzip2']:
-        getPackedInputSandbox(f)
+        with closing(tarfile.open(f, "r:*")) as tf:
+            tf.extractall('.')
     else:
         shutil.copy(f, os.path.join(os.getcwd(), os.path.basename(f)))
 
@@ -75,6 +75,8 @@ for f in input_sandbox:
 sys.path.insert(0, ###GANGADIR###)
 sys.path.insert(0,os.path.join(os.getcwd(),PYTHON_DIR))
 
+from WNSandbox import createOutputSandbox
+
 fullenvironment = os.environ.copy()
 
 outfile=open('stdout','w')
@@ -11,8 +11,6 @@ import os.path
 import re
 import errno
 
-import subprocess
-
 import datetime
 import time
 
@@ -21,15 +19,19 @@ import Ganga.Utility.logging
 import Ganga.Utility.Config
 
 from Ganga.GPIDev.Base.Proxy import getName, stripProxy
+from Ganga.Lib.Localhost.LocalExecutor import getLocalExecutor, QUEUED, RUNNING, FINISHED
 
 logger = Ganga.Utility.logging.getLogger()
 config = Ganga.Utility.Config.getConfig('Local')
 
+_script_location = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'LocalHostExec.py')
+
 class Localhost(IBackend):
 
     """Run jobs in the background on local host.
 
-    The job is run in the workdir (usually in /tmp).
+    The job is run in the workdir (usually in /tmp). At most [Local]max_running
+    jobs run at once, the others stay submitted until a slot is free.
     """
     _schema = Schema(Version(1, 2), {'id': SimpleItem(defvalue=-1, protected=1, copyable=0, doc='Process id.'),
                                      'status': SimpleItem(defvalue=None, typelist=[None, str], protected=1, copyable=0, hidden=1, doc='*NOT USED*'),
@@ -41,14 +43,14 @@ class Localhost(IBackend):
                                      })
     _category = 'backends'
     _name = 'Local'
+    _exportmethods = ['queue_status']
 
     def __init__(self):
         super(Localhost, self).__init__()
 
     def submit(self, jobconfig, master_input_sandbox):
         prepared = self.preparejob(jobconfig, master_input_sandbox)
-        self.run(prepared)
-        return 1
+        return self.run(prepared)
 
     def resubmit(self):
         job = self.getJobObject()
@@ -74,15 +76,23 @@ class Localhost(IBackend):
         return self.run(job.getInputWorkspace().getPath('__jobscript__'))
 
     def run(self, scriptpath):
-        try:
-            process = subprocess.Popen(["python", scriptpath, 'subprocess'])
-        except OSError as x:
-            logger.error('cannot start a job process: %s', str(x))
+        executor = getLocalExecutor()
+        key = self.getJobObject().getFQID('.')
+        pid = executor.submit(key, scriptpath)
+        if pid is None and executor.state(key) == (FINISHED, None):
+            # the process couldn't be started
+            executor.cancel(key)
             return 0
-        self.wrapper_pid = process.pid
+        # the wrapper pid of a queued job is set by the monitoring once it has started
+        self.wrapper_pid = pid if pid is not None else -1
         self.actualCE = Ganga.Utility.util.hostname()
         return 1
 
+    def queue_status(self):
+        """Return the number of Local jobs waiting for a slot and running, the number of slots (see [Local]max_running)
+        and the number of jobs started and finished in this session"""
+        return getLocalExecutor().getStats()
+
     def peek(self, filename="", command=""):
         """
         Allow viewing of output files in job's work directory
@@ -168,18 +178,26 @@ class Localhost(IBackend):
 
         return d
 
+    def master_prepare(self, masterjobconfig):
+        """Prepare the master input sandbox, adding the modules used by the job wrapper script so that they are shipped
+        once for all of the subjobs
+        """
+        import Ganga.Core.Sandbox as Sandbox
+        master_input_sandbox = super(Localhost, self).master_prepare(masterjobconfig)
+        return master_input_sandbox + Sandbox.createPackedWNModulesSandbox(self.getJobObject().getInputWorkspace())
+
     def preparejob(self, jobconfig, master_input_sandbox):
 
         job = self.getJobObject()
         # print str(job.backend_output_postprocess)
         mon = job.getMonitoringService()
         import Ganga.Core.Sandbox as Sandbox
-        from Ganga.GPIDev.Lib.File import File
-        from Ganga.Core.Sandbox.WNSandbox import PYTHON_DIR
-        import inspect
+        from Ganga.Core.Sandbox.WNSandbox import PYTHON_DIR, WN_MODULES_TARBALL_NAME
 
-        fileutils = File( inspect.getsourcefile(Ganga.Utility.files), subdir=PYTHON_DIR )
-        subjob_input_sandbox = job.createPackedInputSandbox(jobconfig.getSandboxFiles() + [ fileutils ] )
+        subjob_input_sandbox = job.createPackedInputSandbox(jobconfig.getSandboxFiles())
+        if not any(os.path.basename(f) == WN_MODULES_TARBALL_NAME for f in master_input_sandbox):
+            # the master input sandbox wasn't made by master_prepare
+            subjob_input_sandbox += Sandbox.createPackedWNModulesSandbox(job.getInputWorkspace())
 
         appscriptpath = [jobconfig.getExeString()] + jobconfig.getArgStrings()
         if self.nice:
@@ -195,39 +213,34 @@ class Localhost(IBackend):
         import tempfile
         workdir = tempfile.mkdtemp(dir=config['location'])
 
-        import inspect
-        script_location = os.path.join(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))),
-                                                        'LocalHostExec.py')
-
         from Ganga.GPIDev.Lib.File import FileUtils
-        script = FileUtils.loadScript(script_location, '')
+        from Ganga.Utility.Config import getConfig
 
-        script = script.replace('###INLINEMODULES###', inspect.getsource(Sandbox.WNSandbox))
+        # the parts of the script which are the same for every job are only filled in when the template is compiled
+        template = FileUtils.loadScriptTemplate(_script_location, {
+            '###PYTHON_DIR###': repr(PYTHON_DIR),
+            '###GANGADIR###': repr(getConfig('System')['GANGA_PYTHONPATH'])})
 
         from Ganga.GPIDev.Lib.File.OutputFileManager import getWNCodeForOutputSandbox, getWNCodeForOutputPostprocessing, getWNCodeForDownloadingInputFiles, getWNCodeForInputdataListCreation
-        from Ganga.Utility.Config import getConfig
         jobidRepr = repr(job.getFQID('.'))
 
-
-        script = script.replace('###OUTPUTSANDBOXPOSTPROCESSING###', getWNCodeForOutputSandbox(job, ['stdout', 'stderr', '__syslog__'], jobidRepr))
-        script = script.replace('###OUTPUTUPLOADSPOSTPROCESSING###', getWNCodeForOutputPostprocessing(job, ''))
-        script = script.replace('###DOWNLOADINPUTFILES###', getWNCodeForDownloadingInputFiles(job, ''))
-        script = script.replace('###CREATEINPUTDATALIST###', getWNCodeForInputdataListCreation(job, ''))
-
-        script = script.replace('###APPLICATION_NAME###', repr(getName(job.application)))
-        script = script.replace('###INPUT_SANDBOX###', repr(subjob_input_sandbox + master_input_sandbox))
-        script = script.replace('###SHAREDOUTPUTPATH###', repr(sharedoutputpath))
-        script = script.replace('###APPSCRIPTPATH###', repr(appscriptpath))
-        script = script.replace('###OUTPUTPATTERNS###', str(outputpatterns))
-        script = script.replace('###JOBID###', jobidRepr)
-        script = script.replace('###ENVIRONMENT###', repr(environment))
-        script = script.replace('###WORKDIR###', repr(workdir))
-        script = script.replace('###INPUT_DIR###', repr(job.getStringInputDir()))
+        script = template.render({
+            '###OUTPUTSANDBOXPOSTPROCESSING###': getWNCodeForOutputSandbox(job, ['stdout', 'stderr', '__syslog__'], jobidRepr),
+            '###OUTPUTUPLOADSPOSTPROCESSING###': getWNCodeForOutputPostprocessing(job, ''),
+            '###DOWNLOADINPUTFILES###': getWNCodeForDownloadingInputFiles(job, ''),
+            '###CREATEINPUTDATALIST###': getWNCodeForInputdataListCreation(job, ''),
+            '###APPLICATION_NAME###': repr(getName(job.application)),
+            '###INPUT_SANDBOX###': repr(subjob_input_sandbox + master_input_sandbox),
+            '###SHAREDOUTPUTPATH###': repr(sharedoutputpath),
+            '###APPSCRIPTPATH###': repr(appscriptpath),
+            '###OUTPUTPATTERNS###': str(outputpatterns),
+            '###JOBID###': jobidRepr,
+            '###ENVIRONMENT###': repr(environment),
+            '###WORKDIR###': repr(workdir),
+            '###INPUT_DIR###': repr(job.getStringInputDir())})
 
         self.workdir = workdir
 
-        script = script.replace('###GANGADIR###', repr(getConfig('System')['GANGA_PYTHONPATH']))
-
         wrkspace = job.getInputWorkspace()
         scriptPath = wrkspace.writefile(FileBuffer('__jobscript__', script), executable=1)
 
@@ -239,6 +252,14 @@ class Localhost(IBackend):
 
         job = self.getJobObject()
 
+        state, value = getLocalExecutor().cancel(job.getFQID('.'))
+        if state == QUEUED:
+            # the job never started
+            self.remove_workdir()
+            return 1
+        if state == RUNNING:
+            self.wrapper_pid = value
+
         ok = True
         try:
             # kill the wrapper script
@@ -305,7 +326,30 @@ class Localhost(IBackend):
 
         logger.debug('local ping: %s', str(jobs))
 
+        executor = getLocalExecutor()
         for j in jobs:
+            b = stripProxy(j.backend)
+            key = j.getFQID('.')
+            state, wrapper_status = executor.state(key)
+            if state == QUEUED:
+                continue
+            if state == RUNNING:
+                # the status file is only read once the wrapper has exited
+                if j.status == 'submitted':
+                    b.wrapper_pid = wrapper_status
+                    j.updateStatus('running')
+                continue
+            if state is None and j.status == 'submitted' and b.wrapper_pid == -1 and \
+                    not os.path.exists(j.getOutputWorkspace().getPath('__jobstatus__')):
+                # queued by a session which ended before a slot was free
+                executor.submit(key, j.getInputWorkspace().getPath('__jobscript__'))
+                continue
+            if state == FINISHED:
+                executor.cancel(key)
+                if wrapper_status is None:
+                    j.updateStatus('failed')
+                    continue
+
             outw = j.getOutputWorkspace()
 
             # try to get the application exit code from the status file
@@ -331,18 +375,23 @@ class Localhost(IBackend):
 
             # check if the exit code of the wrapper script is available (non-blocking check)
             # if the wrapper script exited with non zero this is an error
-            try:
-                ws = os.waitpid(stripProxy(j.backend).wrapper_pid, os.WNOHANG)
-                if not Ganga.Utility.logic.implies(ws[0] != 0, ws[1] == 0):
-                    # FIXME: for some strange reason the logger DOES NOT LOG (checked in python 2.3 and 2.5)
-                    # print 'logger problem', logger.name
-                    # print 'logger',logger.getEffectiveLevel()
-                    logger.critical('wrapper script for job %s exit with code %d', str(j.getFQID('.')), ws[1])
-                    logger.critical('report this as a bug at https://github.com/ganga-devs/ganga/issues/')
-                    j.updateStatus('failed')
-            except OSError as x:
-                if x.errno != errno.ECHILD:
-                    logger.warning('cannot do waitpid for %d: %s', stripProxy(j.backend).wrapper_pid, str(x))
+            if state == FINISHED:
+                ws = (b.wrapper_pid, wrapper_status)
+            else:
+                # started by an earlier session
+                try:
+                    ws = os.waitpid(b.wrapper_pid, os.WNOHANG)
+                except OSError as x:
+                    if x.errno != errno.ECHILD:
+                        logger.warning('cannot do waitpid for %d: %s', b.wrapper_pid, str(x))
+                    ws = (0, 0)
+            if not Ganga.Utility.logic.implies(ws[0] != 0, ws[1] == 0):
+                # FIXME: for some strange reason the logger DOES NOT LOG (checked in python 2.3 and 2.5)
+                # print 'logger problem', logger.name
+                # print 'logger',logger.getEffectiveLevel()
+                logger.critical('wrapper script for job %s exit with code %d', str(j.getFQID('.')), ws[1])
+                logger.critical('report this as a bug at https://github.com/ganga-devs/ganga/issues/')
+                j.updateStatus('failed')
 
             # if the exit code was collected for the application get the exit
             # code back
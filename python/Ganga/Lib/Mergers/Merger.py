@@ -14,10 +14,12 @@ from Ganga.GPIDev.Adapters.IGangaFile import IGangaFile
 from Ganga.Utility.Config import ConfigError, getConfig
 from Ganga.Utility.Plugin import allPlugins
 from Ganga.Utility.logging import getLogger
-import commands
 import os
+import pipes
+import shutil
 import string
 import copy
+import tempfile
 
 logger = getLogger()
 
@@ -94,6 +96,9 @@ class TextMerger(IMerger):
     flag on the TextMerger object. In this case, the merged file
     will have a '.gz' appended to its filename.
 
+    The files are copied in blocks of [Mergers]chunk_size bytes so that
+    the memory used doesn't depend on their size.
+
     A summary of all the files merged will be created for each entry in files.
     This will be created when the merge of those files completes
     successfully. The name of this is the same as the output file, with the
@@ -130,7 +135,7 @@ class TextMerger(IMerger):
                 in_file = gzip.GzipFile(f)
 
             out_file.write('# Start of file %s #\n' % str(f))
-            out_file.write(in_file.read())
+            shutil.copyfileobj(in_file, out_file, getConfig('Mergers')['chunk_size'])
             out_file.write('\n')
 
             in_file.close()
@@ -188,6 +193,13 @@ class RootMerger(IMerger):
     If outputdir is not specified, the default location specfied
     in the [Mergers] section of the .gangarc file will be used.
 
+    More than [Mergers]hadd_fan_in files are merged as a tree: the files
+    are split into groups which are merged by [Mergers]merge_processes
+    hadd processes at once, the results of which are merged in turn.
+    The outputs of the subjobs are also merged in groups of
+    [Mergers]premerge_size as they complete, so that the merge once the
+    job has finished only has the partial results left to combine.
+
     """
 
     _category = 'postprocessor'
@@ -196,6 +208,8 @@ class RootMerger(IMerger):
     _schema.datadict['args'] = SimpleItem(defvalue=None, doc='Arguments to be passed to hadd.',
                                           typelist=[str, None])
 
+    premerge_supported = True
+
     def mergefiles(self, file_list, output_file):
 
         from Ganga.Utility.root import getrootprefix, checkrootprefix
@@ -219,22 +233,59 @@ class RootMerger(IMerger):
         if not default_arguments in merge_cmd:
             merge_cmd += ' %s ' % default_arguments
 
-        # add the list of files, output file first
-        arg_list = [output_file]
-        arg_list.extend(file_list)
-        merge_cmd += string.join(arg_list, ' ')
-
-        rc, out = commands.getstatusoutput(merge_cmd)
+        fan_in = getConfig('Mergers')['hadd_fan_in']
 
         log_file = '%s.hadd_output' % output_file
         with open(log_file, 'w') as log:
             log.write('# -- Hadd output -- #\n')
-            log.write('%s\n' % out)
 
-        if rc:
-            logger.error(out)
-            raise PostProcessException(
-                'The ROOT merge failed to complete. The command used was %s.' % merge_cmd)
+            tmpdir = None
+            try:
+                inputs = file_list
+                level = 0
+                while fan_in > 1 and len(inputs) > fan_in:
+                    if tmpdir is None:
+                        tmpdir = tempfile.mkdtemp(prefix='.hadd_', dir=os.path.dirname(output_file))
+                    outputs = []
+                    cmds = []
+                    for i in range(0, len(inputs), fan_in):
+                        group = inputs[i:i + fan_in]
+                        if len(group) == 1:
+                            outputs.append(group[0])
+                            continue
+                        outputs.append(os.path.join(tmpdir, 'level%d_%d.root' % (level, i // fan_in)))
+                        cmds.append(self._haddCommand(merge_cmd, group, outputs[-1]))
+                    self._runHadd(cmds, log)
+                    inputs = outputs
+                    level += 1
+
+                self._runHadd([self._haddCommand(merge_cmd, inputs, output_file)], log)
+            finally:
+                if tmpdir is not None:
+                    shutil.rmtree(tmpdir, ignore_errors=True)
+
+    @staticmethod
+    def _haddCommand(merge_cmd, file_list, output_file):
+        """Return the hadd command merging file_list into output_file"""
+        # add the list of files, output file first
+        arg_list = [output_file]
+        arg_list.extend(file_list)
+        return merge_cmd + string.join([pipes.quote(arg) for arg in arg_list], ' ')
+
+    @staticmethod
+    def _runHadd(cmds, log):
+        """Run the hadd commands, [Mergers]merge_processes of them at once, and write their output to the log"""
+        from Ganga.Utility.CommandEngine import CommandEngine
+
+        results = CommandEngine(getConfig('Mergers')['merge_processes']).run_all(cmds)
+        for result in results:
+            log.write('%s\n' % result.output)
+
+        for result in results:
+            if result.returncode:
+                logger.error(result.output)
+                raise PostProcessException(
+                    'The ROOT merge failed to complete. The command used was %s.' % result.cmd)
 
 
 class CustomMerger(IMerger):
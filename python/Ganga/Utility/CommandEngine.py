@@ -0,0 +1,212 @@
+##########################################################################
+# Ganga Project. http://cern.ch/ganga
+##########################################################################
+#
+# Engine running the shell commands of Ganga
+#
+# The output of a command is read straight from a pipe and its completion is
+# waited for by blocking on the pipe and on the child, never by polling. At
+# most [Shell]max_concurrent_commands commands run at once, the others wait
+# for a free slot. A command may be given a timeout after which it is sent
+# SIGTERM and then SIGKILL.
+#
+# Usage:
+#
+#     engine = getCommandEngine()
+#
+# Run a command and wait for it
+#
+#     result = engine.run('bjobs -a', timeout=60)
+#     result.returncode, result.output
+#
+# Start several commands and collect them later
+#
+#     results = [engine.start(cmd) for cmd in cmds]
+#     outputs = [r.wait().output for r in results]
+
+import os
+import signal
+import subprocess
+import threading
+
+import Ganga.Utility.Config
+import Ganga.Utility.logging
+
+logger = Ganga.Utility.logging.getLogger()
+config = Ganga.Utility.Config.getConfig('Shell')
+
+
+class CommandResult(object):
+    """
+    The outcome of a command run by the CommandEngine. The returncode is negative if the command was killed by a signal
+    and 255 if it couldn't be started
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.returncode = None
+        self.output = ''
+        self.timed_out = False
+        self._done = threading.Event()
+
+    def done(self):
+        """Return True once the command has finished"""
+        return self._done.isSet()
+
+    def wait(self):
+        """Wait for the command to finish and return this result"""
+        self._done.wait()
+        return self
+
+
+class CommandEngine(object):
+    """
+    Runs shell commands with their output captured through a pipe, at most max_concurrent of them at once
+    """
+
+    # Time given to a command between SIGTERM and SIGKILL once its timeout is reached
+    kill_grace = 5
+
+    def __init__(self, max_concurrent=None):
+        """
+        Args:
+            max_concurrent (int): The number of commands which may run at once, [Shell]max_concurrent_commands if None.
+                                  0 or less for no limit
+        """
+        self._max_concurrent = max_concurrent
+        self._cond = threading.Condition(threading.Lock())
+        self._running = 0
+        self.stats = {'started': 0, 'finished': 0, 'timed_out': 0, 'peak_running': 0}
+
+    def limit(self):
+        """Return the number of commands which may run at once, 0 for no limit"""
+        limit = self._max_concurrent
+        if limit is None:
+            limit = config['max_concurrent_commands']
+        return max(limit, 0)
+
+    def run(self, cmd, env=None, cwd=None, timeout=None, capture=True):
+        """
+        Run a command in /bin/sh and wait for it to finish, return its CommandResult
+        Args:
+            cmd (str): The command
+            env (dict): The environment of the command, the one of Ganga if None
+            cwd (str): The directory to run the command in
+            timeout (float): Seconds after which the command is killed, no limit if None
+            capture (bool): Capture stdout and stderr in the output of the result, otherwise they are inherited
+        """
+        result = CommandResult(cmd)
+        self._execute(result, env, cwd, timeout, capture)
+        return result
+
+    def start(self, cmd, env=None, cwd=None, timeout=None, capture=True):
+        """
+        Start a command in the background and return its CommandResult straight away, see run for the arguments. The
+        command waits for a free slot if max_concurrent commands are already running
+        """
+        result = CommandResult(cmd)
+        thread = threading.Thread(target=self._execute, args=(result, env, cwd, timeout, capture),
+                                  name='CommandEngine')
+        thread.setDaemon(True)
+        thread.start()
+        return result
+
+    def run_all(self, cmds, env=None, cwd=None, timeout=None):
+        """
+        Run several commands, as many at once as the limit allows, and return their CommandResults in the same order
+        Args:
+            cmds (list): The commands
+            env (dict): The environment of the commands
+            cwd (str): The directory to run the commands in
+            timeout (float): Seconds after which each command is killed
+        """
+        return [result.wait() for result in [self.start(cmd, env, cwd, timeout) for cmd in cmds]]
+
+    def getStats(self):
+        """Return the number of commands running and started, finished and timed out so far"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats['running'] = self._running
+            stats['limit'] = self.limit()
+            return stats
+
+    def _acquire(self):
+        with self._cond:
+            while self.limit() and self._running >= self.limit():
+                self._cond.wait()
+            self._running += 1
+            self.stats['started'] += 1
+            self.stats['peak_running'] = max(self.stats['peak_running'], self._running)
+
+    def _release(self, timed_out):
+        with self._cond:
+            self._running -= 1
+            self.stats['finished'] += 1
+            if timed_out:
+                self.stats['timed_out'] += 1
+            self._cond.notify()
+
+    def _execute(self, result, env, cwd, timeout, capture):
+        self._acquire()
+        timers = []
+        try:
+            logger.debug('Running shell command: %s' % result.cmd)
+            try:
+                if capture:
+                    # The command gets its own process group so that a timeout kills the whole pipeline, which would
+                    # otherwise keep the pipe open
+                    process = subprocess.Popen(['/bin/sh', '-c', result.cmd], stdout=subprocess.PIPE,
+                                               stderr=subprocess.STDOUT, env=env, cwd=cwd, close_fds=True,
+                                               preexec_fn=os.setpgrp)
+                else:
+                    process = subprocess.Popen(['/bin/sh', '-c', result.cmd], env=env, cwd=cwd)
+            except OSError as err:
+                logger.warning('Problem with shell command: %s, %s', err.errno, err.strerror)
+                result.returncode = 255
+                return
+
+            if timeout:
+                timers = [threading.Timer(timeout, self._timeout, (result, process, signal.SIGTERM, capture)),
+                          threading.Timer(timeout + self.kill_grace, self._timeout,
+                                          (result, process, signal.SIGKILL, capture))]
+                for timer in timers:
+                    timer.setDaemon(True)
+                    timer.start()
+
+            output = process.communicate()[0]
+            result.output = output if output is not None else ''
+            result.returncode = process.returncode
+        finally:
+            for timer in timers:
+                timer.cancel()
+            self._release(result.timed_out)
+            result._done.set()
+
+    def _timeout(self, result, process, sig, capture):
+        if process.returncode is not None:
+            return
+        if not result.timed_out:
+            logger.warning('Command interrupted - timeout reached: %s', result.cmd)
+        result.timed_out = True
+        logger.debug('killing process %d with signal %d', process.pid, sig)
+        try:
+            if capture:
+                os.killpg(process.pid, sig)
+            else:
+                os.kill(process.pid, sig)
+        except OSError:
+            # it has just finished
+            pass
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def getCommandEngine():
+    """Return the CommandEngine shared by Ganga"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = CommandEngine()
+    return _engine
@@ -9,6 +9,8 @@
 # Usage:
 #
 #
+# The commands are run by the CommandEngine, see CommandEngine.py
+#
 # Initialisation: The shell script is sourced and the environment is captured
 #
 #     shell = Shell('/afs/cern.ch/project/gd/LCG-share/sl3/etc/profile.d/grid_env.sh')
@@ -32,15 +34,12 @@
 #
 #     fullpath=shell.wrapper('lcg-cp')
 
-import errno
 import os
 import re
 import stat
 import tempfile
-import time
-import signal
-import subprocess
 
+from Ganga.Utility.CommandEngine import getCommandEngine
 from Ganga.Utility.execute import execute
 
 import Ganga.Utility.logging
@@ -159,77 +158,14 @@ class Shell(object):
         if not soutfile:
             soutfile = tempfile.NamedTemporaryFile(mode='w+t', suffix='.out', delete=False).name
 
-        logger.debug('Running shell command: %s' % cmd)
-        try:
-            t0 = time.time()
-            already_killed = False
-            timeout0 = timeout
-            launcher = ['/bin/sh', '-c']
-            args = ['%s > %s 2>&1' % (cmd, soutfile)]
-            command = launcher
-            for i in args:
-                command.append(i)
-            this_cwd = os.path.abspath(os.getcwd())
-            if not os.path.exists(this_cwd):
-                this_cwd = os.path.abspath(tempfile.gettempdir())
-            logger.debug("Using CWD: %s" % this_cwd)
-
-            #import traceback
-            # traceback.print_stack()
-
-            process = subprocess.Popen(command, env=self.env, cwd=this_cwd)
-            pid = process.pid
-            while True:
-                wpid, sts = os.waitpid(pid, os.WNOHANG)
-                if wpid != 0:
-                    if os.WIFSIGNALED(sts):
-                        rc = -os.WTERMSIG(sts)
-                        break
-                    elif os.WIFEXITED(sts):
-                        rc = os.WEXITSTATUS(sts)
-                        break
-                if timeout and time.time() - t0 > timeout:
-                    logger.warning(
-                            'Command interrupted - timeout %ss reached: %s', timeout0, cmd)
-                    if already_killed:
-                        sig = signal.SIGKILL
-                    else:
-                        sig = signal.SIGTERM
-                    logger.debug('killing process %d with signal %d', pid, sig)
-                    os.kill(pid, sig)
-                    t0 = time.time()
-                    # wait just 5 seconds before killing with SIGKILL
-                    timeout = 5
-                    already_killed = True
-                time.sleep(0.05)
-
-        except OSError as e:
-            if e.errno == 10:
-                rc = process.returncode
-                logger.debug("Process has already exitted which will throw a 10")
-                logger.debug("Exit status is: %s" % rc)
-            else:
-                logger.warning('Problem with shell command: %s, %s', e.errno, e.strerror)
-                rc = 255
+        rc, output, m = self._run(cmd, allowed_exit, timeout)
 
-        BYTES = 4096
-        if rc not in allowed_exit:
-            logger.warning('exit status [%d] of command %s', rc, cmd)
-            if mention_outputfile_on_errors:
-                logger.warning('full output is in file: %s', soutfile)
-            with open(soutfile) as sout_file:
-                logger.warning('<first %d bytes of output>\n%s', BYTES, sout_file.read(BYTES))
-            logger.warning('<end of first %d bytes of output>', BYTES)
-
-        # FIXME /bin/sh might have also other error messages
-        m = None
-        if rc != 0:
-            with open(soutfile) as sout_file:
-                m = re.search('command not found\n', sout_file.read())
-            if m:
-                logger.warning('command %s not found', cmd)
+        with open(soutfile, 'w') as sout_file:
+            sout_file.write(output)
+        if rc not in allowed_exit and mention_outputfile_on_errors:
+            logger.warning('full output is in file: %s', soutfile)
 
-        return rc, soutfile, m is None
+        return rc, soutfile, m
 
     def cmd1(self, cmd, allowed_exit=None, capture_stderr=False, timeout=None, python=False):
         """Executes an OS command and captures the stderr and stdout which are returned as a string
@@ -246,20 +182,38 @@ class Shell(object):
         if allowed_exit is None:
             allowed_exit = [0]
 
-        rc, outfile, m = self.cmd(cmd, None, allowed_exit, capture_stderr,
-                timeout, mention_outputfile_on_errors=False, python=python)
+        return self._run(cmd, allowed_exit, timeout)
+
+    def _run(self, cmd, allowed_exit, timeout):
+        """Run a command through the CommandEngine and return the rc, the output and False if the command was not found
+        Args:
+            cmd (str): command to be executed in a shell
+            allowed_exit (list): list of numerical rc which are deemed to be a success
+            timeout (int): length of time (sec) that a command is expected to have finished by
+        """
+
+        this_cwd = os.path.abspath(os.getcwd())
+        if not os.path.exists(this_cwd):
+            this_cwd = os.path.abspath(tempfile.gettempdir())
+        logger.debug("Using CWD: %s" % this_cwd)
+
+        result = getCommandEngine().run(cmd, env=self.env, cwd=this_cwd, timeout=timeout)
+        rc, output = result.returncode, result.output
+
+        BYTES = 4096
+        if rc not in allowed_exit:
+            logger.warning('exit status [%d] of command %s', rc, cmd)
+            logger.warning('<first %d bytes of output>\n%s', BYTES, output[:BYTES])
+            logger.warning('<end of first %d bytes of output>', BYTES)
 
-        from contextlib import closing
-        with closing(open(outfile)) as out_file:
-            output = out_file.read()
-        try:
-            os.remove(outfile)
-        except OSError as err:
-            if err.errno != errno.ENOENT:
-                logger.debug("Err removing shell output: %s" % str(err))
-                raise err
+        # FIXME /bin/sh might have also other error messages
+        m = None
+        if rc != 0:
+            m = re.search('command not found\n', output)
+            if m:
+                logger.warning('command %s not found', cmd)
 
-        return rc, output, m
+        return rc, output, m is None
 
     def system(self, cmd, allowed_exit=None, stderr_file=None):
         """Execute on OS command. Useful for interactive commands. Stdout and Stderr are not
@@ -280,13 +234,7 @@ class Shell(object):
         if stderr_file:
             cmd += " 2> %s" % stderr_file
 
-        try:
-            rc = subprocess.call(['/bin/sh', '-c', cmd], env=self.env)
-        except OSError as e:
-            logger.warning(
-                    'Problem with shell command: %s, %s', e.errno, e.strerror)
-            rc = 255
-        return rc
+        return getCommandEngine().run(cmd, env=self.env, capture=False).returncode
 
     def wrapper(self, cmd, preexecute=None):
         """Write wrapper script for command
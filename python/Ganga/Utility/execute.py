@@ -172,6 +172,40 @@ def update_thread(pipes, thread_output, output_key, require_output):
     return ev
 
 
+def process_stdout(stdout, shell, eval_includes=None):
+    """
+    Turn what a command printed into the object it stands for when the command didn't pass one back with output().
+    This is a pickle printed by the command or the repr of an object which can be eval'd with eval_includes, otherwise
+    the text itself
+    Args:
+        stdout (str): What the command printed
+        shell (bool): Whether the command was a shell command rather than python code
+        eval_includes (str): Code setting up the namespace to eval stdout in
+    """
+    try:
+        if stdout:
+            stdout = pickle.loads(stdout)
+    except pickle.UnpicklingError as err:
+        if not shell:
+            logger.error("Execute Err: %s", err)
+        else:
+            logger.debug("Execute Err: %s", err)
+        local_ns = {}
+        if isinstance(eval_includes, str):
+            try:
+                exec(eval_includes, {}, local_ns)
+            except:
+                logger.error("Failed to eval the env, can't eval stdout")
+                pass
+            try:
+                stdout = eval(stdout, {}, local_ns)
+            except Exception as err2:
+                logger.error("Err2: %s" % str(err2))
+                pass
+
+    return stdout
+
+
 def execute(command,
             timeout=None,
             env=None,
@@ -271,25 +305,4 @@ def execute(command,
         if pkl_output_key in thread_output:
             return thread_output[pkl_output_key]
 
-    try:
-        if stdout:
-            stdout = pickle.loads(stdout)
-    except pickle.UnpicklingError as err:
-        if not shell:
-            logger.error("Execute Err: %s", err)
-        else:
-            logger.debug("Execute Err: %s", err)
-        local_ns = {}
-        if isinstance(eval_includes, str):
-            try:
-                exec(eval_includes, {}, local_ns)
-            except:
-                logger.error("Failed to eval the env, can't eval stdout")
-                pass
-            try:
-                stdout = eval(stdout, {}, local_ns)
-            except Exception as err2:
-                logger.error("Err2: %s" % str(err2))
-                pass
-
-    return stdout
+    return process_stdout(stdout, shell, eval_includes)
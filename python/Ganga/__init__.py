@@ -133,6 +133,7 @@ conf_config.addOption('deleteUnusedShareDir', 'always',
                  'If set to ask the user is presented with a prompt asking whether Shared directories not associated with a persisted Ganga object should be deleted upon Ganga exit. If set to never, shared directories will not be deleted upon exit, even if they are not associated with a persisted Ganga object. If set to always (the default), then shared directories will always be deleted if not associated with a persisted Ganga object.')
 
 conf_config.addOption('autoGenerateJobWorkspace', False, 'Autogenerate workspace dirs for new jobs')
+conf_config.addOption('sandbox_cache', True, 'Pack each distinct input sandbox once into a cache in the workspace and hard-link it into every job which uses the same files')
 
 # add named template options
 conf_config.addOption('namedTemplates_ext', 'tpl',
@@ -169,13 +170,16 @@ ipython_config.addOption('args', "['-colors','LightBG', '-autocall','0', '-pprin
 
 # ------------------------------------------------
 # Shell
-makeConfig("Shell", "configuration parameters for internal Shell utility.")
+shell_config = makeConfig("Shell", "configuration parameters for internal Shell utility.")
+shell_config.addOption('max_concurrent_commands', 8,
+                       'The number of shell commands which may run at once, the others wait for one to finish. 0 for no limit')
 
 # ------------------------------------------------
 # Queues
 queues_config = makeConfig("Queues", "configuration section for the queues")
 queues_config.addOption('Timeout', None, 'default timeout for queue generated processes')
 queues_config.addOption('NumWorkerThreads', 5, 'default number of worker threads in the queues system')
+queues_config.addOption('NumSubmissionThreads', 5, 'number of worker threads preparing and submitting the subjobs of jobs with parallel_submit, kept apart from the monitoring threads')
 
 # ------------------------------------------------
 # MSGMS
@@ -233,6 +237,9 @@ poll_config.addOption('diskspace_poll_rate', 30, "The frequency in seconds for f
 poll_config.addOption('DiskSpaceChecker', "", "disk space checking callback. This function should return False when there is no disk space available, True otherwise")
 poll_config.addOption('max_shutdown_retries', 5, 'OBSOLETE: this option has no effect anymore')
 poll_config.addOption('numParallelJobs', 25, 'Number of Jobs to update the status for in parallel')
+poll_config.addOption('adaptive_poll_rate', True, 'Poll each backend as often as the status of its jobs changes: every base_poll_rate seconds after a change, backing off to the poll rate of the backend while nothing changes. If False every backend is polled in every monitoring step')
+poll_config.addOption('stale_job_polls', 10, 'Number of polls after which a job (or subjob) whose status has not changed is only polled every stale_job_poll_factor polls of its backend. 0 polls every job every time')
+poll_config.addOption('stale_job_poll_factor', 3, 'A job whose status has not changed for stale_job_polls polls is only polled once in this many polls of its backend')
 
 poll_config.addOption('forced_shutdown_policy', 'session_type',
                  'If there are remaining background activities at exit such as monitoring, output download Ganga will attempt to wait for the activities to complete. You may select if a user is prompted to answer if he wants to force shutdown ("interactive") or if the system waits on a timeout without questions ("timeout"). The default is "session_type" which will do interactive shutdown for CLI and timeout for scripts.')
@@ -293,6 +300,7 @@ root_config.addOption('version', '6.04.02', 'Version of ROOT')
 local_config = makeConfig('Local', 'parameters of the local backend (jobs in the background on localhost)')
 local_config.addOption('remove_workdir', True, 'remove automatically the local working directory when the job completed')
 local_config.addOption('location', None, 'The location where the workdir will be created. If None it defaults to the value of $TMPDIR')
+local_config.addOption('max_running', 0, 'Number of jobs which may run at once, the others stay submitted until one finishes. 0 means one per CPU, a negative number no limit')
 
 # ------------------------------------------------
 # LCG
@@ -421,6 +429,11 @@ gridsim_config.addOption(
 gridsim_config.addOption('status_time', 'random.uniform(1,5)',
                  'python expression which returns the time it takes (in seconds) to complete the status command (also for subjob in bulk emulation)')
 
+gridsim_config.addOption('master_status_time', 0.0,
+                 'python expression which returns the time it takes (in seconds) to query the status of each master job of a collection, on top of status_time')
+gridsim_config.addOption('single_status_time', 0.0,
+                 'python expression which returns the time it takes (in seconds) to query the status of each job or node, on top of status_time')
+
 gridsim_config.addOption('get_output_time', 'random.uniform(1,5)',
                  'python expression which returns the time it takes (in seconds) to complete the get_output command (also for subjob in bulk emulation)')
 
@@ -446,6 +459,10 @@ condor_config = makeConfig('Condor', 'Settings for Condor Batch system')
 
 condor_config.addOption('query_global_queues', True,
                  "Query global condor queues, i.e. use '-global' flag")
+condor_config.addOption('cluster_submit', True,
+                 "Submit the subjobs of a split job as the processes of a single Condor cluster")
+condor_config.addOption('query_history', True,
+                 "Look up the jobs no longer in the queue with condor_history, once per monitoring cycle")
 
 # ------------------------------------------------
 # LSF
@@ -486,6 +503,21 @@ def filefilter(fn):
 lsf_config.addOption('postexecute', tempstr, "String contains commands executing before submiting job to queue")
 lsf_config.addOption('jobnameopt', 'J', "String contains option name for name of job in batch system")
 lsf_config.addOption('timeout', 600, 'Timeout in seconds after which a job is declared killed if it has not touched its heartbeat file. Heartbeat is touched every 30s so do not set this below 120 or so.')
+lsf_config.addOption('array_submit', True, 'Submit the subjobs of a split job as job arrays rather than one at a time')
+lsf_config.addOption('array_opt', '-J "%(name)s[%(first)d-%(last)d]"',
+                 'Option of the submit command creating a job array of the elements first to last')
+lsf_config.addOption('array_max_size', 1000, 'Largest number of elements in one job array (MAX_JOB_ARRAY_SIZE)')
+lsf_config.addOption('array_index_name', 'LSB_JOBINDEX', 'Name of environment with index of the job array element')
+lsf_config.addOption('array_submit_res_pattern', '^Job <(?P<id>\d*)> is submitted to .*queue <(?P<queue>\S*)>',
+                 'String pattern for replay from the submit command of a job array')
+lsf_config.addOption('array_id_format', '%(id)s[%(index)d]', 'Batch id of the job array element index')
+lsf_config.addOption('query_monitoring', False, 'Query the batch system once per monitoring cycle for the state of all jobs, the status files of a job are only read once it has finished')
+lsf_config.addOption('query_str', 'bjobs -a -noheader -o "jobid jobindex stat"', 'String used to query the state of all jobs')
+lsf_config.addOption('query_max_age', 10, 'Time in seconds for which the result of query_str is used to monitor further jobs')
+lsf_config.addOption('query_states', {'PEND': 'queued', 'PSUSP': 'queued', 'WAIT': 'queued', 'RUN': 'running',
+                                      'USUSP': 'running', 'SSUSP': 'running', 'UNKWN': 'running',
+                                      'DONE': 'finished', 'EXIT': 'finished', 'ZOMBI': 'finished'},
+                 'Category (queued, running or finished) of each job state reported by query_str, the status files of jobs in other states are read')
 
 # ------------------------------------------------
 # PBS
@@ -529,6 +561,21 @@ pbs_config.addOption('postexecute', tempstr,
 pbs_config.addOption('jobnameopt', 'N', "String contains option name for name of job in batch system")
 pbs_config.addOption('timeout', 600,
                  'Timeout in seconds after which a job is declared killed if it has not touched its heartbeat file. Heartbeat is touched every 30s so do not set this below 120 or so.')
+pbs_config.addOption('array_submit', True, 'Submit the subjobs of a split job as job arrays rather than one at a time')
+pbs_config.addOption('array_opt', '-t %(first)d-%(last)d',
+                 'Option of the submit command creating a job array of the elements first to last, PBS Pro uses -J')
+pbs_config.addOption('array_max_size', 1000, 'Largest number of elements in one job array (max_job_array_size)')
+pbs_config.addOption('array_index_name', 'PBS_ARRAYID',
+                 'Name of environment with index of the job array element, PBS Pro uses PBS_ARRAY_INDEX')
+pbs_config.addOption('array_submit_res_pattern', '^(?P<id>\d*)\[\]\.pbs\s*',
+                 'String pattern for replay from the submit command of a job array')
+pbs_config.addOption('array_id_format', '%(id)s[%(index)d]', 'Batch id of the job array element index')
+pbs_config.addOption('query_monitoring', False, 'Query the batch system once per monitoring cycle for the state of all jobs, the status files of a job are only read once it has finished')
+pbs_config.addOption('query_str', 'qstat -x -t', 'String used to query the state of all jobs, the output is XML')
+pbs_config.addOption('query_max_age', 10, 'Time in seconds for which the result of query_str is used to monitor further jobs')
+pbs_config.addOption('query_states', {'Q': 'queued', 'H': 'queued', 'W': 'queued', 'T': 'queued', 'R': 'running',
+                                      'E': 'running', 'S': 'running', 'C': 'finished', 'F': 'finished'},
+                 'Category (queued, running or finished) of each job state reported by query_str, the status files of jobs in other states are read')
 
 # ------------------------------------------------
 # SGE
@@ -571,6 +618,20 @@ sge_config.addOption('preexecute', 'os.chdir(os.environ["TMPDIR"])\nos.environ["
 sge_config.addOption('postexecute', '', "String contains commands executing before submiting job to queue")
 sge_config.addOption('jobnameopt', 'N', "String contains option name for name of job in batch system")
 sge_config.addOption('timeout', 600, 'Timeout in seconds after which a job is declared killed if it has not touched its heartbeat file. Heartbeat is touched every 30s so do not set this below 120 or so.')
+sge_config.addOption('array_submit', True, 'Submit the subjobs of a split job as job arrays rather than one at a time')
+sge_config.addOption('array_opt', '-t %(first)d-%(last)d',
+                 'Option of the submit command creating a job array of the elements first to last')
+sge_config.addOption('array_max_size', 75000, 'Largest number of elements in one job array (max_aj_tasks)')
+sge_config.addOption('array_index_name', 'SGE_TASK_ID', 'Name of environment with index of the job array element')
+sge_config.addOption('array_submit_res_pattern', 'Your job-array (?P<id>\d+)\.',
+                 'String pattern for replay from the submit command of a job array')
+sge_config.addOption('array_id_format', '%(id)s.%(index)d', 'Batch id of the job array element index')
+sge_config.addOption('query_monitoring', False, 'Query the batch system once per monitoring cycle for the state of all jobs, the status files of a job are only read once it has finished')
+sge_config.addOption('query_str', 'qstat -xml', 'String used to query the state of all jobs, the output is XML')
+sge_config.addOption('query_max_age', 10, 'Time in seconds for which the result of query_str is used to monitor further jobs')
+sge_config.addOption('query_states', {'qw': 'queued', 'hqw': 'queued', 'Eqw': 'queued', 't': 'running', 'r': 'running',
+                                      'Rr': 'running', 's': 'running', 'dr': 'finished'},
+                 'Category (queued, running or finished) of each job state reported by query_str, the status files of jobs in other states are read')
 
 # ------------------------------------------------
 # Mergers
@@ -581,6 +642,10 @@ gangadir = getConfig('Configuration')['gangadir']
 merge_config.addOption('merge_output_dir', gangadir +
                  '/merge_results', "location of the merger's outputdir")
 merge_config.addOption('std_merge', 'TextMerger', 'Standard (default) merger')
+merge_config.addOption('chunk_size', 1048576, 'Size in bytes of the blocks in which TextMerger copies its input files')
+merge_config.addOption('hadd_fan_in', 16, 'Maximum number of files given to one hadd by RootMerger, more files are merged as a tree of hadd calls. 0 for a single hadd')
+merge_config.addOption('merge_processes', 4, 'Number of hadd processes RootMerger runs at once when merging a tree')
+merge_config.addOption('premerge_size', 16, 'Number of completed subjob outputs which are merged together while the rest of the job is still running, for the mergers which support it (RootMerger). 0 to merge everything once the job has finished')
 
 # ------------------------------------------------
 # Preparable
@@ -838,5 +903,13 @@ Executable/* = Ganga.Lib.MonitoringServices.DummyMS.DummyMS
 # ------------------------------------------------
 # Registry Dirty Monitoring Services (not related to actual Job Monitoring)
 reg_config = makeConfig('Registry','')
-reg_config.addOption('AutoFlusherWaitTime', 30, 'Time to wait between auto-flusher runs')
+reg_config.addOption('AutoFlusherWaitTime', 30, 'Time a modified object may wait before being written by the auto-flusher')
+reg_config.addOption('AutoFlushMaxBatch', 100, 'Maximum number of objects written per auto-flush batch, the auto-flusher runs straight away once this many objects are waiting')
 reg_config.addOption('EnableAutoFlush', True, 'Enable Registry auto-flushing feature')
+reg_config.addOption('SegmentCompactionThreshold', 0.5, 'Fraction of dead records above which a LocalSegment repository is compacted on shutdown')
+reg_config.addOption('TypedXMLValues', False, 'Write simple values (str, int, float, bool, None, lists and dicts of them) to the XML repository with type tags which are loaded without eval. Files are always read either way, but Ganga versions without support for these can not read files written with this enabled')
+reg_config.addOption('SubJobLoaderThreads', 4, 'Number of threads reading subjob files ahead of them being loaded, 0 disables prefetching')
+reg_config.addOption('SubJobPrefetchWindow', 100, 'Number of subjobs read ahead when iterating over the subjobs of a job')
+reg_config.addOption('MaxLoadedSubJobs', 10000, 'Maximum number of subjobs of a single job kept loaded in memory, the least recently used ones are flushed and dropped beyond this. 0 means no limit')
+reg_config.addOption('LogSubJobCacheStats', False, 'Log the subjob cache statistics (hits, loads, evictions) whenever subjobs are evicted from memory')
+reg_config.addOption('SubJobIndexJournalLimit', 1000, 'Number of subjob index updates appended to the subjobs.idx journal before the whole index is rewritten, raised to the number of subjobs for larger jobs')
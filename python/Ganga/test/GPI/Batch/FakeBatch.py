@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+
+import os
+import stat
+import sys
+
+# Stands in for bsub, qsub, bjobs and qstat. A submitted job, or every element of a submitted job array, is run in the
+# background and the jobs still running are reported by the query commands like the batch system would. The interpreter
+# running the tests goes into the shebang when they're installed
+fake_batch_script = '''import os
+import re
+import subprocess
+import sys
+import tempfile
+
+bindir = os.path.dirname(os.path.abspath(sys.argv[0]))
+system = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+with open(os.path.join(bindir, 'calls'), 'a') as log:
+    log.write(' '.join([system] + args) + '\\n')
+
+
+def alive(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as proc_stat:
+            return proc_stat.read().split(')')[-1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+def tracked_jobs(submit_command):
+    """Return the (id, index, running) of the jobs submitted by submit_command"""
+    jobs = []
+    if os.path.exists(os.path.join(bindir, 'jobs')):
+        with open(os.path.join(bindir, 'jobs')) as job_list:
+            for line in job_list:
+                command, job_id, index, pid = line.split()
+                if command == submit_command:
+                    jobs.append((job_id, index, alive(int(pid))))
+    return jobs
+
+
+if system in ('bjobs', 'qstat'):
+    if os.environ.get('GANGA_FAKE_QUERY_FAIL'):
+        print('%s: batch system not responding' % system)
+        sys.exit(1)
+    if system == 'bjobs':
+        for job_id, index, running in tracked_jobs('bsub'):
+            print('%s %s %s' % (job_id, index, 'RUN' if running else 'DONE'))
+    else:
+        print("<?xml version='1.0'?>")
+        print('<job_info><queue_info>')
+        for job_id, index, running in tracked_jobs('qsub'):
+            if running:
+                tasks = '<tasks>%s</tasks>' % index if index != '0' else ''
+                print('<job_list state="running"><JB_job_number>%s</JB_job_number><state>r</state>%s</job_list>'
+                      % (job_id, tasks))
+        print('</queue_info></job_info>')
+    sys.exit(0)
+
+if os.environ.get('GANGA_FAKE_BATCH_FAIL'):
+    print('%s: submission refused' % system)
+    sys.exit(1)
+
+elements = [None]
+if system == 'bsub' and '-J' in args:
+    name, first, last = re.match(r'(.*)\\[(\\d+)-(\\d+)\\]$', args[args.index('-J') + 1]).groups()
+    elements = range(int(first), int(last) + 1)
+if system == 'qsub' and '-t' in args:
+    first, last = args[args.index('-t') + 1].split('-')
+    elements = range(int(first), int(last) + 1)
+
+batch_id = os.getpid()
+stdout = open(args[args.index('-o') + 1], 'a')
+stderr = open(args[args.index('-e') + 1], 'a')
+job_list = open(os.path.join(bindir, 'jobs'), 'a')
+for index in elements:
+    env = dict(os.environ)
+    if system == 'bsub':
+        env.update({'LSB_BATCH_JID': str(batch_id) if index is None else '%d[%d]' % (batch_id, index),
+                    'LSB_QUEUE': 'fake'})
+        if index is not None:
+            env['LSB_JOBINDEX'] = str(index)
+    else:
+        env.update({'JOB_ID': str(batch_id), 'QUEUE': 'fake', 'TMPDIR': tempfile.mkdtemp()})
+        if index is not None:
+            env['SGE_TASK_ID'] = str(index)
+    process = subprocess.Popen([args[-1]], env=env, stdout=stdout, stderr=stderr, close_fds=True)
+    job_list.write('%s %d %d %d\\n' % (system, batch_id, index or 0, process.pid))
+job_list.close()
+
+if system == 'bsub':
+    print('Job <%d> is submitted to default queue <fake>.' % batch_id)
+elif elements == [None]:
+    print('Your job %d ("ganga") has been submitted' % batch_id)
+else:
+    print('Your job-array %d.%d-%d:1 ("ganga") has been submitted' % (batch_id, elements[0], elements[-1]))
+'''
+
+
+def install_fake_batch(bindir):
+    """Write the fake batch commands to bindir"""
+    for command in ('bsub', 'qsub', 'bjobs', 'qstat'):
+        path = os.path.join(bindir, command)
+        with open(path, 'w') as script:
+            script.write('#!%s\n' % sys.executable)
+            script.write(fake_batch_script)
+        os.chmod(path, stat.S_IRWXU)
+
+
+def fake_batch_calls(bindir, command):
+    """Return the arguments of every call to a fake batch command"""
+    calls_file = os.path.join(bindir, 'calls')
+    if not os.path.exists(calls_file):
+        return []
+    with open(calls_file) as calls:
+        return [line.split(' ', 1)[1].rstrip('\n') for line in calls if line.split(' ', 1)[0] == command]
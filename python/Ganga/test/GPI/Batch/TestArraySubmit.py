@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+from .FakeBatch import install_fake_batch, fake_batch_calls
+
+
+class TestArraySubmit(GangaUnitTest):
+
+    def setUp(self):
+        """Put the fake batch commands first on the PATH and split the SGE jobs into arrays of 2 elements"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('LSF', 'heartbeat_frequency', '1'),
+                      ('SGE', 'heartbeat_frequency', '1'), ('SGE', 'array_max_size', 2)]
+        super(TestArraySubmit, self).setUp(extra_opts=extra_opts)
+        self.bindir = tempfile.mkdtemp()
+        install_fake_batch(self.bindir)
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bindir + os.pathsep + self.old_path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        os.environ.pop('GANGA_FAKE_BATCH_FAIL', None)
+        shutil.rmtree(self.bindir)
+        super(TestArraySubmit, self).tearDown()
+
+    def submissions(self):
+        """Return the arguments of every call to the fake submit commands"""
+        return fake_batch_calls(self.bindir, 'bsub') + fake_batch_calls(self.bindir, 'qsub')
+
+    def check_output(self, j, args):
+        for sj, arg in zip(j.subjobs, args):
+            with open(os.path.join(sj.outputdir, 'stdout')) as stdout:
+                self.assertTrue(arg in stdout.read())
+
+    def test_a_LSFArray(self):
+        """ The subjobs are submitted as one LSF job array and each element runs its subjob"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, LSF
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        args = ['lsf_a', 'lsf_b', 'lsf_c']
+        j = Job(application=Executable(), backend=LSF(), splitter=ArgSplitter(args=[[a] for a in args]))
+        j.submit()
+
+        submissions = self.submissions()
+        self.assertEqual(len(submissions), 1)
+        self.assertTrue('[1-3]' in submissions[0])
+        array_id = j.subjobs[0].backend.id.split('[')[0]
+        self.assertEqual([sj.backend.id for sj in j.subjobs], ['%s[%d]' % (array_id, i) for i in range(1, 4)])
+
+        self.assertTrue(sleep_until_completed(j, 120))
+        self.check_output(j, args)
+        # The element id written by the job is the one given on submission
+        self.assertEqual([sj.backend.id for sj in j.subjobs], ['%s[%d]' % (array_id, i) for i in range(1, 4)])
+        self.assertEqual(j.subjobs[0].backend.actualqueue, 'fake')
+
+    def test_b_SGEArrays(self):
+        """ The subjobs are split into SGE job arrays no larger than array_max_size"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, SGE
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        args = ['sge_a', 'sge_b', 'sge_c']
+        j = Job(application=Executable(), backend=SGE(), splitter=ArgSplitter(args=[[a] for a in args]))
+        j.submit()
+
+        submissions = self.submissions()
+        self.assertEqual(len(submissions), 2)
+        self.assertTrue('-t 1-2' in submissions[0])
+        self.assertTrue('-t 3-3' in submissions[1])
+        ids = [sj.backend.id for sj in j.subjobs]
+        self.assertEqual([i.split('.')[1] for i in ids], ['1', '2', '3'])
+
+        self.assertTrue(sleep_until_completed(j, 120))
+        self.check_output(j, args)
+        self.assertEqual([sj.backend.id for sj in j.subjobs], ids)
+
+    def test_c_FailedArraySubmission(self):
+        """ A job array which can't be submitted leaves the job new"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, LSF
+        from Ganga.GPIDev.Lib.Job import JobError
+
+        os.environ['GANGA_FAKE_BATCH_FAIL'] = '1'
+        j = Job(application=Executable(), backend=LSF(), splitter=ArgSplitter(args=[['a'], ['b']]))
+        self.assertRaises(JobError, j.submit)
+        self.assertEqual(j.status, 'new')
+        self.assertEqual(len(self.submissions()), 1)
+
+    def test_d_SingleJob(self):
+        """ A job which isn't split is submitted on its own"""
+        from Ganga.GPI import Job, Executable, LSF
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        j = Job(application=Executable(args=['lsf_single']), backend=LSF())
+        j.submit()
+        self.assertTrue('-J' not in self.submissions()[0].split())
+        self.assertTrue(sleep_until_completed(j, 120))
+        with open(os.path.join(j.outputdir, 'stdout')) as stdout:
+            self.assertTrue('lsf_single' in stdout.read())
+
+    def test_e_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
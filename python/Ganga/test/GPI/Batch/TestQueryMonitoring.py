@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+from .FakeBatch import install_fake_batch, fake_batch_calls
+
+
+class TestQueryMonitoring(GangaUnitTest):
+
+    def setUp(self):
+        """Monitor LSF and SGE jobs by querying the fake batch commands put first on the PATH. With a timeout of 0 a
+        running job whose status files were read would be failed straight away"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False')]
+        for backend in ('LSF', 'SGE'):
+            extra_opts += [(backend, 'heartbeat_frequency', '1'), (backend, 'timeout', 0),
+                           (backend, 'query_monitoring', True), (backend, 'query_max_age', 0)]
+        super(TestQueryMonitoring, self).setUp(extra_opts=extra_opts)
+        self.bindir = tempfile.mkdtemp()
+        install_fake_batch(self.bindir)
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bindir + os.pathsep + self.old_path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        os.environ.pop('GANGA_FAKE_QUERY_FAIL', None)
+        shutil.rmtree(self.bindir)
+        super(TestQueryMonitoring, self).tearDown()
+
+    def check_query_monitoring(self, backend, running_state):
+        """Submit a split job and follow it through the states reported by the fake batch system"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, runMonitoring
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from GangaTest.Framework.utils import sleep_until_completed, sleep_until_state
+
+        j = Job(application=Executable(exe='sleep'), backend=backend, splitter=ArgSplitter(args=[['4'], ['4']]))
+        j.submit()
+        self.assertTrue(sleep_until_state(j, 60, 'running'))
+        runMonitoring()
+        self.assertTrue(running_state in [stripProxy(sj).backend.status for sj in j.subjobs])
+        self.assertTrue(sleep_until_completed(j, 120))
+        self.assertTrue(fake_batch_calls(self.bindir, 'bjobs' if running_state == 'RUN' else 'qstat'))
+
+    def test_a_LSFQuery(self):
+        """ The state of the LSF jobs is taken from bjobs"""
+        from Ganga.GPI import LSF
+        self.check_query_monitoring(LSF(), 'RUN')
+
+    def test_b_SGEQuery(self):
+        """ The state of the SGE jobs is taken from qstat, finished jobs are no longer listed"""
+        from Ganga.GPI import SGE
+        self.check_query_monitoring(SGE(), 'r')
+
+    def test_c_QueryFallback(self):
+        """ The status files are read when the batch system can't be queried"""
+        from Ganga.GPI import Job, Executable, LSF
+        from Ganga.Utility.Config import getConfig
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        getConfig('LSF').setSessionValue('timeout', 600)
+        os.environ['GANGA_FAKE_QUERY_FAIL'] = '1'
+        j = Job(application=Executable(exe='sleep', args=['2']), backend=LSF())
+        j.submit()
+        self.assertTrue(sleep_until_completed(j, 120))
+        self.assertEqual(stripProxy(j).backend.status, '')
+        self.assertTrue(fake_batch_calls(self.bindir, 'bjobs'))
+
+    def test_d_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+
+import os
+import stat
+import sys
+
+# Stands in for condor_submit, condor_q and condor_history. Each process queued by a submit description file is run in
+# the background in a scratch directory with its input files transferred, the output files are transferred back to
+# initialdir once it has finished. The query commands print the requested attributes of the processes still running
+# (condor_q) or finished (condor_history). The interpreter running the tests goes into the shebang when they're
+# installed
+fake_condor_script = '''import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+bindir = os.path.dirname(os.path.abspath(sys.argv[0]))
+command = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+if args[:1] != ['run']:
+    with open(os.path.join(bindir, 'calls'), 'a') as log:
+        log.write(' '.join([command] + args) + '\\n')
+
+
+def alive(pid):
+    try:
+        with open('/proc/%d/stat' % pid) as proc_stat:
+            return proc_stat.read().split(')')[-1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+def processes():
+    """Return the (cluster, proc, pid) of every process submitted"""
+    result = []
+    if os.path.exists(os.path.join(bindir, 'jobs')):
+        with open(os.path.join(bindir, 'jobs')) as job_list:
+            for line in job_list:
+                cluster, proc, pid = line.split()
+                result.append((int(cluster), int(proc), int(pid)))
+    return result
+
+
+def parse_description(path):
+    """Return the settings of each process queued by a submit description file"""
+    settings = {}
+    queued = []
+    with open(path) as cdf:
+        for line in cdf:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line == 'queue':
+                queued.append(dict((k, v) for k, v in settings.items() if v))
+                continue
+            key, value = line.split('=', 1)
+            settings[key.strip().lower()] = value.strip()
+    return queued
+
+
+def run(spec_path):
+    """Run a process like the condor starter would"""
+    with open(spec_path) as spec_file:
+        spec = json.load(spec_file)
+    initialdir = spec['initialdir']
+    scratch = tempfile.mkdtemp()
+    for path in [p for p in spec.get('transfer_input_files', '').split(',') if p]:
+        shutil.copy(path, scratch)
+    executable = os.path.join(scratch, os.path.basename(spec['executable']))
+    shutil.copy(spec['executable'], executable)
+    env = dict(os.environ)
+    for setting in [s for s in spec.get('environment', '').split(';') if s]:
+        key, value = setting.split('=', 1)
+        env[key] = value
+    with open(os.path.join(initialdir, spec['output']), 'w') as stdout:
+        with open(os.path.join(initialdir, spec['error']), 'w') as stderr:
+            subprocess.call([executable], cwd=scratch, env=env, stdout=stdout, stderr=stderr)
+    for name in [n for n in spec.get('transfer_output_files', '').split(',') if n]:
+        if os.path.exists(os.path.join(scratch, name)):
+            shutil.copy(os.path.join(scratch, name), initialdir)
+    with open(os.path.join(initialdir, spec['log']), 'a') as log:
+        log.write('005 (%s.%s.000) Job terminated.\\n' % (spec['cluster'], spec['proc']))
+    shutil.rmtree(scratch)
+
+
+if command == 'condor_q' and args[:1] == ['run']:
+    run(args[1])
+    sys.exit(0)
+
+if command in ('condor_q', 'condor_history'):
+    formats = []
+    clusters = set()
+    i = 0
+    while i < len(args):
+        if args[i] == '-format':
+            formats.append((args[i + 1].decode('string_escape'), args[i + 2]))
+            i += 3
+            continue
+        if args[i] == '-constraint':
+            clusters.update(int(c) for c in re.findall(r'ClusterId\\s*==\\s*(\\d+)', args[i + 1]))
+            i += 2
+            continue
+        if re.match(r'^\\d+(\\.\\d+)?$', args[i]):
+            clusters.add(int(args[i].split('.')[0]))
+        i += 1
+
+    listed = False
+    for cluster, proc, pid in processes():
+        if clusters and cluster not in clusters:
+            continue
+        running = alive(pid)
+        if running != (command == 'condor_q'):
+            continue
+        attributes = {'GlobalJobId': 'fakeschedd#%d.%d#1' % (cluster, proc), 'RemoteHost': 'slot1@fakehost',
+                      'JobStatus': 2 if running else 4, 'RemoteUserCpu': 0.0}
+        sys.stdout.write(''.join(fmt % attributes[attribute] for fmt, attribute in formats))
+        listed = True
+    if command == 'condor_q' and not listed:
+        sys.stdout.write('All queues are empty')
+    sys.exit(0)
+
+if os.environ.get('GANGA_FAKE_CONDOR_FAIL'):
+    print('ERROR: submission refused')
+    sys.exit(1)
+
+queued = parse_description(args[-1])
+cluster_file = os.path.join(bindir, 'cluster')
+cluster = int(open(cluster_file).read()) + 1 if os.path.exists(cluster_file) else 1
+with open(cluster_file, 'w') as cluster_out:
+    cluster_out.write(str(cluster))
+
+print('Submitting job(s)' + '.' * len(queued))
+job_list = open(os.path.join(bindir, 'jobs'), 'a')
+for proc, settings in enumerate(queued):
+    settings.update({'cluster': cluster, 'proc': proc})
+    spec_path = os.path.join(bindir, 'spec_%d_%d' % (cluster, proc))
+    with open(spec_path, 'w') as spec_file:
+        json.dump(settings, spec_file)
+    devnull = open(os.devnull, 'r+')
+    process = subprocess.Popen([sys.executable, os.path.join(bindir, 'condor_q'), 'run', spec_path], stdin=devnull,
+                               stdout=devnull, stderr=devnull, close_fds=True)
+    job_list.write('%d %d %d\\n' % (cluster, proc, process.pid))
+    print('')
+    print('** Proc %d.%d:' % (cluster, proc))
+    print('Iwd = "%s"' % settings['initialdir'])
+job_list.close()
+print('%d job(s) submitted to cluster %d.' % (len(queued), cluster))
+'''
+
+
+def install_fake_condor(bindir):
+    """Write the fake Condor commands to bindir"""
+    for command in ('condor_submit', 'condor_q', 'condor_history'):
+        path = os.path.join(bindir, command)
+        with open(path, 'w') as script:
+            script.write('#!%s\n' % sys.executable)
+            script.write(fake_condor_script)
+        os.chmod(path, stat.S_IRWXU)
+
+
+def fake_condor_calls(bindir, command):
+    """Return the arguments of every call to a fake Condor command"""
+    calls_file = os.path.join(bindir, 'calls')
+    if not os.path.exists(calls_file):
+        return []
+    with open(calls_file) as calls:
+        return [line.split(' ', 1)[1].rstrip('\n') for line in calls if line.split(' ', 1)[0] == command]
@@ -0,0 +1,96 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+from .FakeCondor import install_fake_condor, fake_condor_calls
+
+
+class TestClusterSubmit(GangaUnitTest):
+
+    def setUp(self):
+        """Put the fake Condor commands first on the PATH"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False')]
+        super(TestClusterSubmit, self).setUp(extra_opts=extra_opts)
+        self.bindir = tempfile.mkdtemp()
+        install_fake_condor(self.bindir)
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bindir + os.pathsep + self.old_path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        os.environ.pop('GANGA_FAKE_CONDOR_FAIL', None)
+        shutil.rmtree(self.bindir)
+        super(TestClusterSubmit, self).tearDown()
+
+    def test_a_ClusterSubmit(self):
+        """ The subjobs are submitted as the processes of one cluster and monitored with one query per cycle"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, Condor
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        args = ['condor_a', 'condor_b', 'condor_c']
+        j = Job(application=Executable(), backend=Condor(), splitter=ArgSplitter(args=[[a] for a in args]))
+        j.submit()
+
+        self.assertEqual(len(fake_condor_calls(self.bindir, 'condor_submit')), 1)
+        self.assertEqual([sj.backend.id for sj in j.subjobs], ['fakeschedd#1.%d#1' % i for i in range(3)])
+        # The global ids are looked up once for the whole cluster
+        self.assertEqual(len(fake_condor_calls(self.bindir, 'condor_q')), 1)
+
+        self.assertTrue(sleep_until_completed(j, 120))
+        # Every monitoring cycle asks for the whole cluster at once
+        queries = fake_condor_calls(self.bindir, 'condor_q')[1:]
+        self.assertTrue(queries)
+        for query in queries:
+            self.assertTrue(query.endswith(' 1'))
+        for sj, arg in zip(j.subjobs, args):
+            with open(os.path.join(sj.outputdir, 'stdout')) as stdout:
+                self.assertTrue(arg in stdout.read())
+            self.assertEqual(sj.backend.status, 'Completed')
+        self.assertTrue(fake_condor_calls(self.bindir, 'condor_history'))
+
+    def test_b_SingleJob(self):
+        """ A job which isn't split is submitted with its own description file"""
+        from Ganga.GPI import Job, Executable, Condor
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        j = Job(application=Executable(args=['condor_single']), backend=Condor())
+        j.submit()
+        self.assertTrue(fake_condor_calls(self.bindir, 'condor_submit')[0].endswith('__cdf__'))
+        self.assertEqual(j.backend.id, 'fakeschedd#1.0#1')
+        self.assertTrue(sleep_until_completed(j, 120))
+        with open(os.path.join(j.outputdir, 'stdout')) as stdout:
+            self.assertTrue('condor_single' in stdout.read())
+
+    def test_c_ResubmitSubJob(self):
+        """ A subjob submitted as part of a cluster can be resubmitted on its own"""
+        from Ganga.GPI import jobs
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        sj = jobs(0).subjobs(1)
+        sj.resubmit()
+        self.assertTrue(fake_condor_calls(self.bindir, 'condor_submit')[0].endswith('__cdf__'))
+        self.assertEqual(sj.backend.id, 'fakeschedd#1.0#1')
+        self.assertTrue(sleep_until_completed(sj, 120))
+        with open(os.path.join(sj.outputdir, 'stdout')) as stdout:
+            self.assertTrue('condor_b' in stdout.read())
+
+    def test_d_FailedClusterSubmission(self):
+        """ A cluster which can't be submitted leaves the job new"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, Condor
+        from Ganga.GPIDev.Lib.Job import JobError
+
+        os.environ['GANGA_FAKE_CONDOR_FAIL'] = '1'
+        j = Job(application=Executable(), backend=Condor(), splitter=ArgSplitter(args=[['a'], ['b']]))
+        self.assertRaises(JobError, j.submit)
+        self.assertEqual(j.status, 'new')
+        self.assertEqual(len(fake_condor_calls(self.bindir, 'condor_submit')), 1)
+
+    def test_e_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,61 @@
+from __future__ import absolute_import
+
+import json
+import os
+import tempfile
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+
+class TestGridSimulatorBenchmark(GangaUnitTest):
+
+    def setUp(self):
+        """Make the simulated grid fast enough for a test"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'),
+                      ('LCG', 'GLITE_ENABLE', False),
+                      ('GridSimulator', 'submit_time', 0.0),
+                      ('GridSimulator', 'status_time', 0.0),
+                      ('GridSimulator', 'get_output_time', 0.0),
+                      ('GridSimulator', 'job_id_resolved_time', 0.0),
+                      ('GridSimulator', 'job_finish_time', 'random.uniform(0.5,1.5)')]
+        super(TestGridSimulatorBenchmark, self).setUp(extra_opts=extra_opts)
+
+    def test_a_Benchmark(self):
+        """ The benchmark runs bulk jobs through the simulator until they are final and writes its numbers as JSON"""
+        from Ganga.GPI import jobs
+        from Ganga.Lib.LCG import Grid
+        from Ganga.Lib.LCG.GridSimulator import runBenchmark
+        from Ganga.Utility.Config import getConfig
+
+        submit = Grid.submit
+        outfile = os.path.join(tempfile.mkdtemp(), 'results.json')
+        results = runBenchmark(num_jobs=2, num_subjobs=3, outfile=outfile, poll_interval=0.2, timeout=60)
+
+        with open(outfile) as f:
+            self.assertEqual(json.load(f), json.loads(json.dumps(results)))
+
+        self.assertEqual(results['unfinished'], 0)
+        self.assertEqual(results['subjob_status'], {'completed': 6})
+        self.assertEqual(results['submit']['master_bulk_submit']['count'], 2)
+        self.assertEqual(results['submit']['job_submit']['count'], 2)
+        self.assertTrue(results['submit']['subjobs_per_second'] > 0)
+        self.assertTrue(results['monitoring']['master_bulk_updateMonitoringInformation']['count'] >= 1)
+        self.assertEqual(results['monitoring']['lag']['count'], 6)
+        self.assertTrue(results['monitoring']['lag']['min'] >= 0)
+        self.assertEqual(results['flush']['final']['count'], 2)
+        self.assertTrue(results['peak_rss'] > 0)
+
+        # the middleware, the LCG class and the configuration are given back and the jobs removed
+        self.assertTrue(Grid.submit == submit)
+        self.assertFalse(getConfig('LCG')['GLITE_ENABLE'])
+        self.assertEqual(len(jobs), 0)
+
+    def test_b_Summarise(self):
+        """ Series of times are summarised by their percentiles"""
+        from Ganga.Lib.LCG.GridSimulator.Benchmark import summarise
+
+        summary = summarise(range(1, 101))
+        self.assertEqual((summary['count'], summary['min'], summary['max']), (100, 1, 100))
+        self.assertEqual((summary['median'], summary['p90'], summary['p99']), (50, 90, 99))
+        self.assertEqual(summary['mean'], 50.5)
+        self.assertEqual(summarise([]), {'count': 0})
@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+
+import os
+import time
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_num_jobs = 3
+
+
+def get_repository():
+    """Return the repository of the jobs registry"""
+    from Ganga.Core.GangaRepository import getRegistry
+    return getRegistry('jobs').repository
+
+
+class TestMasterIndex(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job objects aren't destroyed between tests"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False')]
+        super(TestMasterIndex, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobConstruction(self):
+        """ First construct some jobs"""
+        from Ganga.GPI import Job, jobs
+        for i in range(global_num_jobs):
+            Job(name='job_%s' % i)
+        self.assertEqual(len(jobs), global_num_jobs)
+
+    def test_b_MasterIndexWritten(self):
+        """ The master index holds every job and is kept after startup"""
+        from Ganga.GPI import jobs
+        from Ganga.Core.GangaRepository.GangaRepositoryXML import _mtime_margin
+        self.assertEqual(len(jobs), global_num_jobs)
+        repo = get_repository()
+        entries, chunks = repo._master_index.read()
+        self.assertEqual(sorted(entries.keys()), range(global_num_jobs))
+
+        # Let the chunk directory age so its listing can be trusted when this session shuts down
+        time.sleep(_mtime_margin + 0.5)
+        repo.update_index()
+        self.assertTrue(all(state[0] is not None for state in repo._chunk_state.values()))
+
+    def test_c_UnchangedChunksNotListed(self):
+        """ The objects in unchanged chunk directories are loaded from the master index without looking at their files"""
+        from Ganga.GPI import jobs
+        repo = get_repository()
+        self.assertEqual(repo._unchanged_ids, set(range(global_num_jobs)))
+        self.assertEqual([j.name for j in jobs], ['job_%s' % i for i in range(global_num_jobs)])
+
+        # Loading the jobs has their index files rewritten on shutdown
+        self.assertEqual([j.application.exe for j in jobs], ['echo'] * global_num_jobs)
+        self.assertEqual(sorted(repo._fully_loaded.keys()), range(global_num_jobs))
+
+    def test_d_OwnIndexWritesTrusted(self):
+        """ The index files rewritten by the last session on shutdown don't make their chunk directory be listed again"""
+        from Ganga.GPI import jobs
+        repo = get_repository()
+        self.assertEqual(repo._unchanged_ids, set(range(global_num_jobs)))
+        self.assertEqual([j.name for j in jobs], ['job_%s' % i for i in range(global_num_jobs)])
+
+        # A record cut short makes the whole index unusable until it is written again on shutdown
+        with open(repo._master_index.filename, 'ab') as master:
+            master.write('U\x00\x00')
+        self.assertTrue(repo._master_index.read() is None)
+
+    def test_e_ExternalChanges(self):
+        """ The damaged master index was rewritten and external changes are seen"""
+        from Ganga.GPI import jobs
+        from Ganga.Core.GangaRepository.GangaRepositoryXML import rmrf
+        repo = get_repository()
+        self.assertEqual([j.name for j in jobs], ['job_%s' % i for i in range(global_num_jobs)])
+        self.assertEqual(sorted(repo._master_index.read()[0].keys()), range(global_num_jobs))
+
+        # Remove the last job as another session would
+        last_id = global_num_jobs - 1
+        rmrf(repo.get_idxfn(last_id))
+        rmrf(os.path.dirname(repo.get_fn(last_id)))
+        repo.update_index()
+        self.assertEqual(len(jobs), global_num_jobs - 1)
+
+    def test_f_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        self.assertEqual(len(jobs), global_num_jobs - 1)
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import time
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_subjob_num = 5
+
+
+class TestSQLiteRepository(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job object isn't destroyed between tests and use the SQLite repository"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Configuration', 'repositorytype', 'SQLite')]
+        super(TestSQLiteRepository, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobConstruction(self):
+        """ Construct a job with subjobs and a plain job in the SQLite repository"""
+        from Ganga.GPI import Job, jobs, ArgSplitter
+        j = Job()
+        self.assertEqual(len(jobs), 1)
+
+        j.splitter = ArgSplitter(args=[[i] for i in range(global_subjob_num)])
+        j.submit()
+
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        from GangaTest.Framework.utils import sleep_until_completed
+        sleep_until_completed(j, 60)
+
+        Job(name='other')
+        self.assertEqual(len(jobs), 2)
+
+    def test_b_SelectAndLazyLoad(self):
+        """ Selections are done in the database and the subjobs are only loaded on access"""
+        from Ganga.GPI import jobs, Executable, Localhost
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.Core.GangaRepository.GangaRepositorySQLite import SubJobSQLiteList
+
+        self.assertEqual(len(jobs), 2)
+        raw_j = stripProxy(jobs(0))
+        registry = raw_j._getRegistry()
+
+        self.assertEqual(jobs.select(status='completed').ids(), [0])
+        self.assertEqual(jobs.select(name='oth*').ids(), [1])
+        self.assertEqual(jobs.select(status='new', name='other').ids(), [1])
+        self.assertEqual(jobs.select(application=Executable).ids(), [0, 1])
+        self.assertEqual(jobs.select(backend=Localhost, status='comp*').ids(), [0])
+        self.assertFalse(registry.has_loaded(raw_j))
+
+        j = jobs(0)
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        self.assertTrue(isinstance(raw_j.subjobs, SubJobSQLiteList))
+        for i in range(len(j.subjobs)):
+            self.assertFalse(raw_j.subjobs.isLoaded(i))
+
+        self.assertEqual([str(a) for a in j.subjobs(1).application.args], ['1'])
+        self.assertTrue(raw_j.subjobs.isLoaded(1))
+        self.assertFalse(raw_j.subjobs.isLoaded(0))
+
+        # The job has completed so bypass the read-only protection of the GPI
+        raw_sj = stripProxy(j.subjobs(2))
+        raw_sj.setSchemaAttribute('name', 'changed')
+        raw_sj._setDirty()
+
+    def test_c_SubjobChangePersisted(self):
+        """ A change to a single subjob survives a restart and is stored in the subjob table"""
+        from Ganga.GPI import jobs
+        from Ganga.Core.GangaRepository import getRegistry
+        j = jobs(0)
+        self.assertEqual(j.subjobs(2).name, 'changed')
+        self.assertEqual(j.subjobs(3).name, '')
+
+        repo = getRegistry('jobs').repository
+        rows = repo._query("SELECT sub_id, status FROM subjobs WHERE master_id=0 ORDER BY sub_id")
+        self.assertEqual(rows, [(i, 'completed') for i in range(global_subjob_num)])
+
+    def test_d_ForeignLocks(self):
+        """ Ids locked by a live session can't be locked, the locks of dead sessions are reaped"""
+        from Ganga.Core.GangaRepository import getRegistry
+        repo = getRegistry('jobs').repository
+
+        with repo._transaction() as con:
+            con.execute("INSERT INTO sessions (session, info, heartbeat) VALUES ('other', 'other session', ?)", (time.time(),))
+            con.execute("INSERT INTO locks (id, session) VALUES (10, 'other')")
+        self.assertEqual(repo.lock([10, 11]), [11])
+        self.assertEqual(repo.get_lock_session(10), 'other session')
+        self.assertEqual(repo.get_other_sessions(), ['other session'])
+        self.assertTrue(repo.make_new_ids(1)[0] > 11)
+
+        with repo._transaction() as con:
+            con.execute("UPDATE sessions SET heartbeat=0 WHERE session='other'")
+        self.assertEqual(repo.get_other_sessions(), [])
+        self.assertTrue(repo.reap_locks())
+        self.assertEqual(repo.get_lock_session(10), None)
+        self.assertEqual(repo.lock([10]), [10])
+
+    def test_e_JobRemoval(self):
+        """ Remove the jobs and check the database no longer holds them"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
+
+        from Ganga.Core.GangaRepository import getRegistry
+        repo = getRegistry('jobs').repository
+        self.assertEqual(repo._query("SELECT COUNT(*) FROM objects"), [(0,)])
+        self.assertEqual(repo._query("SELECT COUNT(*) FROM subjobs"), [(0,)])
@@ -0,0 +1,68 @@
+from __future__ import absolute_import
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_subjob_num = 5
+
+
+class TestSegmentRepository(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job object isn't destroyed between tests and use the single file repository"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Configuration', 'repositorytype', 'LocalSegment')]
+        super(TestSegmentRepository, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobConstruction(self):
+        """ Construct a job with subjobs in the segment repository"""
+        from Ganga.GPI import Job, jobs, ArgSplitter
+        j = Job()
+        self.assertEqual(len(jobs), 1)
+
+        j.splitter = ArgSplitter(args=[[i] for i in range(global_subjob_num)])
+        j.submit()
+
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        from GangaTest.Framework.utils import sleep_until_completed
+        sleep_until_completed(j, 60)
+
+    def test_b_SubjobsLazyLoaded(self):
+        """ The job and its subjobs come back from the segment and are only loaded on access"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.Core.GangaRepository.GangaRepositorySegment import SubJobSegmentList
+
+        self.assertEqual(len(jobs), 1)
+        j = jobs(0)
+        raw_j = stripProxy(j)
+        self.assertFalse(raw_j._getRegistry().has_loaded(raw_j))
+
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        self.assertTrue(isinstance(raw_j.subjobs, SubJobSegmentList))
+        for i in range(len(j.subjobs)):
+            self.assertFalse(raw_j.subjobs.isLoaded(i))
+
+        self.assertEqual([str(a) for a in j.subjobs(1).application.args], ['1'])
+        self.assertTrue(raw_j.subjobs.isLoaded(1))
+        self.assertFalse(raw_j.subjobs.isLoaded(0))
+
+        # The job has completed so bypass the read-only protection of the GPI
+        raw_sj = stripProxy(j.subjobs(2))
+        raw_sj.setSchemaAttribute('name', 'changed')
+        raw_sj._setDirty()
+
+    def test_c_SubjobChangePersisted(self):
+        """ A change to a single subjob survives a restart"""
+        from Ganga.GPI import jobs
+        j = jobs(0)
+        self.assertEqual(j.subjobs(2).name, 'changed')
+        self.assertEqual(j.subjobs(3).name, '')
+
+    def test_d_JobRemoval(self):
+        """ Remove the job and check the segment no longer holds it"""
+        from Ganga.GPI import jobs
+        jobs(0).remove()
+        self.assertEqual(len(jobs), 0)
+
+        from Ganga.Core.GangaRepository import getRegistry
+        repo = getRegistry('jobs').repository
+        self.assertEqual(repo.store.ids(), [])
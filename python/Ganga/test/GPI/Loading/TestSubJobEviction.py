@@ -0,0 +1,77 @@
+from __future__ import absolute_import
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_subjob_num = 10
+global_budget = 3
+
+
+class TestSubJobEviction(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job object isn't destroyed between tests and only keep a few subjobs in memory"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Registry', 'MaxLoadedSubJobs', global_budget)]
+        super(TestSubJobEviction, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobConstruction(self):
+        """ First construct the Job object with subjobs"""
+        from Ganga.GPI import Job, jobs, ArgSplitter
+        j = Job()
+        self.assertEqual(len(jobs), 1)
+
+        j.splitter = ArgSplitter(args=[[i] for i in range(global_subjob_num)])
+        j.submit()
+
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        from GangaTest.Framework.utils import sleep_until_completed
+        sleep_until_completed(j, 60)
+
+    def test_b_LoadedSubjobsBounded(self):
+        """ Iterating over all subjobs keeps at most MaxLoadedSubJobs of them in memory"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        args = [str(sj.application.args[0]) for sj in raw_sjs]
+        self.assertEqual(args, [str(i) for i in range(global_subjob_num)])
+
+        loaded = [i for i in range(global_subjob_num) if raw_sjs.isLoaded(i)]
+        self.assertTrue(len(loaded) <= global_budget)
+        self.assertTrue(raw_sjs.isLoaded(global_subjob_num - 1))
+        self.assertTrue(raw_sjs.getCacheStats()['evicted'] >= global_subjob_num - global_budget)
+
+        # The statuses of the evicted subjobs come from the index without loading them
+        self.assertEqual(raw_sjs.getAllSJStatus(), ['completed'] * global_subjob_num)
+        self.assertEqual([i for i in range(global_subjob_num) if raw_sjs.isLoaded(i)], loaded)
+
+    def test_c_DirtySubjobFlushedOnEviction(self):
+        """ A modified subjob is written out before being dropped and a referenced one isn't loaded twice"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        # The job has completed so bypass the read-only protection of the GPI
+        raw_sj = raw_sjs[0]
+        raw_sj.setSchemaAttribute('name', 'changed')
+        raw_sj._setDirty()
+
+        for i in range(1, global_subjob_num):
+            raw_sjs[i]
+        self.assertFalse(raw_sjs.isLoaded(0))
+        self.assertFalse(raw_sj._dirty)
+        self.assertTrue(raw_sjs.getCacheStats()['flushed'] >= 1)
+
+        self.assertTrue(raw_sjs[0] is raw_sj)
+        self.assertTrue(raw_sjs.getCacheStats()['revived'] >= 1)
+
+    def test_d_ChangePersisted(self):
+        """ The change made to the evicted subjob survives a restart"""
+        from Ganga.GPI import jobs
+        self.assertEqual(jobs(0).subjobs(0).name, 'changed')
+        self.assertEqual(jobs(0).subjobs(1).name, '')
+
+    def test_e_JobRemoval(self):
+        """ Remove the job"""
+        from Ganga.GPI import jobs
+        jobs(0).remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,168 @@
+from __future__ import absolute_import
+
+from os import path
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_subjob_num = 10
+
+
+def read_journal(raw_sjs):
+    """Return the updates held by each record in the subjob index journal"""
+    from Ganga.Core.GangaRepository.PickleStreamer import from_file
+    records = []
+    with open(raw_sjs._getIndexJournal(), 'rb') as journal_obj:
+        while True:
+            try:
+                records.append(from_file(journal_obj)[0][1])
+            except EOFError:
+                return records
+
+
+class TestSubJobIndexJournal(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job object isn't destroyed between tests and compact the journal early"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Registry', 'SubJobIndexJournalLimit', 1)]
+        super(TestSubJobIndexJournal, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobConstruction(self):
+        """ First construct the Job object with subjobs"""
+        from Ganga.GPI import Job, jobs, ArgSplitter
+        j = Job()
+        self.assertEqual(len(jobs), 1)
+
+        j.splitter = ArgSplitter(args=[[i] for i in range(global_subjob_num)])
+        j.submit()
+
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        from GangaTest.Framework.utils import sleep_until_completed
+        sleep_until_completed(j, 60)
+
+    def test_b_FlushAppendsToJournal(self):
+        """ Flushing a single modified subjob only appends its index to the journal"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        index_file = path.join(raw_sjs._jobDirectory, raw_sjs._subjob_master_index_name)
+        self.assertTrue(path.isfile(index_file))
+        if path.isfile(raw_sjs._getIndexJournal()):
+            raw_sjs._replayIndexJournal()
+            raw_sjs.write_subJobIndex(updated=range(global_subjob_num))
+        self.assertFalse(path.isfile(raw_sjs._getIndexJournal()))
+        snapshot_mtime = path.getmtime(index_file)
+
+        # The job has completed so bypass the read-only protection of the GPI
+        raw_sj = raw_sjs[3]
+        raw_sj.setSchemaAttribute('name', 'changed')
+        raw_sj._setDirty()
+        raw_sjs.flush()
+
+        records = read_journal(raw_sjs)
+        self.assertEqual([sorted(r.keys()) for r in records], [[3]])
+        self.assertEqual(records[0][3]['name'], 'changed')
+        self.assertEqual(path.getmtime(index_file), snapshot_mtime)
+
+    def test_c_JournalReplayed(self):
+        """ The journal is applied on top of the snapshot when the index is loaded"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.Core.GangaRepository.SubJobXMLList import SubJobXMLList
+
+        raw_j = stripProxy(jobs(0))
+        raw_sjs = raw_j.subjobs
+        self.assertEqual(raw_sjs.getCachedData(3)['name'], 'changed')
+        self.assertFalse(raw_sjs.isLoaded(3))
+        self.assertEqual(raw_sjs._journal_length, 1)
+
+        # A record cut short is ignored and forces the next write to compact the journal
+        with open(raw_sjs._getIndexJournal(), 'ab') as journal_obj:
+            journal_obj.write('(dp0\nI4\n')
+        reloaded = SubJobXMLList(raw_sjs._jobDirectory, raw_j._getRegistry(), 'data', False, parent=raw_j)
+        self.assertEqual(reloaded.getCachedData(3)['name'], 'changed')
+        self.assertEqual(reloaded._journal_length, -1)
+
+        reloaded.write_subJobIndex(updated=[])
+        self.assertFalse(path.isfile(raw_sjs._getIndexJournal()))
+        self.assertEqual(reloaded._journal_length, 0)
+
+    def test_d_JournalCompacted(self):
+        """ Once the journal holds more updates than there are subjobs it is folded into the snapshot"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        self.assertEqual(raw_sjs.getCachedData(3)['name'], 'changed')
+
+        for i in range(global_subjob_num):
+            raw_sjs[i].setSchemaAttribute('name', 'again')
+            raw_sjs[i]._setDirty()
+            raw_sjs.flush()
+            if i < global_subjob_num - 1:
+                self.assertEqual(len(read_journal(raw_sjs)), i + 1)
+        raw_sjs[0]._setDirty()
+        raw_sjs.flush()
+        self.assertFalse(path.isfile(raw_sjs._getIndexJournal()))
+
+    def test_e_CompactedIndexLoaded(self):
+        """ The compacted snapshot holds every update"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        self.assertEqual([d['name'] for d in raw_sjs.getAllCachedData()], ['again'] * global_subjob_num)
+        self.assertEqual([i for i in range(global_subjob_num) if raw_sjs.isLoaded(i)], [])
+
+    def test_f_MissingEntriesIndexed(self):
+        """ Subjobs without an index entry when the index is loaded are indexed even when the updated subjobs already had one"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.Core.GangaRepository.SubJobXMLList import SubJobXMLList
+
+        raw_j = stripProxy(jobs(0))
+        raw_sjs = raw_j.subjobs
+        del raw_sjs._subjobIndexData[5]
+        del raw_sjs._subjobIndexData[6]
+        raw_sjs._SubJobXMLList__writeIndexSnapshot()
+
+        reloaded = SubJobXMLList(raw_sjs._jobDirectory, raw_j._getRegistry(), 'data', False, parent=raw_j)
+        self.assertEqual(reloaded._unindexed, set([5, 6]))
+        reloaded.write_subJobIndex(updated=[0, 1])
+        self.assertEqual(sorted(reloaded._subjobIndexData.keys()), range(global_subjob_num))
+        self.assertEqual(reloaded._subjobIndexData[5]['name'], 'again')
+        self.assertEqual(reloaded._unindexed, set())
+
+    def test_g_StaleJournalIgnored(self):
+        """ Journal records left behind by a crash between writing a snapshot and dropping the journal aren't replayed"""
+        import shutil
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.Core.GangaRepository.SubJobXMLList import SubJobXMLList
+
+        raw_j = stripProxy(jobs(0))
+        raw_sjs = raw_j.subjobs
+        raw_sjs[2].setSchemaAttribute('name', 'journalled')
+        raw_sjs[2]._setDirty()
+        raw_sjs.flush()
+        journal_file = raw_sjs._getIndexJournal()
+        self.assertEqual(read_journal(raw_sjs)[-1][2]['name'], 'journalled')
+        shutil.copy(journal_file, journal_file + '.crashed')
+
+        raw_sjs[2].setSchemaAttribute('name', 'snapshotted')
+        raw_sjs._subjobIndexData[2] = raw_j._getRegistry().getIndexCache(raw_sjs[2])
+        raw_sjs._SubJobXMLList__writeIndexSnapshot()
+        self.assertFalse(path.isfile(journal_file))
+        shutil.move(journal_file + '.crashed', journal_file)
+
+        reloaded = SubJobXMLList(raw_sjs._jobDirectory, raw_j._getRegistry(), 'data', False, parent=raw_j)
+        self.assertEqual(reloaded.getCachedData(2)['name'], 'snapshotted')
+        self.assertEqual(reloaded._journal_length, -1)
+        reloaded.write_subJobIndex(updated=[])
+        self.assertFalse(path.isfile(journal_file))
+
+    def test_h_JobRemoval(self):
+        """ Remove the job"""
+        from Ganga.GPI import jobs
+        jobs(0).remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,113 @@
+from __future__ import absolute_import
+
+import threading
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_subjob_num = 10
+global_window = 4
+
+
+class TestSubJobPrefetch(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job object isn't destroyed between tests and use a small prefetch window"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Registry', 'SubJobPrefetchWindow', global_window)]
+        super(TestSubJobPrefetch, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobConstruction(self):
+        """ First construct the Job object with subjobs"""
+        from Ganga.GPI import Job, jobs, ArgSplitter
+        j = Job()
+        self.assertEqual(len(jobs), 1)
+
+        j.splitter = ArgSplitter(args=[[i] for i in range(global_subjob_num)])
+        j.submit()
+
+        self.assertEqual(len(j.subjobs), global_subjob_num)
+        from GangaTest.Framework.utils import sleep_until_completed
+        sleep_until_completed(j, 60)
+
+    def test_b_IterationPrefetches(self):
+        """ Iterating over the subjobs reads the next window of subjobs ahead"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        sj_iter = iter(raw_sjs)
+        first = next(sj_iter)
+        self.assertEqual(str(first.application.args[0]), '0')
+        self.assertTrue(raw_sjs.isLoaded(0))
+        self.assertEqual(sorted(raw_sjs._prefetched.keys()), range(1, global_window))
+        self.assertFalse(raw_sjs.isLoaded(1))
+
+        args = [str(sj.application.args[0]) for sj in sj_iter]
+        self.assertEqual(args, [str(i) for i in range(1, global_subjob_num)])
+        self.assertEqual(raw_sjs._prefetched, {})
+
+    def test_c_LoadRange(self):
+        """ load_range loads exactly the requested subjobs"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        loaded = raw_sjs.load_range(2, 6)
+        self.assertEqual([str(sj.application.args[0]) for sj in loaded], ['2', '3', '4', '5'])
+        self.assertEqual([i for i in range(global_subjob_num) if raw_sjs.isLoaded(i)], [2, 3, 4, 5])
+        self.assertEqual(len(raw_sjs.load_range(8, 100)), 2)
+        self.assertEqual(raw_sjs._prefetched, {})
+
+    def test_d_ConcurrentLoads(self):
+        """ Concurrent requests for the same subjob get the same object"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        raw_sjs.prefetch(range(global_subjob_num))
+        results = []
+
+        def load():
+            results.append([raw_sjs[i] for i in range(global_subjob_num)])
+
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for result in results[1:]:
+            for a, b in zip(results[0], result):
+                self.assertTrue(a is b)
+
+    def test_e_AbandonedPrefetch(self):
+        """ Files read ahead which are never parsed are dropped, oldest first"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_sjs = stripProxy(jobs(0)).subjobs
+        raw_sjs._reset_cachedJobs({})
+        for i in range(global_subjob_num):
+            raw_sjs.prefetch([i])
+        self.assertEqual(list(raw_sjs._prefetched.keys()), range(global_subjob_num - 2 * global_window, global_subjob_num))
+
+        self.assertEqual(len(raw_sjs.load_range(0, global_subjob_num)), global_subjob_num)
+        self.assertEqual(raw_sjs._prefetched, {})
+
+    def test_f_ReaderThreadsStop(self):
+        """ Stopping the reader threads wakes them up and they exit"""
+        from Ganga.Core.GangaRepository.SubJobXMLList import SubJobReaderPool
+
+        pool = SubJobReaderPool(2)
+        self.assertTrue(pool.alive())
+        for t in pool._threads:
+            t.stop()
+        for t in pool._threads:
+            t.join(5)
+            self.assertFalse(t.isAlive())
+        self.assertFalse(pool.alive())
+
+    def test_g_JobRemoval(self):
+        """ Remove the job"""
+        from Ganga.GPI import jobs
+        jobs(0).remove()
+        self.assertEqual(len(jobs), 0)
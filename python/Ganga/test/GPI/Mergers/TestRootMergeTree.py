@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+
+import os
+import stat
+import sys
+import tempfile
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+from Ganga.testlib.monitoring import run_until_completed
+
+# Stands in for hadd, the "ROOT files" hold a number and merging them adds the numbers up. The number of files given
+# to each call is recorded in the calls file next to it. It's run by the interpreter running the tests
+fake_hadd = '''import os
+import sys
+args = [a for a in sys.argv[1:] if not a.startswith('-')]
+with open(os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), 'calls'), 'a') as log:
+    log.write('%d\\n' % (len(args) - 1))
+total = 0
+for path in args[1:]:
+    with open(path) as f:
+        total += int(f.read())
+with open(args[0], 'w') as f:
+    f.write('%d\\n' % total)
+print('hadd Target file: %s' % args[0])
+'''
+
+
+def _write_script(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.chmod(path, stat.S_IRWXU)
+
+
+class TestRootMergeTree(GangaUnitTest):
+
+    def setUp(self):
+        """Use a fake ROOT installation whose hadd adds up numbers, merging at most 3 files at once"""
+        self.rootsys = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.rootsys, 'bin'))
+        _write_script(os.path.join(self.rootsys, 'bin', 'hadd'), '#!%s\n' % sys.executable + fake_hadd)
+        _write_script(os.path.join(self.rootsys, 'bin', 'root-config'), '#!/bin/sh\necho 6.04/02\n')
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('ROOT', 'path', self.rootsys),
+                      ('Mergers', 'hadd_fan_in', 3), ('Mergers', 'premerge_size', 2)]
+        super(TestRootMergeTree, self).setUp(extra_opts=extra_opts)
+
+    def hadd_calls(self):
+        calls_file = os.path.join(self.rootsys, 'bin', 'calls')
+        if not os.path.exists(calls_file):
+            return []
+        with open(calls_file) as calls:
+            return [int(line) for line in calls]
+
+    def test_a_PremergeSubjobs(self):
+        """ The outputs of the subjobs are pre-merged as they complete and the partial results merged at the end"""
+        from Ganga.GPI import Job, Executable, Local, LocalFile, ArgSplitter, RootMerger
+
+        j = Job(application=Executable(exe='sh'), backend=Local())
+        j.splitter = ArgSplitter(args=[['-c', 'echo %d > hist.root' % i] for i in range(7)])
+        j.outputfiles = [LocalFile('hist.root')]
+        j.postprocessors = RootMerger(files=['hist.root'])
+        j.submit()
+
+        run_until_completed(j, timeout=120)
+        self.assertEqual(j.status, 'completed')
+        with open(os.path.join(j.outputdir, 'hist.root')) as merged:
+            self.assertEqual(int(merged.read()), sum(range(7)))
+
+        calls = self.hadd_calls()
+        # three pairs are pre-merged, the final merge of the three partial results and the last output is a tree
+        self.assertEqual(calls.count(2), 4)
+        self.assertEqual(max(calls), 3)
+        partials = os.listdir(os.path.join(j.outputdir, '.merge_partials'))
+        self.assertFalse([p for p in partials if p.startswith('partial')])
+
+    def test_b_MergeTree(self):
+        """ A merge of more files than the fan-in is done as a tree of hadd calls"""
+        from Ganga.GPI import jobs, RootMerger
+
+        outputdir = tempfile.mkdtemp()
+        RootMerger(files=['hist.root']).merge(jobs(0), outputdir=outputdir)
+        with open(os.path.join(outputdir, 'hist.root')) as merged:
+            self.assertEqual(int(merged.read()), sum(range(7)))
+        self.assertEqual(self.hadd_calls(), [3, 3, 3])
+
+    def test_c_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
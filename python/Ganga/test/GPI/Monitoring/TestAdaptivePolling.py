@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_num_jobs = 2
+
+
+class TestAdaptivePolling(GangaUnitTest):
+
+    def setUp(self):
+        """Poll often and mark jobs stale quickly so that a short job is skipped by some polls"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('PollThread', 'base_poll_rate', 1),
+                      ('PollThread', 'Local', 2), ('PollThread', 'stale_job_polls', 1),
+                      ('PollThread', 'stale_job_poll_factor', 2)]
+        super(TestAdaptivePolling, self).setUp(extra_opts=extra_opts)
+
+    def test_a_JobsPolledAdaptively(self):
+        """ Jobs which keep their status are skipped by some polls but still complete"""
+        from Ganga.GPI import Job, Executable, enableMonitoring
+        from Ganga.Core import monitoring_component
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        # Requested monitoring steps poll every job so let the monitoring loop run by itself
+        enableMonitoring()
+        js = []
+        for _ in range(global_num_jobs):
+            j = Job(application=Executable(exe='sleep', args=['8']))
+            j.submit()
+            js.append(j)
+        for j in js:
+            self.assertTrue(sleep_until_completed(j, 120))
+
+        stats = monitoring_component.getPollStats()['Local']
+        self.assertTrue(stats['polls'] > 0)
+        self.assertTrue(stats['changed_polls'] > 0)
+        self.assertTrue(stats['skipped'] > 0)
+        self.assertTrue(1 <= stats['interval'] <= 2)
+
+    def test_b_SubJobsPolledAdaptively(self):
+        """ Subjobs which keep their status are skipped by some polls but still complete"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, enableMonitoring
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        enableMonitoring()
+        j = Job(application=Executable(exe='sleep'), splitter=ArgSplitter(args=[['8'], ['8']]))
+        j.submit()
+        self.assertTrue(sleep_until_completed(j, 120))
+        self.assertTrue(stripProxy(j)._subjob_poll_tracker is not None)
+
+    def test_c_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
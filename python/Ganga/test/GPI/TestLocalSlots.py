@@ -0,0 +1,54 @@
+from __future__ import absolute_import
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+
+class TestLocalSlots(GangaUnitTest):
+
+    def setUp(self):
+        """Only let one Local job run at a time"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Local', 'max_running', 1)]
+        super(TestLocalSlots, self).setUp(extra_opts=extra_opts)
+
+    def test_a_SubJobsWaitForSlot(self):
+        """ The subjobs beyond the number of slots stay submitted and start one after the other"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, Local
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        j = Job(application=Executable(exe='sleep'), backend=Local(), splitter=ArgSplitter(args=[['2']] * 3))
+        j.submit()
+        status = j.backend.queue_status()
+        self.assertEqual(status['slots'], 1)
+        self.assertEqual(status['running'], 1)
+        self.assertEqual(status['queued'], 2)
+        self.assertEqual([sj.status for sj in j.subjobs], ['submitted'] * 3)
+
+        self.assertTrue(sleep_until_completed(j, 120))
+        times = [stripProxy(sj).backend.timedetails() for sj in j.subjobs]
+        for previous, following in zip(times, times[1:]):
+            self.assertTrue(previous['STOP'] <= following['START'])
+        status = j.backend.queue_status()
+        self.assertEqual(status['running'], 0)
+        self.assertEqual(status['queued'], 0)
+
+    def test_b_KillQueued(self):
+        """ A subjob still waiting for a slot is never started once killed"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, Local
+        from GangaTest.Framework.utils import sleep_until_state
+
+        j = Job(application=Executable(exe='sleep'), backend=Local(), splitter=ArgSplitter(args=[['30'], ['30']]))
+        j.submit()
+        self.assertEqual(j.backend.queue_status()['queued'], 1)
+        j.subjobs[1].kill()
+        self.assertEqual(j.subjobs[1].status, 'killed')
+        self.assertEqual(j.backend.queue_status()['queued'], 0)
+        j.subjobs[0].kill()
+        self.assertTrue(sleep_until_state(j, 30, 'killed'))
+
+    def test_c_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,42 @@
+from __future__ import absolute_import
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+
+class TestParallelSubmit(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job objects are kept between tests"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False')]
+        super(TestParallelSubmit, self).setUp(extra_opts=extra_opts)
+
+    def test_a_ParallelSubmit(self):
+        """ The subjobs are prepared and submitted by the submission threads and the submission waits for all of them"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, Local
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        j = Job(application=Executable(), backend=Local(), splitter=ArgSplitter(args=[[str(i)] for i in range(6)]))
+        j.parallel_submit = True
+        j.submit()
+
+        self.assertEqual(len(j.subjobs), 6)
+        for sj in j.subjobs:
+            self.assertNotIn(sj.status, ['new', 'submitting', 'failed'])
+        self.assertTrue(sleep_until_completed(j, 120))
+
+    def test_b_SubmissionPool(self):
+        """ The submission threads are separate from the monitoring threads"""
+        from Ganga.Core.GangaThread.WorkerThreads import getQueues
+        from Ganga.Utility.Config import getConfig
+
+        queues = getQueues()
+        self.assertIsNot(queues._submission_threadpool, queues._monitoring_threadpool)
+        self.assertEqual(len(queues._submission_threadpool.worker_status()),
+                         getConfig('Queues')['NumSubmissionThreads'])
+
+    def test_c_JobRemoval(self):
+        """ Remove the jobs"""
+        from Ganga.GPI import jobs
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,68 @@
+from __future__ import absolute_import
+
+import time
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_num_jobs = 5
+global_max_batch = 2
+
+
+def wait_for_flush(registry, timeout=20):
+    """Wait until the registry has no objects waiting to be flushed"""
+    start = time.time()
+    while registry.getFlushStats()['backlog'] > 0 and time.time() - start < timeout:
+        time.sleep(0.2)
+    return registry.getFlushStats()
+
+
+class TestRegistryFlusher(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job objects aren't destroyed between tests and flush quickly in small batches"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False'), ('Registry', 'AutoFlusherWaitTime', 2),
+                      ('Registry', 'AutoFlushMaxBatch', global_max_batch)]
+        super(TestRegistryFlusher, self).setUp(extra_opts=extra_opts)
+
+    def test_a_DirtyObjectsFlushedInBatches(self):
+        """ Modified jobs are tracked by the registry and written out in batches"""
+        from Ganga.GPI import Job, jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        for _ in range(global_num_jobs):
+            Job()
+        registry = stripProxy(jobs(0))._getRegistry()
+        wait_for_flush(registry)
+        before = registry.getFlushStats()
+
+        for j in jobs:
+            j.name = 'flushed'
+        stats = wait_for_flush(registry)
+
+        self.assertEqual(stats['backlog'], 0)
+        self.assertEqual(stats['objects'] - before['objects'], global_num_jobs)
+        self.assertTrue(stats['max_batch'] <= global_max_batch)
+        self.assertTrue(stats['batches'] - before['batches'] >= global_num_jobs // global_max_batch)
+        self.assertTrue(all(not stripProxy(j)._dirty for j in jobs))
+
+    def test_b_ChangesCoalesced(self):
+        """ Repeated changes to a job before it is flushed are written once"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        self.assertEqual([j.name for j in jobs], ['flushed'] * global_num_jobs)
+
+        registry = stripProxy(jobs(0))._getRegistry()
+        before = wait_for_flush(registry)
+        j = jobs(0)
+        for i in range(10):
+            j.comment = 'change %s' % i
+        stats = wait_for_flush(registry)
+        self.assertEqual(stats['objects'] - before['objects'], 1)
+        self.assertTrue(stats['last_latency'] > 0)
+
+    def test_c_ChangesPersisted(self):
+        """ The flushed changes are seen after a restart"""
+        from Ganga.GPI import jobs
+        self.assertEqual(jobs(0).comment, 'change 9')
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+
+import os
+import tempfile
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+
+class TestSandboxCache(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job objects are kept between tests"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False')]
+        super(TestSandboxCache, self).setUp(extra_opts=extra_opts)
+
+    def test_a_SubjobsShareSandbox(self):
+        """ Subjobs with the same input files share one packed sandbox from the cache"""
+        from Ganga.GPI import Job, Executable, ArgSplitter, Local, File
+        from GangaTest.Framework.utils import sleep_until_completed
+
+        script = os.path.join(tempfile.mkdtemp(), 'script.sh')
+        with open(script, 'w') as f:
+            f.write('#!/bin/sh\necho $1\n')
+        os.chmod(script, 0o755)
+
+        j = Job(application=Executable(exe=File(script)), backend=Local(),
+                splitter=ArgSplitter(args=[['a'], ['b'], ['c']]))
+        j.submit()
+
+        sandboxes = [os.path.join(sj.inputdir, '_input_sandbox_0_%d.tgz' % sj.id) for sj in j.subjobs]
+        for sandbox in sandboxes[1:]:
+            self.assertTrue(os.path.samefile(sandboxes[0], sandbox))
+        self.assertTrue(sleep_until_completed(j, 60))
+
+    def test_b_CopySharesSandbox(self):
+        """ A copy of a job reuses the sandboxes of the original"""
+        from Ganga.GPI import jobs
+        from Ganga.Core.Sandbox import getSandboxCache
+
+        hits = getSandboxCache().getStats()['hits']
+        j = jobs(0).copy()
+        j.submit()
+        self.assertTrue(getSandboxCache().getStats()['hits'] >= hits + len(j.subjobs))
+
+    def test_c_JobRemoval(self):
+        """ Remove the jobs, which empties the sandbox cache"""
+        from Ganga.GPI import jobs
+        from Ganga.Core.Sandbox import getSandboxCache
+        from Ganga.Core.Sandbox.SandboxCache import getSandboxCacheDir
+
+        self.assertTrue(os.listdir(getSandboxCacheDir()))
+        for j in jobs:
+            j.remove()
+        self.assertEqual(len(jobs), 0)
+        self.assertEqual([f for f in os.listdir(getSandboxCacheDir()) if f.endswith('.tgz')], [])
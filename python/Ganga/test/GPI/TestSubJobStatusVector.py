@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+from Ganga.testlib.GangaUnitTest import GangaUnitTest
+
+global_subjob_num = 3
+
+
+class TestSubJobStatusVector(GangaUnitTest):
+
+    def setUp(self):
+        """Make sure that the Job object isn't destroyed between tests"""
+        extra_opts = [('TestingFramework', 'AutoCleanup', 'False')]
+        super(TestSubJobStatusVector, self).setUp(extra_opts=extra_opts)
+
+    def test_a_StatusesCounted(self):
+        """ The status vector of the master job follows its subjobs and is stored in the index"""
+        from Ganga.GPI import Job, jobs, ArgSplitter
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.GPIDev.Lib.Job.SubJobStatusVector import SubJobStatusVector
+        j = Job()
+        j.splitter = ArgSplitter(args=[[i] for i in range(global_subjob_num)])
+        j.submit()
+
+        from GangaTest.Framework.utils import sleep_until_completed
+        sleep_until_completed(j, 60)
+
+        raw_j = stripProxy(j)
+        self.assertEqual(raw_j._getSubJobStatusVector().counts(), {'completed': global_subjob_num})
+        index_cache = raw_j._getRegistry().getIndexCache(raw_j)
+        self.assertEqual(index_cache['subjobs:status'], ['completed'] * global_subjob_num)
+        self.assertEqual(SubJobStatusVector.fromIndex(index_cache['subjobs:status']).counts(), {'completed': global_subjob_num})
+        self.assertEqual(index_cache['subjobs:status_counts'], {'completed': global_subjob_num})
+
+    def test_b_StatusChangeUpdatesCounts(self):
+        """ The vector is built from the index and a subjob changing status updates the counts"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+
+        raw_j = stripProxy(jobs(0))
+        vector = raw_j._getSubJobStatusVector()
+        self.assertEqual(vector.counts(), {'completed': global_subjob_num})
+        self.assertFalse(any(raw_j.subjobs.isLoaded(i) for i in range(global_subjob_num)))
+
+        raw_j.subjobs[1].updateStatus('failed', transition_update=False)
+        self.assertTrue(raw_j._getSubJobStatusVector() is vector)
+        self.assertEqual(vector.counts(), {'completed': global_subjob_num - 1, 'failed': 1})
+        self.assertEqual(raw_j.getSubJobStatuses(), set(['completed', 'failed']))
+        self.assertEqual(raw_j.status, 'failed')
+
+        # Setting the status directly keeps the vector up to date too
+        raw_j.subjobs[1].status = 'completed'
+        self.assertEqual(vector.counts(), {'completed': global_subjob_num})
+
+    def test_c_UnitCounts(self):
+        """ The Tasks counters read the counts stored in the index of a job which isn't loaded and its vector once it is"""
+        from Ganga.GPI import jobs
+        from Ganga.GPIDev.Base.Proxy import stripProxy
+        from Ganga.GPIDev.Lib.Tasks.IUnit import getSubJobStatusCounts
+
+        raw_j = stripProxy(jobs(0))
+        self.assertFalse(raw_j._fullyLoadedFromDisk())
+        self.assertEqual(getSubJobStatusCounts(raw_j)[1], {'completed': global_subjob_num})
+        self.assertFalse(raw_j._fullyLoadedFromDisk())
+
+        raw_j.subjobs[0].updateStatus('failed', transition_update=False)
+        self.assertTrue(raw_j._fullyLoadedFromDisk())
+        self.assertEqual(getSubJobStatusCounts(raw_j), ('failed', {'completed': global_subjob_num - 1, 'failed': 1}))
+
+    def test_d_JobRemoval(self):
+        """ Remove the job"""
+        from Ganga.GPI import jobs
+        jobs(0).remove()
+        self.assertEqual(len(jobs), 0)
@@ -0,0 +1,96 @@
+"""
+Benchmark of loading Job trees from the XML repository format.
+
+Compares Loader decoding of files written with type tags (see [Registry]TypedXMLValues) against
+the eval based <value> format, which is the default and what from_file sees for existing repositories.
+Whole objects are dominated by the construction of the GangaObjects, so the simple attribute
+values of the same objects are also timed on their own.
+
+Run it inside ganga:
+    ganga python/Ganga/test/Performance/XMLDecoding.py [n_subjobs] [repeat]
+"""
+from __future__ import print_function
+
+import sys
+import time
+from StringIO import StringIO
+
+
+def make_job_tree(n_subjobs):
+    """Return a master job and n_subjobs subjobs made by an ArgSplitter, like the ones stored in a repository"""
+    from Ganga.GPI import Job, Executable, ArgSplitter, LocalFile
+    from Ganga.GPIDev.Base.Proxy import stripProxy
+    j = Job(name='benchmark', application=Executable(exe='/bin/echo', env={'LANG': 'C', 'DEBUG': '1'}))
+    j.splitter = ArgSplitter(args=[['arg_%s' % i, str(i), '--flag'] for i in range(n_subjobs)])
+    j.outputfiles = [LocalFile('out_*.txt'), LocalFile('stdout')]
+    master = stripProxy(j)
+    return master, stripProxy(j.splitter).split(master)
+
+
+def serialise(obj, typed_values):
+    """Return the XML written for obj by the repository"""
+    from Ganga.Core.GangaRepository.VStreamer import _raw_to_file
+    out = StringIO()
+    _raw_to_file(obj, out, ['subjobs'], typed_values)
+    return out.getvalue()
+
+
+def collect_values(obj, values):
+    """Append the simple attribute values of obj and its components to values"""
+    from Ganga.GPIDev.Base.Proxy import stripProxy
+    from Ganga.GPIDev.Base.Objects import GangaObject
+    for name, item in obj._schema.allItems():
+        if item['transient'] or item['getter'] is not None or name == 'subjobs':
+            continue
+        value = stripProxy(getattr(obj, name))
+        for v in (value if item['sequence'] else [value]):
+            v = stripProxy(v)
+            if isinstance(v, GangaObject):
+                collect_values(v, values)
+            else:
+                values.append(v)
+    return values
+
+
+def serialise_values(obj, typed_values):
+    """Return a document holding only the simple values of obj as a sequence"""
+    from Ganga.Core.GangaRepository.VStreamer import encode_value
+    body = ''.join(encode_value(v, typed_values) for v in collect_values(obj, []))
+    return '<root><sequence>%s</sequence></root>' % body
+
+
+def time_loading(documents, repeat):
+    """Return the best wall time out of repeat runs of loading all the documents"""
+    from Ganga.Core.GangaRepository.VStreamer import from_file, _cached_eval_strings
+    best = None
+    for _ in range(repeat):
+        _cached_eval_strings.clear()
+        start = time.time()
+        for doc in documents:
+            from_file(StringIO(doc))
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark(n_subjobs=1000, repeat=3):
+    """Return a dict of (what, format) -> (bytes written, seconds to load the master and all subjobs)"""
+    master, subjobs = make_job_tree(n_subjobs)
+    results = {}
+    for label, typed_values in [('eval', False), ('typed', True)]:
+        for what, writer in [('objects', serialise), ('values', serialise_values)]:
+            documents = [writer(master, typed_values)] + [writer(sj, typed_values) for sj in subjobs]
+            results[(what, label)] = (sum(len(doc) for doc in documents), time_loading(documents, repeat))
+    return results
+
+
+if __name__ == '__main__':
+    n_subjobs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    results = run_benchmark(n_subjobs, repeat)
+    print("Loading a job with %s subjobs, best of %s:" % (n_subjobs, repeat))
+    for what in ['objects', 'values']:
+        for label in ['eval', 'typed']:
+            size, elapsed = results[(what, label)]
+            print("  %-8s %-6s %10d bytes %8.3f s %8.1f us/object" % (what, label, size, elapsed, elapsed / (n_subjobs + 1) * 1e6))
+        print("  %-8s speedup: %.2fx" % (what, results[(what, 'eval')][1] / results[(what, 'typed')][1]))
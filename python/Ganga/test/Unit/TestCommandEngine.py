@@ -0,0 +1,66 @@
+import os
+import time
+
+
+def test_run_captures_output():
+    """The output and stderr of a command are captured and its exit status returned"""
+
+    from Ganga.Utility.CommandEngine import CommandEngine
+
+    result = CommandEngine(2).run('echo out; echo err >&2; exit 3')
+    assert result.done()
+    assert result.returncode == 3
+    assert result.output == 'out\nerr\n'
+    assert not result.timed_out
+
+
+def test_timeout_kills_pipeline():
+    """A command still running after its timeout is killed with all of its children"""
+
+    from Ganga.Utility.CommandEngine import CommandEngine
+
+    engine = CommandEngine(2)
+    t0 = time.time()
+    result = engine.run('sleep 30 | cat', timeout=0.5)
+    assert time.time() - t0 < 10
+    assert result.timed_out
+    assert result.returncode != 0
+    assert engine.getStats()['timed_out'] == 1
+
+
+def test_concurrency_is_bounded():
+    """No more than the limit of commands run at once, the others wait for a free slot"""
+
+    from Ganga.Utility.CommandEngine import CommandEngine
+
+    engine = CommandEngine(2)
+    t0 = time.time()
+    results = engine.run_all(['sleep 0.5; echo %d' % i for i in range(4)])
+    assert time.time() - t0 >= 1
+    assert [r.output for r in results] == ['%d\n' % i for i in range(4)]
+    stats = engine.getStats()
+    assert stats['peak_running'] == 2
+    assert stats['running'] == 0
+    assert stats['finished'] == 4
+
+
+def test_shell_compatibility(tmpdir):
+    """Shell.cmd still returns the output in a file and Shell.cmd1 as a string"""
+
+    from Ganga.Utility.Shell import Shell
+
+    shell = Shell()
+    rc, output, m = shell.cmd1('echo hello')
+    assert (rc, output, m) == (0, 'hello\n', True)
+
+    soutfile = str(tmpdir.join('out'))
+    rc, outfile, m = shell.cmd('echo hello; exit 1', soutfile, allowed_exit=[0, 1])
+    assert (rc, outfile, m) == (1, soutfile, True)
+    with open(outfile) as out:
+        assert out.read() == 'hello\n'
+
+    rc, output, m = shell.cmd1('this_command_does_not_exist_in_ganga', allowed_exit=[0, 127])
+    assert rc == 127
+
+    assert shell.system('exit 2', allowed_exit=[0, 2]) == 2
+    assert os.path.exists(soutfile)
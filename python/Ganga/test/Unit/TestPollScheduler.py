@@ -0,0 +1,56 @@
+from Ganga.Core.MonitoringComponent.PollScheduler import StaleStateTracker, BackendPollSchedule
+
+
+def test_stale_keys_polled_less_often():
+    tracker = StaleStateTracker(stale_after=2, stale_factor=3)
+    for _ in range(3):
+        tracker.nextCycle()
+        tracker.update('moving', object())
+        tracker.update('stuck', 'running')
+    assert not tracker.isStale('moving')
+    assert tracker.isStale('stuck')
+
+    due = []
+    for _ in range(6):
+        tracker.nextCycle()
+        due.append((tracker.isDue('moving'), tracker.isDue('stuck')))
+    assert all(moving for moving, stuck in due)
+    assert sum(stuck for moving, stuck in due) == 2
+
+    assert tracker.update('stuck', 'completed')
+    assert not tracker.isStale('stuck')
+
+    tracker.forget(['moving'])
+    assert len(tracker) == 1
+    assert not tracker.isKnown('stuck')
+
+
+def test_interval_backs_off_and_resets():
+    schedule = BackendPollSchedule(1., 8.)
+    jobs = ['1', '2']
+    assert schedule.selectJobs(jobs, str) == jobs
+    assert schedule.recordPoll({'1': 'running', '2': 'running'}, now=0.)
+    assert schedule.interval == 1.
+
+    intervals = []
+    for i in range(5):
+        schedule.recordPoll({'1': 'running', '2': 'running'}, now=0.)
+        intervals.append(schedule.interval)
+    assert intervals == [2., 4., 8., 8., 8.]
+    assert schedule.next_poll == 8.
+
+    schedule.recordPoll({'1': 'completed', '2': 'running'}, now=10.)
+    assert schedule.interval == 1.
+    assert schedule.next_poll == 11.
+
+
+def test_not_due_until_new_job():
+    schedule = BackendPollSchedule(100., 100.)
+    assert schedule.selectJobs(['1'], str) == ['1']
+    schedule.recordPoll({'1': 'running'})
+    assert schedule.selectJobs(['1'], str) == []
+    assert schedule.selectJobs(['1'], str, force=True) == ['1']
+    assert schedule.selectJobs(['1', '2'], str) == ['1', '2']
+    stats = schedule.getStats()
+    assert stats['polls'] == 1
+    assert stats['jobs'] == 1
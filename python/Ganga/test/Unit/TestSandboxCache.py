@@ -0,0 +1,107 @@
+import os
+import tarfile
+
+
+def _members(tgzfile):
+    tf = tarfile.open(tgzfile, 'r:*')
+    try:
+        return dict((m.name, tf.extractfile(m).read()) for m in tf.getmembers())
+    finally:
+        tf.close()
+
+
+def test_identical_sandboxes_are_linked(tmpdir):
+    """A sandbox with the same files is linked to the tarball packed the first time"""
+
+    from Ganga.Core.Sandbox.SandboxCache import SandboxCache
+    from Ganga.GPIDev.Lib.File.File import File
+    from Ganga.GPIDev.Lib.File.FileBuffer import FileBuffer
+
+    script = tmpdir.join('script.sh')
+    script.write('echo hello\n')
+    files = [File(str(script)), FileBuffer('options.txt', 'a = 1\n')]
+
+    cache = SandboxCache(str(tmpdir.join('cache')))
+    first, second = str(tmpdir.join('first.tgz')), str(tmpdir.join('second.tgz'))
+    cache.place(files, first)
+    cache.place([File(str(script)), FileBuffer('options.txt', 'a = 1\n')], second)
+
+    assert os.path.samefile(first, second)
+    assert os.stat(first).st_nlink == 3
+    assert _members(second) == {'./script.sh': 'echo hello\n', 'options.txt': 'a = 1\n'}
+    stats = cache.getStats()
+    assert (stats['hits'], stats['misses'], stats['linked']) == (1, 1, 2)
+    assert stats['bytes_saved'] == os.path.getsize(first)
+
+    # a different file is packed into its own entry
+    third = str(tmpdir.join('third.tgz'))
+    cache.place([File(str(script)), FileBuffer('options.txt', 'a = 2\n')], third)
+    assert not os.path.samefile(first, third)
+    assert _members(third)['options.txt'] == 'a = 2\n'
+
+
+def test_changed_file_is_packed_again(tmpdir):
+    """A file modified after being packed gives a new sandbox and replacing a tarball never writes into the cache"""
+
+    from Ganga.Core.Sandbox.SandboxCache import SandboxCache
+    from Ganga.GPIDev.Lib.File.File import File
+
+    data = tmpdir.join('data.txt')
+    data.write('one\n')
+    cache = SandboxCache(str(tmpdir.join('cache')))
+    tgzfile = str(tmpdir.join('sandbox.tgz'))
+    cache.place([File(str(data))], tgzfile)
+    entry = os.path.join(cache.getCacheDir(), os.listdir(cache.getCacheDir())[0])
+
+    data.write('two, longer\n')
+    cache.place([File(str(data))], tgzfile)
+    assert _members(tgzfile) == {'./data.txt': 'two, longer\n'}
+    assert _members(entry) == {'./data.txt': 'one\n'}
+    assert cache.getStats()['misses'] == 2
+
+
+def test_digest_kept_for_settled_files_only(tmpdir, monkeypatch):
+    """The digest of a file is only reused once its timestamps are old enough to show any later change"""
+
+    import sys
+    from Ganga.Core.Sandbox.SandboxCache import SandboxCache
+    # the package exports the class under the name of the module
+    SandboxCacheModule = sys.modules[SandboxCache.__module__]
+
+    data = tmpdir.join('data.txt')
+    data.write('one\n')
+    cache = SandboxCache(str(tmpdir.join('cache')))
+    first = cache._file_digest(str(data))
+    assert str(data) not in cache._digests
+
+    # rewritten with the same size and mtime, as a coarse filesystem would show a change within the same second
+    mtime = os.stat(str(data)).st_mtime
+    data.write('two\n')
+    os.utime(str(data), (mtime, mtime))
+    second = cache._file_digest(str(data))
+    assert second != first
+
+    monkeypatch.setattr(SandboxCacheModule, '_mtime_margin', 0.)
+    assert cache._file_digest(str(data)) == second
+    assert str(data) in cache._digests
+    data.write('six\n')
+    os.utime(str(data), (mtime, mtime))
+    assert cache._file_digest(str(data)) != second
+
+
+def test_prune_removes_unreferenced_entries(tmpdir):
+    """Entries are deleted once no job workspace links to them"""
+
+    from Ganga.Core.Sandbox.SandboxCache import SandboxCache
+    from Ganga.GPIDev.Lib.File.FileBuffer import FileBuffer
+
+    cache = SandboxCache(str(tmpdir.join('cache')))
+    first, second = str(tmpdir.join('first.tgz')), str(tmpdir.join('second.tgz'))
+    cache.place([FileBuffer('a', 'a')], first)
+    cache.place([FileBuffer('a', 'a')], second)
+
+    os.remove(first)
+    assert cache.prune() == 0
+    os.remove(second)
+    assert cache.prune() == 1
+    assert os.listdir(cache.getCacheDir()) == []
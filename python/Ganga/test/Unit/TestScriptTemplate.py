@@ -0,0 +1,50 @@
+import os
+import time
+
+
+def test_render_fills_tags_once():
+    """The values are inserted as they are, tags within them are not filled in"""
+
+    from Ganga.GPIDev.Lib.File.FileUtils import ScriptTemplate
+
+    template = ScriptTemplate("jobid = ###JOBID###\nargs = ###ARGS###\nleft = ###LEFT###\n")
+    assert template.tags() == set(['###JOBID###', '###ARGS###', '###LEFT###'])
+
+    script = template.render({'###JOBID###': repr('1.2'), '###ARGS###': repr(['###JOBID###'])})
+    assert script == "jobid = '1.2'\nargs = ['###JOBID###']\nleft = ###LEFT###\n"
+
+
+def test_substitute_keeps_nested_tags():
+    """The static values may use tags which are filled in for each job"""
+
+    from Ganga.GPIDev.Lib.File.FileUtils import ScriptTemplate
+
+    template = ScriptTemplate("###MODULE###\nrun(###JOBID###)\n")
+    static = template.substitute({'###MODULE###': "print('job ###JOBID###')"})
+    assert static.tags() == set(['###JOBID###'])
+    assert static.render({'###JOBID###': '7'}) == "print('job 7')\nrun(7)\n"
+    # the original template is left as it was
+    assert template.tags() == set(['###MODULE###', '###JOBID###'])
+
+
+def test_load_script_template_cache(tmpdir):
+    """A script is compiled once for each set of static values and again once it is modified"""
+
+    from Ganga.GPIDev.Lib.File.FileUtils import loadScriptTemplate
+
+    script = tmpdir.join('script.py')
+    script.write("a = ###STATIC###\nb = ###JOB###\n")
+    path = str(script)
+
+    first = loadScriptTemplate(path, {'###STATIC###': '1'})
+    assert loadScriptTemplate(path, {'###STATIC###': '1'}) is first
+    assert first.render({'###JOB###': '2'}) == "a = 1\nb = 2\n"
+
+    other = loadScriptTemplate(path, {'###STATIC###': '3'})
+    assert other is not first
+    assert other.render({'###JOB###': '2'}) == "a = 3\nb = 2\n"
+
+    script.write("a = ###STATIC###\nb = ###JOB### + 1\n")
+    mtime = time.time() + 10
+    os.utime(path, (mtime, mtime))
+    assert loadScriptTemplate(path, {'###STATIC###': '1'}).render({'###JOB###': '2'}) == "a = 1\nb = 2 + 1\n"
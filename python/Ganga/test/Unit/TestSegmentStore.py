@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from Ganga.Core.GangaRepository.SegmentStore import SegmentStore, DATA, INDEX, PUT, DELETE
+
+
+@pytest.yield_fixture(scope='function')
+def segment_file():
+    tmpdir = tempfile.mkdtemp()
+    yield os.path.join(tmpdir, 'jobs', 'segment.dat')
+    shutil.rmtree(tmpdir)
+
+
+def test_put_read_overwrite(segment_file):
+    store = SegmentStore(segment_file)
+    store.open()
+    store.put(DATA, 0, -1, 'master')
+    store.put(DATA, 0, 0, 'sj0')
+    store.put(DATA, 0, 1, 'sj1')
+    store.put(DATA, 0, 1, 'sj1 again')
+
+    assert store.read(DATA, 0) == 'master'
+    assert store.read(DATA, 0, 1) == 'sj1 again'
+    assert store.ids() == [0]
+    assert store.children(0) == [0, 1]
+    assert store.dead_bytes > 0
+
+    with pytest.raises(KeyError):
+        store.read(INDEX, 0)
+    store.close()
+
+
+def test_reopen_from_snapshot_and_tail(segment_file):
+    store = SegmentStore(segment_file)
+    store.open()
+    store.write_many([(PUT, DATA, 1, -1, 'one'), (PUT, INDEX, 1, -1, 'idx')])
+    store.close()
+
+    # A second session appends without touching the snapshot
+    other = SegmentStore(segment_file)
+    other.open()
+    other.put(DATA, 2, -1, 'two')
+
+    store = SegmentStore(segment_file)
+    store.open()
+    assert sorted(store.ids()) == [1, 2]
+    assert store.read(DATA, 2) == 'two'
+
+    other.put(DATA, 3, -1, 'three')
+    assert store.refresh() == set([3])
+    assert store.read(DATA, 3) == 'three'
+    store.close()
+    other.close()
+
+
+def test_delete_and_compact(segment_file):
+    store = SegmentStore(segment_file)
+    store.open()
+    store.write_many([(PUT, DATA, 0, -1, 'a' * 100), (PUT, DATA, 0, 0, 'b' * 100), (PUT, DATA, 1, -1, 'c')])
+    store.write_many([(DELETE, DATA, 0, -1, '')])
+    assert store.ids() == [1]
+    assert store.count_children(0) == 0
+
+    size_before = os.path.getsize(segment_file)
+    assert store.compact() > 0
+    assert os.path.getsize(segment_file) < size_before
+    assert store.read(DATA, 1) == 'c'
+    assert store.dead_fraction() == 0.
+    store.close()
+
+    store = SegmentStore(segment_file)
+    store.open()
+    assert store.ids() == [1]
+    assert store.read(DATA, 1) == 'c'
+    store.close()
+
+
+def test_torn_write_is_ignored(segment_file):
+    store = SegmentStore(segment_file)
+    store.open()
+    store.put(DATA, 0, -1, 'good')
+    store.close()
+    os.unlink(segment_file + '.idx')
+
+    with open(segment_file, 'ab') as seg:
+        seg.write('GRPd\x00\x00')
+
+    store = SegmentStore(segment_file)
+    store.open()
+    assert store.read(DATA, 0) == 'good'
+    store.put(DATA, 1, -1, 'after crash')
+    store.close()
+
+    os.unlink(segment_file + '.idx')
+    store = SegmentStore(segment_file)
+    store.open()
+    assert sorted(store.ids()) == [0, 1]
+    store.close()
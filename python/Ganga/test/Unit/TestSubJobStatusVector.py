@@ -0,0 +1,41 @@
+import cPickle as pickle
+
+from Ganga.GPIDev.Lib.Job.SubJobStatusVector import SubJobStatusVector
+
+
+def test_counts():
+    v = SubJobStatusVector(['running', 'completed', 'running', 'failed'])
+    assert len(v) == 4
+    assert list(v) == ['running', 'completed', 'running', 'failed']
+    assert v.counts() == {'running': 2, 'completed': 1, 'failed': 1}
+    assert v.count('running') == 2
+    assert v.count('submitted', 'running') == 2
+    assert v.count('killed') == 0
+    assert v.statuses() == set(['running', 'completed', 'failed'])
+
+
+def test_set():
+    v = SubJobStatusVector(['running', 'running'])
+    v.set(0, 'completed')
+    v.set(1, 'completed')
+    assert v.counts() == {'completed': 2}
+    assert v.statuses() == set(['completed'])
+    assert v[1] == 'completed'
+
+    other = v.copy()
+    other.set(0, 'failed')
+    assert v.count('failed') == 0
+    assert other.count('failed') == 1
+
+
+def test_pickle():
+    v = SubJobStatusVector(['new', 'test_status', 'completed', 'test_status'])
+    loaded = pickle.loads(pickle.dumps(v, 1))
+    assert list(loaded) == list(v)
+    assert loaded.counts() == {'new': 1, 'test_status': 2, 'completed': 1}
+
+
+def test_from_index():
+    v = SubJobStatusVector(['completed'])
+    assert SubJobStatusVector.fromIndex(v) is v
+    assert SubJobStatusVector.fromIndex(['completed', 'failed']).counts() == {'completed': 1, 'failed': 1}
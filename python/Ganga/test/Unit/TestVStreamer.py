@@ -0,0 +1,75 @@
+from StringIO import StringIO
+
+import pytest
+
+from Ganga.GPIDev.Base import GangaObject
+from Ganga.GPIDev.Schema import Schema, Version, SimpleItem
+from Ganga.Core.GangaRepository.VStreamer import VStreamer, Loader, encode_value
+
+
+class VStreamerTestObject(GangaObject):
+    _schema = Schema(Version(1, 0), {
+        'name': SimpleItem(defvalue=''),
+        'number': SimpleItem(defvalue=0),
+        'ratio': SimpleItem(defvalue=0.),
+        'flag': SimpleItem(defvalue=False),
+        'nothing': SimpleItem(defvalue=None, typelist=None),
+        'args': SimpleItem(defvalue=[], sequence=1),
+        'env': SimpleItem(defvalue={}),
+        'nested': SimpleItem(defvalue=[], typelist=None),
+    })
+    _category = 'TestVStreamer'
+    _name = 'VStreamerTestObject'
+
+
+def make_object():
+    obj = VStreamerTestObject()
+    obj.name = 'a <name> & "quotes"\twith\nnewline'
+    obj.number = 2 ** 70
+    obj.ratio = 0.1
+    obj.flag = True
+    obj.args = ['1', 'caf\xc3\xa9', '\x01']
+    obj.env = {'PATH': '/bin', 'N': 3, 'L': [None, 1.5]}
+    obj.nested = [[1, 'a'], {'k': (1, 2)}]
+    return obj
+
+
+def write(obj, typed_values):
+    out = StringIO()
+    vstreamer = VStreamer(out=out, typed_values=typed_values)
+    vstreamer.begin_root()
+    obj.accept(vstreamer)
+    vstreamer.end_root()
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('typed_values', [True, False])
+def test_round_trip(typed_values):
+    obj = make_object()
+    xml = write(obj, typed_values)
+    assert ('<str>' in xml) == typed_values
+
+    loaded, errors = Loader().parse(xml)
+    assert errors == []
+    for attr in ['name', 'number', 'ratio', 'flag', 'nothing', 'env', 'nested']:
+        assert getattr(loaded, attr) == getattr(obj, attr)
+        assert type(getattr(loaded, attr)) == type(getattr(obj, attr))
+    assert [type(a) for a in loaded.args] == [str, str, str]
+    assert list(loaded.args) == list(obj.args)
+
+
+def test_encode_value():
+    assert encode_value(None) == '<none/>'
+    assert encode_value([1, 'a<']) == '<list><int>1</int><str>a&lt;</str></list>'
+    # Values without a type tag fall back to a python expression
+    assert encode_value((1, 2)) == '<value>(1, 2)</value>'
+    assert encode_value('\x01') == "<value>'\\x01'</value>"
+    assert encode_value('a', typed_values=False) == "<value>'a'</value>"
+
+
+def test_decoded_values_are_not_shared():
+    xml = write(make_object(), True)
+    first, _ = Loader().parse(xml)
+    second, _ = Loader().parse(xml)
+    first.env['PATH'] = 'changed'
+    assert second.env['PATH'] == '/bin'
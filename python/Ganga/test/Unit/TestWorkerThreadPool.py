@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def pool():
+    from Ganga.Core.GangaThread.WorkerThreads.WorkerThreadPool import WorkerThreadPool
+    pool = WorkerThreadPool(num_worker_threads=2, worker_thread_prefix='Test_Worker_')
+    yield pool
+    pool._stop_worker_threads()
+
+
+def test_add_function_returns_future(pool):
+    """The Future of a function gives its return value or the exception it raised"""
+
+    def square(x):
+        time.sleep(0.1)
+        return x * x
+
+    def fail():
+        raise ValueError('no good')
+
+    futures = [pool.add_function(square, (i,)) for i in range(4)]
+    assert [f.result(10) for f in futures] == [0, 1, 4, 9]
+    assert all(f.done() for f in futures)
+
+    failed = pool.add_function(fail)
+    assert isinstance(failed.exception(10), ValueError)
+    with pytest.raises(ValueError):
+        failed.result()
+
+    assert [f.result(10) for f in pool.map(square, [5, 6])] == [25, 36]
+
+
+def test_callback_still_called(pool):
+    """Callbacks are still given the result of the function"""
+
+    results = []
+    done = threading.Event()
+
+    def callback(result):
+        results.append(result)
+        done.set()
+
+    future = pool.add_function(lambda: 'out', callback_func=callback)
+    assert future.result(10) == 'out'
+    assert done.wait(10)
+    assert results == ['out']
+
+
+def test_frozen_and_purged_futures_fail(pool):
+    """A function which won't be run has a failed Future rather than one never done"""
+
+    from Ganga.Core.exceptions import GangaException
+
+    release = threading.Event()
+    blockers = [pool.add_function(release.wait, (10,)) for i in range(2)]
+    # give the workers time to pick up the blocking functions
+    time.sleep(0.5)
+    queued = pool.add_function(lambda: 1)
+    pool.clear_queue()
+    assert isinstance(queued.exception(1), GangaException)
+    release.set()
+    assert all(f.result(10) for f in blockers)
+
+    pool._frozen = True
+    assert isinstance(pool.add_function(lambda: 1).exception(1), GangaException)
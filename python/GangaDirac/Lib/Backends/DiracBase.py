@@ -10,7 +10,10 @@ import datetime
 from Ganga.GPIDev.Schema import Schema, Version, SimpleItem
 from Ganga.GPIDev.Adapters.IBackend import IBackend
 from Ganga.Core import BackendError, GangaException
-from GangaDirac.Lib.Backends.DiracUtils import result_ok, get_job_ident, get_parametric_datasets, outputfiles_iterator, outputfiles_foreach
+from GangaDirac.Lib.Backends.DiracUtils import result_ok, get_job_ident, get_parametric_datasets, get_parametric_script, \
+    outputfiles_iterator, outputfiles_foreach
+from GangaDirac.Lib.Backends.DiracMonitoring import DiracMonitoringState
+from GangaDirac.Lib.Backends.DiracFinalisation import DiracFinalisationPipeline
 from GangaDirac.Lib.Files.DiracFile import DiracFile
 from GangaDirac.Lib.Utilities.DiracUtilities import execute, _proxyValid
 from Ganga.Utility.ColourText import getColour
@@ -60,6 +63,10 @@ class DiracBase(IBackend):
 
     dirac_monitoring_is_active = True
 
+    # what the monitoring knows about the DIRAC jobs from one cycle to the next
+    _monitoring_state = DiracMonitoringState()
+    _finalisation_pipeline = DiracFinalisationPipeline()
+
     _schema = Schema(Version(3, 2), {
         'id': SimpleItem(defvalue=None, protected=1, copyable=0,
                          typelist=['int', 'type(None)'],
@@ -132,11 +139,8 @@ class DiracBase(IBackend):
             master_job.subjobs.append(j)
         return True
 
-    def _common_submit(self, dirac_script):
-        '''Submit the job via the Dirac server.
-        Args:
-            dirac_script (str): filename of the JDL which is to be submitted to DIRAC
-        '''
+    def _clear_submit_info(self):
+        """Forget what DIRAC told us about a previous submission of the job"""
         j = self.getJobObject()
         self.id = None
         self.actualCE = None
@@ -144,6 +148,13 @@ class DiracBase(IBackend):
         self.extraInfo = None
         self.statusInfo = ''
         j.been_queued = False
+
+    def _common_submit(self, dirac_script):
+        '''Submit the job via the Dirac server.
+        Args:
+            dirac_script (str): filename of the JDL which is to be submitted to DIRAC
+        '''
+        self._clear_submit_info()
         dirac_cmd = """execfile(\'%s\')""" % dirac_script
         result = execute(dirac_cmd)
         # Could use the below code instead to submit on a thread
@@ -191,6 +202,14 @@ class DiracBase(IBackend):
             subjobconfig (unknown):
             master_input_sandbox (list): file names which are in the master sandbox of the master sandbox (if any)
         """
+        return self._common_submit(self._write_dirac_script(subjobconfig, master_input_sandbox))
+
+    def _write_dirac_script(self, subjobconfig, master_input_sandbox):
+        """Write the DIRAC API script submitting the job into its input workspace and return its file name
+        Args:
+            subjobconfig (unknown):
+            master_input_sandbox (list): file names which are in the master sandbox of the master sandbox (if any)
+        """
         j = self.getJobObject()
 
         sboxname = j.createPackedInputSandbox(subjobconfig.getSandboxFiles())
@@ -222,7 +241,199 @@ class DiracBase(IBackend):
         f = open(dirac_script_filename, 'w')
         f.write(dirac_script)
         f.close()
-        return self._common_submit(dirac_script_filename)
+        return dirac_script_filename
+
+    def master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going=False, parallel_submit=False):
+        """Submit the subjobs of a split job in chunks, each with one DIRAC command, see the BulkSubmit option.
+        A single job, or a split job if BulkSubmit is disabled, is submitted by IBackend.master_submit
+        Args:
+            rjobs (list): The subjobs to submit
+            subjobconfigs (list): The configuration of each subjob
+            masterjobconfig (StandardJobConfig): The configuration shared by all of the subjobs
+            keep_going (bool): Submit as many subjobs as possible rather than stopping at the first failure
+            parallel_submit (bool): Only used when the subjobs are submitted one at a time
+        """
+        mode = configDirac['BulkSubmit']
+        if len(rjobs) < 2 or mode not in ['bulk', 'parametric']:
+            return IBackend.master_submit(self, rjobs, subjobconfigs, masterjobconfig, keep_going, parallel_submit)
+
+        from Ganga.Core import IncompleteJobSubmissionError
+        from Ganga.Utility.logging import log_user_exception
+
+        master_input_sandbox = self.master_prepare(masterjobconfig)
+
+        incomplete_subjobs = []
+        prepared = []
+        for sc, sj in zip(subjobconfigs, rjobs):
+            try:
+                b = stripProxy(sj.backend)
+                sj.updateStatus('submitting')
+                b._clear_submit_info()
+                # Each subjob still gets a script of its own so that it can be resubmitted on its own
+                prepared.append((sj, b, b._write_dirac_script(sc, master_input_sandbox)))
+            except Exception as x:
+                if isType(x, GangaException):
+                    logger.error("%s" % x)
+                    log_user_exception(logger, debug=True)
+                else:
+                    log_user_exception(logger, debug=False)
+                if not keep_going:
+                    return 0
+                incomplete_subjobs.append(sj.getFQID('.'))
+
+        if not prepared:
+            raise IncompleteJobSubmissionError(incomplete_subjobs, 'submission failed')
+
+        chunk_size = max(1, min(configDirac['BulkSubmitChunkSize'], configDirac['MaxDiracBulkJobs']))
+        chunks = [prepared[i:i + chunk_size] for i in range(0, len(prepared), chunk_size)]
+        logger.info("submitting %d subjobs of job %s to DIRAC in %d chunk(s)", len(prepared),
+                    self.getJobObject().getFQID('.'), len(chunks))
+
+        start = time.time()
+        failures = []
+        for chunk, results in zip(chunks, self._submit_chunks(chunks, mode == 'parametric')):
+            for (sj, b, dirac_script), result in zip(chunk, results):
+                if result_ok(result) and isinstance(result.get('Value'), (int, long)):
+                    b.id = result['Value']
+                    sj.updateStatus('submitted')
+                    stripProxy(sj.info).increment()
+                else:
+                    fqid = sj.getFQID('.')
+                    logger.error("Error submitting job %s to Dirac: %s" % (fqid, result))
+                    sj.updateStatus('failed')
+                    failures.append((fqid, str(result)))
+
+        duration = time.time() - start
+        submitted = len(prepared) - len(failures)
+        logger.info("Submitted %s of %s subjobs in %.1fs (%.1f jobs/s)", submitted, len(prepared), duration,
+                    submitted / max(duration, 1e-3))
+
+        if failures:
+            if not keep_going and not submitted:
+                return 0
+            raise IncompleteJobSubmissionError(incomplete_subjobs + [fqid for fqid, reason in failures],
+                                               'submission failed: %s' % '; '.join('%s: %s' % f for f in failures))
+        if incomplete_subjobs:
+            raise IncompleteJobSubmissionError(incomplete_subjobs, 'submission failed')
+        return 1
+
+    def _submit_chunks(self, chunks, parametric):
+        """Submit the chunks of subjobs, BulkSubmitConcurrency of them at the same time on the submission threads,
+        and return the results of the submission of the subjobs of each chunk
+        Args:
+            chunks (list): The (subjob, backend, DIRAC script) of the subjobs of each chunk
+            parametric (bool): Whether to submit a chunk as one parametric job if the scripts allow it
+        """
+        def chunk_args(chunk):
+            return ('%s' % chunk[0][0].id, [dirac_script for sj, b, dirac_script in chunk], parametric)
+
+        concurrency = max(1, configDirac['BulkSubmitConcurrency'])
+        queues = getQueues()
+        if queues is None or concurrency == 1 or len(chunks) == 1:
+            return [self._submit_chunk(*chunk_args(chunk)) for chunk in chunks]
+
+        futures = []
+        for chunk in chunks:
+            # keep no more than BulkSubmitConcurrency chunks on their way to DIRAC
+            if len(futures) >= concurrency:
+                futures[-concurrency].wait()
+            futures.append(queues._submission_threadpool.add_function(self._submit_chunk, chunk_args(chunk),
+                                                                       name='dirac_submit_%s' % chunk[0][0].getFQID('.')))
+
+        all_results = []
+        for chunk, future in zip(chunks, futures):
+            try:
+                all_results.append(future.result())
+            except Exception as err:
+                all_results.append([str(err)] * len(chunk))
+        return all_results
+
+    def _submit_chunk(self, name, dirac_scripts, parametric):
+        """Submit the subjobs of a chunk with one DIRAC command. Those which DIRAC refused are submitted again, up to
+        BulkSubmitRetries times. A command which failed in any other way isn't repeated as it may have submitted them
+        Args:
+            name (str): Names the parametric script of the chunk, the id of its first subjob
+            dirac_scripts (list): The names of the DIRAC API scripts of the subjobs
+            parametric (bool): Whether to submit the chunk as one parametric job if the scripts allow it
+        Returns the result of the submission of each subjob
+        """
+        results = [None] * len(dirac_scripts)
+        pending = range(len(dirac_scripts))
+        retries = max(0, configDirac['BulkSubmitRetries'])
+        for attempt in range(retries + 1):
+            if attempt:
+                logger.warning("Submitting %s subjobs refused by DIRAC again, retry %s/%s" %
+                               (len(pending), attempt, retries))
+            these_results = self._submit_scripts(name, [dirac_scripts[i] for i in pending], parametric)
+            for i, result in zip(pending, these_results):
+                results[i] = result
+            pending = [i for i in pending if isinstance(results[i], dict) and not results[i].get('OK', False)]
+            if not pending:
+                break
+        return results
+
+    def _submit_scripts(self, name, dirac_scripts, parametric):
+        """Submit the jobs of some DIRAC API scripts with one DIRAC command, returning the result for each of them
+        Args:
+            name (str): Names the parametric script, see _submit_chunk
+            dirac_scripts (list): The names of the scripts
+            parametric (bool): Whether to submit them as one parametric job if the scripts allow it
+        """
+        if parametric and len(dirac_scripts) > 1:
+            contents = []
+            for dirac_script in dirac_scripts:
+                with open(dirac_script, 'r') as f:
+                    contents.append(f.read())
+            parametric_script = get_parametric_script(contents)
+            if parametric_script is not None:
+                parametric_filename = os.path.join(self.getJobObject().getInputWorkspace().getPath(),
+                                                   'dirac-script-parametric-%s.py' % name)
+                with open(parametric_filename, 'w') as f:
+                    f.write(parametric_script)
+                result = execute("execfile('%s')" % parametric_filename)
+                if not result_ok(result):
+                    return [result] * len(dirac_scripts)
+                idlist = result.get('Value')
+                if not isinstance(idlist, list) or len(idlist) != len(dirac_scripts):
+                    # Jobs may have been created, they can't be submitted again
+                    logger.error("DIRAC created the jobs %s for the %s jobs of %s" %
+                                 (idlist, len(dirac_scripts), parametric_filename))
+                    return ['Unexpected DIRAC job ids %s' % idlist] * len(dirac_scripts)
+                return [{'OK': True, 'Value': dirac_id} for dirac_id in idlist]
+            logger.debug("The DIRAC scripts of %s can't be merged into a parametric job" % name)
+
+        results_file = os.path.join(self.getJobObject().getInputWorkspace().getPath(), 'dirac-bulk-submit-%s.ids' % name)
+        if os.path.exists(results_file):
+            os.remove(results_file)
+        timeout = configDirac['Timeout'] + configDirac['BulkSubmitTimeoutPerJob'] * len(dirac_scripts)
+        result = execute('bulkSubmit(%s, results_file=%s)' % (repr(dirac_scripts), repr(results_file)), timeout=timeout)
+        if not isinstance(result, list) or len(result) != len(dirac_scripts):
+            # The command may have submitted some of the jobs before it timed out or the server died, keep those
+            submitted = self._read_submitted_ids(results_file)
+            if submitted:
+                logger.warning("Recovered the DIRAC ids of %s of the %s jobs of chunk %s after: %s" %
+                               (len(submitted), len(dirac_scripts), name, result))
+            result = [{'OK': True, 'Value': submitted[i]} if i in submitted else result for i in range(len(dirac_scripts))]
+        if os.path.exists(results_file):
+            os.remove(results_file)
+        return result
+
+    @staticmethod
+    def _read_submitted_ids(results_file):
+        """Read the DIRAC ids which bulkSubmit recorded in a results file, returning a dict of the ids by script index
+        Args:
+            results_file (str): The file given to bulkSubmit
+        """
+        submitted = {}
+        if not os.path.exists(results_file):
+            return submitted
+        with open(results_file, 'r') as f:
+            for line in f:
+                fields = line.split()
+                # The last line may be incomplete if the server died while writing it
+                if len(fields) == 2 and line.endswith('\n'):
+                    submitted[int(fields[0])] = int(fields[1])
+        return submitted
 
     def master_auto_resubmit(self, rjobs):
         '''Duplicate of the IBackend.master_resubmit but hooked into auto resubmission
@@ -346,6 +557,7 @@ class DiracBase(IBackend):
             self.status = None
             self.actualCE = None
             j.been_queued = False
+            DiracBase._monitoring_state.forget(self.id)
             j.updateStatus('submitted')
             if j.subjobs and not doSubjobs:
                 logger.info('This job has subjobs, if you would like the backends '
@@ -368,6 +580,7 @@ class DiracBase(IBackend):
         result = execute(dirac_cmd)
         if not result_ok(result):
             raise BackendError('Dirac', 'Could not kill job: %s' % str(result))
+        DiracBase._monitoring_state.forget(self.id)
         return result['OK']
 
     def peek(self, filename=None, command=None):
@@ -607,6 +820,95 @@ class DiracBase(IBackend):
         # FIXME should I add something here to cleanup on sandboxes pulled from
         # malformed job output?
 
+    @staticmethod
+    def _complete_job_finalisation(job, getSandboxResult, file_info_dict, completeTimeResult):
+        """
+        This method records the output data of a completing job once its output has been fetched and moves it to completed
+        Args:
+            job (Job): This is the job we want to finalise
+            getSandboxResult (dict): The result of downloading the output sandbox of the job
+            file_info_dict (dict): The OutputDataInfo of the job, i.e. the LFN, GUID and locations of each output file
+            completeTimeResult (dict): The state times of the job, by Ganga status
+        """
+        output_path = job.getOutputWorkspace().getPath()
+
+        # Set DiracFile metadata
+        wildcards = [f.namePattern for f in job.outputfiles.get(DiracFile) if regex.search(f.namePattern) is not None]
+
+        lfn_store = os.path.join(output_path, getConfig('Output')['PostProcessLocationsFileName'])
+
+        # Make the file on disk with a nullop...
+        if not os.path.isfile(lfn_store):
+            with open(lfn_store, 'w'):
+                pass
+
+        if job.outputfiles.get(DiracFile):
+
+            # Now we can iterate over the contents of the file without touching it
+            with open(lfn_store, 'ab') as postprocesslocationsfile:
+                if not hasattr(file_info_dict, 'keys'):
+                    logger.error("Error understanding OutputDataInfo: %s" % str(file_info_dict))
+                    from Ganga.Core.exceptions import GangaException
+                    raise GangaException("Error understanding OutputDataInfo: %s" % str(file_info_dict))
+
+                ## Caution is not clear atm whether this 'Value' is an LHCbism or bug
+                list_of_files = file_info_dict.get('Value', file_info_dict.keys())
+
+                for file_name in list_of_files:
+                    file_name = os.path.basename(file_name)
+                    info = file_info_dict.get(file_name)
+                    #logger.debug("file_name: %s,\tinfo: %s" % (str(file_name), str(info)))
+
+                    if not hasattr(info, 'get'):
+                        logger.error("Error getting OutputDataInfo for: %s" % str(job.getFQID('.')))
+                        logger.error("Please check the Dirac Job still exists or attempt a job.backend.reset() to try again!")
+                        logger.error("Err: %s" % str(info))
+                        logger.error("file_info_dict: %s" % str(file_info_dict))
+                        from Ganga.Core.exceptions import GangaException
+                        raise GangaException("Error getting OutputDataInfo")
+
+                    valid_wildcards = [wc for wc in wildcards if fnmatch.fnmatch(file_name, wc)]
+                    if not valid_wildcards:
+                        valid_wildcards.append('')
+
+                    for wc in valid_wildcards:
+                        #logger.debug("wildcard: %s" % str(wc))
+
+                        DiracFileData = 'DiracFile:::%s&&%s->%s:::%s:::%s\n' % (wc,
+                                                                                file_name,
+                                                                                info.get('LFN', 'Error Getting LFN!'),
+                                                                                str(info.get('LOCATIONS', ['NotAvailable'])),
+                                                                                info.get('GUID', 'NotAvailable')
+                                                                                )
+                        #logger.debug("DiracFileData: %s" % str(DiracFileData))
+                        postprocesslocationsfile.write(DiracFileData)
+                        postprocesslocationsfile.flush()
+
+            logger.debug("Written: %s" % open(lfn_store, 'r').readlines())
+
+        # check outputsandbox downloaded correctly
+        if not result_ok(getSandboxResult):
+            logger.warning('Problem retrieving outputsandbox: %s' % str(getSandboxResult))
+            DiracBase._getStateTime(job, 'failed')
+            if job.status in ['removed', 'killed']:
+                return
+            elif (job.master and job.master.status in ['removed', 'killed']):
+                return  # user changed it under us
+            job.updateStatus('failed')
+            if job.master:
+                job.master.updateMasterJobStatus()
+            raise BackendError('Dirac', 'Problem retrieving outputsandbox: %s' % str(getSandboxResult))
+
+        # finally update job to completed
+        DiracBase._getStateTime(job, 'completed', completeTimeResult)
+        if job.status in ['removed', 'killed']:
+            return
+        elif (job.master and job.master.status in ['removed', 'killed']):
+            return  # user changed it under us
+        job.updateStatus('completed')
+        if job.master:
+            job.master.updateMasterJobStatus()
+
     @staticmethod
     def _internal_job_finalisation(job, updated_dirac_status):
         """
@@ -642,82 +944,7 @@ class DiracBase(IBackend):
             #logger.info('Job ' + job.fqid + ' OutputSandbox: ' + str(getSandboxResult))
             #logger.info('Job ' + job.fqid + ' normCPUTime: ' + str(job.backend.normCPUTime))
 
-            # Set DiracFile metadata
-            wildcards = [f.namePattern for f in job.outputfiles.get(DiracFile) if regex.search(f.namePattern) is not None]
-
-            lfn_store = os.path.join(output_path, getConfig('Output')['PostProcessLocationsFileName'])
-
-            # Make the file on disk with a nullop...
-            if not os.path.isfile(lfn_store):
-                with open(lfn_store, 'w'):
-                    pass
-
-            if job.outputfiles.get(DiracFile):
-
-                # Now we can iterate over the contents of the file without touching it
-                with open(lfn_store, 'ab') as postprocesslocationsfile:
-                    if not hasattr(file_info_dict, 'keys'):
-                        logger.error("Error understanding OutputDataInfo: %s" % str(file_info_dict))
-                        from Ganga.Core.exceptions import GangaException
-                        raise GangaException("Error understanding OutputDataInfo: %s" % str(file_info_dict))
-
-                    ## Caution is not clear atm whether this 'Value' is an LHCbism or bug
-                    list_of_files = file_info_dict.get('Value', file_info_dict.keys())
-
-                    for file_name in list_of_files:
-                        file_name = os.path.basename(file_name)
-                        info = file_info_dict.get(file_name)
-                        #logger.debug("file_name: %s,\tinfo: %s" % (str(file_name), str(info)))
-
-                        if not hasattr(info, 'get'):
-                            logger.error("Error getting OutputDataInfo for: %s" % str(job.getFQID('.')))
-                            logger.error("Please check the Dirac Job still exists or attempt a job.backend.reset() to try again!")
-                            logger.error("Err: %s" % str(info))
-                            logger.error("file_info_dict: %s" % str(file_info_dict))
-                            from Ganga.Core.exceptions import GangaException
-                            raise GangaException("Error getting OutputDataInfo")
-
-                        valid_wildcards = [wc for wc in wildcards if fnmatch.fnmatch(file_name, wc)]
-                        if not valid_wildcards:
-                            valid_wildcards.append('')
-
-                        for wc in valid_wildcards:
-                            #logger.debug("wildcard: %s" % str(wc))
-
-                            DiracFileData = 'DiracFile:::%s&&%s->%s:::%s:::%s\n' % (wc,
-                                                                                    file_name,
-                                                                                    info.get('LFN', 'Error Getting LFN!'),
-                                                                                    str(info.get('LOCATIONS', ['NotAvailable'])),
-                                                                                    info.get('GUID', 'NotAvailable')
-                                                                                    )
-                            #logger.debug("DiracFileData: %s" % str(DiracFileData))
-                            postprocesslocationsfile.write(DiracFileData)
-                            postprocesslocationsfile.flush()
-
-                logger.debug("Written: %s" % open(lfn_store, 'r').readlines())
-
-            # check outputsandbox downloaded correctly
-            if not result_ok(getSandboxResult):
-                logger.warning('Problem retrieving outputsandbox: %s' % str(getSandboxResult))
-                DiracBase._getStateTime(job, 'failed')
-                if job.status in ['removed', 'killed']:
-                    return
-                elif (job.master and job.master.status in ['removed', 'killed']):
-                    return  # user changed it under us
-                job.updateStatus('failed')
-                if job.master:
-                    job.master.updateMasterJobStatus()
-                raise BackendError('Dirac', 'Problem retrieving outputsandbox: %s' % str(getSandboxResult))
-
-            # finally update job to completed
-            DiracBase._getStateTime(job, 'completed', completeTimeResult)
-            if job.status in ['removed', 'killed']:
-                return
-            elif (job.master and job.master.status in ['removed', 'killed']):
-                return  # user changed it under us
-            job.updateStatus('completed')
-            if job.master:
-                job.master.updateMasterJobStatus()
+            DiracBase._complete_job_finalisation(job, getSandboxResult, file_info_dict, completeTimeResult)
             now = time.time()
             logger.debug('Job ' + job.fqid + ' Time for complete update : ' + str(now - start))
 
@@ -800,13 +1027,17 @@ class DiracBase(IBackend):
             if monitoring_component:
                 if monitoring_component.should_stop():
                     break
-            if not configDirac['serializeBackend']:
+            if configDirac['serializeBackend']:
+                DiracBase.job_finalisation(j, finalised_statuses[j.backend.status])
+            elif configDirac['FinalisationPipeline']:
+                # a job the pipeline has no room for is offered again on the next cycle
+                if DiracBase._finalisation_pipeline.add(j, finalised_statuses[j.backend.status]):
+                    j.been_queued = True
+            else:
                 getQueues()._monitoring_threadpool.add_function(DiracBase.job_finalisation,
                                                            args=(j, finalised_statuses[j.backend.status]),
                                                            priority=5, name="Job %s Finalizing" % j.fqid)
                 j.been_queued = True
-            else:
-                DiracBase.job_finalisation(j, finalised_statuses[j.backend.status])
 
 
     @staticmethod
@@ -831,10 +1062,10 @@ class DiracBase(IBackend):
             if d.master is not None:
                 d.master.updateMasterJobStatus()
 
-        ganga_job_status = [j.status for j in monitor_jobs if j.backend.id is not None]
-        dirac_job_ids = [j.backend.id for j in monitor_jobs if j.backend.id is not None]
+        monitor_jobs = [j for j in monitor_jobs if j.backend.id is not None]
+        dirac_job_ids = [j.backend.id for j in monitor_jobs]
 
-        logger.debug("GangaStatus: %s" % str(ganga_job_status))
+        logger.debug("GangaStatus: %s" % str([j.status for j in monitor_jobs]))
         logger.debug("diracJobIDs: %s" % str(dirac_job_ids))
 
         if not dirac_job_ids:
@@ -844,18 +1075,15 @@ class DiracBase(IBackend):
 
         statusmapping = configDirac['statusmapping']
 
-        result, bulk_state_result = execute('monitorJobs(%s, %s)' %( repr(dirac_job_ids), repr(statusmapping)))
+        status_result, bulk_state_result = DiracBase._monitoring_state.update(dirac_job_ids, statusmapping,
+                                                                             finalised_statuses)
 
         if not DiracBase.checkDiracProxy():
             return
 
-        #result = results[0]
-        #bulk_state_result = results[1]
-
-        if len(result) != len(ganga_job_status):
-            logger.warning('Dirac monitoring failed for %s, result = %s' % (str(dirac_job_ids), str(result)))
-            logger.warning("Results: %s" % str(results))
-            return
+        # only the jobs DIRAC was asked about, and answered for, are updated
+        monitor_jobs = [j for j in monitor_jobs if j.backend.id in status_result]
+        result = [status_result[j.backend.id] for j in monitor_jobs]
 
         from Ganga.Core import monitoring_component
 
@@ -866,7 +1094,7 @@ class DiracBase(IBackend):
         master_jobs_to_update = []
 
         thread_handled_states = ['completed', 'failed']
-        for job, state, old_state in zip(monitor_jobs, result, ganga_job_status):
+        for job, state in zip(monitor_jobs, result):
             if monitoring_component:
                 if monitoring_component.should_stop():
                     break
@@ -967,6 +1195,10 @@ class DiracBase(IBackend):
         # if backend status is these then the job should be on the queue
         finalised_statuses = configDirac['finalised_statuses']
 
+        # pick up the jobs an earlier session was finalising, including those it left completing
+        if configDirac['FinalisationPipeline'] and not configDirac['serializeBackend']:
+            DiracBase._finalisation_pipeline.resume()
+
         monitor_jobs = [j for j in interesting_jobs if j.backend.status not in finalised_statuses]
         requeue_jobs = [j for j in interesting_jobs if j.backend.status in finalised_statuses]
 
@@ -0,0 +1,501 @@
+"""
+Pipelined finalisation of DIRAC jobs
+
+Finalising a DIRAC job means fetching the times of its state transitions, downloading its output sandbox and looking up
+its CPU time and the LFNs of its output data. Rather than one thread running all of these for each job in turn, the
+DiracFinalisationPipeline has a stage for each with a bounded queue and FinalisationStageThreads threads of its own. A
+thread of a stage takes up to FinalisationBatchSize jobs off its queue and runs one DIRAC command for all of them before
+handing them to the next stage, which blocks when that stage is full. Jobs which a stage failed for are tried again up
+to FinalisationRetries times.
+
+How far the finalisation of each job got, and what the stages found out, is written to a journal file per job in the
+repository. A new session queues the jobs of the journal again, skipping the stages they went through, e.g. the
+sandboxes which were downloaded already, including those of jobs left completing which the monitoring doesn't look at.
+"""
+
+import datetime
+import json
+import os
+import Queue
+import threading
+import time
+
+from Ganga.Core.GangaThread import GangaThread
+from Ganga.Utility.Config import getConfig
+from Ganga.Utility.logging import getLogger
+from GangaDirac.Lib.Backends.DiracUtils import result_ok
+from GangaDirac.Lib.Utilities.DiracUtilities import execute, _proxyValid
+
+logger = getLogger()
+
+# The format of the state times in the journal
+_time_format = '%Y-%m-%d %H:%M:%S'
+
+# The Ganga statuses the DIRAC state times are fetched for
+_state_time_statuses = ['running', 'completing', 'completed', 'failed']
+
+
+def _timeToString(state_time):
+    if isinstance(state_time, datetime.datetime):
+        return state_time.strftime(_time_format)
+    return None
+
+
+def _stringToTime(state_time):
+    if state_time is None:
+        return None
+    return datetime.datetime.strptime(state_time, _time_format)
+
+
+def _defaultJournalDir():
+    """The directory of the journal within the repository, '' if the repository isn't local"""
+    from Ganga.Runtime.Repository_runtime import getLocalRoot
+    root = getLocalRoot()
+    if not root:
+        return ''
+    return os.path.join(root, 'DiracFinalisation')
+
+
+def _findJob(fqid):
+    """Return the job of an fqid, e.g. '3.12', from the job registry"""
+    from Ganga.Core.GangaRepository import getRegistry
+    ids = [int(i) for i in fqid.split('.')]
+    job = getRegistry('jobs')[ids[0]]
+    for i in ids[1:]:
+        job = job.subjobs[i]
+    return job
+
+
+class DiracFinalisationJournal(object):
+
+    """
+    The progress of the finalisation of each job, kept in a JSON file per job so that it outlives the session
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Where the files are kept, nothing is kept if ''
+        """
+        self.directory = directory
+
+    def _path(self, fqid):
+        return os.path.join(self.directory, '%s.json' % fqid)
+
+    def save(self, record):
+        """
+        Write the progress of a job, replacing what was written before
+        Args:
+            record (dict): The progress, whose 'fqid' names the job
+        """
+        if not self.directory:
+            return
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                pass
+        path = self._path(record['fqid'])
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(record, f, default=str)
+        os.rename(tmp, path)
+
+    def remove(self, fqid):
+        """Forget the progress of the job of an fqid"""
+        if not self.directory:
+            return
+        try:
+            os.remove(self._path(fqid))
+        except OSError:
+            pass
+
+    def load(self):
+        """Return the progress of each job in the journal"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        records = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    records.append(json.load(f))
+            except (IOError, ValueError) as err:
+                logger.warning("Could not read the DIRAC finalisation journal %s: %s" % (name, err))
+        return records
+
+
+class _StageThread(GangaThread):
+
+    """A thread running the batches of one stage of the pipeline until it is stopped"""
+
+    def __init__(self, pipeline, stage, index):
+        GangaThread.__init__(self, name='DiracFinalisation_%s_%d' % (stage, index), critical=False)
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def run(self):
+        while not self.should_stop() and not self.pipeline._stopping:
+            self.pipeline._work(self.stage)
+
+
+class DiracFinalisationPipeline(object):
+
+    """
+    The stages finalising the DIRAC jobs which reached a final status, each with a bounded queue and threads of its own
+    """
+
+    # The stages in the order a job goes through them
+    stages = ['statetime', 'sandbox', 'outputdata']
+
+    # Seconds before a job a stage failed for is tried again
+    retry_delay = 2.5
+
+    def __init__(self, journal_dir=None):
+        """
+        Args:
+            journal_dir (str): The directory of the journal, in the repository if None and not kept if ''
+        """
+        self._lock = threading.RLock()
+        self._journal_dir = journal_dir
+        self._journal = None
+        self._queues = {}
+        # stage -> [(time.time() after which to try again, (job, record))]
+        self._retries = dict((stage, []) for stage in self.stages)
+        self._threads = []
+        # fqid -> (job, record) of each job in the pipeline
+        self._pending = {}
+        self._resumed = False
+        self._stopping = False
+        self.stats = {'queued': 0, 'resumed': 0, 'rejected': 0, 'finalised': 0, 'failed': 0, 'dropped': 0,
+                      'commands': dict((stage, 0) for stage in self.stages)}
+
+    def getStats(self):
+        """Return how many jobs were queued, resumed, rejected as the pipeline was full, finalised, failed or dropped,
+        how many are pending and how many DIRAC commands each stage ran"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['commands'] = dict(self.stats['commands'])
+            stats['pending'] = len(self._pending)
+            return stats
+
+    def _getJournal(self):
+        with self._lock:
+            if self._journal is None:
+                self._journal = DiracFinalisationJournal(
+                    _defaultJournalDir() if self._journal_dir is None else self._journal_dir)
+            return self._journal
+
+    def _start(self):
+        """Create the queues and start the threads of the stages, unless they were"""
+        with self._lock:
+            if self._threads:
+                return
+            config = getConfig('DIRAC')
+            self._stopping = False
+            for stage in self.stages:
+                self._queues[stage] = Queue.Queue(maxsize=max(1, config['FinalisationQueueSize']))
+                for index in range(max(1, config['FinalisationStageThreads'])):
+                    thread = _StageThread(self, stage, index)
+                    self._threads.append(thread)
+                    thread.start()
+
+    def stop(self):
+        """Stop the threads of the stages, the jobs still in the pipeline are resumed by the next session"""
+        with self._lock:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.stop()
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            for job, _ in self._pending.values():
+                job.been_queued = False
+            self._pending.clear()
+            for stage in self.stages:
+                self._retries[stage] = []
+            self._resumed = False
+
+    def join(self, timeout=None):
+        """
+        Wait until every job queued was finalised, failed or dropped and return whether they were
+        Args:
+            timeout (float): The most seconds to wait, for ever if None
+        """
+        start = time.time()
+        while self._pending:
+            if timeout is not None and time.time() - start > timeout:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def add(self, job, ganga_status):
+        """
+        Queue a job whose DIRAC job reached a final status to be finalised. Returns False if the job wasn't queued
+        because the pipeline is full, in which case it is to be offered again on a later monitoring cycle
+        Args:
+            job (Job): The job to finalise
+            ganga_status (str): The Ganga status the DIRAC job finished in, completed or failed
+        """
+        if ganga_status not in ['completed', 'failed']:
+            logger.error("Job #%s Unexpected dirac status '%s' encountered" % (job.getFQID('.'), ganga_status))
+            return False
+        if job.getFQID('.') in self._pending:
+            return True
+        stages = ['statetime']
+        if ganga_status == 'completed':
+            stages += ['sandbox', 'outputdata']
+        elif getConfig('DIRAC')['failed_sandbox_download']:
+            stages.append('sandbox')
+        record = {'fqid': job.getFQID('.'), 'dirac_id': job.backend.id, 'status': ganga_status, 'stages': stages,
+                  'attempts': 0}
+        if not self._enqueue(job, record):
+            return False
+        with self._lock:
+            self.stats['queued'] += 1
+        return True
+
+    def resume(self, find_job=_findJob):
+        """
+        Queue again the jobs of the journal whose finalisation an earlier session didn't finish, once per session.
+        Jobs which no longer exist, or were resubmitted since, are taken off the journal
+        Args:
+            find_job (callable): Returns the job of an fqid
+        """
+        with self._lock:
+            if self._resumed:
+                return
+        journal = self._getJournal()
+        resumed = True
+        for record in journal.load():
+            try:
+                job = find_job(record['fqid'])
+            except Exception as err:
+                logger.debug("Could not find job %s to finalise: %s" % (record['fqid'], err))
+                job = None
+            if job is None or job.backend.id != record['dirac_id'] or not record['stages']:
+                journal.remove(record['fqid'])
+                continue
+            if job.been_queued or record['fqid'] in self._pending:
+                continue
+            if not self._enqueue(job, record):
+                resumed = False
+                break
+            job.been_queued = True
+            with self._lock:
+                self.stats['resumed'] += 1
+        with self._lock:
+            self._resumed = resumed
+
+    def _enqueue(self, job, record):
+        """Put a job on the queue of the first of its stages left, returning False if it is full"""
+        self._start()
+        journal = self._getJournal()
+        with self._lock:
+            if record['fqid'] in self._pending:
+                return True
+            journal.save(record)
+            try:
+                self._queues[record['stages'][0]].put_nowait((job, record))
+            except Queue.Full:
+                journal.remove(record['fqid'])
+                self.stats['rejected'] += 1
+                return False
+            self._pending[record['fqid']] = (job, record)
+        return True
+
+    def _put(self, stage, item):
+        """Put a job on the queue of a stage, waiting for room until the pipeline is stopped"""
+        while not self._stopping:
+            try:
+                self._queues[stage].put(item, timeout=0.5)
+                return
+            except Queue.Full:
+                pass
+
+    def _nextBatch(self, stage):
+        """Take the jobs due to be tried again and then those queued for a stage, up to FinalisationBatchSize of them"""
+        batch_size = max(1, getConfig('DIRAC')['FinalisationBatchSize'])
+        now = time.time()
+        with self._lock:
+            due = [entry for entry in self._retries[stage] if entry[0] <= now][:batch_size]
+            for entry in due:
+                self._retries[stage].remove(entry)
+        batch = [item for _, item in due]
+        try:
+            if not batch:
+                batch.append(self._queues[stage].get(timeout=0.5))
+            while len(batch) < batch_size:
+                batch.append(self._queues[stage].get_nowait())
+        except Queue.Empty:
+            pass
+        return batch
+
+    def _work(self, stage):
+        """Run a stage for the next batch of its jobs and hand those it went through to the next stage"""
+        batch = []
+        for job, record in self._nextBatch(stage):
+            if job.status in ['removed', 'killed', 'completed'] or \
+                    (job.master and job.master.status in ['removed', 'killed']) or \
+                    (record['status'] == 'completed' and job.status == 'failed'):
+                # the user changed it under us
+                self._done((job, record), 'dropped')
+            else:
+                batch.append((job, record))
+        if not batch:
+            return
+
+        if not _proxyValid(shouldRenew=False, shouldRaise=False):
+            # wait for the proxy to be renewed rather than failing the jobs
+            with self._lock:
+                self._retries[stage].extend((time.time() + self.retry_delay, item) for item in batch)
+            return
+
+        try:
+            failures = getattr(self, '_run_%s' % stage)(batch)
+        except Exception as err:
+            logger.debug("DIRAC finalisation stage %s failed: %s" % (stage, err))
+            failures = dict((record['fqid'], str(err)) for _, record in batch)
+        with self._lock:
+            self.stats['commands'][stage] += 1
+
+        for item in batch:
+            error = failures.get(item[1]['fqid'])
+            if error is None:
+                try:
+                    self._advance(stage, item)
+                    continue
+                except Exception as err:
+                    error = str(err)
+            self._retry(stage, item, error)
+
+    def _advance(self, stage, item):
+        """Hand a job a stage went through to the next stage, or finish it after the last"""
+        job, record = item
+        if stage == 'statetime':
+            self._begin(item)
+        remaining = record['stages'][1:]
+        if not remaining:
+            self._finish(item)
+            self._done(item, 'finalised')
+            return
+        record['stages'] = remaining
+        record['attempts'] = 0
+        self._getJournal().save(record)
+        self._put(remaining[0], item)
+
+    def _retry(self, stage, item, error):
+        """Try a stage again for a job later, or give up on it after FinalisationRetries attempts"""
+        job, record = item
+        record['attempts'] += 1
+        if record['attempts'] > getConfig('DIRAC')['FinalisationRetries']:
+            logger.error("Unable to finalise job %s after %s attempts due to error:\n%s" %
+                         (record['fqid'], record['attempts'], error))
+            try:
+                job.force_status('failed')
+            except Exception as err:
+                logger.debug("Could not fail job %s: %s" % (record['fqid'], err))
+            self._done(item, 'failed')
+            return
+        logger.warning("An error occured finalising job %s, attempting again (%s of %s) after %s-sec delay: %s" %
+                       (record['fqid'], record['attempts'] + 1, getConfig('DIRAC')['FinalisationRetries'] + 1,
+                        self.retry_delay, error))
+        with self._lock:
+            self._retries[stage].append((time.time() + self.retry_delay, item))
+
+    def _done(self, item, outcome):
+        """Take a job out of the pipeline, the journal and the monitoring state, which no longer follows it"""
+        job, record = item
+        from GangaDirac.Lib.Backends.DiracBase import DiracBase
+        with self._lock:
+            self._pending.pop(record['fqid'], None)
+            self.stats[outcome] += 1
+        self._getJournal().remove(record['fqid'])
+        DiracBase._monitoring_state.forget(record['dirac_id'])
+        job.been_queued = False
+
+    @staticmethod
+    def _stateTimes(record):
+        return dict((status, _stringToTime(state_time)) for status, state_time in record['state_times'].items())
+
+    @staticmethod
+    def _updateStatus(job, status):
+        job.updateStatus(status)
+        if job.master:
+            job.master.updateMasterJobStatus()
+
+    def _begin(self, item):
+        """Move a job to completing, or to failed, once its state times are known"""
+        job, record = item
+        from GangaDirac.Lib.Backends.DiracBase import DiracBase
+        if job.status == 'completing' or (record['status'] == 'failed' and job.status == 'failed'):
+            return
+        # Check status is sane before we start
+        if job.status != 'running':
+            job.updateStatus('submitted')
+            job.updateStatus('running')
+        state_times = DiracFinalisationPipeline._stateTimes(record)
+        if record['status'] == 'completed':
+            DiracBase._getStateTime(job, 'completing', state_times)
+            DiracFinalisationPipeline._updateStatus(job, 'completing')
+        else:
+            DiracBase._getStateTime(job, 'failed', state_times)
+            DiracFinalisationPipeline._updateStatus(job, 'failed')
+
+    def _finish(self, item):
+        """Record the output data of a completed job and move it to completed"""
+        job, record = item
+        from GangaDirac.Lib.Backends.DiracBase import DiracBase
+        if record['status'] != 'completed':
+            return
+        job.backend.normCPUTime = record['cpu_time']
+        DiracBase._complete_job_finalisation(job, record['sandbox'], record['output_data'],
+                                             DiracFinalisationPipeline._stateTimes(record))
+
+    @staticmethod
+    def _allFailed(batch, message):
+        return dict((record['fqid'], message) for _, record in batch)
+
+    def _run_statetime(self, batch):
+        """Fetch the times of the state transitions of the jobs, asking once for each job"""
+        dirac_ids = [record['dirac_id'] for _, record in batch]
+        result = execute('getBulkStateTimes(%s, %s)' % (repr(dirac_ids), repr(_state_time_statuses)))
+        if not isinstance(result, dict):
+            return DiracFinalisationPipeline._allFailed(batch, 'Could not get the state times: %s' % str(result))
+        for _, record in batch:
+            record['state_times'] = dict((status, _timeToString(result.get(status, {}).get(record['dirac_id'])))
+                                         for status in _state_time_statuses)
+        return {}
+
+    def _run_sandbox(self, batch):
+        """Download the output sandboxes of the jobs"""
+        jobs = [(record['dirac_id'], job.getOutputWorkspace().getPath()) for job, record in batch]
+        result = execute('getBulkOutputSandbox(%s)' % repr(jobs))
+        if not isinstance(result, dict):
+            return DiracFinalisationPipeline._allFailed(batch, 'Problem retrieving outputsandbox: %s' % str(result))
+        failures = {}
+        for _, record in batch:
+            record['sandbox'] = result.get(record['dirac_id'])
+            if not result_ok(record['sandbox']):
+                if record['status'] == 'completed':
+                    failures[record['fqid']] = 'Problem retrieving outputsandbox: %s' % str(record['sandbox'])
+                else:
+                    logger.warning('Problem retrieving outputsandbox of failed job %s: %s' %
+                                   (record['fqid'], str(record['sandbox'])))
+        return failures
+
+    def _run_outputdata(self, batch):
+        """Look up the CPU time and the LFNs of the output data of the jobs"""
+        dirac_ids = [record['dirac_id'] for _, record in batch]
+        result = execute('getBulkOutputDataInfo(%s)' % repr(dirac_ids))
+        if not isinstance(result, dict):
+            return DiracFinalisationPipeline._allFailed(batch, 'Error getting OutputDataInfo: %s' % str(result))
+        failures = {}
+        for _, record in batch:
+            if record['dirac_id'] not in result:
+                failures[record['fqid']] = 'Error getting OutputDataInfo: %s' % str(result)
+                continue
+            record['cpu_time'], record['output_data'] = result[record['dirac_id']]
+        return failures
@@ -0,0 +1,178 @@
+"""
+Incremental monitoring of DIRAC jobs
+
+Asking DIRAC for the status of every job in flight on every monitoring cycle sends the same, mostly unchanged, status
+vectors over and over again. DiracMonitoringState remembers up to when the changes of each DIRAC job are known (its
+watermark). A monitoring cycle first asks the WMS which of the jobs of the user were updated since the oldest watermark
+of the jobs being monitored and then only asks for the status of those, split into shards of MonitoringShardSize ids
+which are run at the same time. Every MonitoringFullUpdateInterval seconds a job is asked about whether it changed or not.
+
+Jobs which reached a final DIRAC status never change again. Their last status is kept and handed back instead of asking
+DIRAC about them, until Ganga has dealt with them and stops monitoring them or they are reset.
+"""
+
+import datetime
+import threading
+import time
+
+from Ganga.Utility.Config import getConfig
+from Ganga.Utility.logging import getLogger
+from GangaDirac.Lib.Backends.DiracUtils import result_ok
+from GangaDirac.Lib.Utilities.DiracUtilities import execute
+
+logger = getLogger()
+
+# The format of the times DIRAC compares LastUpdateTime with
+_time_format = '%Y-%m-%d %H:%M:%S'
+
+
+class DiracMonitoringState(object):
+
+    """
+    What the monitoring of DIRAC jobs knows about them from one cycle to the next
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # DIRAC id -> (UTC time up to which the changes of the job are known, time.time() it was last asked about)
+        self._checked = {}
+        # DIRAC id -> (status vector, (Ganga status, state time)) of the jobs in a final DIRAC status
+        self._terminal = {}
+        self.stats = {'cycles': 0, 'queried': 0, 'unchanged': 0, 'terminal': 0, 'failed': 0}
+
+    def getStats(self):
+        """Return how many cycles ran and how many jobs were asked about, found unchanged, known to be final or failed"""
+        with self._lock:
+            return dict(self.stats)
+
+    def forget(self, dirac_id):
+        """
+        Forget what is known about a job, so that DIRAC is asked about it on the next cycle
+        Args:
+            dirac_id (int): The DIRAC id of the job
+        """
+        with self._lock:
+            self._checked.pop(dirac_id, None)
+            self._terminal.pop(dirac_id, None)
+
+    def update(self, dirac_job_ids, status_mapping, finalised_statuses):
+        """
+        Find out the status of the jobs which may have changed since the last cycle
+        Args:
+            dirac_job_ids (list): The DIRAC ids of the jobs being monitored
+            status_mapping (dict): The Ganga status of each DIRAC status
+            finalised_statuses (dict): The DIRAC statuses which a job doesn't leave
+
+        Returns the status vector of each job which may have changed, as given by the monitorJobs DIRAC command, and
+        the state times of these jobs for each Ganga status, as given by monitorJobs. A job which is missing hasn't
+        changed, or DIRAC couldn't be asked about it
+        """
+        config = getConfig('DIRAC')
+        now = time.time()
+        query_start = datetime.datetime.utcnow()
+
+        statuses = {}
+        state_times = {}
+        with self._lock:
+            for dirac_id in dirac_job_ids:
+                if dirac_id in self._terminal:
+                    status, (ganga_status, state_time) = self._terminal[dirac_id]
+                    statuses[dirac_id] = status
+                    state_times.setdefault(ganga_status, {})[dirac_id] = state_time
+            ids = [dirac_id for dirac_id in dirac_job_ids if dirac_id not in statuses]
+            checked = dict((dirac_id, self._checked[dirac_id]) for dirac_id in ids if dirac_id in self._checked)
+
+        to_query = ids
+        if config['IncrementalMonitoring']:
+            full = set(dirac_id for dirac_id in ids
+                       if dirac_id not in checked or now - checked[dirac_id][1] >= config['MonitoringFullUpdateInterval'])
+            others = [dirac_id for dirac_id in ids if dirac_id not in full]
+            if others:
+                # go back a little further to allow for the clock of the WMS differing from ours
+                since = min(checked[dirac_id][0] for dirac_id in others) - \
+                    datetime.timedelta(seconds=config['MonitoringWatermarkOverlap'])
+                changed = execute('getJobsChangedSince(%s)' % repr(since.strftime(_time_format)))
+                if result_ok(changed):
+                    changed = set(changed['Value'])
+                    to_query = [dirac_id for dirac_id in ids if dirac_id in full or dirac_id in changed]
+                else:
+                    logger.debug("Could not find out which DIRAC jobs changed, asking about all of them: %s" % changed)
+
+        queried_statuses, queried_state_times, failed = DiracMonitoringState._queryStatus(to_query, status_mapping)
+
+        queried = set(to_query)
+        with self._lock:
+            self.stats['cycles'] += 1
+            self.stats['queried'] += len(to_query)
+            self.stats['unchanged'] += len(ids) - len(to_query)
+            self.stats['terminal'] += len(statuses)
+            self.stats['failed'] += len(failed)
+            for dirac_id in ids:
+                if dirac_id in failed:
+                    continue
+                if dirac_id not in queried:
+                    self._checked[dirac_id] = (query_start, checked[dirac_id][1])
+                    continue
+                status = queried_statuses[dirac_id]
+                if status[1] in finalised_statuses:
+                    ganga_status = status[3]
+                    state_time = queried_state_times.get(ganga_status, {}).get(dirac_id)
+                    self._terminal[dirac_id] = (status, (ganga_status, state_time))
+                    self._checked.pop(dirac_id, None)
+                else:
+                    self._checked[dirac_id] = (query_start, now)
+
+        statuses.update(queried_statuses)
+        for ganga_status, times in queried_state_times.items():
+            state_times.setdefault(ganga_status, {}).update(times)
+        return statuses, state_times
+
+    @staticmethod
+    def _queryStatus(dirac_job_ids, status_mapping):
+        """
+        Run the monitorJobs DIRAC command on shards of the ids, MonitoringConcurrency of them at the same time
+        Args:
+            dirac_job_ids (list): The DIRAC ids of the jobs to ask about
+            status_mapping (dict): The Ganga status of each DIRAC status
+
+        Returns the status vector of each job, the state times of the jobs for each Ganga status and the ids of the
+        jobs in shards which failed
+        """
+        config = getConfig('DIRAC')
+        shard_size = max(1, config['MonitoringShardSize'])
+        shards = [dirac_job_ids[i:i + shard_size] for i in range(0, len(dirac_job_ids), shard_size)]
+        results = [None] * len(shards)
+
+        def run(index):
+            try:
+                results[index] = execute('monitorJobs(%s, %s)' % (repr(shards[index]), repr(status_mapping)))
+            except Exception as err:
+                results[index] = str(err)
+
+        concurrency = max(1, config['MonitoringConcurrency'])
+        for first in range(0, len(shards), concurrency):
+            indices = range(first, min(first + concurrency, len(shards)))
+            if len(indices) == 1:
+                run(indices[0])
+                continue
+            threads = [threading.Thread(target=run, args=(index,), name='DIRAC_monitoring_shard_%s' % index)
+                       for index in indices]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        statuses = {}
+        state_times = {}
+        failed = set()
+        for shard, result in zip(shards, results):
+            if not isinstance(result, (tuple, list)) or len(result) != 2 or len(result[0]) != len(shard):
+                logger.warning('Dirac monitoring failed for %s, result = %s' % (str(shard), str(result)))
+                failed.update(shard)
+                continue
+            status_info, state_info = result
+            statuses.update(zip(shard, status_info))
+            for ganga_status, times in state_info.items():
+                state_times.setdefault(ganga_status, {}).update(times)
+        return statuses, state_times, failed
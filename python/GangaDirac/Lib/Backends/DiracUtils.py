@@ -1,3 +1,4 @@
+import re
 from Ganga.Core.exceptions import GangaException, BackendError
 #from GangaDirac.BOOT       import dirac_ganga_server
 from GangaDirac.Lib.Utilities.DiracUtilities import execute
@@ -84,6 +85,56 @@ def get_parametric_datasets(dirac_script_lines):
     return eval(dataset_str)
 
 
+def get_parametric_script(dirac_scripts):
+    '''
+    Merge the DIRAC API scripts of several jobs into the script of one parametric DIRAC job, submitting one job per
+    script in the same order. Return None if the scripts differ in something other than the name, input data and
+    input sandbox of the job, which are the parameters DIRAC knows how to vary.
+    Args:
+        dirac_scripts (list): The contents of the scripts, which must have been made from the same template
+    '''
+    import ast
+
+    script_lines = [script.split('\n') for script in dirac_scripts]
+    if len(set(len(lines) for lines in script_lines)) != 1:
+        return None
+
+    job_ident = get_job_ident(script_lines[0])
+    setter = re.compile(r'^(\s*)%s\.set(Name|InputData|InputSandbox)\((.*)\)\s*$' % re.escape(job_ident))
+
+    merged = []
+    for lines in zip(*script_lines):
+        if len(set(lines)) == 1:
+            merged.append(lines[0])
+            continue
+        matches = [setter.match(line) for line in lines]
+        if not all(matches) or len(set(m.group(2) for m in matches)) != 1:
+            return None
+        indent, attribute = matches[0].group(1), matches[0].group(2)
+        try:
+            values = [ast.literal_eval(m.group(3)) for m in matches]
+        except (ValueError, SyntaxError):
+            return None
+
+        if attribute == 'Name':
+            merged.append("%s%s.setParameterSequence('JobName', %r)" % (indent, job_ident, values))
+            merged.append("%s%s.setName('%%(JobName)s')" % (indent, job_ident))
+        elif attribute == 'InputData':
+            if not all(isinstance(value, list) for value in values):
+                return None
+            merged.append("%s%s.setParameterSequence('InputData', %r, addToWorkflow='ParametricInputData')" %
+                          (indent, job_ident, values))
+        else:
+            if not all(isinstance(value, list) for value in values):
+                return None
+            # the master sandbox is shared, only the packed sandbox of each job is a parameter
+            common = [f for f in values[0] if all(f in value for value in values[1:])]
+            merged.append("%s%s.setInputSandbox(%r)" % (indent, job_ident, common))
+            merged.append("%s%s.setParameterSequence('InputSandbox', %r, addToWorkflow='ParametricInputSandbox')" %
+                          (indent, job_ident, [[f for f in value if f not in common] for value in values]))
+    return '\n'.join(merged)
+
+
 # Note could combine selection_pred with file_type
 # using types.typetype or types.functiontype
 def outputfiles_iterator(job, file_type, selection_pred=None,
@@ -0,0 +1,134 @@
+"""
+Long-lived DIRAC command server, run within the DIRAC environment by the DiracServerPool of Ganga
+
+The DIRAC API and the Ganga DIRAC commands are imported once when the server starts, after which it runs one command
+after the other. Requests and replies are pickled dictionaries on the stdin and stdout of the process. The real stdout
+is pointed at stderr so that anything printed by DIRAC can't get mixed up with the replies.
+
+Requests:
+    {'command': 'setup', 'code': <python>}             -> {'ok': True} or {'ok': False, 'error': <traceback>}
+    {'command': 'exec', 'code': <python>, 'cwd': dir}   -> {'ok': True, 'has_output': bool, 'output': obj,
+                                                           'stdout': <printed text>}
+    {'command': 'ping'}                                 -> {'ok': True, 'pid': pid}
+    {'command': 'quit'}                                 -> the server exits
+
+As in the one process per command wrapper of Ganga.Utility.execute, the first object passed to output() is the result
+of a command, or the traceback of the exception it raised.
+
+This file must not import anything from Ganga, it runs with the python and the modules of the DIRAC environment.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import traceback
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+# keep the request and reply channels to ourselves
+_requests = os.fdopen(os.dup(0), 'rb')
+_replies = os.fdopen(os.dup(1), 'wb')
+_devnull = os.open(os.devnull, os.O_RDONLY)
+os.dup2(_devnull, 0)
+os.dup2(2, 1)
+sys.stdin = open(os.devnull)
+sys.stdout = sys.stderr
+
+
+class _Output(object):
+
+    """The output() function of the commands, keeping the first object it is given"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.has_output = False
+        self.value = None
+
+    def __call__(self, data):
+        if not self.has_output:
+            self.has_output = True
+            self.value = data
+
+
+_output = _Output()
+_namespace = {'pickle': pickle, 'output': _output}
+
+
+def _reply(reply):
+    try:
+        data = pickle.dumps(reply, 2)
+    except Exception as err:
+        # an object the DIRAC API returned which can't be sent back
+        data = pickle.dumps({'ok': True, 'has_output': True, 'stdout': '',
+                             'output': 'Could not pickle the output of the command: %s' % err}, 2)
+    _replies.write(data)
+    _replies.flush()
+
+
+def _run(code, namespace):
+    """Run some code, returning what it printed"""
+    stdout = StringIO()
+    sys.stdout = stdout
+    try:
+        exec(code, namespace)
+    except:
+        _output(traceback.format_exc())
+    finally:
+        sys.stdout = sys.stderr
+    return stdout.getvalue()
+
+
+def _exec(request):
+    _output.reset()
+    cwd = os.getcwd()
+    try:
+        if request.get('cwd'):
+            os.chdir(request['cwd'])
+        # every command gets its own namespace on top of the DIRAC one, as it got its own process before
+        stdout = _run(request['code'], dict(_namespace))
+    finally:
+        os.chdir(cwd)
+    return {'ok': True, 'has_output': _output.has_output, 'output': _output.value, 'stdout': stdout}
+
+
+def _setup(request):
+    _output.reset()
+    _run(request['code'], _namespace)
+    if _output.has_output:
+        return {'ok': False, 'error': _output.value}
+    return {'ok': True, 'pid': os.getpid()}
+
+
+def main():
+    while True:
+        try:
+            request = pickle.load(_requests)
+        except EOFError:
+            # Ganga has gone away
+            break
+
+        command = request.get('command')
+        if command == 'quit':
+            break
+        elif command == 'ping':
+            _reply({'ok': True, 'pid': os.getpid()})
+        elif command == 'setup':
+            _reply(_setup(request))
+        elif command == 'exec':
+            _reply(_exec(request))
+        else:
+            _reply({'ok': False, 'error': 'Unknown request %s' % command})
+
+
+if __name__ == '__main__':
+    main()
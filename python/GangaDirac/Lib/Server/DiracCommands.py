@@ -32,6 +32,35 @@ def submit(djob, mode='wms'):
     output(dirac.submit(djob, mode=mode))
 
 
+def bulkSubmit(scripts, pipe_out=True, results_file=None):
+    ''' Run the DIRAC API script of each of a list of jobs and return what each script output, i.e. the result of its
+    submission, in the same order. A script which raised gives its traceback instead. The index and DIRAC id of each
+    job submitted are also appended to results_file, if given, as soon as they are known'''
+    import traceback
+    results = []
+    for script in scripts:
+        result = []
+
+        def script_output(data):
+            if not result:
+                result.append(data)
+
+        try:
+            execfile(script, {'output': script_output})
+        except:
+            script_output(traceback.format_exc())
+        results.append(result[0] if result else None)
+        submitted = isinstance(results[-1], dict) and results[-1].get('OK', False) and isinstance(results[-1].get('Value'), (int, long))
+        if results_file is not None and submitted:
+            with open(results_file, 'a') as f:
+                f.write('%d %d%s' % (len(results) - 1, results[-1]['Value'], os.linesep))
+
+    if pipe_out:
+        output(results)
+    else:
+        return results
+
+
 def ping(system, service):
     ''' Ping a given service on a given system running DIRAC '''
     output(dirac.ping(system, service))
@@ -118,7 +147,7 @@ def addFile(lfn, file, diracSE, guid):
     output(dirac.addFile(lfn, file, diracSE, guid))
 
 
-def getOutputSandbox(id, outputDir=os.getcwd(), oversized=True, noJobDir=True, pipe_out=True):
+def getOutputSandbox(id, outputDir=None, oversized=True, noJobDir=True, pipe_out=True):
     '''
     Get the outputsandbox and return the output from Dirac to the calling function
     id: the DIRAC jobid of interest
@@ -126,6 +155,8 @@ def getOutputSandbox(id, outputDir=os.getcwd(), oversized=True, noJobDir=True, p
     oversized: is this output sandbox oversized this will be modified
     noJobDir: should we create a folder with the DIRAC job ID?
     output: should I output the Dirac output or should I return a python object (False)'''
+    if outputDir is None:
+        outputDir = os.getcwd()
     result = dirac.getOutputSandbox(id, outputDir, oversized, noJobDir)
     if result is not None and result.get('OK', False):
 
@@ -141,40 +172,86 @@ def getOutputSandbox(id, outputDir=os.getcwd(), oversized=True, noJobDir=True, p
         return result
 
 
+def getBulkOutputSandbox(jobs, oversized=True, noJobDir=True, pipe_out=True):
+    ''' Get the outputsandboxes of several DIRAC jobs, given as a list of (id, outputDir), within one command and return
+    the result of getOutputSandbox for each id in a dictionary '''
+    result = {}
+    for this_id, outputDir in jobs:
+        result[this_id] = getOutputSandbox(this_id, outputDir, oversized, noJobDir, pipe_out=False)
+
+    if pipe_out:
+        output(result)
+    else:
+        return result
+
+
 def getOutputDataInfo(id, pipe_out=True):
     ''' Get information on the output data generated by a job of ID and pipe it out or return it'''
-    ret = {}
-    result = getOutputDataLFNs(id, pipe_out=False)
-    if result.get('OK', False) and 'Value' in result:
-        for lfn in result.get('Value', []):
+    ret = getBulkOutputDataInfo([id], pipe_out=False)[id][1]
+    if pipe_out:
+        output(ret)
+    else:
+        return ret
+
+
+def getBulkOutputDataInfo(job_ids, pipe_out=True):
+    ''' Get the normalised CPU time of several DIRAC jobs and information on the output data they generated. The metadata
+    and replicas of the output data of all the jobs are asked for at once. Returns a dictionary of (normCPUTime, output data
+    information) for each id, the information being as given by getOutputDataInfo'''
+    lfns = {}
+    cpu_times = {}
+    for this_id in job_ids:
+        parameters = dirac.parameters(this_id)
+        cpu_times[this_id] = _normCPUTime(parameters)
+        lfns_result = _outputDataLFNs(parameters)
+        lfns[this_id] = lfns_result['Value'] if lfns_result['OK'] else []
+
+    all_lfns = [lfn for these_lfns in lfns.values() for lfn in these_lfns]
+    md = {}
+    rp = {}
+    if all_lfns:
+        md = dirac.getMetadata(all_lfns)
+        rp = dirac.getReplicas(all_lfns)
+    metadata = md.get('Value', {}) if md.get('OK', False) else {}
+    replicas = rp.get('Value', {}) if rp.get('OK', False) else {}
+
+    result = {}
+    for this_id in job_ids:
+        ret = {}
+        for lfn in lfns[this_id]:
             file_name = os.path.basename(lfn)
             ret.update({file_name: {'LFN': lfn}})
-            md = dirac.getMetadata(lfn)
-            if md.get('OK', False) and lfn in md.get('Value', {'Successful': {}})['Successful']:
-                ret[file_name].update(
-                    {'GUID': md['Value']['Successful'][lfn]['GUID']})
+            if lfn in metadata.get('Successful', {}):
+                ret[file_name].update({'GUID': metadata['Successful'][lfn]['GUID']})
             # this catches if fail upload, note lfn still exists in list as
             # dirac tried it
-            elif md.get('OK', False) and lfn in md.get('Value', {'Failed': {}})['Failed']:
+            elif lfn in metadata.get('Failed', {}):
                 ret[file_name].update({'LFN': '###FAILED###'})
-                ret[file_name].update(
-                    {'LOCATIONS': md['Value']['Failed'][lfn]})
+                ret[file_name].update({'LOCATIONS': metadata['Failed'][lfn]})
                 ret[file_name].update({'GUID': 'NotAvailable'})
                 continue
-            rp = dirac.getReplicas(lfn)
-            if rp.get('OK', False) and lfn in rp.get('Value', {'Successful': {}})['Successful']:
-                ret[file_name].update(
-                    {'LOCATIONS': rp['Value']['Successful'][lfn].keys()})
+            if lfn in replicas.get('Successful', {}):
+                ret[file_name].update({'LOCATIONS': replicas['Successful'][lfn].keys()})
+        result[this_id] = (cpu_times[this_id], ret)
+
     if pipe_out:
-        output(ret)
+        output(result)
     else:
-        return ret
+        return result
 
 
 # could shrink this with dirac.getJobOutputLFNs from ##dirac
 def getOutputDataLFNs(id, pipe_out=True):
     ''' Get the outputDataLFN which have been generated by a Dirac job of ID and pipe it out or return it'''
-    parameters = dirac.parameters(id)
+    result = _outputDataLFNs(dirac.parameters(id))
+    if pipe_out:
+        output(result)
+    else:
+        return result
+
+
+def _outputDataLFNs(parameters):
+    ''' Find the outputDataLFN in the result of dirac.parameters for a job'''
     lfns = []
     ok = False
     message = 'The outputdata LFNs could not be found.'
@@ -202,30 +279,33 @@ def getOutputDataLFNs(id, pipe_out=True):
         result['Value'] = lfns
     else:
         result['Message'] = message
+    return result
+
 
+def normCPUTime(id, pipe_out=True):
+    ''' Get the normalied CPU time that has been used by a DIRAC job of ID and pipe it out or return it'''
+    ncput = _normCPUTime(dirac.parameters(id))
     if pipe_out:
-        output(result)
+        output(ncput)
     else:
-        return result
+        return ncput
 
 
-def normCPUTime(id, pipe_out=True):
-    ''' Get the normalied CPU time that has been used by a DIRAC job of ID and pipe it out or return it'''
-    parameters = dirac.parameters(id)
+def _normCPUTime(parameters):
+    ''' Find the normalised CPU time in the result of dirac.parameters for a job'''
     ncput = None
     if parameters is not None and parameters.get('OK', False):
         parameters = parameters['Value']
         if 'NormCPUTime(s)' in parameters:
             ncput = parameters['NormCPUTime(s)']
-    if pipe_out:
-        output(ncput)
-    else:
-        return ncput
+    return ncput
 
 
-def finished_job(id, outputDir=os.getcwd(), oversized=True, noJobDir=True):
+def finished_job(id, outputDir=None, oversized=True, noJobDir=True):
     ''' Nesting function to reduce number of calls made against DIRAC when finalising a job, takes arguments such as getOutputSandbox
     Returns the CPU time of the job as a dict, the output sandbox information in another dict and a dict of the LFN of any uploaded data'''
+    if outputDir is None:
+        outputDir = os.getcwd()
     out_cpuTime = normCPUTime(id, pipe_out=False)
     out_sandbox = getOutputSandbox(id, outputDir, oversized, noJobDir, pipe_out=False)
     out_dataInfo = getOutputDataInfo(id, pipe_out=False)
@@ -277,13 +357,17 @@ def status(job_ids, statusmapping, pipe_out=True):
 
 def getStateTime(id, status, pipe_out=True):
     ''' Return the state time from DIRAC corresponding to DIRACJob tranasitions'''
-    log = dirac.loggingInfo(id)
+    T = _stateTime(dirac.loggingInfo(id), status)
+    if pipe_out:
+        output(T)
+    else:
+        return T
+
+
+def _stateTime(log, status):
+    ''' Find the time of the DIRACJob transition corresponding to a Ganga status in the result of dirac.loggingInfo'''
     if 'Value' not in log:
-        if pipe_out:
-            output(None)
-            return
-        else:
-            return None
+        return None
     L = log['Value']
     checkstr = ''
 
@@ -299,21 +383,12 @@ def getStateTime(id, status, pipe_out=True):
         checkstr = ''
 
     if checkstr == '':
-        print("%s" % None)
-        return
+        return None
 
     for l in L:
         if checkstr in l[0]:
-            T = datetime.datetime(*(time.strptime(l[3], "%Y-%m-%d %H:%M:%S")[0:6]))
-            if pipe_out:
-                output(T)
-                return
-            else:
-                return T
-    if pipe_out:
-        output(None)
-    else:
-        return None
+            return datetime.datetime(*(time.strptime(l[3], "%Y-%m-%d %H:%M:%S")[0:6]))
+    return None
 
 def getBulkStateTime(job_ids, status, pipe_out=True):
     ''' Function to repeatedly call getStateTime for multiple Dirac Job id and return the result in a dictionary '''
@@ -326,6 +401,20 @@ def getBulkStateTime(job_ids, status, pipe_out=True):
     else:
         return result
 
+def getBulkStateTimes(job_ids, statuses, pipe_out=True):
+    ''' Return the state time of several Ganga statuses for multiple Dirac Job ids as a dictionary of the times of each
+    id for each status, asking for the logging information of each job only once '''
+    result = dict((status, {}) for status in statuses)
+    for this_id in job_ids:
+        log = dirac.loggingInfo(this_id)
+        for status in statuses:
+            result[status][this_id] = _stateTime(log, status)
+
+    if pipe_out:
+        output(result)
+    else:
+        return result
+
 def monitorJobs(job_ids, status_mapping, pipe_out=True):
     ''' This combines 'status' and 'getBulkStateTime' into 1 function call for monitoring
     '''
@@ -346,6 +435,29 @@ def monitorJobs(job_ids, status_mapping, pipe_out=True):
     else:
         return (status_info, state_info)
 
+def getJobsChangedSince(since, pipe_out=True):
+    ''' Return the ids of the jobs of the user whose LastUpdateTime in DIRAC is after since, a UTC time as a string.
+    Only the WMS is asked, about the jobs which changed, rather than about the status of every job'''
+    owner = None
+    try:
+        from DIRAC.Core.Security.ProxyInfo import getProxyInfo
+        proxy_info = getProxyInfo(disableVOMS=True)
+        if proxy_info['OK']:
+            owner = proxy_info['Value'].get('username')
+    except ImportError:
+        pass
+    if owner is None:
+        result = {'OK': False, 'Message': 'Could not find the DIRAC user of the proxy'}
+    else:
+        result = dirac.selectJobs(owner=owner, date=since)
+        if result.get('OK', False):
+            result['Value'] = [int(job_id) for job_id in result['Value']]
+
+    if pipe_out:
+        output(result)
+    else:
+        return result
+
 def timedetails(id):
     ''' Function to return the loggingInfo for a DIRAC Job of id'''
     log = dirac.loggingInfo(id)
@@ -6,16 +6,13 @@ from Ganga.Utility.logging import getLogger
 from GangaDirac.Lib.Utilities.DiracUtilities import execute
 from Ganga.Core.GangaThread.WorkerThreads import getQueues
 from GangaDirac.Lib.Files.DiracFile import DiracFile
-from copy import deepcopy
-import random
+from GangaDirac.Lib.Splitters.ReplicaSetCover import locationMasks, packSubsets, popCount
 import time
 import math
 
 configDirac = getConfig('DIRAC')
 logger = getLogger()
 
-global_random = random
-
 LFN_parallel_limit = 250
 limit_divide_one = 1. / float(LFN_parallel_limit)
 
@@ -31,24 +28,6 @@ def wrapped_execute(command, expected_type):
     return result
 
 
-# Find a random element from a python list that isn't in a given banned list
-# This is used for selecting a site element but it doesn't matter which is used
-
-def find_random_site(original_SE_list, banned_SE):
-    input_list = deepcopy(original_SE_list)
-    chosen_element = ""
-
-    while chosen_element == "" and len(input_list) > 0:
-        global global_random
-        this_element = global_random.sample(input_list, 1)[0]
-        if not this_element in banned_SE:
-            chosen_element = this_element
-            break
-        else:
-            input_list.remove(this_element)
-
-    return chosen_element
-
 # This function is used for adding all of the known site for a given SE
 # The output is stored in the dictionary site_to_SE_mapping
 
@@ -102,43 +81,20 @@ def getLFNReplicas(allLFNs, index, allLFNData):
         logger.info("Got Replica Info: [%s:%s] of %s" % (
             str(this_min), str(this_max), len(allLFNs)))
 
-# For a given site select 'wanted_common_site' many site from a given Set
-# If uniqueSE is requestd the site selected will NOT share a common SE
-
-
-def generate_site_selection(input_site, wanted_common_site, uniqueSE, site_to_SE_mapping, SE_to_site_mapping):
-    req_sitez = set([])
-    if len(input_site) > wanted_common_site:
-        used_site = set([])
-        for se in range(wanted_common_site):
-            this_site = find_random_site(input_site, used_site)
-            req_sitez.add(this_site)
-            if uniqueSE:
-
-                these_SE = SE_to_site_mapping[this_site]
-                for this_SE in these_SE:
-
-                    for site in site_to_SE_mapping[this_SE]:
-                        used_site.add(site)
-            else:
-                used_site.add(this_site)
-    else:
-        for s in input_site:
-            req_sitez.add(s)
-    return req_sitez
-
-
-def calculateSiteSEMapping(file_replicas, wanted_common_site, uniqueSE, site_to_SE_mapping, SE_to_site_mapping):
+def calculateSiteSEMapping(file_replicas, site_to_SE_mapping):
+    """
+    Find the sites which can read each LFN from the SEs it has replicas on
+    Args:
+        file_replicas (dict): The SEs of the replicas of each LFN
+        site_to_SE_mapping (dict): Filled with the sites which can read from each SE
+    """
 
-    SE_dict = dict()
     maps_size = 0
     found = []
 
-    # First find the SE for each site
+    # First find the site for each SE
     for lfn, repz in file_replicas.iteritems():
-        sitez = set([])
         for replica in repz:
-            sitez.add(replica)
             if not replica in found:
 
                 getQueues()._monitoring_threadpool.add_function(addToMapping, (str(replica), site_to_SE_mapping))
@@ -146,42 +102,18 @@ def calculateSiteSEMapping(file_replicas, wanted_common_site, uniqueSE, site_to_
                 maps_size = maps_size + 1
                 found.append(replica)
 
-        SE_dict[lfn] = sitez
-
     # Doing this in parallel so wait for it to finish
     while len(site_to_SE_mapping) != maps_size:
         time.sleep(0.1)
 
-    # Now calculate the 'inverse' dictionary of site for each SE
-    for _SE, _sites in site_to_SE_mapping.iteritems():
-        for site_i in _sites:
-            if site_i not in SE_to_site_mapping:
-                SE_to_site_mapping[site_i] = set([])
-            if _SE not in SE_to_site_mapping[site_i]:
-                SE_to_site_mapping[site_i].add(_SE)
-
-    # These can be used to select the site which know of a given SE
-    # Or vice versa
-
-    # Now lets generate a dictionary of some chosen site vs LFN to use in
-    # constructing subsets
-    allSubSets = []
-    allChosenSets = {}
-
     site_dict = {}
-    for _lfn, sites in SE_dict.iteritems():
+    for _lfn, repz in file_replicas.iteritems():
         site_dict[_lfn] = set([])
-        for _site in sites:
-            for _SE in site_to_SE_mapping[_site]:
-                site_dict[_lfn].add(_SE)
+        for _SE in repz:
+            for _site in site_to_SE_mapping[_SE]:
+                site_dict[_lfn].add(_site)
 
-    # Now select a set of site to use as a seed for constructing a subset of
-    # LFN
-    for lfn in site_dict.keys():
-        allChosenSets[lfn] = generate_site_selection(
-            site_dict[lfn], wanted_common_site, uniqueSE, site_to_SE_mapping, SE_to_site_mapping)
-
-    return site_dict, allSubSets, allChosenSets
+    return site_dict
 
 
 def lookUpLFNReplicas(inputs, allLFNData):
@@ -312,7 +244,6 @@ def OfflineGangaDiracSplitter(_inputs, filesPerJob, maxFiles, ignoremissing):
     # REQUESTS AT ONCE ON ONE CONNECTION
 
     wanted_common_site = configDirac['OfflineSplitterMaxCommonSites']
-    iterative_limit = configDirac['OfflineSplitterLimit']
     good_fraction = configDirac['OfflineSplitterFraction']
     uniqueSE = configDirac['OfflineSplitterUniqueSE']
 
@@ -348,112 +279,45 @@ def OfflineGangaDiracSplitter(_inputs, filesPerJob, maxFiles, ignoremissing):
             logger.error("Errors found getting LFNs:\n%s" % str(errors))
             raise SplittingError("Error trying to split dataset with invalid LFN and ignoremissing = False")
 
-    # This finds all replicas for all LFNs...
-    # This will probably struggle for LFNs which don't exist
-    # Bad LFN should have been removed by this point however
-    all_lfns = [LFNdict[this_lfn].locations for this_lfn in LFNdict if this_lfn not in bad_lfns]
-
     logger.info("Got replicas")
 
+    # This finds all replicas for all LFNs...
+    # Bad LFN should have been removed by this point however
+    bad_lfn_set = set(bad_lfns)
     for this_input in inputs:
-        if this_input.lfn not in bad_lfns:
+        if this_input.lfn not in bad_lfn_set:
             file_replicas[this_input.lfn] = this_input.locations
 
     logger.info("found all replicas")
 
-    logger.info("Calculating site<->SE Mapping")
-
-    site_to_SE_mapping = {}
-    SE_to_site_mapping = {}
-
-    # Now lets generate a dictionary of some chosen site vs LFN to use in
-    # constructing subsets
-    site_dict, allSubSets, allChosenSets = calculateSiteSEMapping(
-        file_replicas, wanted_common_site, uniqueSE, site_to_SE_mapping, SE_to_site_mapping)
-
-    logger.debug("Found all SE in use")
+    if uniqueSE:
+        # LFNs sharing replicas on different SEs can be read at sites which use different SEs
+        lfn_locations = file_replicas
+    else:
+        logger.info("Calculating site<->SE Mapping")
+        site_to_SE_mapping = {}
+        lfn_locations = calculateSiteSEMapping(file_replicas, site_to_SE_mapping)
+        logger.debug("Found all SE in use")
 
     # BELOW IS WHERE THE ACTUAL SPLITTING IS DONE
 
     logger.info("Calculating best data subsets")
 
-    iterations = 0
-    # Loop over all LFNs
-    while len(site_dict.keys()) > 0:
-
-        # LFN left to be used
-        # NB: Can't modify this list and iterate over it directly in python
-        LFN_instances = site_dict.keys()
-        # Already used LFN
-        chosen_lfns = set()
-
-        for iterating_LFN in LFN_instances:
-
-            # If this has previously been selected lets ignore it and move on
-            if iterating_LFN in chosen_lfns:
-                continue
-
-            # Use this seed to try and construct a subset
-            req_sitez = allChosenSets[iterating_LFN]
-            _this_subset = []
-
-            #logger.debug("find common LFN for: " + str(allChosenSets[iterating_LFN]))
-
-            # Construct subset
-            # Starting with i, populate subset with LFNs which have an
-            # overlap of at least 2 SE
-            for this_LFN in LFN_instances:
-                if this_LFN in chosen_lfns:
-                    continue
-                if req_sitez.issubset(site_dict[this_LFN]):
-                    if len(_this_subset) >= filesPerJob:
-                        break
-                    _this_subset.append(this_LFN)
-
-            limit = int(math.floor(float(filesPerJob) * good_fraction))
-
-            #logger.debug("Size limit: %s" % str(limit))
-
-            # If subset is too small throw it away
-            if len(_this_subset) < limit:
-                #logger.debug("%s < %s" % (str(len(_this_subset)), str(limit)))
-                allChosenSets[iterating_LFN] = generate_site_selection(site_dict[iterating_LFN], wanted_common_site, uniqueSE, site_to_SE_mapping, SE_to_site_mapping)
-                continue
-            else:
-                logger.debug("found common LFN for: " + str(allChosenSets[iterating_LFN]))
-                logger.debug("%s > %s" % (str(len(_this_subset)), str(limit)))
-                # else Dataset was large enough to be considered useful
-                logger.debug("Generating Dataset of size: %s" % str(len(_this_subset)))
-                ## Construct DiracFile here as we want to keep the above combination
-                allSubSets.append([DiracFile(lfn=str(this_LFN)) for this_LFN in _this_subset])
-
-                for lfn in _this_subset:
-                    site_dict.pop(lfn)
-                    allChosenSets.pop(lfn)
-                    chosen_lfns.add(lfn)
-
-        # Lets keep track of how many times we've tried this
-        iterations = iterations + 1
-
-        # Can take a while so lets not let threads become un-locked
-        import Ganga.Runtime.Repository_runtime
-        Ganga.Runtime.Repository_runtime.updateLocksNow()
-
-        # If on final run, will exit loop after this so lets try and cleanup
-        if iterations >= iterative_limit:
-
-            if good_fraction < 0.5:
-                good_fraction = good_fraction * 0.75
-                iterations = 0
-            elif wanted_common_site > 1:
-                logger.debug("Reducing Common Site Size")
-                wanted_common_site = wanted_common_site - 1
-                iterations = 0
-                good_fraction = 0.75
-            else:
-                good_fraction = good_fraction * 0.75
+    # Group the LFNs with the same replicas, keeping them in the order of the inputs
+    lfns = []
+    lfns_seen = set()
+    for this_input in inputs:
+        if this_input.lfn in file_replicas and this_input.lfn not in lfns_seen:
+            lfns_seen.add(this_input.lfn)
+            lfns.append(this_input.lfn)
+    locations, groups = locationMasks(lfns, lfn_locations)
+    logger.debug("%s LFNs at %s locations have %s different replica signatures" % (len(lfns), len(locations), len(groups)))
 
-            logger.debug("good_fraction: %s" % str(good_fraction))
+    allSubSets = []
+    for mask, subset in packSubsets(groups, filesPerJob, wanted_common_site, good_fraction):
+        logger.debug("Generating Dataset of size: %s sharing %s locations" % (str(len(subset)), popCount(mask)))
+        ## Construct DiracFile here as we want to keep the above combination
+        allSubSets.append([DiracFile(lfn=str(this_LFN)) for this_LFN in subset])
 
     split_files = allSubSets
 
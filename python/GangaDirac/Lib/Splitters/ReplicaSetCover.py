@@ -0,0 +1,116 @@
+"""
+Packing of LFNs into subsets which can be read at the same locations
+
+The locations of each LFN, the sites which can read it or the storage elements holding it, are encoded as an integer
+with a bit per location, its replica signature. The LFNs are grouped by signature, as many LFNs share theirs, and
+whole subsets of filesPerJob LFNs are cut from each group first. What is left of the groups is packed greedily, biggest
+first, into subsets of at most filesPerJob LFNs whose signatures share at least the wanted number of locations, a group
+being split across subsets when it doesn't fit. Subsets which come out smaller than the wanted fraction of filesPerJob
+are undone and packed again asking for one location less in common, down to one.
+
+This takes time linear in the number of LFNs and in the number of signatures times the number of subsets open at once,
+rather than in the square of the number of LFNs.
+"""
+
+import math
+from Ganga.Utility.external.OrderedDict import OrderedDict as oDict
+
+
+def popCount(mask):
+    """Return the number of locations in a mask"""
+    return bin(mask).count('1')
+
+
+def locationMasks(lfns, lfn_locations):
+    """
+    Encode the locations of each LFN as a mask with a bit per location and group the LFNs by mask
+    Args:
+        lfns (list): The LFNs to group, in the order to keep within the groups
+        lfn_locations (dict): The locations, e.g. sites, of each LFN
+
+    Returns the locations in the order of their bits and an OrderedDict of the LFNs of each mask, in the order the
+    masks were first seen
+    """
+    locations = sorted(set(location for lfn in lfns for location in lfn_locations.get(lfn, [])))
+    bits = dict((location, 1 << i) for i, location in enumerate(locations))
+    groups = oDict()
+    for lfn in lfns:
+        mask = 0
+        for location in lfn_locations.get(lfn, []):
+            mask |= bits[location]
+        groups.setdefault(mask, []).append(lfn)
+    return locations, groups
+
+
+def _firstFit(fragments, filesPerJob, common):
+    """
+    Pack fragments of groups into subsets, biggest first, each going to the first subset it shares enough locations
+    with and has room in, split across subsets if need be
+    Args:
+        fragments (list): (mask, [lfns]) of each fragment
+        filesPerJob (int): The most LFNs in a subset
+        common (int): The number of locations the LFNs of a subset are to share, or all those of the first fragment of
+                      the subset or of a fragment joining it if they have fewer
+
+    Returns [mask shared by the LFNs, [(mask, [lfns]) of each fragment]] of each subset
+    """
+    subsets = []
+    # [mask shared by the LFNs, locations to be kept in common, number of LFNs, fragments] of the subsets with room
+    open_subsets = []
+    for mask, lfns in sorted(fragments, key=lambda fragment: (-len(fragment[1]), fragment[0])):
+        need = min(common, popCount(mask))
+        while lfns:
+            for subset in open_subsets:
+                shared = subset[0] & mask
+                if popCount(shared) >= max(subset[1], need) and (mask or not subset[0]):
+                    break
+            else:
+                subset = [mask, need, 0, []]
+                open_subsets.append(subset)
+                subsets.append(subset)
+                shared = mask
+            taken = lfns[:filesPerJob - subset[2]]
+            lfns = lfns[len(taken):]
+            subset[0] = shared
+            subset[2] += len(taken)
+            subset[3].append((mask, taken))
+            if subset[2] >= filesPerJob:
+                open_subsets.remove(subset)
+    return [(subset[0], subset[3]) for subset in subsets]
+
+
+def packSubsets(groups, filesPerJob, wanted_common, good_fraction):
+    """
+    Pack groups of LFNs with the same locations into subsets of at most filesPerJob LFNs which share locations
+    Args:
+        groups (dict): The LFNs of each location mask, as given by locationMasks
+        filesPerJob (int): The most LFNs in a subset
+        wanted_common (int): The number of locations the LFNs of a subset should share at first
+        good_fraction (float): Subsets with fewer than this fraction of filesPerJob LFNs are packed again asking for
+                               a location less in common, until one is asked for
+
+    Returns (mask of the locations all its LFNs share, [lfns]) of each subset. Every LFN is in exactly one subset
+    """
+    filesPerJob = max(1, int(filesPerJob))
+    subsets = []
+    fragments = []
+    # whole subsets of a group share all of its locations
+    for mask, lfns in groups.items():
+        whole = len(lfns) - len(lfns) % filesPerJob
+        for i in range(0, whole, filesPerJob):
+            subsets.append((mask, lfns[i:i + filesPerJob]))
+        if whole < len(lfns):
+            fragments.append((mask, lfns[whole:]))
+
+    limit = int(math.floor(float(filesPerJob) * good_fraction))
+    common = max(1, wanted_common)
+    while fragments:
+        packed = _firstFit(fragments, filesPerJob, common)
+        fragments = []
+        for mask, members in packed:
+            if common > 1 and sum(len(lfns) for _, lfns in members) < limit:
+                fragments.extend(members)
+            else:
+                subsets.append((mask, [lfn for _, lfns in members for lfn in lfns]))
+        common -= 1
+    return subsets
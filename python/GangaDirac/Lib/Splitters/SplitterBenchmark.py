@@ -0,0 +1,159 @@
+"""
+Benchmark of the packing of LFNs into subsets by the OfflineGangaDiracSplitter on synthetic replica maps
+
+A dataset of num_lfns LFNs is spread over num_ses storage elements. The files come in num_placements placements, the
+SEs a run of files was replicated to, of 1 to max_replicas SEs each, and the number of LFNs of each placement falls
+off like a power law as in real datasets. The LFNs are grouped and packed as the splitter does, without asking DIRAC,
+and the numbers recorded are:
+
+ - time:    the seconds taken to find the replica signatures and to pack the subsets
+ - subsets: the number of subsets, how many LFNs they have and how many SEs their LFNs share
+ - checks:  whether every LFN is in exactly one subset, no subset is bigger than filesPerJob and the LFNs of each subset
+            share an SE
+
+Usage:
+
+    from GangaDirac.Lib.Splitters.SplitterBenchmark import runBenchmark
+    runBenchmark(num_lfns=200000, files_per_job=100, outfile='results.json')
+
+or from the command line, outside of a Ganga session:
+
+    python -m GangaDirac.Lib.Splitters.SplitterBenchmark --lfns 200000 --output results.json
+"""
+
+import json
+import random
+import time
+
+from GangaDirac.Lib.Splitters.ReplicaSetCover import locationMasks, packSubsets, popCount
+
+
+def syntheticReplicas(num_lfns, num_ses=30, num_placements=500, max_replicas=4, seed=1234):
+    """
+    Return the SEs of the replicas of each of num_lfns made up LFNs, and the LFNs in the order they were made
+    Args:
+        num_lfns (int): The number of LFNs
+        num_ses (int): The number of SEs the replicas are on
+        num_placements (int): The number of different sets of SEs the LFNs are replicated to
+        max_replicas (int): The most replicas of an LFN
+        seed (int): The seed of the random numbers, the same seed making the same map
+    """
+    rand = random.Random(seed)
+    ses = ['SE-%02d' % i for i in range(num_ses)]
+    placements = [rand.sample(ses, rand.randint(1, min(max_replicas, num_ses))) for i in range(num_placements)]
+    # the first placements hold most of the files
+    weights = [1. / (i + 1) for i in range(num_placements)]
+    total = sum(weights)
+    cumulative = []
+    running = 0.
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+
+    lfns = []
+    replicas = {}
+    for i in range(num_lfns):
+        draw = rand.random()
+        index = next((j for j, c in enumerate(cumulative) if draw <= c), num_placements - 1)
+        lfn = '/lhcb/MC/2016/DST/%08d/%04d/%08d_%08d_1.dst' % (index, i // 1000, index, i)
+        lfns.append(lfn)
+        replicas[lfn] = placements[index]
+    return lfns, replicas
+
+
+def summarise(values):
+    """Return the count, min, mean and max of a series of numbers"""
+    if not values:
+        return {'count': 0}
+    return {'count': len(values), 'min': min(values), 'mean': sum(values) / float(len(values)), 'max': max(values)}
+
+
+def checkSubsets(subsets, lfns, lfn_locations, files_per_job):
+    """
+    Return whether the subsets hold every LFN exactly once, are no bigger than files_per_job and whether their LFNs
+    share a location
+    Args:
+        subsets (list): (mask, [lfns]) of each subset, as given by packSubsets
+        lfns (list): The LFNs which were packed
+        lfn_locations (dict): The locations of each LFN
+        files_per_job (int): The most LFNs in a subset
+    """
+    packed = [lfn for _, subset in subsets for lfn in subset]
+    shared = True
+    for _, subset in subsets:
+        common = set(lfn_locations[subset[0]])
+        for lfn in subset[1:]:
+            common &= set(lfn_locations[lfn])
+        if not common and any(lfn_locations[lfn] for lfn in subset):
+            shared = False
+            break
+    return {'all_lfns_once': len(packed) == len(lfns) and set(packed) == set(lfns),
+            'within_files_per_job': all(len(subset) <= files_per_job for _, subset in subsets),
+            'locations_shared': shared}
+
+
+def runBenchmark(num_lfns=200000, files_per_job=100, num_ses=30, num_placements=500, max_replicas=4,
+                 wanted_common=3, good_fraction=0.75, seed=1234, outfile=None):
+    """
+    Pack the LFNs of a synthetic replica map into subsets and return the numbers recorded
+    Args:
+        num_lfns (int): The number of LFNs
+        files_per_job (int): The most LFNs in a subset
+        num_ses (int): The number of SEs the replicas are on
+        num_placements (int): The number of different sets of SEs the LFNs are replicated to
+        max_replicas (int): The most replicas of an LFN
+        wanted_common (int): The number of SEs the LFNs of a subset should share, as OfflineSplitterMaxCommonSites
+        good_fraction (float): The fraction of files_per_job a subset should have, as OfflineSplitterFraction
+        seed (int): The seed of the random numbers
+        outfile (str): Where to write the results as JSON, not written if None
+    """
+    lfns, replicas = syntheticReplicas(num_lfns, num_ses, num_placements, max_replicas, seed)
+
+    t0 = time.time()
+    locations, groups = locationMasks(lfns, replicas)
+    t_masks = time.time() - t0
+    t0 = time.time()
+    subsets = packSubsets(groups, files_per_job, wanted_common, good_fraction)
+    t_pack = time.time() - t0
+
+    results = {
+        'parameters': {'num_lfns': num_lfns, 'files_per_job': files_per_job, 'num_ses': num_ses,
+                       'num_placements': num_placements, 'max_replicas': max_replicas,
+                       'wanted_common': wanted_common, 'good_fraction': good_fraction, 'seed': seed},
+        'time': {'masks': t_masks, 'pack': t_pack, 'total': t_masks + t_pack,
+                 'lfns_per_second': num_lfns / (t_masks + t_pack) if t_masks + t_pack else 0},
+        'signatures': len(groups),
+        'subsets': {'count': len(subsets),
+                    'size': summarise([len(subset) for _, subset in subsets]),
+                    'shared_ses': summarise([popCount(mask) for mask, _ in subsets]),
+                    'full': len([subset for _, subset in subsets if len(subset) == files_per_job])},
+        'checks': checkSubsets(subsets, lfns, replicas, files_per_job),
+    }
+
+    if outfile is not None:
+        with open(outfile, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    from optparse import OptionParser
+
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--lfns', dest='num_lfns', type='int', default=200000, help='number of LFNs')
+    parser.add_option('-f', '--files-per-job', dest='files_per_job', type='int', default=100,
+                      help='most LFNs in a subset')
+    parser.add_option('-s', '--ses', dest='num_ses', type='int', default=30, help='number of SEs')
+    parser.add_option('-p', '--placements', dest='num_placements', type='int', default=500,
+                      help='number of different sets of SEs the LFNs are replicated to')
+    parser.add_option('-r', '--replicas', dest='max_replicas', type='int', default=4, help='most replicas of an LFN')
+    parser.add_option('--seed', dest='seed', type='int', default=1234, help='seed of the random numbers')
+    parser.add_option('-o', '--output', dest='outfile', default=None, help='JSON results file')
+
+    (opts, args) = parser.parse_args(sys.argv[1:])
+    results = runBenchmark(num_lfns=opts.num_lfns, files_per_job=opts.files_per_job, num_ses=opts.num_ses,
+                           num_placements=opts.num_placements, max_replicas=opts.max_replicas, seed=opts.seed,
+                           outfile=opts.outfile)
+    print(json.dumps(results, indent=2, sort_keys=True))
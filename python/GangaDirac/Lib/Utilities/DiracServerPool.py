@@ -0,0 +1,316 @@
+"""
+A pool of long-lived DIRAC command servers
+
+Running a DIRAC command used to start a new python within the DIRAC environment which imported the DIRAC API and the
+Ganga DIRAC commands before running the command, seconds of overhead for every call. The pool keeps a few
+DiracCommandServer processes which have done that once and hands each command to an idle one.
+
+Servers are started when first needed, checked with a ping before being used after they have been idle for a while,
+restarted when they die, time out or have run their share of commands and stopped when Ganga exits.
+"""
+
+import atexit
+import hashlib
+import os
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from Ganga.Core.exceptions import GangaException
+from Ganga.Utility.Config import getConfig
+from Ganga.Utility.logging import getLogger
+
+logger = getLogger()
+
+_server_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Server',
+                              'DiracCommandServer.py')
+
+
+class DiracServerError(GangaException):
+
+    """A DIRAC command server couldn't be started or died while running a command"""
+
+    def __init__(self, message):
+        super(DiracServerError, self).__init__(message)
+        self.message = message
+
+    def __str__(self):
+        return "DiracServerError: %s" % self.message
+
+
+class DiracServerDied(DiracServerError):
+
+    """A server died while running a command, which may or may not have been done"""
+    pass
+
+
+class DiracServerTimeout(DiracServerDied):
+
+    """A command didn't finish within its timeout and the server running it was killed"""
+    pass
+
+
+class DiracServerProcess(object):
+
+    """
+    One DiracCommandServer process and the pipes to it
+    """
+
+    def __init__(self, env, setup, timeout=None):
+        """
+        Start the server and load the DIRAC commands into it
+        Args:
+            env (dict): The DIRAC environment to run the server in
+            setup (str): The DIRAC commands, run once within the server
+            timeout (int): How long loading the DIRAC commands may take
+        """
+        self.requests = 0
+        self.last_used = time.time()
+        # what the server and DIRAC print, read back only to explain a server failing to start
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(['python', _server_script], env=env, cwd=tempfile.gettempdir(),
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._log,
+                                         preexec_fn=os.setsid, close_fds=True)
+        self.pid = self._process.pid
+        try:
+            reply = self.request({'command': 'setup', 'code': setup}, timeout)
+        except DiracServerError as err:
+            log = self.getLog()
+            self.stop()
+            raise DiracServerError('Could not start a DIRAC command server: %s\n%s' % (err.message, log))
+        if not reply.get('ok'):
+            self.stop()
+            raise DiracServerError('Could not load the DIRAC commands:\n%s' % reply.get('error'))
+        logger.debug('Started DIRAC command server %s', self.pid)
+
+    def alive(self):
+        return self._process.poll() is None
+
+    def request(self, request, timeout=None):
+        """
+        Send a request to the server and return its reply
+        Args:
+            request (dict): The request, see DiracCommandServer
+            timeout (float): Seconds after which the server is killed, None to wait for ever
+        """
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            self.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            pickle.dump(request, self._process.stdin, 2)
+            self._process.stdin.flush()
+            reply = pickle.load(self._process.stdout)
+        except (EOFError, IOError, OSError, pickle.UnpicklingError) as err:
+            self.kill()
+            if timed_out.is_set():
+                raise DiracServerTimeout('DIRAC command server %s timed out after %ss' % (self.pid, timeout))
+            raise DiracServerDied('DIRAC command server %s died: %s' % (self.pid, err or type(err).__name__))
+        finally:
+            if timer is not None:
+                timer.cancel()
+        self.last_used = time.time()
+        return reply
+
+    def execute(self, command, cwd=None, timeout=None):
+        """
+        Run python code within the server and return the reply
+        Args:
+            command (str): The code
+            cwd (str): The directory to run it in
+            timeout (float): Seconds after which the server is killed
+        """
+        self.requests += 1
+        return self.request({'command': 'exec', 'code': command, 'cwd': cwd}, timeout)
+
+    def ping(self, timeout=10):
+        """Return whether the server answers"""
+        try:
+            return self.request({'command': 'ping'}, timeout).get('pid') == self.pid
+        except DiracServerError as err:
+            logger.debug('DIRAC command server failed the health check: %s', err)
+            return False
+
+    def getLog(self):
+        """Return what the server printed"""
+        try:
+            self._log.seek(0)
+            return self._log.read()
+        except (IOError, ValueError):
+            return ''
+
+    def kill(self):
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def stop(self):
+        """Ask the server to exit, kill it if it doesn't"""
+        if self.alive():
+            try:
+                pickle.dump({'command': 'quit'}, self._process.stdin, 2)
+                self._process.stdin.close()
+            except (IOError, OSError):
+                pass
+            for i in range(10):
+                if not self.alive():
+                    break
+                time.sleep(0.1)
+            else:
+                self.kill()
+        try:
+            self._process.wait()
+        except OSError:
+            pass
+        for f in [self._process.stdout, self._log]:
+            try:
+                f.close()
+            except (IOError, OSError):
+                pass
+
+
+class DiracServerPool(object):
+
+    """
+    Hands DIRAC commands to a bounded number of DiracServerProcess
+    """
+
+    def __init__(self, size=None):
+        """
+        Args:
+            size (int): The largest number of servers, [DIRAC]CommandServers if None
+        """
+        self._size = size
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = []
+        self._count = 0
+        self._key = None
+        self.stats = {'started': 0, 'restarted': 0, 'requests': 0, 'timed_out': 0, 'failed_checks': 0}
+
+    def getSize(self):
+        if self._size is None:
+            return max(1, getConfig('DIRAC')['CommandServers'])
+        return self._size
+
+    def getStats(self):
+        """Return how many servers were started and restarted, how many commands ran and how many timed out"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update({'servers': self._count, 'idle': len(self._idle)})
+        return stats
+
+    def execute(self, command, env, setup, cwd=None, timeout=None):
+        """
+        Run a command on an idle server, starting one if there's room for it
+        Args:
+            command (str): The python code of the command
+            env (dict): The DIRAC environment
+            setup (str): The DIRAC commands the servers load
+            cwd (str): The directory to run the command in
+            timeout (float): Seconds after which the command is given up on, its server killed and replaced
+
+        Returns the reply of the server, see DiracCommandServer. Raises DiracServerError if no server could be started,
+        DiracServerDied if the server died running the command and DiracServerTimeout if the command timed out
+        """
+        server = self._acquire(env, setup, timeout)
+        ok = False
+        try:
+            reply = server.execute(command, cwd, timeout)
+            ok = True
+        except DiracServerTimeout:
+            with self._lock:
+                self.stats['timed_out'] += 1
+            raise
+        finally:
+            self._release(server, ok)
+        return reply
+
+    def _acquire(self, env, setup, timeout):
+        key = hashlib.sha1(setup + repr(sorted(env.items()))).hexdigest()
+        health_check = getConfig('DIRAC')['CommandServerHealthCheck']
+        while True:
+            with self._lock:
+                if self._key != key:
+                    # the DIRAC environment or commands changed, the servers have to be started again
+                    self._stopIdle()
+                    self._key = key
+                while not self._idle and self._count >= self.getSize():
+                    self._lock.wait()
+                server = self._idle.pop() if self._idle else None
+                if server is None:
+                    self._count += 1
+            if server is None:
+                try:
+                    server = DiracServerProcess(env, setup, timeout)
+                except:
+                    with self._lock:
+                        self._count -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self.stats['started'] += 1
+                return server
+            if server.alive() and (time.time() - server.last_used < health_check or server.ping()):
+                return server
+            # dead or not answering, start another in its place
+            logger.debug('DIRAC command server %s failed its health check, restarting it', server.pid)
+            server.stop()
+            with self._lock:
+                self.stats['failed_checks'] += 1
+                self.stats['restarted'] += 1
+                self._count -= 1
+                self._lock.notify()
+
+    def _release(self, server, ok):
+        retire = not ok or not server.alive() or server.requests >= getConfig('DIRAC')['CommandServerMaxRequests']
+        if retire:
+            server.stop()
+        with self._lock:
+            self.stats['requests'] += 1
+            if retire:
+                self._count -= 1
+                if not ok:
+                    self.stats['restarted'] += 1
+            else:
+                self._idle.append(server)
+            self._lock.notify()
+
+    def _stopIdle(self):
+        for server in self._idle:
+            server.stop()
+        self._count -= len(self._idle)
+        self._idle = []
+
+    def shutdown(self):
+        """Stop the idle servers, those running a command are stopped when they are done with it"""
+        with self._lock:
+            self._stopIdle()
+            self._key = None
+
+
+_dirac_server_pool = None
+_dirac_server_pool_lock = threading.Lock()
+
+
+def getDiracServerPool():
+    """Return the DiracServerPool shared by Ganga"""
+    global _dirac_server_pool
+    with _dirac_server_pool_lock:
+        if _dirac_server_pool is None:
+            _dirac_server_pool = DiracServerPool()
+            atexit.register(_dirac_server_pool.shutdown)
+    return _dirac_server_pool
@@ -214,6 +214,39 @@ def _checkProxy( delay=60, renew = True, shouldRaise = True, force = False ):
             last_modified_time = time.time()
 
 
+_server_disabled = False
+
+# Returned by _server_execute when the command couldn't be run on a command server, None being a valid command output
+_server_unavailable = object()
+
+
+def _server_execute(command, env, python_setup, cwd, timeout, eval_includes):
+    """
+    Run a DIRAC command on the DiracServerPool and return what it gave back like Ganga.Utility.execute.execute does.
+    Returns _server_unavailable if no server could be started, the command is then run in its own process and no servers
+    are tried again in this session
+    """
+    from GangaDirac.Lib.Utilities.DiracServerPool import getDiracServerPool, DiracServerDied, DiracServerTimeout,\
+        DiracServerError
+    global _server_disabled
+    try:
+        reply = getDiracServerPool().execute(command, env, python_setup, cwd=cwd, timeout=timeout)
+    except DiracServerTimeout:
+        return 'Command timed out!'
+    except DiracServerDied as err:
+        # the command may have been done, running it again could e.g. submit a job twice
+        logger.warning("%s", err)
+        return str(err)
+    except DiracServerError as err:
+        logger.warning("Can't run DIRAC commands on a command server, starting a process for each: %s", err)
+        _server_disabled = True
+        return _server_unavailable
+
+    if reply['has_output']:
+        return reply['output']
+    return gexecute.process_stdout(reply['stdout'], False, eval_includes)
+
+
 def execute(command,
             timeout=getConfig('DIRAC')['Timeout'],
             env=None,
@@ -239,6 +272,10 @@ def execute(command,
         update_env (bool): Should this modify the given env object with the env after the command has executed
     """
 
+    # Plain DIRAC commands run on a command server which has loaded DIRAC already
+    use_server = getConfig('DIRAC')['useCommandServer'] and not _server_disabled and not shell and not update_env \
+        and env is None and python_setup == ''
+
     if env is None:
         env = getDiracEnv()
     if python_setup == '':
@@ -263,14 +300,20 @@ def execute(command,
     if not last_modified_valid:
         return None
 
-    returnable = gexecute.execute(command,
-                                  timeout=timeout,
-                                  env=env,
-                                  cwd=cwd_,
-                                  shell=shell,
-                                  python_setup=python_setup,
-                                  eval_includes=eval_includes,
-                                  update_env=update_env)
+    if use_server:
+        returnable = _server_execute(command, env, python_setup, cwd_, timeout, eval_includes)
+    else:
+        returnable = _server_unavailable
+
+    if returnable is _server_unavailable:
+        returnable = gexecute.execute(command,
+                                      timeout=timeout,
+                                      env=env,
+                                      cwd=cwd_,
+                                      shell=shell,
+                                      python_setup=python_setup,
+                                      eval_includes=eval_includes,
+                                      update_env=update_env)
 
     # TODO we would like some way of working out if the code has been executed correctly
     # Most commands will be OK now that we've added the check for the valid proxy before executing commands here
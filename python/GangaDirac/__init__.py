@@ -32,11 +32,26 @@ if not _after_bootstrap:
                                                 os.path.join(os.path.dirname(__file__), 'Lib/Server/DiracCommands.py')],
                       'The file containing the python commands that the local DIRAC server can execute. The default DiracCommands.py is added automatically')
 
+    configDirac.addOption('useCommandServer', True,
+                      'Run DIRAC commands on long-lived command servers which load the DIRAC API once, rather than starting a new python for each command')
+    configDirac.addOption('CommandServers', 4, 'The largest number of DIRAC command servers running commands at the same time')
+    configDirac.addOption('CommandServerMaxRequests', 500, 'Number of commands after which a DIRAC command server is replaced by a fresh one')
+    configDirac.addOption('CommandServerHealthCheck', 60, 'Seconds a DIRAC command server may be idle before it is pinged to check that it still answers before being used')
+
     configDirac.addOption('noInputDataBannedSites', [],
                       'List of sites to ban when a user job has no input data (this is meant to reduce the load on these sites)')
 
     configDirac.addOption('MaxDiracBulkJobs', 500, 'The Maximum allowed number of bulk submitted jobs before Ganga intervenes')
 
+    configDirac.addOption('BulkSubmit', 'bulk',
+                      "How the subjobs of a split job are submitted: 'bulk' runs the DIRAC scripts of a chunk of subjobs within one DIRAC command, "
+                      "'parametric' submits a chunk as one parametric DIRAC job when their scripts only differ in name, input data and input sandbox "
+                      "(falling back to 'bulk' otherwise) and '' submits each subjob with a command of its own")
+    configDirac.addOption('BulkSubmitChunkSize', 100, 'The number of subjobs submitted together by one DIRAC command, no more than MaxDiracBulkJobs')
+    configDirac.addOption('BulkSubmitConcurrency', 4, 'The number of chunks of subjobs being submitted at the same time')
+    configDirac.addOption('BulkSubmitRetries', 2, 'How many more times the subjobs of a chunk are submitted if DIRAC refused them')
+    configDirac.addOption('BulkSubmitTimeoutPerJob', 10, 'The seconds added to Timeout for each subjob of a chunk submitted by one DIRAC command')
+
     configDirac.addOption('failed_sandbox_download', True, 'Automatically download sandbox for failed jobs?')
 
     configDirac.addOption('load_default_Dirac_backend', True, 'Whether or not to load the default dirac backend. This allows packages to load a modified version if necessary')
@@ -53,11 +68,11 @@ if not _after_bootstrap:
 
     configDirac.addOption('DiracFileAutoGet', True, 'Should the DiracFile object automatically poll the Dirac backend for missing information on an lfn?')
 
-    configDirac.addOption('OfflineSplitterFraction', 0.75, 'If subset is above OfflineSplitterFraction*filesPerJob then keep the subset')
+    configDirac.addOption('OfflineSplitterFraction', 0.75, 'If subset is above OfflineSplitterFraction*filesPerJob then keep the subset, otherwise its LFN are grouped again asking for one common site less')
     configDirac.addOption('OfflineSplitterMaxCommonSites', 3, 'Maximum number of storage sites all LFN should share in the same dataset. This is reduced to 1 as the splitter gets more desperate to group the data.')
-    configDirac.addOption('OfflineSplitterUniqueSE', True, 'Should the Sites chosen be accessing different Storage Elements.')
+    configDirac.addOption('OfflineSplitterUniqueSE', True, 'Should the Sites chosen be accessing different Storage Elements. If True the LFN of a subset share replicas on OfflineSplitterMaxCommonSites SEs, otherwise they can be read at as many sites.')
     configDirac.addOption('OfflineSplitterLimit', 50,
-                      'Number of iterations of selecting random Sites that are performed before the spliter reduces the OfflineSplitter fraction by raising it by 1 power and reduces OfflineSplitterMaxCommonSites by 1. Smaller number makes the splitter accept many smaller subsets higher means keeping more subsets but takes much more CPU to match files accordingly.')
+                      'DEPRECATED. No longer used, the splitter groups the LFN by the sites of their replicas rather than by selecting random Sites.')
 
     configDirac.addOption('RequireDefaultSE', True, 'Do we require the user to configure a defaultSE in some way?')
 
@@ -82,6 +97,22 @@ if not _after_bootstrap:
                                                  'Unknown: No status for Job': 'failed'},
                                                 "Mapping of Dirac to Ganga Job statuses used to construct a queue to finalize a given job, i.e. final statues in 'statusmapping'")
 
+    configDirac.addOption('IncrementalMonitoring', True,
+                      'Only ask DIRAC for the status of the jobs which it updated since they were last monitored, rather than for the status of every job on every cycle')
+    configDirac.addOption('MonitoringFullUpdateInterval', 3600, 'Seconds after which a job is asked about on the next cycle whether DIRAC updated it or not')
+    configDirac.addOption('MonitoringWatermarkOverlap', 300,
+                      'Seconds to go back before the time jobs were last monitored when asking DIRAC which of them were updated, allowing for the clocks differing')
+    configDirac.addOption('MonitoringShardSize', 1000, 'The largest number of jobs asked about by one DIRAC monitoring command')
+    configDirac.addOption('MonitoringConcurrency', 4, 'The number of DIRAC monitoring commands run at the same time')
+
+    configDirac.addOption('FinalisationPipeline', True,
+                      'Finalise the jobs DIRAC finished on a pipeline of stages fetching their state times, output sandboxes and output data LFNs for many jobs at once, '
+                      'which a new session resumes, rather than on the monitoring threads one job at a time')
+    configDirac.addOption('FinalisationBatchSize', 50, 'The largest number of jobs a stage of the finalisation pipeline runs one DIRAC command for')
+    configDirac.addOption('FinalisationQueueSize', 500, 'The largest number of jobs waiting for each stage of the finalisation pipeline')
+    configDirac.addOption('FinalisationStageThreads', 2, 'The number of threads running each stage of the finalisation pipeline')
+    configDirac.addOption('FinalisationRetries', 4, 'How many more times a stage of the finalisation pipeline is tried for a job it failed for before the job is failed')
+
     configDirac.addOption('serializeBackend', False, 'Developer option to serialize Dirac code for profiling/debugging')
 
 
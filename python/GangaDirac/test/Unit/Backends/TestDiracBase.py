@@ -242,9 +242,11 @@ def test_kill(db):
         with pytest.raises(BackendError):
             db.kill()
 
+    DiracBase._monitoring_state._checked[1234] = (None, 0)
     with patch('GangaDirac.Lib.Backends.DiracBase.execute', return_value={'OK': True}) as execute:
         assert db.kill()
         execute.assert_called_once_with('kill(1234)')
+    assert 1234 not in DiracBase._monitoring_state._checked
 
 
 def test_peek(db):
@@ -416,3 +418,202 @@ def test_getOutputDataLFNs(db):
 
         subjob = True
         assert db.getOutputDataLFNs() == ['a', 'b', 'c'] * 3
+
+
+submit_script = """
+from DIRAC.Interfaces.API.Dirac import Dirac
+from DIRAC.Interfaces.API.Job import Job
+dirac = Dirac()
+j = Job()
+j.setName('###NAME###')
+j.setExecutable('exe-script.py','','Ganga_Executable.log')
+j.setInputSandbox(##INPUT_SANDBOX##)
+j.setInputData(###INPUTDATA###)
+result = dirac.submit(j)
+output(result)
+"""
+
+
+def _split_job(backend, num_subjobs):
+    """A master job with subjobs and the StandardJobConfig of each subjob"""
+    j = Job()
+    j.id = 0
+    j.backend = backend
+    backend._parent = j
+    j.subjobs = [Job() for i in range(num_subjobs)]
+    configs = []
+    for i, sj in enumerate(j.subjobs):
+        sj.id = i
+        sj._setParent(j)
+        sj.backend = DiracBase()
+        configs.append(StandardJobConfig(exe=submit_script.replace('###NAME###', 'job_0.%d' % i)
+                                         .replace('###INPUTDATA###', repr(['/lfn/%d' % i])),
+                                         inputbox=[File(os.path.abspath(__file__))]))
+    return j, configs
+
+
+def _bulk_submit_args(command):
+    """The scripts and results file of a bulkSubmit command"""
+    return eval(command, {'bulkSubmit': lambda scripts, results_file=None: (scripts, results_file)})
+
+
+@pytest.yield_fixture
+def bulk_config():
+    from Ganga.Utility.Config import getConfig
+    config = getConfig('DIRAC')
+    yield config
+    for option in ['BulkSubmit', 'BulkSubmitChunkSize', 'BulkSubmitRetries']:
+        config.revertToDefault(option)
+
+
+def test_master_submit_bulk(db, bulk_config):
+    """The subjobs are submitted in chunks, those DIRAC refused are submitted again"""
+    bulk_config.setSessionValue('BulkSubmit', 'bulk')
+    bulk_config.setSessionValue('BulkSubmitChunkSize', 2)
+    bulk_config.setSessionValue('BulkSubmitRetries', 1)
+    j, configs = _split_job(db, 5)
+
+    commands = []
+
+    def fake_execute(command, timeout=None):
+        commands.append(command)
+        assert command.startswith('bulkSubmit(')
+        results = []
+        for script in _bulk_submit_args(command)[0]:
+            index = int(os.path.basename(os.path.dirname(os.path.dirname(script))))
+            if index == 3 and len(commands) == 2:
+                results.append({'OK': False, 'Message': 'Busy'})
+            else:
+                results.append({'OK': True, 'Value': 100 + index})
+        return results
+
+    with patch.object(db, 'master_prepare', return_value=['master.tgz']):
+        with patch('GangaDirac.Lib.Backends.DiracBase.execute', fake_execute):
+            assert db.master_submit(j.subjobs, configs, None)
+
+    # 3 chunks and a retry of the subjob which was refused
+    assert len(commands) == 4
+    assert [sj.backend.id for sj in j.subjobs] == [100, 101, 102, 103, 104]
+    assert [sj.status for sj in j.subjobs] == ['submitted'] * 5
+    # the script of each subjob is there to resubmit it
+    for sj in j.subjobs:
+        with open(os.path.join(sj.getInputWorkspace().getPath(), 'dirac-script.py')) as f:
+            assert "j.setName('job_0.%d')" % sj.id in f.read()
+
+
+def test_master_submit_bulk_failure(db, bulk_config):
+    """Subjobs which couldn't be submitted are reported, a failed command isn't run again"""
+    from Ganga.Core import IncompleteJobSubmissionError
+    bulk_config.setSessionValue('BulkSubmit', 'bulk')
+    bulk_config.setSessionValue('BulkSubmitChunkSize', 2)
+    j, configs = _split_job(db, 3)
+
+    def fake_execute(command, timeout=None):
+        scripts = _bulk_submit_args(command)[0]
+        if len(scripts) == 1:
+            return 'Command timed out!'
+        return [{'OK': True, 'Value': 100 + i} for i in range(len(scripts))]
+
+    with patch.object(db, 'master_prepare', return_value=['master.tgz']):
+        with patch('GangaDirac.Lib.Backends.DiracBase.execute', Mock(side_effect=fake_execute)) as execute:
+            with pytest.raises(IncompleteJobSubmissionError):
+                db.master_submit(j.subjobs, configs, None, keep_going=True)
+            assert execute.call_count == 2
+
+    assert [sj.status for sj in j.subjobs] == ['submitted', 'submitted', 'failed']
+
+
+def test_master_submit_bulk_timeout(db, bulk_config):
+    """The jobs a command submitted before it timed out are given to their subjobs, its timeout grows with the chunk"""
+    from Ganga.Core import IncompleteJobSubmissionError
+    bulk_config.setSessionValue('BulkSubmit', 'bulk')
+    bulk_config.setSessionValue('BulkSubmitChunkSize', 3)
+    j, configs = _split_job(db, 3)
+
+    timeouts = []
+    results_files = []
+
+    def fake_execute(command, timeout=None):
+        timeouts.append(timeout)
+        scripts, results_file = _bulk_submit_args(command)
+        results_files.append(results_file)
+        with open(results_file, 'w') as f:
+            f.write('0 100\n2 102\n1 1')
+        return 'Command timed out!'
+
+    with patch.object(db, 'master_prepare', return_value=['master.tgz']):
+        with patch('GangaDirac.Lib.Backends.DiracBase.execute', fake_execute):
+            with pytest.raises(IncompleteJobSubmissionError):
+                db.master_submit(j.subjobs, configs, None, keep_going=True)
+
+    assert timeouts == [bulk_config['Timeout'] + 3 * bulk_config['BulkSubmitTimeoutPerJob']]
+    assert [sj.backend.id for sj in j.subjobs] == [100, None, 102]
+    assert [sj.status for sj in j.subjobs] == ['submitted', 'failed', 'submitted']
+    assert not os.path.exists(results_files[0])
+
+
+def test_master_submit_parametric(db, bulk_config, tmpdir, monkeypatch):
+    """A chunk is submitted as one parametric job of the fake DIRAC, whose jobs are given to the subjobs in order"""
+    import sys
+    fake_dirac_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
+                                  'testlib', 'FakeDIRAC')
+    monkeypatch.syspath_prepend(fake_dirac_dir)
+    monkeypatch.setenv('FAKE_DIRAC_DIR', str(tmpdir))
+    import FakeDiracState
+
+    bulk_config.setSessionValue('BulkSubmit', 'parametric')
+    bulk_config.setSessionValue('BulkSubmitChunkSize', 3)
+    j, configs = _split_job(db, 4)
+
+    def run_script(script):
+        result = []
+        execfile(script, {'output': result.append})
+        return result[0]
+
+    def fake_execute(command, timeout=None):
+        if command.startswith('bulkSubmit('):
+            return [run_script(script) for script in _bulk_submit_args(command)[0]]
+        return run_script(eval(command[len('execfile('):-1]))
+
+    with patch.object(db, 'master_prepare', return_value=['master.tgz']):
+        with patch('GangaDirac.Lib.Backends.DiracBase.execute', fake_execute):
+            assert db.master_submit(j.subjobs, configs, None)
+
+    jobs = FakeDiracState.readState(str(tmpdir))['jobs']
+    assert len(jobs) == 4
+    for sj in j.subjobs[:3]:
+        parameters = jobs[str(sj.backend.id)]['JobParameters']
+        assert eval(parameters['JobName']) == 'job_0.%d' % sj.id
+        assert eval(parameters['InputData']) == ['/lfn/%d' % sj.id]
+        [sandbox] = eval(parameters['InputSandbox'])
+        assert sandbox.startswith(sj.getInputWorkspace().getPath())
+    # one parametric job for the first chunk, the last subjob on its own
+    assert [call[0] for call in FakeDiracState.readState(str(tmpdir))['calls']] == ['submit'] * 2
+    assert [jobs[str(sj.backend.id)].get('ParametricIndex') for sj in j.subjobs] == [0, 1, 2, None]
+    assert eval(jobs[str(j.subjobs[3].backend.id)]['Attributes']['Name']) == 'job_0.3'
+
+
+def test_monitor_dirac_running_jobs(db):
+    """Only the jobs the monitoring has news of are updated, those without a DIRAC id have failed"""
+    from Ganga.Utility.Config import getConfig
+    finalised_statuses = getConfig('DIRAC')['finalised_statuses']
+
+    j, configs = _split_job(db, 4)
+    j.status = 'submitted'
+    for sj, dirac_id in zip(j.subjobs, [11, 12, 13, None]):
+        sj.backend.id = dirac_id
+        sj.status = 'submitted'
+
+    news = {11: ['Application', 'Running', 'LCG.CERN.cern', 'running', 'Running'],
+            13: ['Execution Complete', 'Done', 'LCG.CERN.cern', 'completed', 'Done']}
+
+    with patch.object(DiracBase._monitoring_state, 'update', return_value=(news, {})) as update:
+        with patch.object(DiracBase, 'checkDiracProxy', return_value=True):
+            with patch.object(DiracBase, '_bulk_updateStateTime'):
+                with patch.object(DiracBase, 'requeue_dirac_finished_jobs') as requeue:
+                    DiracBase.monitor_dirac_running_jobs(j.subjobs, finalised_statuses)
+
+    assert update.call_args[0][0] == [11, 12, 13]
+    assert [sj.status for sj in j.subjobs] == ['running', 'submitted', 'running', 'failed']
+    assert [sj.backend.status for sj in j.subjobs] == ['Running', None, 'Done', None]
+    assert requeue.call_args[0][0] == [j.subjobs[2]]
@@ -0,0 +1,175 @@
+import os
+import sys
+
+import pytest
+
+from Ganga.testlib.GangaUnitTest import load_config_files, clear_config
+from Ganga.GPIDev.Lib.Job import Job
+from Ganga.Lib.Executable import Executable
+from GangaDirac.Lib.Backends import Dirac
+from GangaDirac.Lib.Files.DiracFile import DiracFile
+
+fake_dirac_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'testlib',
+                              'FakeDIRAC')
+sys.path.insert(0, fake_dirac_dir)
+import FakeDiracState
+
+
+@pytest.yield_fixture(scope='module', autouse=True)
+def config_files():
+    """
+    Load the config files in a way similar to a full Ganga session
+    """
+    load_config_files()
+    yield
+    clear_config()
+
+
+@pytest.yield_fixture
+def fake_dirac(tmpdir, monkeypatch):
+    """Run the DIRAC commands on a command server of a fake DIRAC with its own state"""
+    from Ganga.Utility.Config import getConfig
+    from GangaDirac.Lib.Backends import DiracFinalisation
+    from GangaDirac.Lib.Utilities import DiracUtilities, DiracServerPool
+
+    fake_env = FakeDiracState.fakeDiracEnv(str(tmpdir.mkdir('dirac_state')))
+    monkeypatch.setattr(DiracUtilities, 'DIRAC_ENV', fake_env)
+    monkeypatch.setattr(DiracUtilities, '_checkProxy', lambda *args, **kwds: None)
+    monkeypatch.setattr(DiracUtilities, 'last_modified_valid', True)
+    monkeypatch.setattr(DiracFinalisation, '_proxyValid', lambda *args, **kwds: True)
+    monkeypatch.setattr(DiracServerPool, '_dirac_server_pool', DiracServerPool.DiracServerPool(2))
+
+    config = getConfig('DIRAC')
+    config.setSessionValue('FinalisationStageThreads', 1)
+    config.setSessionValue('FinalisationRetries', 1)
+    yield fake_env['FAKE_DIRAC_DIR']
+    for option in ['FinalisationStageThreads', 'FinalisationRetries', 'FinalisationQueueSize']:
+        config.revertToDefault(option)
+    DiracServerPool.getDiracServerPool().shutdown()
+
+
+@pytest.yield_fixture
+def pipeline(tmpdir):
+    from GangaDirac.Lib.Backends.DiracFinalisation import DiracFinalisationPipeline
+    pipeline = DiracFinalisationPipeline(str(tmpdir.join('journal')))
+    pipeline.retry_delay = 0.1
+    yield pipeline
+    pipeline.stop()
+
+
+def _running_job(dirac_ids):
+    """A running master job with a running subjob for each of the DIRAC ids"""
+    j = Job()
+    j.id = 0
+    j.backend = Dirac()
+    j.subjobs = [Job() for i in dirac_ids]
+    for i, (sj, dirac_id) in enumerate(zip(j.subjobs, dirac_ids)):
+        sj.id = i
+        sj._setParent(j)
+        sj.backend = Dirac()
+        sj.backend.id = dirac_id
+        sj.outputfiles = [DiracFile('out.root')]
+        sj.status = 'running'
+    j.status = 'running'
+    return j
+
+
+def _finish_dirac_jobs(state_dir, num_done, num_failed):
+    """Create DIRAC jobs which are done, each with an output file, and jobs which failed, returning their ids"""
+    ids = FakeDiracState.addJobs([{} for i in range(num_done + num_failed)], state_dir=state_dir)
+    for dirac_id in ids[:num_done]:
+        lfn = '/lfn/%d/out.root' % dirac_id
+        FakeDiracState.addFile(lfn, {'CERN-DST': 'fake://CERN-DST%s' % lfn}, state_dir=state_dir)
+        FakeDiracState.setJobStatus([dirac_id], 'Done', 'Execution Complete', state_dir=state_dir,
+                                    parameters={'UploadedOutputData': lfn, 'NormCPUTime(s)': '12.5'})
+    FakeDiracState.setJobStatus(ids[num_done:], 'Failed', 'Application Finished With Errors', state_dir=state_dir)
+    return ids
+
+
+def test_pipeline_finalises_jobs(fake_dirac, pipeline, tmpdir):
+    """Done jobs are completed with their output, failed jobs failed and jobs whose output can't be had are failed"""
+    from Ganga.Utility.Config import getConfig
+
+    from GangaDirac.Lib.Backends.DiracBase import DiracBase
+
+    ids = _finish_dirac_jobs(fake_dirac, 3, 1)
+    j = _running_job(ids + [9999])
+    monitoring_state = DiracBase._monitoring_state
+    for dirac_id in ids:
+        monitoring_state._terminal[dirac_id] = (None, ('completed', None))
+    monitoring_state._checked[9999] = (None, 0)
+
+    # the stage threads wait until every job was queued, so the state times are fetched by one command
+    with pipeline._lock:
+        for sj, status in zip(j.subjobs, ['completed'] * 3 + ['failed', 'completed']):
+            assert pipeline.add(sj, status)
+            sj.been_queued = True
+        assert len(os.listdir(str(tmpdir.join('journal')))) == 5
+    assert pipeline.join(60)
+
+    assert [sj.status for sj in j.subjobs] == ['completed'] * 3 + ['failed'] * 2
+    for sj in j.subjobs[:3]:
+        output_path = sj.getOutputWorkspace().getPath()
+        assert os.path.isfile(os.path.join(output_path, 'std.out'))
+        with open(os.path.join(output_path, getConfig('Output')['PostProcessLocationsFileName'])) as f:
+            assert '/lfn/%d/out.root' % sj.backend.id in f.read()
+        assert sj.backend.normCPUTime == '12.5'
+        assert sj.time.timestamps['backend_final'] is not None
+        assert sj.been_queued is False
+    # the sandbox of the failed job is downloaded too
+    assert os.path.isfile(os.path.join(j.subjobs[3].getOutputWorkspace().getPath(), 'std.out'))
+
+    stats = pipeline.getStats()
+    assert (stats['queued'], stats['finalised'], stats['failed'], stats['pending']) == (5, 4, 1, 0)
+    assert stats['commands']['statetime'] == 1
+    assert os.listdir(str(tmpdir.join('journal'))) == []
+    # nothing is kept about the DIRAC jobs once they are no longer monitored
+    assert not set(ids + [9999]) & (set(monitoring_state._terminal) | set(monitoring_state._checked))
+
+
+def test_pipeline_resumes_from_journal(fake_dirac, pipeline, tmpdir):
+    """A job left completing by an earlier session goes on from the stage it reached, stale entries are dropped"""
+    from GangaDirac.Lib.Backends.DiracFinalisation import DiracFinalisationJournal
+
+    ids = _finish_dirac_jobs(fake_dirac, 1, 0)
+    j = _running_job(ids + [ids[0] + 1])
+    j.subjobs[0].status = 'completing'
+    journal = DiracFinalisationJournal(str(tmpdir.join('journal')))
+    state_times = {'running': None, 'completing': None, 'completed': '2016-01-01 12:00:00', 'failed': None}
+    journal.save({'fqid': '0.0', 'dirac_id': ids[0], 'status': 'completed', 'stages': ['outputdata'], 'attempts': 0,
+                  'state_times': state_times, 'sandbox': {'OK': True, 'Value': ['std.out']}})
+    journal.save({'fqid': '0.1', 'dirac_id': ids[0] + 2, 'status': 'completed', 'stages': ['sandbox', 'outputdata'],
+                  'attempts': 0, 'state_times': state_times})
+
+    pipeline.resume(lambda fqid: j.subjobs[int(fqid.split('.')[1])])
+    assert pipeline.join(60)
+
+    assert j.subjobs[0].status == 'completed'
+    assert j.subjobs[1].status == 'running'
+    assert str(j.subjobs[0].time.timestamps['backend_final']) == '2016-01-01 12:00:00'
+    # the sandbox was downloaded by the earlier session
+    calls = FakeDiracState.readState(fake_dirac)['calls']
+    assert 'getOutputSandbox' not in [call[0] for call in calls]
+    stats = pipeline.getStats()
+    assert (stats['resumed'], stats['finalised']) == (1, 1)
+    assert journal.load() == []
+
+
+def test_full_pipeline_rejects_jobs(fake_dirac, pipeline):
+    """A job the first stage has no room for is not queued, to be offered again later"""
+    from Ganga.Utility.Config import getConfig
+
+    getConfig('DIRAC').setSessionValue('FinalisationQueueSize', 1)
+    ids = _finish_dirac_jobs(fake_dirac, 2, 0)
+    j = _running_job(ids)
+
+    with pipeline._lock:
+        assert pipeline.add(j.subjobs[0], 'completed')
+        assert not pipeline.add(j.subjobs[1], 'completed')
+        # a job already in the pipeline isn't queued twice
+        assert pipeline.add(j.subjobs[0], 'completed')
+    assert pipeline.join(60)
+
+    assert [sj.status for sj in j.subjobs] == ['completed', 'running']
+    stats = pipeline.getStats()
+    assert (stats['queued'], stats['rejected'], stats['finalised']) == (1, 1, 1)
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+
+import pytest
+
+from Ganga.testlib.GangaUnitTest import load_config_files, clear_config
+
+fake_dirac_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'testlib',
+                              'FakeDIRAC')
+sys.path.insert(0, fake_dirac_dir)
+import FakeDiracState
+
+
+@pytest.yield_fixture(scope='module', autouse=True)
+def config_files():
+    """
+    Load the config files in a way similar to a full Ganga session
+    """
+    load_config_files()
+    yield
+    clear_config()
+
+
+@pytest.yield_fixture
+def fake_dirac(tmpdir, monkeypatch):
+    """Run the DIRAC commands on a command server of a fake DIRAC with its own state"""
+    from Ganga.Utility.Config import getConfig
+    from GangaDirac.Lib.Utilities import DiracUtilities, DiracServerPool
+
+    fake_env = FakeDiracState.fakeDiracEnv(str(tmpdir.mkdir('dirac_state')))
+    monkeypatch.setattr(DiracUtilities, 'DIRAC_ENV', fake_env)
+    monkeypatch.setattr(DiracUtilities, '_checkProxy', lambda *args, **kwds: None)
+    monkeypatch.setattr(DiracUtilities, 'last_modified_valid', True)
+    monkeypatch.setattr(DiracServerPool, '_dirac_server_pool', DiracServerPool.DiracServerPool(2))
+
+    config = getConfig('DIRAC')
+    config.setSessionValue('MonitoringWatermarkOverlap', 0)
+    yield fake_env['FAKE_DIRAC_DIR']
+    for option in ['MonitoringWatermarkOverlap', 'MonitoringFullUpdateInterval', 'MonitoringShardSize']:
+        config.revertToDefault(option)
+    DiracServerPool.getDiracServerPool().shutdown()
+
+
+def _status_calls(state_dir):
+    """The ids of the jobs of each call to the status method of the fake DIRAC, forgetting them"""
+    with FakeDiracState.state(state_dir) as data:
+        calls = [sorted(details) for name, pid, details in data['calls'] if name == 'status']
+        data['calls'] = []
+    return calls
+
+
+def test_only_changed_jobs_are_asked_about(fake_dirac):
+    """After a first cycle asking about every job, only those DIRAC updated are asked about"""
+    from Ganga.Utility.Config import getConfig
+    from GangaDirac.Lib.Backends.DiracMonitoring import DiracMonitoringState
+
+    mapping = getConfig('DIRAC')['statusmapping']
+    finalised = getConfig('DIRAC')['finalised_statuses']
+    ids = FakeDiracState.addJobs([{} for i in range(5)], state_dir=fake_dirac)
+    # DIRAC keeps the update times to the second
+    time.sleep(1.1)
+
+    state = DiracMonitoringState()
+    statuses, state_times = state.update(ids, mapping, finalised)
+    assert sorted(statuses) == ids
+    assert statuses[ids[0]][1:4] == ['Received', 'ANY', 'submitted']
+    assert _status_calls(fake_dirac) == [ids]
+
+    time.sleep(1.1)
+    FakeDiracState.setJobStatus([ids[1]], 'Running', 'Application', site='LCG.CERN.cern', state_dir=fake_dirac)
+    FakeDiracState.setJobStatus([ids[2]], 'Done', 'Execution Complete', state_dir=fake_dirac)
+    time.sleep(1.1)
+    statuses, state_times = state.update(ids, mapping, finalised)
+    assert sorted(statuses) == ids[1:3]
+    assert statuses[ids[1]][1:4] == ['Running', 'LCG.CERN.cern', 'running']
+    assert ids[2] in state_times['completed']
+    assert _status_calls(fake_dirac) == [ids[1:3]]
+
+    # nothing changed, the job which is done is given back without asking DIRAC
+    statuses, state_times = state.update(ids, mapping, finalised)
+    assert sorted(statuses) == [ids[2]]
+    assert statuses[ids[2]][1] == 'Done'
+    assert _status_calls(fake_dirac) == []
+
+    state.forget(ids[2])
+    statuses, state_times = state.update(ids, mapping, finalised)
+    assert _status_calls(fake_dirac) == [[ids[2]]]
+
+    stats = state.getStats()
+    assert (stats['cycles'], stats['queried'], stats['terminal']) == (4, 8, 1)
+
+
+def test_full_update_and_shards(fake_dirac):
+    """Jobs are asked about after MonitoringFullUpdateInterval, in shards of MonitoringShardSize"""
+    from Ganga.Utility.Config import getConfig
+    from GangaDirac.Lib.Backends.DiracMonitoring import DiracMonitoringState
+
+    config = getConfig('DIRAC')
+    ids = FakeDiracState.addJobs([{} for i in range(5)], state_dir=fake_dirac)
+    config.setSessionValue('MonitoringFullUpdateInterval', 0)
+    config.setSessionValue('MonitoringShardSize', 2)
+
+    state = DiracMonitoringState()
+    for i in range(2):
+        statuses, state_times = state.update(ids, config['statusmapping'], config['finalised_statuses'])
+        assert sorted(statuses) == ids
+        assert sorted(_status_calls(fake_dirac)) == [ids[0:2], ids[2:4], ids[4:5]]
@@ -1,7 +1,8 @@
 import pytest
 
 from Ganga.Core.exceptions import BackendError
-from GangaDirac.Lib.Backends.DiracUtils import result_ok, get_job_ident, get_parametric_datasets, outputfiles_iterator
+from GangaDirac.Lib.Backends.DiracUtils import result_ok, get_job_ident, get_parametric_datasets, get_parametric_script, \
+    outputfiles_iterator
 
 
 def test_result_ok():
@@ -58,6 +59,34 @@ j.somethingelse('other')
     assert isinstance(get_parametric_datasets(script.splitlines()), list)
 
 
+def test_get_parametric_script():
+    script = """
+from DIRAC.Interfaces.API.Job import Job
+j = Job()
+j.setName('%s')
+j.setExecutable('exe-script.py','','Ganga_Executable.log')
+j.setInputSandbox(['master.tgz', '%s'])
+j.setInputData(%s)
+result = dirac.submit(j)
+"""
+    scripts = [script % ('name_%d' % i, 'sandbox_%d.tgz' % i, [str(i)]) for i in range(3)]
+
+    merged = get_parametric_script(scripts).splitlines()
+    assert "j.setParameterSequence('JobName', ['name_0', 'name_1', 'name_2'])" in merged
+    assert "j.setName('%(JobName)s')" in merged
+    assert "j.setInputSandbox(['master.tgz'])" in merged
+    assert ("j.setParameterSequence('InputSandbox', [['sandbox_0.tgz'], ['sandbox_1.tgz'], ['sandbox_2.tgz']], "
+            "addToWorkflow='ParametricInputSandbox')") in merged
+    assert "j.setParameterSequence('InputData', [['0'], ['1'], ['2']], addToWorkflow='ParametricInputData')" in merged
+    assert "j.setExecutable('exe-script.py','','Ganga_Executable.log')" in merged
+
+    # DIRAC can't vary anything else, or input data given to some of the jobs only
+    other = scripts[0].replace("'Ganga_Executable.log'", "'other.log'")
+    assert get_parametric_script([scripts[0], other]) is None
+    assert get_parametric_script([scripts[0], script % ('name_1', 'sandbox_1.tgz', None)]) is None
+    assert get_parametric_script([scripts[0], scripts[1] + '\nj.setCPUTime(10)']) is None
+
+
 def test_outputfiles_iterator():
 
     ########################################################
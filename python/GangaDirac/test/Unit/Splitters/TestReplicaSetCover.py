@@ -0,0 +1,75 @@
+from GangaDirac.Lib.Splitters.ReplicaSetCover import locationMasks, packSubsets, popCount
+from GangaDirac.Lib.Splitters.SplitterBenchmark import checkSubsets, runBenchmark, syntheticReplicas
+
+
+def test_locationMasks():
+    """LFNs with the same locations share a mask, whichever order the locations are listed in"""
+    lfn_locations = {'a': ['CERN', 'RAL'], 'b': ['RAL', 'CERN'], 'c': ['PIC'], 'd': []}
+    locations, groups = locationMasks(['c', 'a', 'd', 'b'], lfn_locations)
+
+    assert locations == ['CERN', 'PIC', 'RAL']
+    assert list(groups.items()) == [(2, ['c']), (5, ['a', 'b']), (0, ['d'])]
+    assert popCount(5) == 2
+
+
+def test_packSubsets_whole_groups():
+    """Groups are cut into whole subsets first and what's left is packed with LFNs sharing the locations"""
+    lfn_locations = {}
+    lfns = []
+    for i in range(25):
+        lfns.append('one_%d' % i)
+        lfn_locations[lfns[-1]] = ['CERN', 'RAL', 'PIC']
+    for i in range(5):
+        lfns.append('two_%d' % i)
+        lfn_locations[lfns[-1]] = ['CERN', 'RAL']
+    for i in range(3):
+        lfns.append('three_%d' % i)
+        lfn_locations[lfns[-1]] = ['GRIDKA']
+    _, groups = locationMasks(lfns, lfn_locations)
+
+    subsets = packSubsets(groups, 10, 2, 0.75)
+
+    assert checkSubsets(subsets, lfns, lfn_locations, 10) == {'all_lfns_once': True, 'within_files_per_job': True,
+                                                              'locations_shared': True}
+    assert sorted(len(subset) for _, subset in subsets) == [3, 10, 10, 10]
+    # the 5 LFNs left of the first group joined those at two of its three sites
+    assert sorted(lfn[:3] for lfn in subsets[2][1]) == ['one'] * 5 + ['two'] * 5
+    assert popCount(subsets[2][0]) == 2
+
+
+def test_packSubsets_relaxes_common_locations():
+    """Subsets too small with the wanted locations in common are packed again asking for fewer"""
+    lfn_locations = {}
+    lfns = []
+    for name, sites in [('a', ['CERN', 'RAL']), ('b', ['CERN', 'PIC']), ('c', ['CERN', 'GRIDKA'])]:
+        for i in range(3):
+            lfns.append('%s_%d' % (name, i))
+            lfn_locations[lfns[-1]] = sites
+    _, groups = locationMasks(lfns, lfn_locations)
+
+    assert len(packSubsets(groups, 10, 2, 0.)) == 3
+    subsets = packSubsets(groups, 10, 2, 0.75)
+    assert len(subsets) == 1
+    assert checkSubsets(subsets, lfns, lfn_locations, 10)['locations_shared']
+
+
+def test_packSubsets_no_locations():
+    """LFNs without locations only go with each other"""
+    lfn_locations = {'a': [], 'b': [], 'c': ['CERN']}
+    _, groups = locationMasks(['a', 'b', 'c'], lfn_locations)
+
+    subsets = packSubsets(groups, 10, 1, 0.75)
+
+    assert sorted(sorted(subset) for _, subset in subsets) == [['a', 'b'], ['c']]
+
+
+def test_benchmark():
+    """The benchmark packs a synthetic dataset correctly"""
+    lfns, replicas = syntheticReplicas(1000, num_ses=10, num_placements=40, seed=1)
+    assert len(lfns) == len(set(lfns)) == 1000
+    assert all(1 <= len(replicas[lfn]) <= 4 for lfn in lfns)
+
+    results = runBenchmark(num_lfns=2000, files_per_job=50, num_ses=10, num_placements=40, seed=1)
+    assert results['checks'] == {'all_lfns_once': True, 'within_files_per_job': True, 'locations_shared': True}
+    assert results['subsets']['size']['max'] <= 50
+    assert results['subsets']['count'] >= 2000 // 50
@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+
+import pytest
+
+from Ganga.testlib.GangaUnitTest import load_config_files, clear_config
+
+fake_dirac_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'testlib',
+                              'FakeDIRAC')
+sys.path.insert(0, fake_dirac_dir)
+import FakeDiracState
+
+
+@pytest.yield_fixture(scope='module', autouse=True)
+def config_files():
+    """
+    Load the config files in a way similar to a full Ganga session
+    """
+    load_config_files()
+    yield
+    clear_config()
+
+
+@pytest.fixture
+def fake_env(tmpdir):
+    """The environment of a fake DIRAC with its own state"""
+    return FakeDiracState.fakeDiracEnv(str(tmpdir.mkdir('dirac_state')))
+
+
+@pytest.yield_fixture
+def pool():
+    from GangaDirac.Lib.Utilities.DiracServerPool import DiracServerPool
+    pool = DiracServerPool(2)
+    yield pool
+    pool.shutdown()
+
+
+def _setup():
+    from GangaDirac.Lib.Utilities.DiracUtilities import getDiracCommandIncludes
+    return getDiracCommandIncludes()
+
+
+def test_commands_share_a_server(pool, fake_env, tmpdir):
+    """Commands run one after the other on the same server, giving back what they output, print or raise"""
+
+    FakeDiracState.addFile('/lhcb/data/1.dst', {'CERN-DST': 'fake://1'}, state_dir=fake_env['FAKE_DIRAC_DIR'])
+
+    reply = pool.execute('getReplicas(["/lhcb/data/1.dst"])', fake_env, _setup())
+    assert reply['has_output']
+    assert reply['output']['Value']['Successful'] == {'/lhcb/data/1.dst': {'CERN-DST': 'fake://1'}}
+
+    t0 = time.time()
+    reply = pool.execute('import os\nprint(os.getcwd())\noutput(os.getpid())', fake_env, _setup(), cwd=str(tmpdir))
+    assert time.time() - t0 < 5
+    assert reply['stdout'].strip() == str(tmpdir)
+    first_pid = reply['output']
+
+    reply = pool.execute('print("foo")', fake_env, _setup())
+    assert (reply['has_output'], reply['stdout']) == (False, 'foo\n')
+
+    reply = pool.execute('output(1)\nraise ValueError("bad")', fake_env, _setup())
+    assert reply['output'] == 1
+    reply = pool.execute('raise ValueError("bad")', fake_env, _setup())
+    assert 'ValueError: bad' in reply['output']
+
+    # variables of one command don't leak into the next one
+    pool.execute('leaked = 1', fake_env, _setup())
+    assert 'NameError' in pool.execute('output(leaked)', fake_env, _setup())['output']
+
+    assert pool.execute('import os\noutput(os.getpid())', fake_env, _setup())['output'] == first_pid
+    stats = pool.getStats()
+    assert (stats['started'], stats['servers'], stats['idle']) == (1, 1, 1)
+
+
+def test_timeout_and_death_restart_server(pool, fake_env):
+    """A server which times out or dies is replaced by a new one"""
+
+    from GangaDirac.Lib.Utilities.DiracServerPool import DiracServerDied, DiracServerTimeout
+
+    first_pid = pool.execute('import os\noutput(os.getpid())', fake_env, _setup())['output']
+
+    with pytest.raises(DiracServerTimeout):
+        pool.execute('while True: pass', fake_env, _setup(), timeout=1)
+    assert pool.getStats()['timed_out'] == 1
+
+    second_pid = pool.execute('import os\noutput(os.getpid())', fake_env, _setup())['output']
+    assert second_pid != first_pid
+
+    with pytest.raises(DiracServerDied):
+        pool.execute('import os\nos._exit(3)', fake_env, _setup())
+    assert pool.execute('import os\noutput(os.getpid())', fake_env, _setup())['output'] not in [first_pid, second_pid]
+    assert pool.getStats()['restarted'] == 2
+
+
+def test_health_check(pool, fake_env):
+    """An idle server which was killed is found out by the health check before a command is given to it"""
+
+    import signal
+    from Ganga.Utility.Config import getConfig
+
+    first_pid = pool.execute('import os\noutput(os.getpid())', fake_env, _setup())['output']
+    os.kill(first_pid, signal.SIGKILL)
+    time.sleep(0.5)
+
+    getConfig('DIRAC').setSessionValue('CommandServerHealthCheck', 0)
+    try:
+        assert pool.execute('import os\noutput(os.getpid())', fake_env, _setup())['output'] != first_pid
+    finally:
+        getConfig('DIRAC').revertToDefault('CommandServerHealthCheck')
+    assert pool.getStats()['failed_checks'] == 1
+
+
+def test_concurrent_commands_are_bounded(pool, fake_env):
+    """No more servers are started than the size of the pool"""
+
+    import threading
+
+    results = []
+
+    def run():
+        results.append(pool.execute('import os, time\ntime.sleep(0.5)\noutput(os.getpid())', fake_env, _setup()))
+
+    threads = [threading.Thread(target=run) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(60)
+    assert len(results) == 6
+    assert len(set(r['output'] for r in results)) == 2
+    assert pool.getStats()['started'] == 2
+
+
+def test_execute_uses_server(fake_env, monkeypatch):
+    """DiracUtilities.execute runs DIRAC commands on the command servers and falls back to a process if they fail"""
+
+    from GangaDirac.Lib.Utilities import DiracUtilities, DiracServerPool
+
+    monkeypatch.setattr(DiracUtilities, 'DIRAC_ENV', fake_env)
+    monkeypatch.setattr(DiracUtilities, '_checkProxy', lambda *args, **kwds: None)
+    monkeypatch.setattr(DiracUtilities, 'last_modified_valid', True)
+    monkeypatch.setattr(DiracServerPool, '_dirac_server_pool', DiracServerPool.DiracServerPool(1))
+
+    job_id = DiracUtilities.execute('from DIRAC.Interfaces.API.Job import Job\noutput(dirac.submit(Job()))')['Value']
+    FakeDiracState.setJobStatus([job_id], 'Running', 'Application', site='LCG.CERN.cern',
+                                state_dir=fake_env['FAKE_DIRAC_DIR'])
+    status = DiracUtilities.execute('status([%d], {"Running": "running"})' % job_id)
+    assert status[0][:4] == ['Application', 'Running', 'LCG.CERN.cern', 'running']
+    assert DiracUtilities.execute('print(repr({"a": 1}))', eval_includes='') == {'a': 1}
+    assert DiracUtilities.execute('while True: pass', timeout=1) == 'Command timed out!'
+    assert DiracServerPool.getDiracServerPool().getStats()['timed_out'] == 1
+
+    # a command which gives back None has been run and isn't run again in a process of its own
+    def no_process(*args, **kwds):
+        raise AssertionError('The command was run again in a process')
+    with monkeypatch.context() as m:
+        m.setattr(DiracUtilities.gexecute, 'execute', no_process)
+        assert DiracUtilities.execute('output(None)') is None
+
+    # the servers can't load DIRAC, the command runs in a process of its own
+    broken_env = dict(fake_env)
+    broken_env['PYTHONPATH'] = ''
+    monkeypatch.setattr(DiracUtilities, 'DIRAC_ENV', broken_env)
+    monkeypatch.setattr(DiracUtilities, '_server_disabled', False)
+    assert 'ImportError' in DiracUtilities.execute('output(1)')
+    assert DiracUtilities._server_disabled
+    DiracServerPool.getDiracServerPool().shutdown()
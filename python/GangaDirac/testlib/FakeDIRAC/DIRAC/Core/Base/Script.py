@@ -0,0 +1,3 @@
+def parseCommandLine(*args, **kwds):
+    """The fake DIRAC needs no configuration"""
+    pass
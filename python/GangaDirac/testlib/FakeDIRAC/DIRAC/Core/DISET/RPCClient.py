@@ -0,0 +1,14 @@
+from DIRAC import S_OK, S_ERROR
+import FakeDiracState
+
+
+class RPCClient(object):
+
+    def __init__(self, service, *args, **kwds):
+        self.service = service
+
+    def getJobAttributes(self, job_id):
+        job = FakeDiracState.readState()['jobs'].get(str(job_id))
+        if job is None:
+            return S_ERROR('Job %s not found' % job_id)
+        return S_OK({'ApplicationStatus': job['ApplicationStatus'], 'LastUpdateTime': job['LastUpdateTime']})
@@ -0,0 +1,7 @@
+from DIRAC import S_OK
+import FakeDiracState
+
+
+def getProxyInfo(*args, **kwds):
+    """Every job of the fake DIRAC belongs to the same user"""
+    return S_OK({'username': FakeDiracState.owner, 'group': 'fake_user', 'secondsLeft': 86400})
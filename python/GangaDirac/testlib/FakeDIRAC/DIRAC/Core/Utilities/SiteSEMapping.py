@@ -0,0 +1,10 @@
+from DIRAC import S_OK
+import FakeDiracState
+
+
+def getSitesForSE(storageElement, *args, **kwds):
+    return S_OK(FakeDiracState.readState()['se_sites'].get(storageElement, []))
+
+
+def getSEsForSite(site):
+    return S_OK(sorted(se for se, sites in FakeDiracState.readState()['se_sites'].items() if site in sites))
@@ -0,0 +1,187 @@
+import os
+import shutil
+
+from DIRAC import S_OK, S_ERROR
+import FakeDiracState
+
+
+class Dirac(object):
+
+    """
+    The DIRAC API as far as Ganga uses it, keeping the jobs and files in the FakeDiracState
+    """
+
+    def _job(self, job_id, data=None):
+        data = data or FakeDiracState.readState()
+        return data['jobs'].get(str(job_id))
+
+    def submit(self, job, mode='wms'):
+        """Create a job, or one job per parameter of a parametric job, and return the id(s)"""
+        FakeDiracState.recordCall('submit')
+        attributes = job._toJSON()
+        sequences = getattr(job, 'parameterSequences', {})
+        if not sequences:
+            return S_OK(FakeDiracState.addJobs([{'Attributes': attributes}])[0])
+
+        lengths = set(len(values) for values in sequences.values())
+        if len(lengths) != 1:
+            return S_ERROR('Parameter sequences of different lengths')
+        definitions = []
+        for i in range(lengths.pop()):
+            parameters = dict((name, repr(values[i])) for name, values in sequences.items())
+            definitions.append({'Attributes': attributes, 'JobParameters': parameters, 'ParametricIndex': i})
+        return S_OK(FakeDiracState.addJobs(definitions))
+
+    submitJob = submit
+
+    def status(self, job_ids):
+        FakeDiracState.recordCall('status', list(job_ids))
+        data = FakeDiracState.readState()
+        result = {}
+        for job_id in job_ids:
+            job = self._job(job_id, data)
+            if job is not None:
+                result[job_id] = {'Status': job['Status'], 'MinorStatus': job['MinorStatus'], 'Site': job['Site']}
+        return S_OK(result)
+
+    def loggingInfo(self, job_id):
+        job = self._job(job_id)
+        if job is None:
+            return S_ERROR('Job %s not found' % job_id)
+        return S_OK([tuple(entry) for entry in job['LoggingInfo']])
+
+    def parameters(self, job_id):
+        job = self._job(job_id)
+        if job is None:
+            return S_ERROR('Job %s not found' % job_id)
+        return S_OK(dict(job['Parameters']))
+
+    def getJobCPUTime(self, job_id):
+        return S_OK({'CPU': self.parameters(job_id).get('Value', {}).get('NormCPUTime(s)', 0)})
+
+    def peek(self, job_id):
+        if self._job(job_id) is None:
+            return S_ERROR('Job %s not found' % job_id)
+        return S_OK('fake stdout of job %s' % job_id)
+
+    def delete(self, job_id):
+        ids = job_id if isinstance(job_id, list) else [job_id]
+        data = FakeDiracState.readState()
+        if any(self._job(i, data) is None for i in ids):
+            return S_ERROR('Job not found')
+        FakeDiracState.setJobStatus(ids, 'Killed', 'Marked for termination')
+        return S_OK(ids)
+
+    def reschedule(self, job_id):
+        if self._job(job_id) is None:
+            return S_ERROR('Job %s not found' % job_id)
+        FakeDiracState.setJobStatus([job_id], 'Received', 'Job Rescheduled')
+        return S_OK([job_id])
+
+    def selectJobs(self, jobGroup=None, owner=None, date=None, **kwds):
+        """The ids of the jobs in a group, of an owner and last updated at or after a date"""
+        FakeDiracState.recordCall('selectJobs')
+        jobs = FakeDiracState.readState()['jobs']
+        return S_OK(sorted(i for i, job in jobs.items()
+                           if (jobGroup is None or job.get('JobGroup') == jobGroup) and
+                           (owner is None or job.get('Owner') == owner) and
+                           (date is None or job['LastUpdateTime'] >= str(date))))
+
+    def getOutputSandbox(self, job_id, outputDir=None, oversized=True, noJobDir=False):
+        FakeDiracState.recordCall('getOutputSandbox')
+        if self._job(job_id) is None:
+            return S_ERROR('Job %s not found' % job_id)
+        outputDir = outputDir or os.getcwd()
+        if not noJobDir:
+            outputDir = os.path.join(outputDir, str(job_id))
+        if not os.path.isdir(outputDir):
+            os.makedirs(outputDir)
+        with open(os.path.join(outputDir, 'std.out'), 'w') as f:
+            f.write('fake stdout of job %s\n' % job_id)
+        return S_OK(['std.out'])
+
+    def getJobOutputData(self, job_id, outputFiles='', destinationDir=''):
+        return S_OK([])
+
+    def ping(self, system, service):
+        return S_OK({'service': '%s/%s' % (system, service)})
+
+    def getReplicas(self, lfns, active=True, preferDisk=False):
+        FakeDiracState.recordCall('getReplicas')
+        lfns = lfns if isinstance(lfns, list) else [lfns]
+        files = FakeDiracState.readState()['files']
+        successful, failed = {}, {}
+        for lfn in lfns:
+            if lfn in files:
+                successful[lfn] = files[lfn]['replicas']
+            else:
+                failed[lfn] = 'No such file or directory'
+        return S_OK({'Successful': successful, 'Failed': failed})
+
+    def getMetadata(self, lfn):
+        lfns = lfn if isinstance(lfn, list) else [lfn]
+        files = FakeDiracState.readState()['files']
+        successful, failed = {}, {}
+        for this_lfn in lfns:
+            if this_lfn in files:
+                successful[this_lfn] = files[this_lfn]['metadata']
+            else:
+                failed[this_lfn] = 'No such file or directory'
+        return S_OK({'Successful': successful, 'Failed': failed})
+
+    def getAccessURL(self, lfn, SE):
+        files = FakeDiracState.readState()['files']
+        if lfn not in files or SE not in files[lfn]['replicas']:
+            return S_ERROR('No replica of %s at %s' % (lfn, SE))
+        return S_OK({'Successful': {lfn: files[lfn]['replicas'][SE]}, 'Failed': {}})
+
+    def addFile(self, lfn, file, diracSE, guid=None):
+        if not os.path.exists(file):
+            return S_ERROR('File %s does not exist' % file)
+        metadata = {'Size': os.path.getsize(file)}
+        if guid:
+            metadata['GUID'] = guid
+        FakeDiracState.addFile(lfn, {diracSE: 'fake://%s%s' % (diracSE, lfn)}, metadata)
+        return S_OK({'Successful': {lfn: {'put': 0.0, 'register': 0.0}}, 'Failed': {}})
+
+    def removeFile(self, lfn):
+        with FakeDiracState.state() as data:
+            if data['files'].pop(lfn, None) is None:
+                return S_OK({'Successful': {}, 'Failed': {lfn: 'No such file or directory'}})
+        return S_OK({'Successful': {lfn: True}, 'Failed': {}})
+
+    def getFile(self, lfns, destDir=''):
+        lfns = lfns if isinstance(lfns, list) else [lfns]
+        files = FakeDiracState.readState()['files']
+        successful, failed = {}, {}
+        for lfn in lfns:
+            if lfn not in files:
+                failed[lfn] = 'No such file or directory'
+                continue
+            path = os.path.join(destDir or os.getcwd(), os.path.basename(lfn))
+            with open(path, 'w') as f:
+                f.write('fake contents of %s\n' % lfn)
+            successful[lfn] = path
+        return S_OK({'Successful': successful, 'Failed': failed})
+
+    def replicateFile(self, lfn, destSE, sourceSE='', localCache=''):
+        with FakeDiracState.state() as data:
+            if lfn not in data['files']:
+                return S_ERROR('No such file or directory')
+            data['files'][lfn]['replicas'][destSE] = 'fake://%s%s' % (destSE, lfn)
+        return S_OK({'Successful': {lfn: {'replicate': 0.0, 'register': 0.0}}, 'Failed': {}})
+
+    def removeReplica(self, lfn, storageElement):
+        with FakeDiracState.state() as data:
+            if lfn not in data['files']:
+                return S_OK({'Successful': {}, 'Failed': {lfn: 'No such file or directory'}})
+            data['files'][lfn]['replicas'].pop(storageElement, None)
+        return S_OK({'Successful': {lfn: True}, 'Failed': {}})
+
+    def splitInputData(self, lfns, maxFilesPerJob=20, printOutput=False):
+        return S_OK([lfns[i:i + maxFilesPerJob] for i in range(0, len(lfns), maxFilesPerJob)])
+
+    def getInputDataCatalog(self, lfns, siteName='', fileName='pool_xml_catalog.xml', ignoreMissing=False):
+        with open(fileName, 'w') as f:
+            f.write('<POOLFILECATALOG>\n</POOLFILECATALOG>\n')
+        return S_OK({'Successful': dict((lfn, {}) for lfn in lfns), 'Failed': {}})
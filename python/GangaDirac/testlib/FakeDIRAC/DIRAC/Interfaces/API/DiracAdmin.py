@@ -0,0 +1,10 @@
+from DIRAC import S_OK
+
+
+class DiracAdmin(object):
+
+    def getJobPilotOutput(self, job_id):
+        return S_OK({'StdOut': 'fake pilot output of job %s' % job_id})
+
+    def getServicePorts(self, *args, **kwds):
+        return S_OK({})
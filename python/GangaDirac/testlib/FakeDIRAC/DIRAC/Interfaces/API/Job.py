@@ -0,0 +1,25 @@
+class Job(object):
+
+    """
+    Records the attributes a DIRAC API script sets, as the name of the setter without 'set' (setName -> Name)
+    """
+
+    def __init__(self, *args, **kwds):
+        self.attributes = {}
+        self.parameterSequences = {}
+
+    def setParameterSequence(self, name, values, addToWorkflow=False):
+        self.parameterSequences[name] = list(values)
+
+    def __getattr__(self, name):
+        if not name.startswith('set'):
+            raise AttributeError(name)
+
+        def setter(*args, **kwds):
+            self.attributes[name[3:]] = args[0] if len(args) == 1 and not kwds else [args, kwds]
+
+        return setter
+
+    def _toJSON(self):
+        """The attributes as they are stored with the job"""
+        return dict((k, repr(v)) for k, v in self.attributes.items())
@@ -0,0 +1,12 @@
+"""
+Fake DIRAC, standing in for the parts of the DIRAC API which Ganga uses so that it can be tested offline.
+See FakeDiracState for the state shared between the processes using it.
+"""
+
+
+def S_OK(value=None):
+    return {'OK': True, 'Value': value}
+
+
+def S_ERROR(message=''):
+    return {'OK': False, 'Message': message}
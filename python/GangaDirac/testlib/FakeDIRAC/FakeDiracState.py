@@ -0,0 +1,181 @@
+"""
+State of the fake DIRAC used to test Ganga without a DIRAC installation
+
+The ``DIRAC`` package next to this module stands in for the parts of the DIRAC API which the Ganga DIRAC commands
+use. Every process importing it, whether a DIRAC command server or a test, shares the jobs and files kept as JSON in
+the directory named by ``FAKE_DIRAC_DIR``, so a test can submit jobs through Ganga and then move them through the
+DIRAC states with ``setJobStatus``.
+
+This module is imported both within the fake DIRAC environment and by the tests, which put this directory on sys.path,
+so it imports nothing but the standard library.
+"""
+
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+_state_file = 'state.json'
+_lock_file = 'state.lock'
+
+# The DIRAC user owning the jobs
+owner = 'fakeuser'
+
+# The statuses of DIRAC jobs in the order they go through them
+job_statuses = ['Received', 'Checking', 'Waiting', 'Matched', 'Running', 'Completed', 'Done']
+
+
+def utcNow():
+    """The time as DIRAC keeps it, e.g. as the LastUpdateTime of a job"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+def stateDir():
+    """Return the directory of the fake DIRAC state, as given by $FAKE_DIRAC_DIR"""
+    state_dir = os.environ.get('FAKE_DIRAC_DIR')
+    if not state_dir:
+        state_dir = os.path.join(tempfile.gettempdir(), 'fake_dirac_%s' % os.getuid())
+    if not os.path.isdir(state_dir):
+        try:
+            os.makedirs(state_dir)
+        except OSError:
+            pass
+    return state_dir
+
+
+def _emptyState():
+    return {'next_id': 1, 'jobs': {}, 'files': {}, 'se_sites': {}, 'calls': []}
+
+
+@contextmanager
+def state(state_dir=None):
+    """
+    Lock the fake DIRAC state and yield it as a dictionary which is written back afterwards
+    Args:
+        state_dir (str): The directory of the state, stateDir() if None
+    """
+    state_dir = state_dir or stateDir()
+    with open(os.path.join(state_dir, _lock_file), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            path = os.path.join(state_dir, _state_file)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (IOError, ValueError):
+                data = _emptyState()
+            yield data
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp, path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def readState(state_dir=None):
+    """Return a copy of the fake DIRAC state"""
+    with state(state_dir) as data:
+        return json.loads(json.dumps(data))
+
+
+def resetState(state_dir=None):
+    """Forget all jobs, files and calls"""
+    with state(state_dir) as data:
+        data.clear()
+        data.update(_emptyState())
+
+
+def recordCall(name, details=None, state_dir=None):
+    """
+    Count a call of a DIRAC API method, so tests can check how much DIRAC was asked
+    Args:
+        name (str): The name of the method
+        details (object): What it was asked about, e.g. the job ids
+    """
+    with state(state_dir) as data:
+        data['calls'].append([name, os.getpid(), details])
+
+
+def addJobs(definitions, state_dir=None):
+    """
+    Create a job for each of the definitions and return their ids
+    Args:
+        definitions (list): dicts of the attributes of the jobs, e.g. Name and Parameters
+    """
+    ids = []
+    now = utcNow()
+    with state(state_dir) as data:
+        for definition in definitions:
+            job_id = data['next_id']
+            data['next_id'] += 1
+            job = {'Status': 'Received', 'MinorStatus': 'Job accepted', 'Site': 'ANY', 'ApplicationStatus': 'Unknown',
+                   'Owner': owner,
+                   'LastUpdateTime': now, 'Parameters': {}, 'LoggingInfo': [['Received', 'Job accepted', 'Unknown', now,
+                                                                            'JobManager']]}
+            job.update(definition)
+            data['jobs'][str(job_id)] = job
+            ids.append(job_id)
+    return ids
+
+
+def setJobStatus(job_ids, status, minor_status='', site='ANY', parameters=None, state_dir=None):
+    """
+    Move jobs to a DIRAC status, as the WMS would
+    Args:
+        job_ids (list): The ids of the jobs
+        status (str): The major status, e.g. Running or Done
+        minor_status (str): The minor status
+        site (str): Where the job runs
+        parameters (dict): Job parameters to add, e.g. UploadedOutputData or NormCPUTime(s)
+    """
+    now = utcNow()
+    with state(state_dir) as data:
+        for job_id in job_ids:
+            job = data['jobs'][str(job_id)]
+            job['Status'] = status
+            job['MinorStatus'] = minor_status
+            job['Site'] = site
+            job['LastUpdateTime'] = now
+            job['Parameters'].update(parameters or {})
+            job['LoggingInfo'].append([status, minor_status, 'Unknown', now, 'JobAgent'])
+
+
+def addFile(lfn, replicas, metadata=None, state_dir=None):
+    """
+    Register a file in the fake catalogue
+    Args:
+        lfn (str): The LFN of the file
+        replicas (dict): SE -> PFN of each replica
+        metadata (dict): Extra metadata, GUID and Size are made up if missing
+    """
+    md = {'GUID': 'GUID-%s' % abs(hash(lfn)), 'Size': 1}
+    md.update(metadata or {})
+    with state(state_dir) as data:
+        data['files'][lfn] = {'replicas': replicas, 'metadata': md}
+
+
+def setSitesForSE(se, sites, state_dir=None):
+    """Set the sites which can read from a storage element"""
+    with state(state_dir) as data:
+        data['se_sites'][se] = sites
+
+
+def fakeDiracEnv(state_dir=None, env=None):
+    """
+    Return an environment in which the fake DIRAC is imported instead of a real one, usable as the DIRAC environment
+    Args:
+        state_dir (str): The directory of the fake DIRAC state
+        env (dict): The environment to extend, os.environ if None
+    """
+    fake_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ if env is None else env)
+    env['PYTHONPATH'] = os.pathsep.join([fake_dir] + [p for p in [env.get('PYTHONPATH')] if p])
+    env['DIRACROOT'] = fake_dir
+    env['FAKE_DIRAC_DIR'] = state_dir or stateDir()
+    # make sure the same interpreter is found first
+    env['PATH'] = os.pathsep.join([os.path.dirname(sys.executable)] + [p for p in [env.get('PATH')] if p])
+    return env